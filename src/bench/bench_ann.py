@@ -0,0 +1,86 @@
+"""
+Benchmark wyszukiwania CLIP: IVF-PQ (src.clip.ann_index) vs dokładne top-k – recall@k i czas zapytania.
+
+Dane syntetyczne: znormalizowane wektory z mieszaniny klastrów (jak embeddingi podobnych zdjęć).
+
+Uruchomienie:
+    python -m src.bench.bench_ann --n 200000 --dim 512 --nprobe 4 8 16 32 --rerank 0 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from src.bench.synthetic import synthetic_embeddings
+from src.clip.ann_index import ExactIndex, IVFPQIndex, recall_at_k
+from src.clip.embedding_store import EmbeddingStore
+
+
+def _latency_ms(index, queries: np.ndarray, k: int, **kw) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        index.search(q, k=k, **kw)
+    return 1000 * (time.perf_counter() - t0) / max(1, len(queries))
+
+
+def run(
+    n: int,
+    dim: int = 512,
+    n_queries: int = 100,
+    k: int = 10,
+    nprobes: List[int] = (4, 8, 16, 32),
+    reranks: List[int] = (0, 200),
+    seed: int = 0,
+) -> List[Dict]:
+    X = synthetic_embeddings(n + n_queries, dim=dim, seed=seed)
+    X, queries = X[:n], X[n:]
+
+    with tempfile.TemporaryDirectory() as root:
+        store = EmbeddingStore(root, dim=dim, model_id="bench")
+        store.append(X, [{"gcs_path": f"gs://bench/{i}.jpg", "file_name": f"{i}.jpg"} for i in range(n)])
+        exact = ExactIndex(store)
+
+        t0 = time.perf_counter()
+        ann = IVFPQIndex(store, seed=seed)
+        ann.sync()
+        build_s = time.perf_counter() - t0
+
+        results = [{"backend": "exact", "n": n, "ms_per_query": _latency_ms(exact, queries, k), "recall": 1.0}]
+        print(results[-1])
+        for rerank in reranks:
+            for nprobe in nprobes:
+                row = {
+                    "backend": "ivfpq",
+                    "n": n,
+                    "nlist": ann.nlist,
+                    "m": ann.m,
+                    "nprobe": nprobe,
+                    "rerank": rerank,
+                    "build_s": build_s,
+                    "ms_per_query": _latency_ms(ann, queries, k, nprobe=nprobe, rerank=rerank),
+                    "recall": recall_at_k(ann, exact, queries, k=k, nprobe=nprobe, rerank=rerank),
+                }
+                results.append(row)
+                print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--n", type=int, default=200000)
+    p.add_argument("--dim", type=int, default=512)
+    p.add_argument("--queries", type=int, default=100)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    p.add_argument("--rerank", type=int, nargs="+", default=[0, 200])
+    args = p.parse_args(argv)
+    run(args.n, dim=args.dim, n_queries=args.queries, k=args.k, nprobes=args.nprobe, reranks=args.rerank)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark magazynów cache OCR (src.ocr.cache_store): CSV vs Parquet na syntetycznych liniach.
+
+Dla każdego rozmiaru i formatu:
+- save_s: zapis pełnego cache (pierwsze add),
+- load_s: odczyt całości świeżą instancją magazynu (jak nowy kernel / nowe uruchomienie),
+- content_index_s: lista przetworzonych plików + klucze treści (to czyta każde run_ocr_cache),
+- increment_s: dopisanie ~1% nowych obrazów (typowe kolejne uruchomienie OCR).
+
+Uruchomienie:
+    python -m src.bench.bench_cache --lines 100000 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from src.bench.synthetic import synthetic_lines
+from src.ocr.cache_store import CsvOcrCacheStore, ParquetOcrCacheStore
+
+
+def _open(fmt: str, tmp: str):
+    if fmt == "csv":
+        return CsvOcrCacheStore(os.path.join(tmp, "ocr_cache.csv"))
+    return ParquetOcrCacheStore(os.path.join(tmp, "ocr_cache"))
+
+
+def _size_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / 1e6
+
+
+def run(sizes: List[int], formats: List[str] = ("csv", "parquet"), lines_per_image: int = 40, seed: int = 0) -> List[Dict]:
+    results = []
+    for n in sizes:
+        df = synthetic_lines(n, lines_per_image=lines_per_image, seed=seed)
+        df_inc = synthetic_lines(max(1, n // 100), lines_per_image=lines_per_image, seed=seed + 1, prefix="gs://bench/new")
+        for fmt in formats:
+            with tempfile.TemporaryDirectory() as tmp:
+                store = _open(fmt, tmp)
+                t0 = time.perf_counter()
+                store.add(df, processed=df["gcs_path"].unique())
+                save_s = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                loaded = _open(fmt, tmp).load()
+                load_s = time.perf_counter() - t0
+
+                t0 = time.perf_counter()
+                n_files = len(_open(fmt, tmp).content_index())
+                index_s = time.perf_counter() - t0
+
+                store = _open(fmt, tmp)
+                t0 = time.perf_counter()
+                store.add(df_inc, processed=df_inc["gcs_path"].unique())
+                inc_s = time.perf_counter() - t0
+
+                row = {
+                    "lines": n,
+                    "format": fmt,
+                    "files": n_files,
+                    "save_s": save_s,
+                    "load_s": load_s,
+                    "content_index_s": index_s,
+                    "increment_s": inc_s,
+                    "size_mb": _size_mb(store.location),
+                    "roundtrip_ok": len(loaded) == len(df),
+                }
+            results.append(row)
+            print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000])
+    p.add_argument("--formats", nargs="+", default=["csv", "parquet"])
+    p.add_argument("--lines-per-image", type=int, default=40)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    run(args.lines, formats=args.formats, lines_per_image=args.lines_per_image, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
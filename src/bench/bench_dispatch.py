@@ -0,0 +1,185 @@
+"""
+Benchmark wysyłki OCR do Vision na lokalnym zamienniku (FakeImageAnnotatorClient z opóźnieniem i błędami).
+
+- single: iter_ocr_results + ocr_lines_from_gcs, różne max_in_flight,
+- batch: iter_ocr_results_batched (batch_annotate_images, do 16 obrazów / RPC),
+- pipeline: run_ocr_cache end-to-end na FakeStorageClient (listing + OCR + zapis cache),
+  uruchomienie "zimne" (wszystko do OCR) i "ciepłe" (wszystko z cache, 0 wywołań Vision).
+
+Ponowienia w trybie single używają krótkiego backoffu (base_delay), żeby error_rate mierzył koszt
+retry, a nie czekanie; batch i pipeline mają backoff produkcyjny – tam domyślnie bez błędów.
+
+Uruchomienie:
+    python -m src.bench.bench_dispatch --images 500 --latency 0.05 --in-flight 1 4 8 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.bench.fake_vision import FakeImageAnnotatorClient
+from src.bench.synthetic import populate_fake_gcs
+from src.io.gcs import set_client
+from src.ocr.batch import iter_ocr_results_batched
+from src.ocr.cache_store import ParquetOcrCacheStore
+from src.ocr.dispatch import iter_ocr_results
+from src.ocr.ocr_cache import lines_from_response, ocr_lines_from_gcs, run_ocr_cache
+
+
+PREFIX = "gs://bench/photos"
+
+
+def _drain(results) -> tuple[int, int]:
+    ok = err = 0
+    for _, rows, e in results:
+        if e is None:
+            ok += 1
+        else:
+            err += 1
+    return ok, err
+
+
+def run_single(paths: List[str], in_flight: List[int], latency_s: float, error_rate: float, seed: int = 0) -> List[Dict]:
+    results = []
+    for m in in_flight:
+        client = FakeImageAnnotatorClient(latency_s=latency_s, error_rate=error_rate, seed=seed)
+        t0 = time.perf_counter()
+        ok, err = _drain(
+            iter_ocr_results(
+                paths,
+                lambda p: ocr_lines_from_gcs(p, client=client),
+                max_in_flight=m,
+                base_delay=0.01,
+                max_delay=0.1,
+            )
+        )
+        s = time.perf_counter() - t0
+        row = {
+            "backend": "single",
+            "images": len(paths),
+            "max_in_flight": m,
+            "error_rate": error_rate,
+            "seconds": s,
+            "images_per_s": len(paths) / max(s, 1e-9),
+            "calls": client.calls,
+            "max_concurrent": client.max_concurrent,
+            "ok": ok,
+            "failed": err,
+        }
+        results.append(row)
+        print(row)
+    return results
+
+
+def run_batch(paths: List[str], in_flight: List[int], latency_s: float, batch_size: int = 16, seed: int = 0) -> List[Dict]:
+    results = []
+    for m in in_flight:
+        client = FakeImageAnnotatorClient(latency_s=latency_s, seed=seed)
+        t0 = time.perf_counter()
+        ok, err = _drain(
+            iter_ocr_results_batched(
+                paths,
+                client,
+                lines_from_response,
+                lambda p: ocr_lines_from_gcs(p, client=client),
+                batch_size=batch_size,
+                max_in_flight=m,
+            )
+        )
+        s = time.perf_counter() - t0
+        row = {
+            "backend": "batch",
+            "images": len(paths),
+            "max_in_flight": m,
+            "batch_size": batch_size,
+            "seconds": s,
+            "images_per_s": len(paths) / max(s, 1e-9),
+            "calls": client.calls,
+            "batched_images": client.batch_calls,
+            "ok": ok,
+            "failed": err,
+        }
+        results.append(row)
+        print(row)
+    return results
+
+
+def run_pipeline(n_images: int, latency_s: float, max_in_flight: int = 8, seed: int = 0) -> List[Dict]:
+    """run_ocr_cache na fake GCS + fake Vision (Parquet cache w katalogu tymczasowym); logi wyciszone."""
+    storage = FakeStorageClient(latency_s=latency_s / 10, seed=seed)
+    populate_fake_gcs(storage, PREFIX, n_images, width=64, height=48, distinct=2, seed=seed)
+    results = []
+    set_client(storage)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ParquetOcrCacheStore(os.path.join(tmp, "cache"))
+            for phase in ("cold", "warm"):
+                vision = FakeImageAnnotatorClient(latency_s=latency_s, seed=seed)
+                t0 = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    df = run_ocr_cache(PREFIX, None, client=vision, max_in_flight=max_in_flight, store=store)
+                s = time.perf_counter() - t0
+                row = {
+                    "backend": "pipeline",
+                    "phase": phase,
+                    "images": n_images,
+                    "max_in_flight": max_in_flight,
+                    "seconds": s,
+                    "images_per_s": n_images / max(s, 1e-9),
+                    "calls": vision.calls,
+                    "lines": len(df),
+                }
+                results.append(row)
+                print(row)
+    finally:
+        set_client(None)
+    return results
+
+
+def run(
+    n_images: int = 500,
+    in_flight: List[int] = (1, 4, 8, 16),
+    latency_s: float = 0.05,
+    error_rate: float = 0.02,
+    batch_size: int = 16,
+    pipeline: bool = True,
+    seed: int = 0,
+) -> List[Dict]:
+    paths = [f"{PREFIX}/img_{i:07d}.jpg" for i in range(n_images)]
+    results = run_single(paths, list(in_flight), latency_s, error_rate, seed=seed)
+    results += run_batch(paths, [m for m in in_flight if m <= 4], latency_s, batch_size=batch_size, seed=seed)
+    if pipeline:
+        results += run_pipeline(n_images, latency_s, max_in_flight=max(in_flight), seed=seed)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--images", type=int, default=500)
+    p.add_argument("--in-flight", type=int, nargs="+", default=[1, 4, 8, 16])
+    p.add_argument("--latency", type=float, default=0.05, help="opóźnienie wywołania Vision [s]")
+    p.add_argument("--error-rate", type=float, default=0.02, help="odsetek błędów 503 (tryb single)")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--no-pipeline", action="store_true", help="bez pomiaru run_ocr_cache end-to-end")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    run(
+        args.images,
+        in_flight=args.in_flight,
+        latency_s=args.latency,
+        error_rate=args.error_rate,
+        batch_size=args.batch_size,
+        pipeline=not args.no_pipeline,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark export_per_image: wektorowa agregacja vs dawny groupby.agg z join_unique_lines per grupa.
+
+Dane syntetyczne jak zbiór po recenzji: linie z duplikatami, pustymi wpisami, NaN i excluded (watermark).
+Sprawdza, że CSV jest bajtowo identyczny z dawnym eksportem; mierzy też zapis strumieniowy Parquet.
+
+Uruchomienie:
+    python -m src.bench.bench_export --lines 100000 1000000 --lines-per-image 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.exports.ocr_review_export import export_per_image, join_unique_lines
+
+
+def export_per_image_reference(
+    df: pd.DataFrame,
+    output_csv: str,
+    *,
+    text_col_prefer: str = "text_edited",
+    excluded_col: str = "excluded",
+) -> str:
+    """Pierwotna implementacja (groupby.agg z funkcjami Pythona per grupa) – wzorzec wyniku."""
+    base, _ = os.path.splitext(output_csv)
+    per_image_csv = base + "__per_image.csv"
+
+    dff = df.copy()
+    if excluded_col in dff.columns:
+        dff = dff[~dff[excluded_col].eq(True)].copy()
+
+    text_col = text_col_prefer if text_col_prefer in dff.columns else "text"
+    agg = (
+        dff.groupby("file_name", as_index=False)
+        .agg(
+            gcs_path=("gcs_path", "first") if "gcs_path" in dff.columns else ("file_name", "first"),
+            text_joined=(text_col, join_unique_lines),
+            lines_n=(text_col, lambda s: int((s.astype(str).str.strip() != "").sum())),
+        )
+    )
+    agg.to_csv(per_image_csv, index=False, encoding="utf-8")
+    return per_image_csv
+
+
+def synthetic_reviewed(n_lines: int, lines_per_image: int = 40, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n_images = max(1, n_lines // lines_per_image)
+    img = rng.integers(0, n_images, size=n_lines)
+    vocab = np.array(
+        ["APTEKA", "ul. Długa 5", "  Sklep Kolonialny ", "", "   ", "FOTO \"Studio\"", "Bar, Mleczny", "ZAKŁAD\nFRYZJERSKI"]
+        + [f"linia {i}" for i in range(500)],
+        dtype=object,
+    )
+    text = vocab[rng.integers(0, len(vocab), size=n_lines)]
+    text[rng.random(n_lines) < 0.01] = np.nan
+    gcs = np.array([f"gs://ocr-2026/photos/img_{i:07d}.jpg" for i in range(n_images)], dtype=object)[img]
+    gcs[rng.random(n_lines) < 0.05] = np.nan
+    return pd.DataFrame(
+        {
+            "file_name": [f"img_{i:07d}.jpg" for i in img],
+            "gcs_path": gcs,
+            "line_id": np.arange(n_lines),
+            "text": text,
+            "text_edited": text,
+            "excluded": rng.random(n_lines) < 0.05,
+        }
+    )
+
+
+def _timed(fn, *args, **kw) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return time.perf_counter() - t0, out
+
+
+def run(sizes: List[int], lines_per_image: int = 40, seed: int = 0) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            df = synthetic_reviewed(n, lines_per_image=lines_per_image, seed=seed)
+            ref_s, ref_path = _timed(export_per_image_reference, df, os.path.join(tmp, "ref.csv"))
+            new_s, new_path = _timed(export_per_image, df, os.path.join(tmp, "new.csv"))
+            pq_s, _ = _timed(export_per_image, df, os.path.join(tmp, "new.csv"), fmt="parquet")
+            row = {
+                "lines": n,
+                "images": int(df["file_name"].nunique()),
+                "reference_s": ref_s,
+                "vectorized_s": new_s,
+                "parquet_s": pq_s,
+                "speedup": ref_s / max(new_s, 1e-9),
+                "identical_csv": filecmp.cmp(ref_path, new_path, shallow=False),
+            }
+            results.append(row)
+            print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000])
+    p.add_argument("--lines-per-image", type=int, default=40)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    run(args.lines, lines_per_image=args.lines_per_image, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark listingu GCS (src.io.gcs) na lokalnym zamienniku FakeStorageClient z opóźnieniem na stronę.
+
+Mierzy iter_images_meta (strumieniowo) i list_images_meta (z sortowaniem) dla różnych page_size
+oraz list_folders (listowanie z delimiter="/"). Liczba stron = liczba round-tripów do GCS.
+
+Uruchomienie:
+    python -m src.bench.bench_listing --images 10000 100000 --page-size 100 1000 --latency 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.bench.synthetic import populate_fake_gcs
+from src.io.gcs import iter_images_meta, list_folders, list_images_meta
+
+
+PREFIX = "gs://bench/photos"
+
+
+def run(
+    sizes: List[int],
+    page_sizes: List[int] = (100, 1000),
+    latency_s: float = 0.02,
+    folders: int = 20,
+    seed: int = 0,
+) -> List[Dict]:
+    results = []
+    for n in sizes:
+        client = FakeStorageClient(latency_s=latency_s, seed=seed)
+        populate_fake_gcs(client, PREFIX, n, width=64, height=48, distinct=2, folders=folders, seed=seed)
+
+        for ps in page_sizes:
+            pages0 = client.pages_served
+            t0 = time.perf_counter()
+            n_meta = sum(1 for _ in iter_images_meta(PREFIX, client=client, page_size=ps))
+            iter_s = time.perf_counter() - t0
+            row = {
+                "images": n,
+                "page_size": ps,
+                "latency_s": latency_s,
+                "pages": client.pages_served - pages0,
+                "iter_s": iter_s,
+                "images_per_s": n_meta / max(iter_s, 1e-9),
+            }
+            results.append(row)
+            print(row)
+
+        t0 = time.perf_counter()
+        list_images_meta(PREFIX, client=client)
+        sorted_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        n_folders = len(list_folders(PREFIX, client=client))
+        folders_s = time.perf_counter() - t0
+        row = {"images": n, "latency_s": latency_s, "list_sorted_s": sorted_s, "folders": n_folders, "list_folders_s": folders_s}
+        results.append(row)
+        print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--images", type=int, nargs="+", default=[10_000, 100_000])
+    p.add_argument("--page-size", type=int, nargs="+", default=[100, 1000])
+    p.add_argument("--latency", type=float, default=0.02, help="opóźnienie strony listingu [s]")
+    p.add_argument("--folders", type=int, default=20)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    run(args.images, page_sizes=args.page_size, latency_s=args.latency, folders=args.folders, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark zimnego startu: czas importu modułów (osobny proces na pomiar) i które ciężkie biblioteki ładują.
+
+Pilnuje, żeby import modułów rdzenia nie wciągał google-cloud (gRPC), torch ani open_clip
+– te mają się ładować dopiero przy pierwszym użyciu backendu.
+Opcjonalnie (--model): pierwsze połączenie z serwerem modelu CLIP (start + wagi) vs zapytanie do działającego.
+
+Uruchomienie:
+    python -m src.bench.bench_startup --repeat 5
+    python -m src.bench.bench_startup --model
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Sequence
+
+
+DEFAULT_MODULES = (
+    "src.io.gcs",
+    "src.io.image_fetcher",
+    "src.ocr.batch",
+    "src.ocr.ocr_cache",
+    "src.search.text_index",
+    "src.search.hybrid",
+    "src.search.cli",
+    "src.clip.embed_pipeline",
+    "src.clip.model_server",
+    "src.viz.thumbs",
+)
+HEAVY = ("grpc", "google.cloud.vision", "google.cloud.storage", "torch", "open_clip", "pandas", "IPython")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+t = time.perf_counter() - t0
+print(json.dumps({{"s": t, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(module: str) -> Dict:
+    """Import modułu w świeżym interpreterze: czas importu (bez startu Pythona) i załadowane ciężkie biblioteki."""
+    t0 = time.perf_counter()
+    r = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - t0
+    if r.returncode != 0:
+        return {"module": module, "error": (r.stderr or "").strip().splitlines()[-1:]}
+    out = json.loads(r.stdout.strip().splitlines()[-1])
+    return {"module": module, "import_s": out["s"], "process_s": wall, "heavy": out["heavy"]}
+
+
+def run_imports(modules: Sequence[str] = DEFAULT_MODULES, repeat: int = 3) -> List[Dict]:
+    results = []
+    for module in modules:
+        runs = [import_once(module) for _ in range(max(1, repeat))]
+        ok = [r for r in runs if "error" not in r]
+        if not ok:
+            row = runs[0]
+        else:
+            row = {
+                "module": module,
+                "import_ms": 1000 * statistics.median(r["import_s"] for r in ok),
+                "process_ms": 1000 * statistics.median(r["process_s"] for r in ok),
+                "heavy": ",".join(ok[0]["heavy"]) or "-",
+            }
+        results.append(row)
+        print(row)
+    return results
+
+
+def run_model(mode: str = "server") -> Dict:
+    """Pierwsze zapytanie (start serwera albo połączenie z działającym) vs kolejne połączenie i zapytanie."""
+    from src.clip.model_server import connect_clip
+
+    t0 = time.perf_counter()
+    clip = connect_clip(mode=mode)
+    clip.embed_text("szyld apteki")
+    first_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    clip2 = connect_clip(mode=mode) if mode != "local" else clip
+    clip2.embed_text("szyld apteki")
+    warm_ms = 1000 * (time.perf_counter() - t0)
+
+    row = {"model": clip.model_id, "mode": mode, "first_query_s": first_s, "warm_connect_query_ms": warm_ms}
+    print(row)
+    return row
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--model", action="store_true", help="zmierz też start serwera modelu CLIP (src.clip.model_server)")
+    p.add_argument("--model-mode", default="server", help="server / local")
+    p.add_argument("--json", default=None, help="zapisz wyniki do pliku JSON")
+    args = p.parse_args(argv)
+
+    results = {"imports": run_imports(args.modules, repeat=args.repeat)}
+    if args.model:
+        results["model"] = run_model(args.model_mode)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print("[DONE] Zapisano:", args.json)
+
+
+if __name__ == "__main__":
+    main()
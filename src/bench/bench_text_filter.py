@@ -0,0 +1,84 @@
+"""
+Benchmark filtrowania tabeli po tekście (src.ui.table_helpers.filter_df_for_table):
+skan substringów vs TextIndex vs FuzzyIndex na syntetycznych liniach.
+
+Mierzy budowę indeksów (TextIndex.sync, FuzzyIndex.refresh) i medianę czasu zapytania [ms]
+dla kilku typowych zapytań (słowo, prefiks, fraza, literówka OCR).
+
+Uruchomienie:
+    python -m src.bench.bench_text_filter --lines 100000 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from src.bench.synthetic import synthetic_lines
+from src.search.fuzzy_index import FuzzyIndex
+from src.search.text_index import TextIndex
+from src.ui.table_helpers import filter_df_for_table
+
+
+QUERIES = ("apteka", "marsz", '"bar mleczny"', "sklep kolonialny")
+FUZZY_QUERIES = ("aptcka", "kolonjalny")
+
+
+def _median_ms(fn, repeat: int) -> tuple[float, int]:
+    times, n = [], 0
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        n = len(fn())
+        times.append(time.perf_counter() - t0)
+    return 1000 * statistics.median(times), n
+
+
+def run(sizes: List[int], repeat: int = 3, fuzzy: bool = True, seed: int = 0) -> List[Dict]:
+    results = []
+    for n in sizes:
+        df = synthetic_lines(n, seed=seed)
+
+        index = TextIndex()
+        t0 = time.perf_counter()
+        index.sync(df)
+        build_s = time.perf_counter() - t0
+        fz = None
+        fuzzy_build_s = None
+        if fuzzy:
+            t0 = time.perf_counter()
+            fz = FuzzyIndex(index)
+            fz.refresh()
+            fuzzy_build_s = time.perf_counter() - t0
+        row = {"lines": n, "index_build_s": build_s, "fuzzy_build_s": fuzzy_build_s}
+        results.append(row)
+        print(row)
+
+        for q in QUERIES:
+            scan_ms, n_scan = _median_ms(lambda: filter_df_for_table(df, "(wszystkie)", q.strip('"')), repeat)
+            index_ms, n_index = _median_ms(lambda: filter_df_for_table(df, "(wszystkie)", q, index=index), repeat)
+            row = {"lines": n, "query": q, "scan_ms": scan_ms, "index_ms": index_ms, "scan_rows": n_scan, "index_rows": n_index}
+            results.append(row)
+            print(row)
+
+        for q in FUZZY_QUERIES if fz is not None else ():
+            fuzzy_ms, n_fuzzy = _median_ms(lambda: filter_df_for_table(df, "(wszystkie)", q, fuzzy=fz), repeat)
+            row = {"lines": n, "query": q, "fuzzy_ms": fuzzy_ms, "fuzzy_rows": n_fuzzy}
+            results.append(row)
+            print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--lines", type=int, nargs="+", default=[100_000, 1_000_000])
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--no-fuzzy", action="store_true")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    run(args.lines, repeat=args.repeat, fuzzy=not args.no_fuzzy, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark words_to_lines: czas vs liczba słów + zgodność z pierwotnym algorytmem zachłannym.
+
+Uruchomienie:
+    python -m src.bench.bench_words_to_lines --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+from src.bench.synthetic import synthetic_words
+from src.ocr.postprocess import _bbox_from_str, _y_center, words_to_lines
+
+
+def words_to_lines_reference(word_records: List[Dict], *, y_threshold_px: float = 20.0) -> List[List[int]]:
+    """Pierwotny algorytm O(słowa × linie): zwraca przypisanie słów (indeksy) do linii per plik."""
+    by_file: Dict[str, List[int]] = {}
+    for i, r in enumerate(word_records):
+        by_file.setdefault(r["file_id"], []).append(i)
+
+    out: List[List[int]] = []
+    for _, idxs in by_file.items():
+        enriched = []
+        for i in idxs:
+            bbox = _bbox_from_str(word_records[i]["bbox_norm"])
+            enriched.append((i, bbox, _y_center(bbox)))
+        enriched.sort(key=lambda x: x[2])
+
+        lines: List[List] = []
+        for i, bbox, yc in enriched:
+            placed = False
+            for line in lines:
+                if abs(yc - _y_center(line[0][1])) <= y_threshold_px:
+                    line.append((i, bbox))
+                    placed = True
+                    break
+            if not placed:
+                lines.append([(i, bbox)])
+
+        for line in lines:
+            out.append([i for i, _ in sorted(line, key=lambda x: x[1][0])])
+    return out
+
+
+def check_identical(words: List[Dict], y_threshold_px: float = 20.0) -> bool:
+    """Porównuje teksty linii z algorytmem referencyjnym (ta sama kolejność linii i słów)."""
+    ref = [" ".join(words[i]["text"] for i in line) for line in words_to_lines_reference(words, y_threshold_px=y_threshold_px)]
+    got = [r["text"] for r in words_to_lines(words, y_threshold_px=y_threshold_px)]
+    return ref == got
+
+
+def run(sizes: List[int], repeat: int = 3, verify_max: int = 20000) -> List[Dict]:
+    results = []
+    for n in sizes:
+        words = synthetic_words(n)
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            words_to_lines(words)
+            best = min(best, time.perf_counter() - t0)
+        row = {"n_words": n, "seconds": best, "us_per_word": 1e6 * best / max(1, n)}
+        if n <= verify_max:
+            row["identical"] = check_identical(words)
+        results.append(row)
+        print(row)
+    return results
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+    run(args.sizes, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Lokalny (w pamięci) zamiennik google.cloud.storage.Client.
+
+Obsługuje to, czego używa src.io.gcs: list_blobs(bucket, prefix, delimiter, page_size)
+z paginacją (.pages, .prefixes), bucket(...).blob(...) / get_blob(...) oraz download_as_bytes().
+Metadane blobów (generation, size, md5_hash, crc32c) w formacie GCS (base64);
+crc32c przybliżone przez zlib.crc32 (wystarcza do wykrywania zmian treści).
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import random
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+
+class FakeNotFound(Exception):
+    """Odpowiednik google.api_core.exceptions.NotFound."""
+
+    code = 404
+
+
+class FakeBlob:
+    def __init__(self, client: "FakeStorageClient", bucket: str, name: str, data: bytes, generation: int):
+        self._client = client
+        self.bucket = SimpleNamespace(name=bucket)
+        self.name = name
+        self._data = data
+        self.generation = generation
+        self.size = len(data)
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+        self.crc32c = base64.b64encode((zlib.crc32(data) & 0xFFFFFFFF).to_bytes(4, "big")).decode("ascii")
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        self._client._io_delay()
+        return self._data
+
+    def reload(self, **kwargs) -> None:
+        pass
+
+
+class _FakeBucket:
+    def __init__(self, client: "FakeStorageClient", name: str):
+        self._client = client
+        self.name = name
+
+    def blob(self, name: str, generation: int | None = None):
+        b = self._client._blobs.get((self.name, name))
+        if b is None or (generation is not None and int(generation) != b.generation):
+            return _MissingBlob(self._client, self.name, name)
+        return b
+
+    def get_blob(self, name: str, **kwargs):
+        self._client._io_delay()
+        return self._client._blobs.get((self.name, name))
+
+
+class _MissingBlob:
+    def __init__(self, client, bucket: str, name: str):
+        self._client = client
+        self.bucket = SimpleNamespace(name=bucket)
+        self.name = name
+        self.generation = None
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        self._client._io_delay()
+        raise FakeNotFound(f"404 No such object: {self.bucket.name}/{self.name}")
+
+    def reload(self, **kwargs) -> None:
+        raise FakeNotFound(f"404 No such object: {self.bucket.name}/{self.name}")
+
+
+class _FakePage:
+    def __init__(self, items: list, prefixes: set[str]):
+        self._items = items
+        self.prefixes = prefixes
+        self.num_items = len(items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class _FakeIterator:
+    """Jak google.api_core.page_iterator.HTTPIterator: iteracja po blobach lub .pages."""
+
+    def __init__(self, client: "FakeStorageClient", bucket: str, prefix: str, delimiter: str | None, page_size: int):
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix or ""
+        self._delimiter = delimiter
+        self._page_size = max(1, int(page_size or 1000))
+        self.prefixes: set[str] = set()
+
+    @property
+    def pages(self):
+        names = sorted(n for (b, n) in self._client._blobs if b == self._bucket and n.startswith(self._prefix))
+        items: list = []
+        prefixes: set[str] = set()
+        for n in names:
+            rest = n[len(self._prefix):]
+            if self._delimiter and self._delimiter in rest:
+                prefixes.add(self._prefix + rest.split(self._delimiter, 1)[0] + self._delimiter)
+            else:
+                items.append(self._client._blobs[(self._bucket, n)])
+
+        prefixes_sorted = sorted(prefixes)
+        n_pages = max(1, -(-max(len(items), len(prefixes_sorted)) // self._page_size))
+        for i in range(n_pages):
+            self._client._io_delay()
+            chunk = items[i * self._page_size : (i + 1) * self._page_size]
+            pfx = set(prefixes_sorted[i * self._page_size : (i + 1) * self._page_size])
+            self.prefixes |= pfx
+            self._client.pages_served += 1
+            yield _FakePage(chunk, pfx)
+
+    def __iter__(self):
+        for page in self.pages:
+            yield from page
+
+
+class FakeStorageClient:
+    """
+    Zamiennik storage.Client z danymi w pamięci.
+
+    latency_s — opóźnienie każdej strony listingu / pobrania,
+    error_rate — odsetek żądań kończących się błędem przejściowym (code=503).
+    Liczniki: requests (strony + pobrania), pages_served.
+    """
+
+    def __init__(self, latency_s: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_s = float(latency_s)
+        self.error_rate = float(error_rate)
+        self.pages_served = 0
+        self.requests = 0
+        self._blobs: dict[tuple[str, str], FakeBlob] = {}
+        self._generation = 1_700_000_000_000_000
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _io_delay(self) -> None:
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        if fail:
+            err = RuntimeError("503 Service Unavailable (fake)")
+            err.code = 503
+            raise err
+
+    def put(self, gs_path: str, data: bytes) -> FakeBlob:
+        """Dodaje/podmienia obiekt gs://bucket/name (nowa generation przy każdym zapisie)."""
+        bucket, _, name = gs_path[len("gs://"):].partition("/")
+        with self._lock:
+            self._generation += 1
+            blob = FakeBlob(self, bucket, name, data, self._generation)
+            self._blobs[(bucket, name)] = blob
+        return blob
+
+    def bucket(self, name: str) -> _FakeBucket:
+        return _FakeBucket(self, name)
+
+    def list_blobs(self, bucket_or_name, prefix: str | None = None, delimiter: str | None = None, page_size: int | None = None, **kwargs):
+        bucket = getattr(bucket_or_name, "name", bucket_or_name)
+        return _FakeIterator(self, bucket, prefix or "", delimiter, page_size or 1000)
@@ -0,0 +1,175 @@
+"""
+Lokalny zamiennik google.cloud.vision.ImageAnnotatorClient (bez sieci i kosztów).
+
+FakeImageAnnotatorClient.document_text_detection zwraca odpowiedź o tym samym kształcie,
+co Vision (full_text_annotation.pages[].blocks[].paragraphs[].words[].symbols[]),
+z deterministyczną treścią per gcs_image_uri i konfigurowalnym opóźnieniem.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Iterable
+
+
+# google.cloud.vision TextAnnotation.DetectedBreak.BreakType
+BREAK_SPACE = 1
+BREAK_LINE = 5
+
+
+class FakeVisionError(Exception):
+    """Symulowany błąd Vision (code jak w google.api_core: 429 / 503 przejściowe, 400 trwały)."""
+
+    def __init__(self, message: str, code: int = 503):
+        super().__init__(message)
+        self.code = code
+
+
+def _vertices(x1: int, y1: int, x2: int, y2: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        vertices=[
+            SimpleNamespace(x=x1, y=y1),
+            SimpleNamespace(x=x2, y=y1),
+            SimpleNamespace(x=x2, y=y2),
+            SimpleNamespace(x=x1, y=y2),
+        ]
+    )
+
+
+def _symbol(ch: str, x: int, y: int, w: int, h: int, br: int | None) -> SimpleNamespace:
+    prop = SimpleNamespace(detected_break=SimpleNamespace(type=br) if br else None)
+    return SimpleNamespace(text=ch, bounding_box=_vertices(x, y, x + w, y + h), property=prop)
+
+
+def fake_response(gs_path: str, n_lines: int = 5, words_per_line: int = 4) -> SimpleNamespace:
+    """Deterministyczna odpowiedź OCR dla gs_path (ta sama ścieżka -> ten sam tekst)."""
+    seed = int(hashlib.sha1(gs_path.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    alphabet = "ABCDEFGHIJKLMNOPRSTUWYZĄĘŁŃÓŚŹŻ"
+
+    words = []
+    ch_w, ch_h = 12, 20
+    for li in range(n_lines):
+        x = 10
+        y = 10 + li * 40
+        for wi in range(words_per_line):
+            word = "".join(rng.choice(alphabet) for _ in range(rng.randint(2, 8)))
+            last_in_line = wi == words_per_line - 1
+            syms = []
+            for ci, ch in enumerate(word):
+                br = None
+                if ci == len(word) - 1:
+                    br = BREAK_LINE if last_in_line else BREAK_SPACE
+                syms.append(_symbol(ch, x + ci * ch_w, y, ch_w, ch_h, br))
+            words.append(
+                SimpleNamespace(
+                    bounding_box=_vertices(x, y, x + len(word) * ch_w, y + ch_h),
+                    symbols=syms,
+                )
+            )
+            x += (len(word) + 1) * ch_w
+
+    page = SimpleNamespace(blocks=[SimpleNamespace(paragraphs=[SimpleNamespace(words=words)])])
+    return SimpleNamespace(
+        error=SimpleNamespace(message="", code=0),
+        full_text_annotation=SimpleNamespace(pages=[page]),
+    )
+
+
+class FakeImageAnnotatorClient:
+    """
+    Zamiennik ImageAnnotatorClient do testów i benchmarków.
+
+    latency_s — opóźnienie każdego wywołania (symulacja round-tripu),
+    error_rate — odsetek wywołań kończących się błędem przejściowym (FakeVisionError, code=503),
+    item_error_rate — (batch) odsetek obrazów w paczce z błędem w resp.error (code=14 UNAVAILABLE),
+    seed — ziarno losowania błędów (powtarzalność).
+    transient_failures — (document_text_detection) każdy obraz odpowiada błędem 503 przy pierwszych N wywołaniach,
+    permanent_error_paths — (document_text_detection) obrazy zawsze z błędem nieprzejściowym (code=400).
+    Liczniki calls / max_concurrent pozwalają sprawdzić faktyczną równoległość, calls_by_path – ponowienia.
+    """
+
+    def __init__(
+        self,
+        latency_s: float = 0.0,
+        error_rate: float = 0.0,
+        item_error_rate: float = 0.0,
+        seed: int = 0,
+        n_lines: int = 5,
+        words_per_line: int = 4,
+        transient_failures: int = 0,
+        permanent_error_paths: Iterable[str] = (),
+    ):
+        self.latency_s = float(latency_s)
+        self.error_rate = float(error_rate)
+        self.item_error_rate = float(item_error_rate)
+        self.batch_calls = 0
+        self.n_lines = n_lines
+        self.words_per_line = words_per_line
+        self.transient_failures = int(transient_failures)
+        self.permanent_error_paths = set(permanent_error_paths)
+        self.calls = 0
+        self.calls_by_path: dict[str, int] = {}
+        self.max_concurrent = 0
+        self._in_flight = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _enter(self) -> bool:
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            self.max_concurrent = max(self.max_concurrent, self._in_flight)
+            return self._rng.random() < self.error_rate
+
+    def _exit(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _respond(self, gs_path: str):
+        return fake_response(gs_path, n_lines=self.n_lines, words_per_line=self.words_per_line)
+
+    def document_text_detection(self, image=None, **kwargs):
+        fail = self._enter()
+        gs_path = image.source.gcs_image_uri
+        with self._lock:
+            n = self.calls_by_path[gs_path] = self.calls_by_path.get(gs_path, 0) + 1
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            if gs_path in self.permanent_error_paths:
+                raise FakeVisionError("400 Bad image data (fake)", code=400)
+            if fail or n <= self.transient_failures:
+                raise FakeVisionError("503 Service Unavailable (fake)", code=503)
+            return self._respond(gs_path)
+        finally:
+            self._exit()
+
+    def batch_annotate_images(self, requests=(), **kwargs):
+        fail = self._enter()
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            if fail:
+                raise FakeVisionError("503 Service Unavailable (fake)", code=503)
+            responses = []
+            for req in requests:
+                with self._lock:
+                    self.batch_calls += 1
+                    item_fail = self._rng.random() < self.item_error_rate
+                if item_fail:
+                    responses.append(
+                        SimpleNamespace(
+                            error=SimpleNamespace(message="Temporary unavailable (fake)", code=14),
+                            full_text_annotation=None,
+                        )
+                    )
+                else:
+                    responses.append(self._respond(req.image.source.gcs_image_uri))
+            return SimpleNamespace(responses=responses)
+        finally:
+            self._exit()
@@ -0,0 +1,255 @@
+"""
+Zestaw benchmarków gorących ścieżek na lokalnych zamiennikach Vision/GCS i danych syntetycznych
+– powtarzalny (stałe ziarno), bez sieci i kosztów, z wynikiem w JSON do porównań między uruchomieniami.
+
+Benchmarki (moduły src.bench.bench_*):
+    listing        – listing GCS (strony, page_size, foldery),
+    dispatch       – wysyłka OCR: single / batch / run_ocr_cache end-to-end,
+    words_to_lines – składanie słów w linie,
+    cache          – zapis / odczyt / dopisywanie cache CSV vs Parquet,
+    export         – eksport per obraz (CSV / Parquet),
+    text_filter    – filtr tabeli: skan vs TextIndex vs FuzzyIndex,
+    vector_search  – ANN (IVF) na embeddingach.
+
+Skale: small (~10k linii, sekundy), medium (~100k), large (~1M linii, minuty).
+
+Uruchomienie:
+    python -m src.bench.suite --scale small --json outputs/bench/base.json
+    python -m src.bench.suite --scale small --only cache text_filter --compare outputs/bench/base.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import importlib.metadata
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES: Dict[str, Dict] = {
+    "small": {"lines": 10_000, "images": 200, "listing": 10_000, "words": 10_000, "vectors": 20_000},
+    "medium": {"lines": 100_000, "images": 1_000, "listing": 100_000, "words": 100_000, "vectors": 200_000},
+    "large": {"lines": 1_000_000, "images": 5_000, "listing": 1_000_000, "words": 1_000_000, "vectors": 1_000_000},
+}
+
+# klucze wyników: czas (mniej = lepiej) i przepustowość (więcej = lepiej); reszta opisuje konfigurację
+TIME_SUFFIXES = ("_s", "_ms", "seconds")
+TIME_PREFIXES = ("ms_per_", "us_per_")
+RATE_SUFFIXES = ("_per_s",)
+
+
+def _listing(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_listing
+
+    return bench_listing.run([sc["listing"]], page_sizes=[100, 1000], latency_s=0.005, seed=seed)
+
+
+def _dispatch(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_dispatch
+
+    return bench_dispatch.run(sc["images"], in_flight=[1, 4, 8, 16], latency_s=0.02, error_rate=0.02, seed=seed)
+
+
+def _words_to_lines(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_words_to_lines
+
+    return bench_words_to_lines.run([sc["words"]], repeat=3)
+
+
+def _cache(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_cache
+
+    return bench_cache.run([sc["lines"]], seed=seed)
+
+
+def _export(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_export
+
+    return bench_export.run([sc["lines"]], seed=seed)
+
+
+def _text_filter(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_text_filter
+
+    return bench_text_filter.run([sc["lines"]], seed=seed)
+
+
+def _vector_search(sc: Dict, seed: int) -> List[Dict]:
+    from src.bench import bench_ann
+
+    return bench_ann.run(sc["vectors"], nprobes=[8, 32], reranks=[0, 200], seed=seed)
+
+
+BENCHMARKS: Dict[str, Callable[[Dict, int], List[Dict]]] = {
+    "listing": _listing,
+    "dispatch": _dispatch,
+    "words_to_lines": _words_to_lines,
+    "cache": _cache,
+    "export": _export,
+    "text_filter": _text_filter,
+    "vector_search": _vector_search,
+}
+
+
+def _version(pkg: str) -> Optional[str]:
+    try:
+        return importlib.metadata.version(pkg)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        r = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return r.stdout.strip() or None if r.returncode == 0 else None
+
+
+def environment(scale: str, seed: int) -> Dict:
+    """Metadane uruchomienia – porównuj wyniki z tej samej maszyny i skali."""
+    return {
+        "timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+        "scale": scale,
+        "seed": seed,
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": {p: _version(p) for p in ("numpy", "pandas", "pyarrow", "pillow")},
+    }
+
+
+def run_suite(scale: str = "small", only: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    if scale not in SCALES:
+        raise ValueError(f"Nieznana skala: {scale} (dostępne: {', '.join(SCALES)})")
+    names = list(only or BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Nieznane benchmarki: {', '.join(unknown)} (dostępne: {', '.join(BENCHMARKS)})")
+
+    out = {"meta": environment(scale, seed), "results": {}, "errors": {}}
+    for name in names:
+        print(f"[INFO] {name} ({scale})")
+        t0 = time.perf_counter()
+        try:
+            out["results"][name] = BENCHMARKS[name](SCALES[scale], seed)
+        except Exception as e:  # brak zależności (np. w venv CLIP) nie przerywa pozostałych
+            print(f"[WARN] {name}: {type(e).__name__}: {e}")
+            out["errors"][name] = f"{type(e).__name__}: {e}"
+        print(f"[DONE] {name}: {time.perf_counter() - t0:.1f} s")
+    return out
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    raise TypeError(f"Nieserializowalny typ: {type(o).__name__}")
+
+
+def save_json(result: Dict, path: str) -> str:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2, default=_json_default)
+    return path
+
+
+def _is_rate(key: str) -> bool:
+    return key.endswith(RATE_SUFFIXES)
+
+
+def _is_time(key: str) -> bool:
+    return not _is_rate(key) and (key.endswith(TIME_SUFFIXES) or key.startswith(TIME_PREFIXES))
+
+
+def _config(row: Dict) -> Dict:
+    """Opis wiersza do raportu: pola tekstowe i całkowite (rozmiar, format, zapytanie, ...), bez metryk."""
+    return {
+        k: v
+        for k, v in row.items()
+        if not (_is_time(k) or _is_rate(k)) and isinstance(v, (str, int)) and not isinstance(v, bool)
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float = 0.2) -> List[Dict]:
+    """
+    Regresje względem baseline: metryka czasu wzrosła albo przepustowość spadła o więcej niż tolerance.
+
+    Wiersze parowane po pozycji w obrębie benchmarku (ta sama skala i ziarno => ta sama kolejność
+    konfiguracji); benchmark z inną liczbą wierszy albo innymi kolumnami jest pomijany.
+    Czasy poniżej 1 ms pomijane (szum pomiaru).
+    """
+    out = []
+    for name, rows in current.get("results", {}).items():
+        base_rows = baseline.get("results", {}).get(name)
+        if not base_rows or len(base_rows) != len(rows):
+            if base_rows:
+                print(f"[WARN] {name}: inna liczba wierszy niż w baseline – pomijam porównanie.")
+            continue
+        for row, base in zip(rows, base_rows):
+            if row.keys() != base.keys():
+                continue
+            for k, v in row.items():
+                b = base.get(k)
+                if isinstance(v, bool) or not isinstance(v, (int, float)) or not isinstance(b, (int, float)) or not b:
+                    continue
+                if _is_time(k):
+                    floor = 0.001 if k.endswith(("_s", "seconds")) else 1.0
+                    if max(v, b) < floor:
+                        continue
+                    change = v / b - 1.0
+                    worse = change > tolerance
+                elif _is_rate(k):
+                    change = v / b - 1.0
+                    worse = change < -tolerance
+                else:
+                    continue
+                if worse:
+                    out.append({"benchmark": name, "config": _config(row), "metric": k, "baseline": b, "current": v, "change": change})
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--scale", default="small", choices=list(SCALES))
+    p.add_argument("--only", nargs="+", default=None, choices=list(BENCHMARKS))
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", default=None, help="plik wyników (domyślnie outputs/bench/bench_<skala>_<czas>.json)")
+    p.add_argument("--compare", default=None, help="JSON z poprzedniego uruchomienia (baseline)")
+    p.add_argument("--tolerance", type=float, default=0.2, help="dopuszczalne pogorszenie (0.2 = 20%%)")
+    args = p.parse_args(argv)
+
+    result = run_suite(args.scale, only=args.only, seed=args.seed)
+    path = args.json or os.path.join(
+        REPO_ROOT, "outputs", "bench", f"bench_{args.scale}_{dt.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    print("[DONE] Zapisano:", save_json(result, path))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("scale") != args.scale:
+            print(f"[WARN] Baseline ma inną skalę: {baseline.get('meta', {}).get('scale')}")
+        regressions = compare(result, baseline, tolerance=args.tolerance)
+        for r in regressions:
+            print(f"[WARN] {r['benchmark']} {r['config']} {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} ({r['change']:+.0%})")
+        if regressions:
+            print(f"[WARN] Regresje: {len(regressions)} (tolerancja {args.tolerance:.0%})")
+            sys.exit(1)
+        print(f"[DONE] Brak regresji względem {args.compare} (tolerancja {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
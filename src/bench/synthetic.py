@@ -0,0 +1,148 @@
+"""
+Dane syntetyczne do benchmarków (deterministyczne: to samo ziarno -> te same dane).
+
+- synthetic_words: słowa OCR (gęsty skan, linie co ~25 px) – wejście words_to_lines,
+- synthetic_lines: linie OCR w formacie cache run_ocr_cache (text, file_name, file_id, gcs_path, line_id, x1..y2, img_w, img_h, source),
+- synthetic_embeddings: znormalizowane wektory z mieszaniny klastrów (jak embeddingi podobnych zdjęć),
+- synthetic_jpeg / populate_fake_gcs: obrazy JPEG i "bucket" w src.bench.fake_gcs.FakeStorageClient.
+
+Skala typowo 10k–1M linii; generatory są wektorowe (1M linii w kilka sekund).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import random
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+WORDS = (
+    "APTEKA", "SKLEP", "KOLONIALNY", "FRYZJER", "ZAKŁAD", "FOTOGRAFICZNY", "BAR", "MLECZNY", "PIEKARNIA",
+    "ul.", "Długa", "Marszałkowska", "Nowy", "Świat", "Łódź", "Kraków", "Gdańsk", "1935", "1948", "nr",
+    "Spółdzielnia", "Społem", "RESTAURACJA", "KINO", "Wyroby", "tytoniowe", "ZEGARMISTRZ", "Księgarnia",
+)
+
+
+def synthetic_words(n_words: int, n_files: int = 1, seed: int = 0) -> List[Dict]:
+    """Gęsty skan: słowa w liniach co ~25 px z losowym drganiem w osi Y."""
+    rng = random.Random(seed)
+    per_file = max(1, n_words // n_files)
+    out: List[Dict] = []
+    for f in range(n_files):
+        fid = f"file{f:05d}"
+        for k in range(per_file):
+            line = k // 12
+            x1 = (k % 12) * 80 + rng.randint(0, 10)
+            y1 = line * 25 + rng.choice([0, 0, 3, 7, 12, 19])
+            out.append(
+                {
+                    "text": f"w{k}",
+                    "file_name": f"{fid}.jpg",
+                    "file_id": fid,
+                    "gcs_path": f"gs://bench/{fid}.jpg",
+                    "bbox_norm": f"{float(x1)},{float(y1)},{float(x1 + 60)},{float(y1 + 18)}",
+                }
+            )
+    return out
+
+
+def synthetic_lines(
+    n_lines: int,
+    lines_per_image: int = 40,
+    seed: int = 0,
+    prefix: str = "gs://bench/photos",
+    words_per_line: int = 4,
+) -> pd.DataFrame:
+    """Linie OCR jak w cache (posortowane po pliku i line_id); tekst z polskiego słownika szyldów."""
+    rng = np.random.default_rng(seed)
+    n_images = max(1, -(-int(n_lines) // max(1, lines_per_image)))
+    img = np.sort(rng.integers(0, n_images, size=n_lines))
+    line_id = np.arange(n_lines) - np.searchsorted(img, img)  # numer linii w obrębie obrazu
+
+    vocab = np.array(WORDS + tuple(str(i) for i in range(1, 500)), dtype=object)  # + numery domów / rok
+    words = vocab[rng.integers(0, len(vocab), size=(n_lines, words_per_line))]
+    text = words[:, 0]
+    for j in range(1, words_per_line):
+        text = text + " " + words[:, j]
+
+    names = np.array([f"img_{i:07d}.jpg" for i in range(n_images)], dtype=object)
+    paths = np.array([f"{prefix.rstrip('/')}/{n}" for n in names], dtype=object)
+    fids = np.array([hashlib.sha1(p.encode("utf-8")).hexdigest() for p in paths], dtype=object)
+
+    y1 = (line_id * 0.02) % 0.95
+    x1 = rng.random(n_lines) * 0.3
+    return pd.DataFrame(
+        {
+            "text": text,
+            "file_name": names[img],
+            "file_id": fids[img],
+            "gcs_path": paths[img],
+            "line_id": line_id.astype(np.int64),
+            "x1": x1.astype(np.float32),
+            "y1": y1.astype(np.float32),
+            "x2": (x1 + 0.5).astype(np.float32),
+            "y2": (y1 + 0.018).astype(np.float32),
+            "img_w": np.float32(np.nan),
+            "img_h": np.float32(np.nan),
+            "source": "gcv_ocr_line",
+        }
+    )
+
+
+def synthetic_embeddings(n: int, dim: int = 512, n_clusters: int = 1000, spread: float = 0.6, seed: int = 0) -> np.ndarray:
+    from src.clip.embedding_store import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((n_clusters, dim)))
+    assign = rng.integers(0, n_clusters, size=n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * (spread / np.sqrt(dim))
+    return normalize_rows(centers[assign] + noise)
+
+
+def synthetic_jpeg(width: int = 800, height: int = 600, seed: int = 0, quality: int = 85) -> bytes:
+    """Zdjęcie-atrapa: tło, prostokąty ("szyldy") i napis."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    img = Image.new("RGB", (width, height), tuple(rng.randint(60, 200) for _ in range(3)))
+    d = ImageDraw.Draw(img)
+    w_min, h_min = max(1, width // 20), max(1, height // 30)
+    for _ in range(6):
+        x, y = rng.randint(0, width - w_min), rng.randint(0, height - h_min)
+        d.rectangle([x, y, x + rng.randint(w_min, max(w_min, width // 2)), y + rng.randint(h_min, max(h_min, height // 4))],
+                    fill=tuple(rng.randint(0, 255) for _ in range(3)))
+    d.text((10, 10), rng.choice(WORDS), fill=(255, 255, 255))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def populate_fake_gcs(
+    client,
+    prefix: str,
+    n_images: int,
+    width: int = 800,
+    height: int = 600,
+    distinct: int = 16,
+    folders: int = 1,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Wypełnia FakeStorageClient obrazami pod prefix (opcjonalnie w `folders` podfolderach); zwraca gs://... .
+
+    Kodowanych jest tylko `distinct` różnych JPEG-ów; każdy obiekt dostaje unikalny sufiks bajtów
+    za znacznikiem końca JPEG (inne md5 – bez "identycznej treści" w run_ocr_cache, dekoduje się normalnie).
+    """
+    pool = [synthetic_jpeg(width, height, seed=seed + i) for i in range(max(1, distinct))]
+    base = prefix.rstrip("/")
+    out = []
+    for i in range(int(n_images)):
+        folder = f"/set_{i % folders:03d}" if folders > 1 else ""
+        path = f"{base}{folder}/img_{i:07d}.jpg"
+        client.put(path, pool[i % len(pool)] + i.to_bytes(8, "big"))
+        out.append(path)
+    return out
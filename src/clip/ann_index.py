@@ -0,0 +1,346 @@
+"""
+Przybliżone wyszukiwanie najbliższych sąsiadów (ANN) dla embeddingów CLIP (GLOBAL i fragmenty).
+
+Backendy (ten sam interfejs: sync(), search(q, k) -> (wiersze magazynu, podobieństwa)):
+- ExactIndex: dokładne top-k po macierzy EmbeddingStore (małe zestawy),
+- IVFPQIndex: czysty NumPy IVF-PQ
+    * IVF: k-means na wektorach -> nlist list, zapytanie przegląda nprobe najbliższych list,
+    * PQ: reszta (wektor - centroid) kodowana m bajtami (m podprzestrzeni po 256 centroidów),
+      podobieństwo = <q, centroid> + suma z tablicy LUT (bez dekodowania wektorów),
+    * rerank: najlepsze `rerank` kandydatów przeliczane dokładnie z macierzy float16 (memmap).
+
+Pokrętła jakość/czas: nprobe (więcej list => wyższy recall, wolniej), rerank (0 = same kody PQ).
+Nowe wiersze magazynu dopisywane przez sync() bez ponownego treningu; trening od nowa,
+gdy magazyn urósł > RETRAIN_FACTOR razy od ostatniego treningu.
+
+Zapis: <store.root>/ann/ivfpq.npz + ivfpq.json.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from src.clip.embedding_store import EmbeddingStore, normalize_rows, topk_desc
+
+
+EXACT_MAX_ROWS = 50_000  # poniżej: dokładne wyszukiwanie (szybkie i bez treningu)
+TRAIN_SAMPLE = 100_000
+SAMPLE_PER_LIST = 40  # próbka treningowa IVF: ~40 wektorów na listę
+PQ_TRAIN_SAMPLE = 20_000
+KMEANS_ITERS = 10
+RETRAIN_FACTOR = 4.0
+ANN_DIR = "ann"
+
+
+def kmeans(X: np.ndarray, k: int, iters: int = KMEANS_ITERS, seed: int = 0, chunk: int = 65536) -> np.ndarray:
+    """Lloyd k-means (odległość L2), przypisania liczone porcjami; puste klastry losowane ponownie."""
+    X = np.asarray(X, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(int(k), len(X))
+    C = X[rng.choice(len(X), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = assign_nearest(X, C, chunk=chunk)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        empty = counts == 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+        C = np.zeros_like(C)
+        C[~empty] = np.add.reduceat(X[order], starts, axis=0) / counts[~empty, None]
+        if empty.any():
+            C[empty] = X[rng.choice(len(X), size=int(empty.sum()), replace=False)]
+    return C
+
+
+def assign_nearest(X: np.ndarray, C: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """Indeks najbliższego centroidu (L2) dla każdego wiersza X."""
+    c_sq = (C * C).sum(axis=1)
+    out = np.empty(len(X), dtype=np.int64)
+    for lo in range(0, len(X), chunk):
+        x = X[lo:lo + chunk]
+        out[lo:lo + chunk] = np.argmin(c_sq[None, :] - 2.0 * (x @ C.T), axis=1)
+    return out
+
+
+class ExactIndex:
+    """
+    Dokładne wyszukiwanie po EmbeddingStore (fallback dla małych zestawów).
+
+    Do cache_max_rows aktywnych wierszy macierz float32 trzymana w RAM (bez konwersji float16
+    przy każdym zapytaniu); większe zestawy czytane porcjami z memmap (EmbeddingStore.search).
+    """
+
+    backend = "exact"
+
+    def __init__(self, store: EmbeddingStore, cache_max_rows: int = EXACT_MAX_ROWS):
+        self.store = store
+        self.cache_max_rows = int(cache_max_rows)
+        self._rows: np.ndarray | None = None
+        self._M: np.ndarray | None = None
+        self._version = -1
+
+    def sync(self) -> int:
+        """Odświeża macierz w RAM po zmianie magazynu; zwraca liczbę nowych wierszy."""
+        if self._version == self.store.version:
+            return 0
+        before = 0 if self._rows is None else len(self._rows)
+        rows = self.store.active_rows()
+        if len(rows) <= self.cache_max_rows:
+            self._rows, self._M = rows, self.store.vectors(rows)
+        else:
+            self._rows, self._M = None, None
+        self._version = self.store.version
+        return max(0, len(rows) - before)
+
+    def search(self, q: np.ndarray, k: int = 20) -> tuple[np.ndarray, np.ndarray]:
+        self.sync()
+        if self._M is None:
+            return self.store.search(q, k=k)
+        q = normalize_rows(np.asarray(q, dtype=np.float32).reshape(1, -1))[0]
+        sims = self._M @ q
+        top = topk_desc(sims, k)
+        return self._rows[top], sims[top]
+
+
+class IVFPQIndex:
+    """
+    IVF-PQ nad EmbeddingStore.
+
+    nlist — liczba list (None => ~sqrt(n)), m — liczba podprzestrzeni PQ (dim % m == 0;
+    None => dim // 8, czyli 8 wymiarów na bajt), nprobe / rerank — domyślne pokrętła search().
+    """
+
+    backend = "ivfpq"
+
+    def __init__(
+        self,
+        store: EmbeddingStore,
+        nlist: int | None = None,
+        m: int | None = None,
+        nprobe: int = 16,
+        rerank: int = 200,
+        seed: int = 0,
+    ):
+        self.store = store
+        self.nlist = nlist
+        self.m = m
+        self.nprobe = int(nprobe)
+        self.rerank = int(rerank)
+        self.seed = int(seed)
+
+        self.centroids: np.ndarray | None = None  # [nlist, dim]
+        self.codebooks: np.ndarray | None = None  # [m, 256, dim / m]
+        self.n_trained = 0
+        self.indexed_upto = 0  # wiersze magazynu < indexed_upto są w listach
+        self._list_ids: list[list[np.ndarray]] = []
+        self._list_codes: list[list[np.ndarray]] = []
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.store.root, ANN_DIR, "ivfpq")
+
+    # --- trening i dodawanie ---
+
+    def train(self, X: np.ndarray, n_total: int | None = None) -> None:
+        """Trening centroidów IVF i książek kodowych PQ na próbce X (n_total = rozmiar zbioru, dobór nlist)."""
+        X = normalize_rows(X)
+        n, dim = X.shape
+        n_total = n_total or n
+        nlist = self.nlist or int(max(1, min(np.sqrt(n_total), n // SAMPLE_PER_LIST)))
+        m = self.m or max(1, dim // 8)
+        if dim % m:
+            raise ValueError(f"dim={dim} nie dzieli się przez m={m}")
+        self.nlist, self.m = nlist, m
+
+        rng = np.random.default_rng(self.seed)
+        X_ivf = X[rng.choice(n, size=min(n, SAMPLE_PER_LIST * nlist), replace=False)]
+        self.centroids = kmeans(X_ivf, nlist, seed=self.seed)
+        X_pq = X[rng.choice(n, size=min(n, PQ_TRAIN_SAMPLE), replace=False)]
+        resid = X_pq - self.centroids[assign_nearest(X_pq, self.centroids)]
+
+        d_sub = dim // m
+        ksub = min(256, len(X_pq))
+        self.codebooks = np.stack(
+            [kmeans(resid[:, j * d_sub:(j + 1) * d_sub], ksub, seed=self.seed + j) for j in range(m)]
+        ).astype(np.float32)
+        self.n_trained = n_total
+        self._list_ids = [[] for _ in range(self.nlist)]
+        self._list_codes = [[] for _ in range(self.nlist)]
+        self.indexed_upto = 0
+
+    def encode(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(lista IVF, kody PQ uint8 [n, m]) dla wektorów X."""
+        X = normalize_rows(X)
+        lists = assign_nearest(X, self.centroids)
+        resid = X - self.centroids[lists]
+        d_sub = X.shape[1] // self.m
+        codes = np.empty((len(X), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = assign_nearest(resid[:, j * d_sub:(j + 1) * d_sub], self.codebooks[j])
+        return lists, codes
+
+    def add(self, X: np.ndarray, rows: np.ndarray) -> None:
+        lists, codes = self.encode(X)
+        order = np.argsort(lists, kind="stable")
+        lists, codes, rows = lists[order], codes[order], np.asarray(rows, dtype=np.int64)[order]
+        bounds = np.searchsorted(lists, np.arange(self.nlist + 1))
+        for l in np.flatnonzero(np.diff(bounds)):
+            lo, hi = bounds[l], bounds[l + 1]
+            self._list_ids[l].append(rows[lo:hi])
+            self._list_codes[l].append(codes[lo:hi])
+
+    def sync(self, batch_rows: int = 65536) -> int:
+        """Dopisuje nowe wiersze magazynu (trening przy pierwszym użyciu lub po dużym wzroście). Zwraca liczbę dodanych."""
+        n = len(self.store)
+        if self.centroids is None or n > RETRAIN_FACTOR * max(self.n_trained, 1):
+            rows = self.store.active_rows()
+            rng = np.random.default_rng(self.seed)
+            sample = np.sort(rng.choice(rows, size=min(len(rows), TRAIN_SAMPLE), replace=False))
+            self.train(self.store.vectors(sample), n_total=n)
+        start = self.indexed_upto
+        for lo in range(start, n, batch_rows):
+            rows = np.arange(lo, min(n, lo + batch_rows), dtype=np.int64)
+            self.add(np.asarray(self.store.matrix[lo:lo + len(rows)], dtype=np.float32), rows)
+        self.indexed_upto = n
+        return n - start
+
+    # --- wyszukiwanie ---
+
+    def _list_arrays(self, l: int) -> tuple[np.ndarray, np.ndarray]:
+        ids, codes = self._list_ids[l], self._list_codes[l]
+        if len(ids) > 1:  # scalenie porcji z kolejnych add()
+            self._list_ids[l] = ids = [np.concatenate(ids)]
+            self._list_codes[l] = codes = [np.concatenate(codes)]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.m), dtype=np.uint8)
+        return ids[0], codes[0]
+
+    def search(
+        self,
+        q: np.ndarray,
+        k: int = 20,
+        nprobe: int | None = None,
+        rerank: int | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k (wiersze magazynu, podobieństwa); tylko aktywne wiersze (ostatni append gcs_path)."""
+        nprobe = self.nprobe if nprobe is None else int(nprobe)
+        rerank = self.rerank if rerank is None else int(rerank)
+        q = normalize_rows(np.asarray(q, dtype=np.float32).reshape(1, -1))[0]
+
+        coarse = self.centroids @ q
+        probe = topk_desc(coarse, nprobe)
+
+        d_sub = len(q) // self.m
+        lut = np.einsum("jkd,jd->jk", self.codebooks, q.reshape(self.m, d_sub))  # [m, 256]
+        ids_all, scores_all = [], []
+        for l in probe.tolist():
+            ids, codes = self._list_arrays(l)
+            if len(ids) == 0:
+                continue
+            ids_all.append(ids)
+            scores_all.append(coarse[l] + lut[np.arange(self.m), codes].sum(axis=1))
+        if not ids_all:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate(ids_all)
+        scores = np.concatenate(scores_all).astype(np.float32)
+
+        active = np.zeros(len(self.store), dtype=bool)
+        active[self.store.active_rows()] = True
+        keep = active[ids]
+        ids, scores = ids[keep], scores[keep]
+
+        top = topk_desc(scores, max(k, rerank))
+        ids, scores = ids[top], scores[top]
+        if rerank > 0 and len(ids):
+            order = np.argsort(ids)  # odczyt memmap rosnąco po wierszach
+            exact = np.asarray(self.store.matrix[ids[order]], dtype=np.float32) @ q
+            scores = np.empty_like(exact)
+            scores[order] = exact
+            top = topk_desc(scores, k)
+            return ids[top], scores[top]
+        return ids[:k], scores[:k]
+
+    # --- zapis / odczyt ---
+
+    def save(self) -> str:
+        for l in range(self.nlist):
+            self._list_arrays(l)
+        sizes = np.array([len(self._list_arrays(l)[0]) for l in range(self.nlist)], dtype=np.int64)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            codebooks=self.codebooks,
+            sizes=sizes,
+            ids=np.concatenate([self._list_arrays(l)[0] for l in range(self.nlist)]),
+            codes=np.concatenate([self._list_arrays(l)[1] for l in range(self.nlist)]),
+        )
+        os.replace(tmp, self.path + ".npz")
+        info = {
+            "nlist": self.nlist,
+            "m": self.m,
+            "n_trained": self.n_trained,
+            "indexed_upto": self.indexed_upto,
+            "store_version": self.store.version,
+            "store_epoch": self.store.epoch,
+        }
+        with open(self.path + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+        return self.path
+
+    def load(self) -> bool:
+        """Wczytuje zapisany indeks; False, gdy go nie ma albo magazyn był kompaktowany (inne numery wierszy)."""
+        if not (os.path.exists(self.path + ".npz") and os.path.exists(self.path + ".json")):
+            return False
+        with open(self.path + ".json", encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("store_epoch") != self.store.epoch or info["indexed_upto"] > len(self.store):
+            return False
+        with np.load(self.path + ".npz") as z:
+            self.centroids, self.codebooks = z["centroids"], z["codebooks"]
+            sizes, ids, codes = z["sizes"], z["ids"], z["codes"]
+        self.nlist, self.m = int(info["nlist"]), int(info["m"])
+        self.n_trained, self.indexed_upto = int(info["n_trained"]), int(info["indexed_upto"])
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        self._list_ids = [[ids[bounds[l]:bounds[l + 1]]] if sizes[l] else [] for l in range(self.nlist)]
+        self._list_codes = [[codes[bounds[l]:bounds[l + 1]]] if sizes[l] else [] for l in range(self.nlist)]
+        return True
+
+
+def open_vector_index(
+    store: EmbeddingStore,
+    backend: str = "auto",
+    exact_max_rows: int = EXACT_MAX_ROWS,
+    **knobs,
+) -> ExactIndex | IVFPQIndex:
+    """
+    Indeks wektorowy dla magazynu: "exact", "ivfpq" albo "auto" (exact do exact_max_rows wierszy).
+
+    IVF-PQ jest wczytywany z dysku, uzupełniany o nowe wiersze (sync) i zapisywany po zmianach.
+    """
+    if backend == "auto":
+        backend = "exact" if len(store) <= exact_max_rows else "ivfpq"
+    if backend == "exact":
+        return ExactIndex(store)
+    if backend != "ivfpq":
+        raise ValueError(f"Nieznany backend ANN: {backend}")
+
+    index = IVFPQIndex(store, **knobs)
+    index.load()
+    if index.sync():
+        index.save()
+    return index
+
+
+def recall_at_k(index, exact: ExactIndex, queries: np.ndarray, k: int = 10, **search_kw) -> float:
+    """Średni recall@k względem dokładnego wyszukiwania."""
+    hits = 0
+    for q in queries:
+        truth = set(exact.search(q, k=k)[0].tolist())
+        got = set(index.search(q, k=k, **search_kw)[0].tolist())
+        hits += len(truth & got)
+    return hits / max(1, k * len(queries))
@@ -0,0 +1,378 @@
+"""
+Budowa indeksu GLOBAL: embeddingi CLIP obrazów z GCS, porcjami, z równoległym dekodowaniem.
+
+Zamiast jednego obrazu na raz (pobranie -> preprocess -> encode_image dla batcha 1):
+- procesy robocze pobierają, dekodują i robią preprocess całych porcji (batch_size obrazów),
+  okno max_pending porcji w locie = ograniczona kolejka (pamięć nie rośnie z liczbą obrazów),
+- model liczy mini-batche w procesie głównym (torch.inference_mode),
+- wyniki dopisywane do EmbeddingStore co commit_rows wektorów (także przy przerwaniu),
+- wznowienie: obrazy już obecne w magazynie (gcs_path) są pomijane,
+- postęp i przepustowość w obrazach/s (oraz czas czekania na dekodowanie vs czas modelu).
+
+Uruchomienie:
+    python -m src.clip.embed_pipeline --prefix gs://ocr-2026/<zestaw> \
+        --store outputs/clip_index/clip_global__<slug> --batch-size 32 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import multiprocessing as mp
+import os
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Mapping, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:  # pandas / magazyn tylko w procesie głównym (procesy robocze i klient modelu bez nich)
+    from src.clip.embedding_store import EmbeddingStore
+
+
+DEFAULT_MODEL = "ViT-B-32"
+DEFAULT_PRETRAINED = "laion2b_s34b_b79k"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_COMMIT_ROWS = 1024
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp")
+
+
+# --- model ---
+
+def load_clip(
+    model_name: str = DEFAULT_MODEL,
+    pretrained: str = DEFAULT_PRETRAINED,
+    device: str | None = None,
+):
+    """(model, preprocess, model_id, device); torch/open_clip importowane dopiero tutaj."""
+    import open_clip
+    import torch
+
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    model, _, preprocess = open_clip.create_model_and_transforms(model_name, pretrained=pretrained)
+    model = model.to(device).eval()
+    return model, preprocess, f"{model_name}::{pretrained}", device
+
+
+def image_encoder(model, device: str = "cpu") -> Callable[[np.ndarray], np.ndarray]:
+    """Funkcja batch [n, 3, H, W] float32 -> embeddingi [n, dim] float32 (bez normalizacji)."""
+    import torch
+
+    def encode(batch: np.ndarray) -> np.ndarray:
+        x = torch.from_numpy(batch).to(device)
+        with torch.inference_mode():
+            e = model.encode_image(x)
+        return e.float().cpu().numpy()
+
+    return encode
+
+
+def text_encoder(model, model_name: str = DEFAULT_MODEL, device: str = "cpu") -> Callable[[str], np.ndarray]:
+    """Funkcja tekst -> embedding CLIP [dim] float32 (wyszukiwanie tekst -> obraz)."""
+    import open_clip
+    import torch
+
+    tokenizer = open_clip.get_tokenizer(model_name)
+
+    def encode(text: str) -> np.ndarray:
+        with torch.inference_mode():
+            e = model.encode_text(tokenizer([text]).to(device))
+        return e.float().cpu().numpy()[0]
+
+    return encode
+
+
+# --- dekodowanie (procesy robocze) ---
+
+_worker_preprocess: Callable | None = None
+_worker_fetch_many: Callable | None = None
+
+
+def fetch_many_default(paths: Sequence[str]) -> list[bytes | Exception]:
+    """Równoległe pobranie przez współdzielony ImageFetcher (cache dyskowy wspólny dla procesów)."""
+    from src.io.image_fetcher import get_fetcher
+
+    return get_fetcher().get_many(paths)
+
+
+def _init_worker(preprocess: Callable, fetch_many: Callable | None) -> None:
+    global _worker_preprocess, _worker_fetch_many
+    _worker_preprocess = preprocess
+    _worker_fetch_many = fetch_many or fetch_many_default
+    try:
+        import torch
+
+        torch.set_num_threads(1)  # wątki torch zostają dla modelu w procesie głównym
+    except ModuleNotFoundError:
+        pass
+
+
+def preprocess_array(img) -> np.ndarray:
+    """preprocess obrazu PIL w procesie roboczym -> [3, H, W] float32 (numpy, tanie przesłanie do procesu głównego)."""
+    x = _worker_preprocess(img)
+    return np.asarray(x.numpy() if hasattr(x, "numpy") else x, dtype=np.float32)
+
+
+def iter_fetched_images(items: Sequence[tuple[str, object]], errors: list[tuple[str, str]]):
+    """(ścieżka, dane dodatkowe, otwarty obraz PIL – jeszcze bez dekodowania pikseli); błędy dopisywane do errors."""
+    from PIL import Image
+
+    for (p, extra), data in zip(items, _worker_fetch_many([p for p, _ in items])):
+        if isinstance(data, Exception):
+            errors.append((p, str(data)[:300]))
+            continue
+        try:
+            yield p, extra, Image.open(io.BytesIO(data))
+        except Exception as e:
+            errors.append((p, str(e)[:300]))
+
+
+def decode_chunk(items: Sequence[tuple[str, object]]) -> tuple[list[dict], np.ndarray | None, list[tuple[str, str]]]:
+    """
+    Pobranie + dekodowanie + preprocess porcji obrazów (jeden wektor na obraz).
+
+    Zwraca (metadane wierszy, tensor [n, 3, H, W] float32, [(ścieżka, błąd)]).
+    """
+    metas: list[dict] = []
+    arrays: list[np.ndarray] = []
+    errors: list[tuple[str, str]] = []
+    for p, _, img in iter_fetched_images(items, errors):
+        try:
+            arrays.append(preprocess_array(img.convert("RGB")))
+            metas.append({"gcs_path": p, "file_name": p.rsplit("/", 1)[-1]})
+        except Exception as e:
+            errors.append((p, str(e)[:300]))
+    return metas, (np.stack(arrays) if arrays else None), errors
+
+
+def iter_decoded(
+    chunks: Iterable[Sequence[tuple[str, object]]],
+    preprocess: Callable,
+    fetch_many: Callable | None = None,
+    workers: int = 2,
+    max_pending: int | None = None,
+    start_method: str = "spawn",
+    decode: Callable = decode_chunk,
+) -> Iterator[tuple[list[dict], np.ndarray | None, list[tuple[str, str]]]]:
+    """Zdekodowane porcje w kolejności wejścia; workers > 0 => pula procesów z oknem max_pending porcji."""
+    if workers <= 0:
+        _init_worker(preprocess, fetch_many)
+        for c in chunks:
+            yield decode(c)
+        return
+
+    max_pending = max_pending or 2 * workers
+    pending: deque = deque()
+    # spawn: proces główny ma już wątki torch, fork mógłby się zakleszczyć
+    ctx = mp.get_context(start_method)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(preprocess, fetch_many),
+    ) as ex:
+        for c in chunks:
+            pending.append(ex.submit(decode, list(c)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# --- magazyn + pętla główna ---
+
+def open_store(root: str, dim: int, model_id: str, legacy_parquet: str | None = None) -> EmbeddingStore:
+    """Istniejący (albo zmigrowany z legacy parquet) magazyn; nowy, jeśli nie ma żadnego."""
+    from src.clip.embedding_store import STORE_FILE, EmbeddingStore, open_or_migrate
+
+    has_legacy = bool(legacy_parquet) and os.path.exists(legacy_parquet)
+    if os.path.exists(os.path.join(root, STORE_FILE)) or has_legacy:
+        store = open_or_migrate(root, legacy_parquet=legacy_parquet, model_id=model_id)
+    else:
+        store = EmbeddingStore(root, dim=dim, model_id=model_id)
+    if store.dim != int(dim):
+        raise ValueError(f"Wymiar embeddingów {dim} != {store.dim} w {root}")
+    if store.model_id and store.model_id != model_id:
+        raise ValueError(f"Model {model_id} != {store.model_id} w {root}")
+    return store
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def embed_images(
+    paths: Iterable[str],
+    store: EmbeddingStore,
+    encode: Callable[[np.ndarray], np.ndarray],
+    preprocess: Callable,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 2,
+    max_pending: int | None = None,
+    commit_rows: int = DEFAULT_COMMIT_ROWS,
+    fetch_many: Callable | None = None,
+    log_every_s: float = 10.0,
+    start_method: str = "spawn",
+    decode: Callable = decode_chunk,
+    extras: Mapping[str, object] | None = None,
+    images_per_chunk: int | None = None,
+) -> dict:
+    """
+    Liczy embeddingi obrazów, których jeszcze nie ma w store, i dopisuje je porcjami.
+
+    encode — batch [n, 3, H, W] -> [n, dim] (np. image_encoder(model)), wołane po batch_size wierszy,
+    preprocess — transformacja PIL -> tensor/array [3, H, W] (z open_clip; przekazywana do procesów),
+    workers — procesy dekodujące (0 = dekodowanie w procesie głównym),
+    decode / extras — funkcja porcji (domyślnie 1 wektor na obraz) i dane per obraz dla niej
+                      (np. bboxy OCR dla indeksu fragmentów); images_per_chunk domyślnie = batch_size.
+    Obrazy, których nie udało się pobrać/zdekodować, nie trafiają do magazynu (ponowna próba przy
+    kolejnym uruchomieniu). Zwraca statystyki (images, vectors, failed, skipped, images_per_s, ...).
+    """
+    t0 = time.perf_counter()
+    done = store.paths()
+    unique = list(dict.fromkeys(paths))
+    todo = [p for p in unique if p not in done]
+    skipped = len(unique) - len(todo)  # wejście już w magazynie (nie cały magazyn)
+    total = len(todo)
+    extras = extras or {}
+    items = [(p, extras.get(p)) for p in todo]
+
+    buf_vecs: list[np.ndarray] = []
+    buf_meta: list[dict] = []
+    failed: list[tuple[str, str]] = []
+    n_done = 0
+    n_vectors = 0
+    wait_s = 0.0
+    encode_s = 0.0
+
+    def commit() -> None:
+        if not buf_meta:
+            return
+        store.append(np.concatenate(buf_vecs), list(buf_meta))
+        buf_vecs.clear()
+        buf_meta.clear()
+
+    print(f"[INFO] Do przeliczenia: {total} obrazów (już w magazynie: {skipped})")
+    last_log = time.perf_counter()
+    decoded = iter_decoded(
+        _chunks(items, images_per_chunk or batch_size),
+        preprocess,
+        fetch_many=fetch_many,
+        workers=workers,
+        max_pending=max_pending,
+        start_method=start_method,
+        decode=decode,
+    )
+    try:
+        while True:
+            t = time.perf_counter()
+            try:
+                metas, batch, errors = next(decoded)
+            except StopIteration:
+                break
+            wait_s += time.perf_counter() - t
+
+            for p, err in errors:
+                print(f"[WARN] {p}: {err}")
+            failed.extend(errors)
+            if batch is not None:
+                t = time.perf_counter()
+                for lo in range(0, len(batch), batch_size):
+                    buf_vecs.append(np.asarray(encode(batch[lo:lo + batch_size]), dtype=np.float32))
+                encode_s += time.perf_counter() - t
+                buf_meta.extend(metas)
+                n_vectors += len(metas)
+                n_done += len({m["gcs_path"] for m in metas})
+            # commit między porcjami: wszystkie wiersze obrazu zawsze w jednym append
+            if len(buf_meta) >= commit_rows:
+                commit()
+
+            now = time.perf_counter()
+            if now - last_log >= log_every_s:
+                rate = n_done / max(now - t0, 1e-9)
+                print(f"[EMB] {n_done + len(failed)}/{total} | {rate:.1f} img/s")
+                last_log = now
+    finally:
+        decoded.close()
+        commit()  # przy przerwaniu zapisujemy to, co już policzone (wznowienie od tego miejsca)
+
+    seconds = time.perf_counter() - t0
+    stats = {
+        "images": n_done,
+        "vectors": n_vectors,
+        "failed": len(failed),
+        "skipped": skipped,
+        "seconds": round(seconds, 2),
+        "images_per_s": round(n_done / max(seconds, 1e-9), 2),
+        "decode_wait_s": round(wait_s, 2),
+        "encode_s": round(encode_s, 2),
+    }
+    print(
+        f"[DONE] Embeddingi: {n_done} nowych, {len(failed)} błędów, {skipped} pominiętych | "
+        f"{stats['images_per_s']} img/s (model {stats['encode_s']} s, czekanie na dekodowanie {stats['decode_wait_s']} s)"
+    )
+    stats["failed_paths"] = failed
+    return stats
+
+
+def list_gcs_images(prefix: str) -> list[str]:
+    """Obrazy pod prefixem gs://...; przez src.io.gcs, a bez google-cloud-storage przez `gcloud storage ls`."""
+    from src.io.gcs import list_images, split_gs_uri, storage_available
+
+    if not storage_available():
+        r = subprocess.run(["gcloud", "storage", "ls", f"{prefix.rstrip('/')}/**"], capture_output=True, text=True)
+        if r.returncode != 0:
+            raise RuntimeError(r.stderr.strip()[:2000])
+        lines = (line.strip() for line in r.stdout.splitlines())
+        return sorted(p for p in lines if p.lower().endswith(IMAGE_EXTS))
+
+    bucket, name = split_gs_uri(prefix.rstrip("/") + "/")
+    return sorted(list_images(bucket, name))
+
+
+def main():
+    p = argparse.ArgumentParser()
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--prefix", help="gs://bucket/folder (zestaw obrazów)")
+    src.add_argument("--paths-file", help="plik z listą gs://... (jedna ścieżka w linii)")
+    p.add_argument("--store", required=True, help="katalog magazynu embeddingów (clip_global__<slug>)")
+    p.add_argument("--legacy-parquet", default=None, help="stary clip_global__<slug>.parquet do migracji")
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--pretrained", default=DEFAULT_PRETRAINED)
+    p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="procesy dekodujące")
+    p.add_argument("--threads", type=int, default=None, help="wątki torch dla modelu (domyślnie torch)")
+    p.add_argument("--commit-rows", type=int, default=DEFAULT_COMMIT_ROWS)
+    p.add_argument("--limit", type=int, default=None)
+    args = p.parse_args()
+
+    if args.prefix:
+        paths = list_gcs_images(args.prefix)
+    else:
+        with open(args.paths_file, encoding="utf-8") as f:
+            paths = [line.strip() for line in f if line.strip()]
+    if args.limit:
+        paths = paths[: args.limit]
+
+    model, preprocess, model_id, device = load_clip(args.model, args.pretrained)
+    if args.threads:
+        import torch
+
+        torch.set_num_threads(args.threads)
+    store = open_store(args.store, model.visual.output_dim, model_id, legacy_parquet=args.legacy_parquet)
+    embed_images(
+        paths,
+        store,
+        image_encoder(model, device),
+        preprocess,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        commit_rows=args.commit_rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
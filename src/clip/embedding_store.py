@@ -0,0 +1,284 @@
+"""
+Magazyn embeddingów CLIP: jedna ciągła macierz float16 mapowana z dysku + mała tabela metadanych.
+
+Zastępuje embeddingi trzymane jako bajty per wiersz (emb_f16) w clip_global__<slug>.parquet.
+
+Układ katalogu root:
+    vectors.f16              – surowa macierz float16 [n, dim], wiersze znormalizowane (L2 = 1)
+    meta/part-000000000.parquet – metadane wierszy dopisanych w jednym append (row, gcs_path, file_name, ...)
+    store.json               – dim, n (liczba zatwierdzonych wierszy), model_id, version, epoch (compact)
+
+Otwarcie = odczyt store.json + np.memmap (bez kopiowania macierzy; strony ładuje system).
+append(): wektory dopisywane na końcu pliku, potem partycja metadanych, na końcu store.json –
+wiersze po przerwanym append (poza n) są ignorowane i nadpisywane przy następnym.
+
+Ten sam gcs_path dopisany ponownie (np. podmieniony skan) – obowiązują wiersze z ostatniego append
+tego gcs_path (active_rows()); jeden obraz może mieć wiele wierszy (np. indeks fragmentów).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+VECTORS_FILE = "vectors.f16"
+STORE_FILE = "store.json"
+META_DIR = "meta"
+META_COLS = ("row", "gcs_path", "file_name")
+SEARCH_CHUNK_ROWS = 262144  # wiersze float16 -> float32 liczone porcjami (pamięć ograniczona)
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    """Wiersze znormalizowane do długości 1 (float32)."""
+    x = np.asarray(x, dtype=np.float32)
+    n = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(n, 1e-12)
+
+
+def _write_json_atomic(obj: dict, path: str) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def topk_desc(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indeksy k największych wartości (malejąco)."""
+    k = min(int(k), len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, kth=k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+class EmbeddingStore:
+    """
+    root — katalog magazynu (tworzony przy pierwszym append, jeśli nie istnieje),
+    dim / model_id — wymagane dla nowego magazynu; dla istniejącego sprawdzane ze store.json.
+    """
+
+    def __init__(self, root: str, dim: int | None = None, model_id: str | None = None):
+        self.root = root
+        self._vec_path = os.path.join(root, VECTORS_FILE)
+        self._meta_dir = os.path.join(root, META_DIR)
+        self._mm: np.memmap | None = None
+        self._meta: pd.DataFrame | None = None
+        self._active: np.ndarray | None = None
+        self._part_starts: list[int] = []
+
+        store_path = os.path.join(root, STORE_FILE)
+        if os.path.exists(store_path):
+            with open(store_path, encoding="utf-8") as f:
+                info = json.load(f)
+            if dim is not None and int(dim) != int(info["dim"]):
+                raise ValueError(f"Wymiar embeddingów {dim} != {info['dim']} w {root}")
+            if model_id is not None and info.get("model_id") and model_id != info["model_id"]:
+                raise ValueError(f"Model {model_id} != {info['model_id']} w {root}")
+            self.dim = int(info["dim"])
+            self.n = int(info["n"])
+            self.model_id = info.get("model_id")
+            self.version = int(info.get("version", 0))
+            self.epoch = int(info.get("epoch", 0))
+        else:
+            if dim is None:
+                raise FileNotFoundError(f"Brak magazynu embeddingów: {root} (podaj dim, aby utworzyć nowy)")
+            self.dim = int(dim)
+            self.n = 0
+            self.model_id = model_id
+            self.version = 0
+            self.epoch = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    def reload(self) -> bool:
+        """
+        Ponownie czyta store.json (append/compact z innego procesu, np. budowa indeksu w innej komórce).
+
+        True, gdy magazyn się zmienił (odczyty odświeżone; zależne cache/indeksy należy zsynchronizować).
+        """
+        store_path = os.path.join(self.root, STORE_FILE)
+        if not os.path.exists(store_path):
+            return False
+        with open(store_path, encoding="utf-8") as f:
+            info = json.load(f)
+        state = (int(info["n"]), int(info.get("version", 0)), int(info.get("epoch", 0)))
+        if state == (self.n, self.version, self.epoch):
+            return False
+        self.n, self.version, self.epoch = state
+        self._mm = None
+        self._meta = None
+        self._active = None
+        return True
+
+    # --- odczyt ---
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Macierz [n, dim] float16 tylko do odczytu (memmap; pusta dla n=0)."""
+        if self.n == 0:
+            return np.empty((0, self.dim), dtype=np.float16)
+        if self._mm is None or self._mm.shape[0] != self.n:
+            self._mm = np.memmap(self._vec_path, dtype=np.float16, mode="r", shape=(self.n, self.dim))
+        return self._mm
+
+    def meta(self, columns: Sequence[str] | None = None) -> pd.DataFrame:
+        """Metadane wierszy (row = indeks w macierzy), posortowane po row."""
+        if self._meta is None:
+            parts = sorted(os.listdir(self._meta_dir)) if os.path.isdir(self._meta_dir) else []
+            parts = [p for p in parts if p.endswith(".parquet")]
+            frames = [pd.read_parquet(os.path.join(self._meta_dir, p)) for p in parts]
+            self._part_starts = [int(p[len("part-"):-len(".parquet")]) for p in parts]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(META_COLS))
+            df = df[df["row"] < self.n].sort_values("row", kind="stable").reset_index(drop=True)
+            self._meta = df
+        return self._meta if columns is None else self._meta[list(columns)]
+
+    def active_rows(self) -> np.ndarray:
+        """Wiersze obowiązujące (z ostatniego append danego gcs_path), rosnąco."""
+        if self._active is None:
+            m = self.meta(["row", "gcs_path"])
+            rows = m["row"].to_numpy(dtype=np.int64)
+            part = np.searchsorted(np.asarray(self._part_starts, dtype=np.int64), rows, side="right") - 1
+            last = pd.Series(part).groupby(m["gcs_path"].to_numpy()).transform("max").to_numpy()
+            self._active = rows[part == last]
+        return self._active
+
+    def paths(self) -> set[str]:
+        return set(self.meta(["gcs_path"])["gcs_path"].tolist())
+
+    def vectors(self, rows: np.ndarray | None = None) -> np.ndarray:
+        """Wektory float32 dla wskazanych wierszy (domyślnie active_rows) – kopia w RAM."""
+        rows = self.active_rows() if rows is None else np.asarray(rows, dtype=np.int64)
+        return np.asarray(self.matrix[rows], dtype=np.float32)
+
+    def search(self, q: np.ndarray, k: int = 20, rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Dokładne top-k (iloczyn skalarny = cosine) po wierszach rows (domyślnie active_rows).
+
+        Zwraca (wiersze, podobieństwa). Macierz czytana porcjami, więc RAM nie rośnie z n.
+        """
+        rows = self.active_rows() if rows is None else np.asarray(rows, dtype=np.int64)
+        q = normalize_rows(np.asarray(q, dtype=np.float32).reshape(1, -1))[0]
+        M = self.matrix
+        best_rows: list[np.ndarray] = []
+        best_sims: list[np.ndarray] = []
+        contiguous = len(rows) == self.n
+        for lo in range(0, len(rows), SEARCH_CHUNK_ROWS):
+            r = rows[lo:lo + SEARCH_CHUNK_ROWS]
+            block = M[lo:lo + len(r)] if contiguous else M[r]
+            sims = np.asarray(block, dtype=np.float32) @ q
+            top = topk_desc(sims, k)
+            best_rows.append(r[top])
+            best_sims.append(sims[top])
+        if not best_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        r_all, s_all = np.concatenate(best_rows), np.concatenate(best_sims)
+        top = topk_desc(s_all, k)
+        return r_all[top], s_all[top]
+
+    # --- zapis ---
+
+    def append(self, vectors: np.ndarray, meta: pd.DataFrame | Iterable[dict]) -> np.ndarray:
+        """
+        Dopisuje wektory (normalizowane, zapis float16) i ich metadane (gcs_path, file_name, ...).
+        Zwraca numery nowych wierszy.
+        """
+        vecs = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)).astype(np.float16)
+        meta = meta.copy() if isinstance(meta, pd.DataFrame) else pd.DataFrame(list(meta))
+        if len(meta) != len(vecs):
+            raise ValueError(f"Liczba wektorów ({len(vecs)}) != liczba wierszy metadanych ({len(meta)})")
+        if len(vecs) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        os.makedirs(self._meta_dir, exist_ok=True)
+        start = self.n
+        rows = np.arange(start, start + len(vecs), dtype=np.int64)
+
+        # 1) wektory: obcięcie pozostałości przerwanego append, dopisanie, fsync
+        self._mm = None
+        with open(self._vec_path, "ab") as f:
+            f.truncate(start * self.dim * 2)
+            f.write(vecs.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        # 2) metadane (partycja nazwana numerem pierwszego wiersza)
+        meta.insert(0, "row", rows)
+        for c in META_COLS[1:]:
+            if c not in meta.columns:
+                meta[c] = None
+        meta.to_parquet(os.path.join(self._meta_dir, f"part-{start:09d}.parquet"), index=False)
+
+        # 3) zatwierdzenie
+        self.n = start + len(vecs)
+        self.version += 1
+        self._write_info()
+        self._meta = None
+        self._active = None
+        return rows
+
+    def _write_info(self) -> None:
+        _write_json_atomic(
+            {"dim": self.dim, "n": self.n, "model_id": self.model_id, "version": self.version, "epoch": self.epoch},
+            os.path.join(self.root, STORE_FILE),
+        )
+
+    def compact(self) -> None:
+        """Przepisuje magazyn tylko z active_rows (jedna partycja metadanych)."""
+        rows = self.active_rows()
+        if len(rows) == self.n:
+            return
+        vecs = np.asarray(self.matrix[rows])
+        meta = self.meta().set_index("row").loc[rows].reset_index(drop=True)
+
+        self._mm = None
+        tmp = self._vec_path + ".tmp"
+        vecs.tofile(tmp)
+        os.replace(tmp, self._vec_path)
+        for p in os.listdir(self._meta_dir):
+            os.remove(os.path.join(self._meta_dir, p))
+        meta.insert(0, "row", np.arange(len(rows), dtype=np.int64))
+        meta.to_parquet(os.path.join(self._meta_dir, f"part-{0:09d}.parquet"), index=False)
+
+        self.n = len(rows)
+        self.version += 1
+        self.epoch += 1  # nowe numery wierszy (indeksy ANN budowane od nowa)
+        self._write_info()
+        self._meta = None
+        self._active = None
+
+
+def open_or_migrate(root: str, legacy_parquet: str | None = None, model_id: str | None = None) -> EmbeddingStore:
+    """
+    Otwiera magazyn; jeśli go nie ma, a istnieje legacy clip_global__<slug>.parquet (emb_f16 + dim),
+    jednorazowo przenosi embeddingi (wektorowo, bez iterrows).
+    """
+    if os.path.exists(os.path.join(root, STORE_FILE)) or not legacy_parquet or not os.path.exists(legacy_parquet):
+        return EmbeddingStore(root)
+
+    df = pd.read_parquet(legacy_parquet)
+    df = df[df["emb_f16"].notna()]
+    dims = df["dim"].astype(int)
+    if dims.nunique() != 1:
+        raise ValueError(f"Różne wymiary embeddingów w {legacy_parquet}: {sorted(dims.unique())}")
+    dim = int(dims.iloc[0])
+
+    blobs = df["emb_f16"].tolist()
+    ok = np.fromiter((len(b) == dim * 2 for b in blobs), dtype=bool, count=len(blobs))
+    df = df[ok]
+    vecs = np.frombuffer(b"".join(b for b, good in zip(blobs, ok) if good), dtype=np.float16).reshape(-1, dim)
+
+    if model_id is None and "model_id" in df.columns and len(df):
+        model_id = str(df["model_id"].iloc[0])
+    meta_cols = [c for c in df.columns if c not in ("emb_f16", "dim", "model_id")]
+    store = EmbeddingStore(root, dim=dim, model_id=model_id)
+    store.append(vecs, df[meta_cols].reset_index(drop=True))
+    return store
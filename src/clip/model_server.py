@@ -0,0 +1,347 @@
+"""
+Współdzielony model CLIP: jeden długo żyjący proces z załadowanym modelem dla CLI i notebooków.
+
+Każdy nowy kernel wołał load_clip (import torch/open_clip + wagi ViT-B-32: kilka–kilkanaście sekund
+i ~0.6 GB RAM na kernel). Tutaj model ładuje się raz, w osobnym procesie:
+- serwer: python -m src.clip.model_server [--model ... --pretrained ...]
+  (gniazdo unix w ~/.cache/ocr-search/, klucz autoryzacji w pliku 0600 obok),
+- klient: connect_clip() – łączy się z działającym serwerem albo uruchamia go w tle i czeka na model;
+  import klienta nie ładuje torch (tensory przesyłane jako numpy).
+
+Klient i lokalny model (LocalClip, mode="local") mają ten sam interfejs:
+model_id, dim, preprocess, encode_batch(batch), embed_images([bytes]), embed_image(bytes | PIL),
+embed_texts([str]), embed_text(str). Embeddingi bez normalizacji (jak image_encoder / text_encoder).
+Serwer kończy pracę po idle_timeout_s bez zapytań (domyślnie 2 h) albo po shutdown().
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import hashlib
+import io
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Sequence
+
+import numpy as np
+
+from src.clip.embed_pipeline import DEFAULT_MODEL, DEFAULT_PRETRAINED
+
+
+RUNTIME_DIR = os.environ.get(
+    "OCR_SEARCH_RUNTIME",
+    os.path.join(os.path.expanduser("~"), ".cache", "ocr-search"),
+)
+DEFAULT_IDLE_TIMEOUT_S = float(os.environ.get("OCR_SEARCH_MODEL_IDLE_S", 2 * 3600))
+START_TIMEOUT_S = 300.0  # pierwsze uruchomienie może pobierać wagi
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def server_address(model_name: str = DEFAULT_MODEL, pretrained: str = DEFAULT_PRETRAINED) -> str:
+    """Ścieżka gniazda serwera danego modelu (krótka: limit ~100 znaków na ścieżkę gniazda unix)."""
+    h = hashlib.sha1(f"{model_name}::{pretrained}".encode("utf-8")).hexdigest()[:10]
+    return os.path.join(RUNTIME_DIR, f"clip-{h}.sock")
+
+
+def _authkey(address: str, create: bool = False) -> bytes:
+    path = address + ".key"
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        os.replace(tmp, path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _image_bytes(img) -> bytes:
+    """PIL -> PNG (bez strat); bajty pliku przekazywane bez zmian."""
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        return bytes(img)
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class LocalClip:
+    """Model CLIP w bieżącym procesie (serwer używa tej klasy; mode="local" – bez serwera)."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, pretrained: str = DEFAULT_PRETRAINED, device: str | None = None):
+        from src.clip.embed_pipeline import image_encoder, load_clip
+
+        import open_clip
+        import torch
+
+        self.model, self.preprocess, self.model_id, self.device = load_clip(model_name, pretrained, device)
+        self.dim = int(self.model.visual.output_dim)
+        self.encode_batch = image_encoder(self.model, self.device)
+        self._tokenizer = open_clip.get_tokenizer(model_name)
+        self._torch = torch
+
+    def embed_images(self, images: Sequence[bytes]) -> np.ndarray:
+        from PIL import Image
+
+        batch = np.stack(
+            [np.asarray(self.preprocess(Image.open(io.BytesIO(b)).convert("RGB")), dtype=np.float32) for b in images]
+        )
+        return self.encode_batch(batch)
+
+    def embed_image(self, img) -> np.ndarray:
+        return self.embed_images([_image_bytes(img)])[0]
+
+    def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
+        with self._torch.inference_mode():
+            e = self.model.encode_text(self._tokenizer(list(texts)).to(self.device))
+        return e.float().cpu().numpy()
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_texts([text])[0]
+
+    def info(self) -> dict:
+        return {"model_id": self.model_id, "dim": self.dim, "device": self.device, "pid": os.getpid()}
+
+
+class ClipClient:
+    """Połączenie z serwerem modelu (bezpieczne wątkowo: jedno zapytanie naraz na połączenie)."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._conn = Client(address, family="AF_UNIX", authkey=_authkey(address))
+        self._lock = threading.Lock()
+        self._preprocess = None
+        info = self.info()
+        self.model_id = info["model_id"]
+        self.dim = int(info["dim"])
+
+    def _call(self, op: str, payload=None):
+        with self._lock:
+            self._conn.send((op, payload))
+            status, out = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"model_server ({op}): {out}")
+        return out
+
+    def info(self) -> dict:
+        return self._call("info")
+
+    @property
+    def preprocess(self):
+        """Transformacja preprocess modelu (unpickle wymaga torchvision – tylko do budowy indeksu)."""
+        if self._preprocess is None:
+            self._preprocess = self._call("preprocess")
+        return self._preprocess
+
+    def encode_batch(self, batch: np.ndarray) -> np.ndarray:
+        return self._call("encode", np.ascontiguousarray(batch, dtype=np.float32))
+
+    def embed_images(self, images: Sequence[bytes]) -> np.ndarray:
+        return self._call("images", [bytes(b) for b in images])
+
+    def embed_image(self, img) -> np.ndarray:
+        return self.embed_images([_image_bytes(img)])[0]
+
+    def embed_texts(self, texts: Sequence[str]) -> np.ndarray:
+        return self._call("texts", list(texts))
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self.embed_texts([text])[0]
+
+    def shutdown(self) -> None:
+        """Zatrzymuje serwer (dla wszystkich klientów)."""
+        try:
+            self._call("shutdown")
+        except (EOFError, OSError):
+            pass
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _try_connect(address: str) -> ClipClient | None:
+    try:
+        return ClipClient(address)
+    except (FileNotFoundError, ConnectionRefusedError, EOFError, OSError):
+        return None
+
+
+def start_server(
+    model_name: str = DEFAULT_MODEL,
+    pretrained: str = DEFAULT_PRETRAINED,
+    address: str | None = None,
+    idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+) -> subprocess.Popen:
+    """Uruchamia serwer w tle (osobna sesja – przeżywa kernel/CLI, który go uruchomił); log w <gniazdo>.log."""
+    address = address or server_address(model_name, pretrained)
+    os.makedirs(os.path.dirname(address), exist_ok=True)
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (REPO_ROOT, env.get("PYTHONPATH")) if p)
+    cmd = [
+        sys.executable, "-m", "src.clip.model_server",
+        "--model", model_name, "--pretrained", pretrained,
+        "--address", address, "--idle-timeout", str(idle_timeout_s),
+    ]
+    with open(address + ".log", "ab") as log:
+        return subprocess.Popen(
+            cmd, cwd=REPO_ROOT, env=env, stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True
+        )
+
+
+def connect_clip(
+    model_name: str = DEFAULT_MODEL,
+    pretrained: str = DEFAULT_PRETRAINED,
+    mode: str = "auto",
+    address: str | None = None,
+    timeout_s: float = START_TIMEOUT_S,
+):
+    """
+    Model CLIP do zapytań i budowy indeksu.
+
+    mode: "server" – współdzielony proces (uruchamiany w razie potrzeby), "local" – LocalClip w tym procesie,
+          "auto" – serwer, a gdy nie da się go uruchomić – LocalClip z ostrzeżeniem.
+    """
+    if mode not in ("auto", "server", "local"):
+        raise ValueError(f"Nieznany tryb: {mode} (auto / server / local)")
+    if mode == "local":
+        return LocalClip(model_name, pretrained)
+
+    address = address or server_address(model_name, pretrained)
+    try:
+        client = _try_connect(address)
+        if client is None:
+            print("[INFO] Uruchamiam serwer modelu CLIP:", address)
+            proc = start_server(model_name, pretrained, address)
+            deadline = time.monotonic() + timeout_s
+            while client is None:
+                if proc.poll():  # kod 0 = inny proces właśnie uruchamia serwer – czekamy na niego
+                    raise RuntimeError(f"serwer modelu zakończył się (kod {proc.returncode}), log: {address}.log")
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"serwer modelu nie odpowiada po {timeout_s:.0f} s, log: {address}.log")
+                time.sleep(0.2)
+                client = _try_connect(address)
+        want = f"{model_name}::{pretrained}"
+        if client.model_id != want:
+            client.close()
+            raise RuntimeError(f"serwer pod {address} ma model {client.model_id}, oczekiwano {want}")
+        return client
+    except Exception as e:
+        if mode == "server":
+            raise
+        print(f"[WARN] Serwer modelu niedostępny ({type(e).__name__}: {e}) – model ładowany w tym procesie.")
+        return LocalClip(model_name, pretrained)
+
+
+# --- serwer ---
+
+def serve(
+    model_name: str = DEFAULT_MODEL,
+    pretrained: str = DEFAULT_PRETRAINED,
+    address: str | None = None,
+    idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S,
+) -> None:
+    address = address or server_address(model_name, pretrained)
+    os.makedirs(os.path.dirname(address), exist_ok=True)
+    lock = open(address + ".lock", "w")  # trzymany do końca procesu: jeden serwer na gniazdo
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("[SKIP] Serwer już działa albo startuje:", address)
+        return
+    if os.path.exists(address):
+        os.remove(address)  # gniazdo po procesie, który nie posprzątał
+
+    t0 = time.perf_counter()
+    clip = LocalClip(model_name, pretrained)
+    print(f"[INFO] Model {clip.model_id} ({clip.device}) załadowany w {time.perf_counter() - t0:.1f} s", flush=True)
+
+    model_lock = threading.Lock()  # jedno wywołanie modelu naraz (wątki per połączenie)
+    last_used = [time.monotonic()]
+
+    def stop() -> None:
+        try:
+            os.remove(address)
+        except FileNotFoundError:
+            pass
+        print("[DONE] Serwer modelu zatrzymany:", address, flush=True)
+        os._exit(0)
+
+    def handle(conn) -> None:
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                last_used[0] = time.monotonic()
+                try:
+                    if op == "info":
+                        out = clip.info()
+                    elif op == "preprocess":
+                        out = clip.preprocess
+                    elif op == "shutdown":
+                        conn.send(("ok", None))
+                        stop()
+                    else:
+                        fn = {"encode": clip.encode_batch, "images": clip.embed_images, "texts": clip.embed_texts}.get(op)
+                        if fn is None:
+                            raise ValueError(f"nieznana operacja: {op}")
+                        with model_lock:
+                            out = fn(payload)
+                    conn.send(("ok", out))
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+                last_used[0] = time.monotonic()
+
+    def watchdog() -> None:
+        while True:
+            time.sleep(min(60.0, max(idle_timeout_s / 4, 1.0)))
+            if not model_lock.locked() and time.monotonic() - last_used[0] > idle_timeout_s:
+                print(f"[INFO] Brak zapytań od {idle_timeout_s:.0f} s", flush=True)
+                stop()
+
+    listener = Listener(address, family="AF_UNIX", authkey=_authkey(address, create=True))
+    if idle_timeout_s > 0:
+        threading.Thread(target=watchdog, daemon=True).start()
+    print("[INFO] Serwer modelu nasłuchuje:", address, flush=True)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # np. nieudana autoryzacja klienta
+                print("[WARN] Odrzucone połączenie:", e, flush=True)
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+    finally:
+        stop()
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--pretrained", default=DEFAULT_PRETRAINED)
+    p.add_argument("--address", default=None, help="ścieżka gniazda (domyślnie ~/.cache/ocr-search/clip-<hash>.sock)")
+    p.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT_S, help="s bez zapytań do wyłączenia (0 = nigdy)")
+    p.add_argument("--stop", action="store_true", help="zatrzymaj działający serwer")
+    args = p.parse_args()
+
+    if args.stop:
+        client = _try_connect(args.address or server_address(args.model, args.pretrained))
+        if client is None:
+            print("[SKIP] Serwer nie działa.")
+        else:
+            client.shutdown()
+            print("[DONE] Zatrzymano serwer.")
+        return
+    serve(args.model, args.pretrained, args.address, args.idle_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Indeks fragmentów (patch) CLIP: wyszukiwanie małych obiektów (szyld, logo) na dużych zdjęciach.
+
+Embedding całego zdjęcia "rozmywa" mały szyld, dlatego tutaj obraz ma wiele wektorów:
+- siatka kwadratowych okien w kilku skalach (bok = scale × krótszy bok obrazu, zakładka OVERLAP),
+- opcjonalnie okna wokół linii OCR z cache (bbox linii powiększony o margines) – napisy to zwykle szyldy.
+Wycinki są dopełniane do kwadratu (letterbox), żeby CenterCrop z preprocess CLIP nie obcinał krawędzi.
+
+Magazyn: EmbeddingStore (float16 memmap) w katalogu clip_patch__<slug>/ – wiersz = fragment, metadane:
+gcs_path, file_name, source ("grid" / "ocr"), x1, y1, x2, y2 (współrzędne [0..1] względem obrazu).
+Przy domyślnych skalach to ~65 fragmentów na zdjęcie 4:3 (~65 KB na zdjęcie dla ViT-B-32).
+
+Budowa: embed_images z src.clip.embed_pipeline z decode=decode_patches (te same procesy robocze,
+mini-batche, zapis porcjami i wznowienie). Wyszukiwanie: PatchSearcher – najlepsze fragmenty z indeksu
+wektorowego (exact / IVF-PQ z src.clip.ann_index), max-pool per obraz (wynik obrazu = najlepszy fragment).
+"""
+
+from __future__ import annotations
+
+from functools import partial
+from typing import Callable, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.clip.ann_index import open_vector_index
+from src.clip.embed_pipeline import embed_images, iter_fetched_images, preprocess_array
+from src.clip.embedding_store import EmbeddingStore
+from src.ocr.bbox import LEGACY_BBOX_COL, bbox_array, has_bbox_columns, to_pixels, valid_mask
+
+
+GRID_SCALES = (1.0, 0.5, 0.3)
+OVERLAP = 0.5
+MODEL_INPUT_PX = 224  # rozmiar wejścia CLIP: do tej rozdzielczości wystarczy dekodować najmniejsze okno
+OCR_PAD = 0.6  # margines wokół linii OCR (ułamek wysokości linii)
+MAX_OCR_BOXES = 24  # największe linie OCR na obraz
+PATCH_COLS = ("gcs_path", "file_name", "source", "x1", "y1", "x2", "y2")
+OVERSAMPLE = 8  # fragmentów pobieranych na 1 oczekiwany obraz wyniku (potem max-pool)
+
+
+def grid_boxes(width: int, height: int, scales: Sequence[float] = GRID_SCALES, overlap: float = OVERLAP) -> np.ndarray:
+    """Kwadratowe okna siatki w kilku skalach -> [n, 4] (x1, y1, x2, y2) w [0..1]."""
+    out = []
+    short = min(width, height)
+    for s in scales:
+        side = s * short
+        step = side * (1.0 - overlap)
+        nx = int(np.ceil(max(width - side, 0) / step - 1e-9)) + 1
+        ny = int(np.ceil(max(height - side, 0) / step - 1e-9)) + 1
+        xs = np.linspace(0, width - side, nx)
+        ys = np.linspace(0, height - side, ny)
+        gx, gy = np.meshgrid(xs, ys)
+        b = np.stack([gx.ravel(), gy.ravel(), gx.ravel() + side, gy.ravel() + side], axis=1)
+        out.append(b / np.array([width, height, width, height]))
+    return np.concatenate(out).astype(np.float32) if out else np.empty((0, 4), dtype=np.float32)
+
+
+def ocr_boxes_by_path(lines: pd.DataFrame, max_per_image: int = MAX_OCR_BOXES) -> dict[str, np.ndarray]:
+    """
+    bboxy linii OCR (kolumny x1..y2 albo legacy bbox_norm; piksele albo [0..1]) pogrupowane po gcs_path.
+
+    Na obraz zostaje max_per_image linii o największej powierzchni (drobny tekst rzadko jest szyldem).
+    """
+    if len(lines) == 0 or "gcs_path" not in lines.columns:
+        return {}
+    if not (has_bbox_columns(lines) or LEGACY_BBOX_COL in lines.columns):
+        return {}
+    arr = bbox_array(lines).astype(np.float64)
+    ok = valid_mask(arr)
+    df = pd.DataFrame(arr[ok], columns=["x1", "y1", "x2", "y2"])
+    df["gcs_path"] = lines["gcs_path"].to_numpy()[ok]
+    df["area"] = (df["x2"] - df["x1"]) * (df["y2"] - df["y1"])
+    df = df.sort_values(["gcs_path", "area"], ascending=[True, False], kind="stable")
+    df = df.groupby("gcs_path", sort=False).head(max_per_image)
+    boxes = df[["x1", "y1", "x2", "y2"]].to_numpy(dtype=np.float32)
+    paths = df["gcs_path"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, paths[1:] != paths[:-1]]) if len(paths) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(paths)]
+    return {paths[s]: boxes[s:e] for s, e in zip(starts, ends)}
+
+
+def expand_ocr_boxes(boxes: np.ndarray, width: int, height: int, pad: float = OCR_PAD) -> np.ndarray:
+    """Linie OCR -> okna [0..1] wokół nich: margines pad × wysokość linii, minimum MODEL_INPUT_PX / 2 pikseli."""
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4).copy()
+    if len(b) == 0:
+        return np.empty((0, 4), dtype=np.float32)
+    b = to_pixels(b, width, height)  # ta sama reguła px / [0..1] co w miniaturach (src.ocr.bbox)
+    m = pad * (b[:, 3] - b[:, 1])
+    b += np.stack([-m, -m, m, m], axis=1)
+    grow = np.maximum(MODEL_INPUT_PX / 2 - (b[:, 2:] - b[:, :2]), 0) / 2
+    b += np.concatenate([-grow, grow], axis=1)
+    b = np.clip(b, 0, [width, height, width, height])
+    return (b / np.array([width, height, width, height])).astype(np.float32)
+
+
+def square_crop(img, box: Sequence[float], fill: tuple[int, int, int] = (0, 0, 0)):
+    """Wycinek box (piksele) dopełniony do kwadratu (letterbox)."""
+    from PIL import Image
+
+    crop = img.crop(tuple(int(round(v)) for v in box))
+    w, h = crop.size
+    if w == h:
+        return crop
+    side = max(w, h)
+    canvas = Image.new("RGB", (side, side), fill)
+    canvas.paste(crop, ((side - w) // 2, (side - h) // 2))
+    return canvas
+
+
+def decode_patches(
+    items: Sequence[tuple[str, object]],
+    scales: Sequence[float] = GRID_SCALES,
+    overlap: float = OVERLAP,
+) -> tuple[list[dict], np.ndarray | None, list[tuple[str, str]]]:
+    """
+    Funkcja porcji dla embed_images: fragmenty siatki (+ okna OCR z extras) każdego obrazu.
+
+    JPEG bez okien OCR dekodowany w zmniejszonej rozdzielczości (Image.draft) – najmniejsze okno siatki
+    i tak jest skalowane do MODEL_INPUT_PX.
+    """
+    metas: list[dict] = []
+    arrays: list[np.ndarray] = []
+    errors: list[tuple[str, str]] = []
+    for p, ocr, img in iter_fetched_images(items, errors):
+        try:
+            W, H = img.size
+            boxes = [("grid", grid_boxes(W, H, scales, overlap))]
+            if ocr is not None and len(ocr):
+                boxes.append(("ocr", expand_ocr_boxes(ocr, W, H)))
+            elif img.format == "JPEG" and scales:
+                need = MODEL_INPUT_PX / min(scales)
+                f = need / min(W, H)
+                img.draft("RGB", (int(W * f) + 1, int(H * f) + 1))
+            img = img.convert("RGB")
+            scale_xy = np.array([img.width, img.height, img.width, img.height], dtype=np.float64)
+            file_name = p.rsplit("/", 1)[-1]
+            for source, b in boxes:
+                for box in b:
+                    arrays.append(preprocess_array(square_crop(img, box * scale_xy)))
+                    x1, y1, x2, y2 = (float(v) for v in box)
+                    metas.append(
+                        {"gcs_path": p, "file_name": file_name, "source": source, "x1": x1, "y1": y1, "x2": x2, "y2": y2}
+                    )
+        except Exception as e:
+            # obraz w całości albo wcale (wznowienie po gcs_path)
+            keep = [i for i, m in enumerate(metas) if m["gcs_path"] != p]
+            metas = [metas[i] for i in keep]
+            arrays = [arrays[i] for i in keep]
+            errors.append((p, str(e)[:300]))
+    return metas, (np.stack(arrays) if arrays else None), errors
+
+
+def build_patch_index(
+    paths: Iterable[str],
+    store: EmbeddingStore,
+    encode: Callable[[np.ndarray], np.ndarray],
+    preprocess: Callable,
+    ocr_lines: pd.DataFrame | None = None,
+    scales: Sequence[float] = GRID_SCALES,
+    overlap: float = OVERLAP,
+    batch_size: int = 64,
+    images_per_chunk: int = 2,
+    workers: int = 2,
+    **kwargs,
+) -> dict:
+    """
+    Dopisuje do store fragmenty obrazów, których jeszcze w nim nie ma (wznowienie po gcs_path).
+
+    ocr_lines — linie z cache OCR (gcs_path, x1..y2 albo legacy bbox_norm); okna wokół nich dochodzą do siatki.
+    Pozostałe argumenty (commit_rows, max_pending, fetch_many, ...) przekazywane do embed_images.
+    """
+    extras = ocr_boxes_by_path(ocr_lines) if ocr_lines is not None else None
+    return embed_images(
+        paths,
+        store,
+        encode,
+        preprocess,
+        batch_size=batch_size,
+        workers=workers,
+        decode=partial(decode_patches, scales=tuple(scales), overlap=float(overlap)),
+        extras=extras,
+        images_per_chunk=images_per_chunk,
+        **kwargs,
+    )
+
+
+class PatchSearcher:
+    """
+    Wyszukiwanie "znajdź ten szyld": podobieństwo obrazu = maksimum po jego fragmentach.
+
+    Top-k obrazów według maksimum to dokładnie pierwsze k różnych obrazów na liście fragmentów
+    posortowanej malejąco – pobieramy więc k × OVERSAMPLE najlepszych fragmentów i powiększamy
+    tę liczbę tylko wtedy, gdy zawiera mniej niż k różnych obrazów.
+    """
+
+    def __init__(self, store: EmbeddingStore, backend: str = "auto", **knobs):
+        self.store = store
+        self.index = open_vector_index(store, backend=backend, **knobs)
+
+    def search(self, q: np.ndarray, k: int = 20, sources: Sequence[str] | None = None) -> pd.DataFrame:
+        """
+        Top-k obrazów: gcs_path, file_name, score, source, bbox_norm (najlepszy fragment, [0..1]).
+
+        sources — np. ("ocr",), żeby szukać tylko w oknach wokół napisów.
+        """
+        meta = self.store.meta(PATCH_COLS)
+        n_active = len(self.store.active_rows())
+        want = max(int(k), 1) * OVERSAMPLE
+        while True:
+            rows, sims = self.index.search(q, k=want)
+            hits = meta.iloc[rows].assign(score=sims)
+            if sources is not None:
+                hits = hits[hits["source"].isin(list(sources))]
+            best = hits[~hits["gcs_path"].duplicated()]
+            if len(best) >= k or len(rows) < want or want >= n_active:
+                break
+            want *= 4
+
+        best = best.head(int(k)).reset_index(drop=True)
+        xy = best[["x1", "y1", "x2", "y2"]].to_numpy(dtype=np.float64)
+        best["bbox_norm"] = [",".join(f"{v:.4f}" for v in r) for r in xy]
+        return best[["gcs_path", "file_name", "score", "source", "bbox_norm"]]
@@ -0,0 +1,184 @@
+"""
+Cache zapytań wyszukiwania obrazowego: embeddingi referencji i listy top-k wyników.
+
+Recenzenci wielokrotnie klikają te same referencje (gs://ocr-2026/referencje), a każde kliknięcie
+liczyło embedding od nowa i przeszukiwało cały indeks. QueryCache trzyma:
+- embeddingi zapytań: klucz (sha1 treści referencji / tekstu, model_id); LRU w pamięci + pliki .npy
+  na dysku (przetrwają restart kernela; embedding nie zależy od indeksu),
+- wyniki top-k: klucz (indeks: root, epoch, version; sha1 treści; model_id; parametry wyszukiwania);
+  tylko pamięć, LRU.
+
+Unieważnianie: index_key(store) zmienia się przy każdym append/compact (store.version / epoch);
+pierwsze zapytanie z nowym kluczem danego indeksu usuwa wszystkie starsze wyniki tego indeksu.
+Zmiany z innego procesu widać po EmbeddingStore.reload().
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import numpy as np
+
+
+DEFAULT_QUERY_CACHE_DIR = os.environ.get(
+    "OCR_SEARCH_QUERY_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ocr-search", "queries"),
+)
+
+
+def content_hash(data: bytes | str) -> str:
+    """sha1 treści referencji (bajty obrazu) albo tekstu zapytania."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+
+def index_key(store) -> tuple:
+    """Wersja indeksu nad EmbeddingStore: (root, epoch, version) – zmienia się przy każdym append/compact."""
+    return (store.root, store.epoch, store.version)
+
+
+def _freeze(value: Any) -> Any:
+    """Tablice NumPy w wynikach tylko do odczytu (ten sam obiekt zwracany z cache wielokrotnie)."""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, tuple):
+        for v in value:
+            _freeze(v)
+    return value
+
+
+class QueryCache:
+    """
+    max_embeddings / max_results — limity LRU w pamięci,
+    cache_dir — katalog embeddingów zapytań ("" = tylko pamięć).
+    """
+
+    def __init__(self, max_embeddings: int = 512, max_results: int = 256, cache_dir: str = DEFAULT_QUERY_CACHE_DIR):
+        self.max_embeddings = int(max_embeddings)
+        self.max_results = int(max_results)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._emb: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._res: OrderedDict[tuple, Any] = OrderedDict()
+        self._current: dict[Hashable, tuple] = {}  # root indeksu -> bieżący index_key
+
+        self.hits_embedding = 0
+        self.misses_embedding = 0
+        self.hits_results = 0
+        self.misses_results = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- embeddingi zapytań ---
+
+    def _emb_path(self, key: tuple) -> str:
+        name = hashlib.sha1("\x1f".join(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, name[:2], name + ".npy")
+
+    def embedding(self, content: bytes | str, model_id: str, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Embedding zapytania z cache (pamięć -> dysk); compute() tylko przy braku."""
+        key = (content_hash(content), str(model_id))
+        with self._lock:
+            hit = self._emb.get(key)
+            if hit is not None:
+                self._emb.move_to_end(key)
+                self.hits_embedding += 1
+                return hit
+
+        hit = None
+        if self.cache_dir:
+            try:
+                hit = np.load(self._emb_path(key))
+            except (FileNotFoundError, ValueError, OSError):
+                hit = None
+        if hit is None:
+            self.misses_embedding += 1
+            hit = np.asarray(compute(), dtype=np.float32)
+            if self.cache_dir:
+                p = self._emb_path(key)
+                os.makedirs(os.path.dirname(p), exist_ok=True)
+                tmp = f"{p}.{threading.get_ident()}.tmp.npy"
+                np.save(tmp, hit)
+                os.replace(tmp, p)
+        else:
+            self.hits_embedding += 1
+
+        _freeze(hit)
+        with self._lock:
+            self._emb[key] = hit
+            while len(self._emb) > self.max_embeddings:
+                self._emb.popitem(last=False)
+        return hit
+
+    # --- wyniki top-k ---
+
+    def _invalidate_stale(self, ikey: tuple) -> None:
+        root = ikey[0]
+        if self._current.get(root) == ikey:
+            return
+        self._current[root] = ikey
+        for k in [k for k in self._res if k[0][0] == root and k[0] != ikey]:
+            del self._res[k]
+
+    def results(
+        self,
+        ikey: tuple,
+        content: bytes | str,
+        model_id: str,
+        params: tuple,
+        compute: Callable[[], Any],
+    ) -> Any:
+        """
+        Wynik wyszukiwania z cache; compute() przy braku albo po zmianie indeksu.
+
+        ikey = index_key(store); params — wszystko, od czego zależy wynik (np. ("global", k, nprobe)).
+        """
+        key = (tuple(ikey), content_hash(content), str(model_id), tuple(params))
+        with self._lock:
+            self._invalidate_stale(key[0])
+            if key in self._res:
+                self._res.move_to_end(key)
+                self.hits_results += 1
+                return self._res[key]
+            self.misses_results += 1
+
+        value = _freeze(compute())
+        with self._lock:
+            if self._current.get(key[0][0]) == key[0]:  # indeks nie zmienił się w trakcie compute()
+                self._res[key] = value
+                while len(self._res) > self.max_results:
+                    self._res.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._emb.clear()
+            self._res.clear()
+            self._current.clear()
+
+    def stats(self) -> dict:
+        return {
+            "embeddings": len(self._emb),
+            "results": len(self._res),
+            "hits_embedding": self.hits_embedding,
+            "misses_embedding": self.misses_embedding,
+            "hits_results": self.hits_results,
+            "misses_results": self.misses_results,
+        }
+
+
+_query_cache: QueryCache | None = None
+
+
+def get_query_cache() -> QueryCache:
+    """Współdzielony QueryCache (domyślny katalog i limity)."""
+    global _query_cache
+    if _query_cache is None:
+        _query_cache = QueryCache()
+    return _query_cache
@@ -5,13 +5,28 @@ Funkcje:
 - join_unique_lines: łączenie unikalnych niepustych linii w jeden słupek
 - export_reviewed_lines: zapis pełnego df (audit)
 - export_per_image: zapis 1 wiersz / zdjęcie (po filtrze excluded=True)
+- iter_per_image / write_per_image: to samo porcjami (strumieniowy zapis CSV albo Parquet)
+- update_per_image: przeliczenie tylko zdjęć dotkniętych edycją (np. delty src.ui.edit_journal)
+
+Agregacja per zdjęcie jest wektorowa: strip / niepuste / duplikaty liczone raz dla całych kolumn,
+linie sortowane stabilnie po zdjęciu i łączone w granicach grup (bez groupby.agg z funkcją Pythona
+per grupa). CSV jest bajtowo identyczny z dawnym groupby("file_name").agg(...).
 """
 
 from __future__ import annotations
 
 import os
+from typing import Iterable, Iterator
+
+import numpy as np
 import pandas as pd
 
+from src.pipeline.metrics import get_metrics
+
+
+PER_IMAGE_COLS = ["file_name", "gcs_path", "text_joined", "lines_n"]
+DEFAULT_CHUNK_IMAGES = 50_000
+
 
 def join_unique_lines(lines: pd.Series) -> str:
     """Łączy unikalne, niepuste linie tekstu w jeden słupek (jedna linia na wpis)."""
@@ -33,7 +48,103 @@ def export_reviewed_lines(df: pd.DataFrame, output_csv: str) -> None:
     out_dir = os.path.dirname(output_csv)
     if out_dir:
         os.makedirs(out_dir, exist_ok=True)
-    df.to_csv(output_csv, index=False, encoding="utf-8")
+    with get_metrics().timer("export.reviewed_lines"):
+        df.to_csv(output_csv, index=False, encoding="utf-8")
+
+
+def _per_image_text_col(df: pd.DataFrame, text_col_prefer: str) -> str:
+    text_col = text_col_prefer if text_col_prefer in df.columns else "text"
+    if text_col not in df.columns:
+        raise KeyError(f"Brak kolumny tekstu: {text_col}")
+    return text_col
+
+
+def iter_per_image(
+    df: pd.DataFrame,
+    *,
+    text_col_prefer: str = "text_edited",
+    excluded_col: str = "excluded",
+    chunk_images: int = DEFAULT_CHUNK_IMAGES,
+) -> Iterator[pd.DataFrame]:
+    """
+    1 wiersz / zdjęcie (PER_IMAGE_COLS), porcjami po chunk_images zdjęć, posortowane po file_name.
+
+    Semantyka jak dawne groupby("file_name").agg: linie excluded==True pominięte, wiersze bez file_name
+    pominięte, gcs_path = pierwsza niepusta wartość, text_joined = join_unique_lines,
+    lines_n = liczba niepustych linii (z powtórzeniami).
+    """
+    keep = ~df[excluded_col].eq(True).to_numpy() if excluded_col in df.columns else None
+    text_col = _per_image_text_col(df, text_col_prefer)
+
+    def col(name: str) -> pd.Series:
+        return df[name] if keep is None else df[name][keep]  # tylko potrzebne kolumny, bez df.copy()
+
+    codes, uniques = pd.factorize(col("file_name"), sort=True)  # kolejność grup jak w groupby(sort=True)
+    names = np.asarray(uniques, dtype=object)
+    n = len(names)
+    if n == 0:
+        yield pd.DataFrame(columns=PER_IMAGE_COLS)
+        return
+
+    text = col(text_col).astype(str).str.strip().to_numpy(dtype=object)
+    nonempty = (codes >= 0) & (text != "")
+    lines_n = np.bincount(codes[nonempty], minlength=n).astype(np.int64)
+
+    # unikalne linie w kolejności pierwszego wystąpienia, zgrupowane po zdjęciu (sort stabilny)
+    idx = np.flatnonzero(nonempty)
+    dup = pd.DataFrame({"c": codes[idx], "t": text[idx]}).duplicated().to_numpy()
+    idx = idx[~dup]
+    idx = idx[np.argsort(codes[idx], kind="stable")]
+    bounds = np.searchsorted(codes[idx], np.arange(n + 1)).tolist()
+    lines = text[idx].tolist()
+
+    if "gcs_path" in df.columns:
+        gcs = col("gcs_path")
+        has = np.flatnonzero((codes >= 0) & gcs.notna().to_numpy())
+        first_codes, first_pos = np.unique(codes[has], return_index=True)
+        gcs_first = np.full(n, np.nan, dtype=object)
+        gcs_first[first_codes] = gcs.to_numpy(dtype=object)[has[first_pos]]
+    else:
+        gcs_first = names
+
+    step = max(1, int(chunk_images))
+    for s in range(0, n, step):
+        e = min(n, s + step)
+        yield pd.DataFrame(
+            {
+                "file_name": names[s:e],
+                "gcs_path": gcs_first[s:e],
+                "text_joined": ["\n".join(lines[bounds[g] : bounds[g + 1]]) for g in range(s, e)],
+                "lines_n": lines_n[s:e],
+            }
+        )
+
+
+def write_per_image(chunks: Iterable[pd.DataFrame], path: str, fmt: str = "csv") -> str:
+    """Strumieniowy zapis porcji iter_per_image do CSV albo Parquet (plik tymczasowy + os.replace)."""
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Nieznany format: {fmt} (csv / parquet)")
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    tmp = path + ".tmp"
+    if fmt == "csv":
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=(i == 0))
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [("file_name", pa.string()), ("gcs_path", pa.string()), ("text_joined", pa.string()), ("lines_n", pa.int64())]
+        )
+        with pq.ParquetWriter(tmp, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    os.replace(tmp, path)
+    return path
 
 
 def export_per_image(
@@ -42,37 +153,64 @@ def export_per_image(
     *,
     text_col_prefer: str = "text_edited",
     excluded_col: str = "excluded",
+    fmt: str = "csv",
+    chunk_images: int = DEFAULT_CHUNK_IMAGES,
 ) -> str:
     """
-    Zapisuje 1 wiersz / zdjęcie do pliku output_csv__per_image.csv.
-    Zwraca ścieżkę per_image_csv.
+    Zapisuje 1 wiersz / zdjęcie do pliku output_csv__per_image.csv (fmt="parquet": __per_image.parquet).
+    Zwraca ścieżkę pliku.
 
     - usuwa linie excluded==True (watermark)
-    - agreguje po file_name
+    - agreguje po file_name (iter_per_image), zapis porcjami po chunk_images zdjęć
     """
     base, _ = os.path.splitext(output_csv)
-    per_image_csv = base + "__per_image.csv"
+    per_image_path = f"{base}__per_image.{fmt}"
+    _per_image_text_col(df, text_col_prefer)  # brak kolumny tekstu => KeyError przed utworzeniem pliku
 
-    dff = df.copy()
-    if excluded_col in dff.columns:
-        dff = dff[~dff[excluded_col].eq(True)].copy()
+    chunks = iter_per_image(df, text_col_prefer=text_col_prefer, excluded_col=excluded_col, chunk_images=chunk_images)
+    with get_metrics().timer("export.per_image", fmt=fmt):
+        return write_per_image(chunks, per_image_path, fmt=fmt)
 
-    text_col = text_col_prefer if text_col_prefer in dff.columns else "text"
-    if text_col not in dff.columns:
-        raise KeyError(f"Brak kolumny tekstu: {text_col}")
 
-    agg = (
-        dff.groupby("file_name", as_index=False)
-        .agg(
-            gcs_path=("gcs_path", "first") if "gcs_path" in dff.columns else ("file_name", "first"),
-            text_joined=(text_col, join_unique_lines),
-            lines_n=(text_col, lambda s: int((s.astype(str).str.strip() != "").sum())),
-        )
-    )
+def _read_per_image(path: str, fmt: str) -> pd.DataFrame:
+    if fmt == "parquet":
+        out = pd.read_parquet(path)
+    else:
+        out = pd.read_csv(path, dtype=str, keep_default_na=False)  # bez NaN: zapis z powrotem bajtowo ten sam
+    return out.astype({"lines_n": np.int64})[PER_IMAGE_COLS]
 
-    out_dir = os.path.dirname(per_image_csv)
-    if out_dir:
-        os.makedirs(out_dir, exist_ok=True)
 
-    agg.to_csv(per_image_csv, index=False, encoding="utf-8")
-    return per_image_csv
+def update_per_image(
+    df: pd.DataFrame,
+    output_csv: str,
+    file_ids: Iterable[str],
+    *,
+    text_col_prefer: str = "text_edited",
+    excluded_col: str = "excluded",
+    fmt: str = "csv",
+) -> str:
+    """
+    Aktualizuje plik export_per_image tylko dla zdjęć z file_ids (np. commit()["file_ids"] dziennika edycji):
+    wiersze tych zdjęć są liczone od nowa z df, pozostałe przepisywane z istniejącego pliku.
+    Wynik jak pełny export_per_image, o ile istniejący plik odpowiadał df przed edycją;
+    brak pliku => pełny eksport. Zwraca ścieżkę pliku.
+    """
+    base, _ = os.path.splitext(output_csv)
+    per_image_path = f"{base}__per_image.{fmt}"
+    if not os.path.exists(per_image_path):
+        return export_per_image(df, output_csv, text_col_prefer=text_col_prefer, excluded_col=excluded_col, fmt=fmt)
+    _per_image_text_col(df, text_col_prefer)
+
+    ids = {str(f) for f in file_ids}
+    if not ids:
+        return per_image_path
+    with get_metrics().timer("export.per_image_update", fmt=fmt):
+        touched_names = df["file_name"][df["file_id"].astype(str).isin(ids)].dropna().unique()
+        rows = df[df["file_name"].isin(touched_names)]  # całe zdjęcia (także linie innych file_id o tej nazwie)
+        fresh = [c for c in iter_per_image(rows, text_col_prefer=text_col_prefer, excluded_col=excluded_col) if len(c)]
+
+        old = _read_per_image(per_image_path, fmt)
+        old = old[~old["file_name"].isin(touched_names)]
+        out = pd.concat([old] + fresh, ignore_index=True).sort_values("file_name", kind="stable")
+        get_metrics().inc("export.per_image_updated", len(touched_names))
+        return write_per_image([out], per_image_path, fmt=fmt)
@@ -1,9 +1,63 @@
 """
 GCS I/O helpers.
+
+Jeden moduł listowania GCS (zamiast `gcloud storage ls` w subprocess):
+- get_client(): współdzielony storage.Client (jeden na proces, bez tworzenia per wywołanie),
+- iter_images_meta(): strumieniowe listowanie (paginacja) z metadanymi blobów,
+- stat_blob() / stat_blobs(): metadane wybranych obiektów (generation, size) bez listowania prefixu,
+- iter_folders() / list_folders(): "foldery" przez delimiter="/".
+
+Zamiast klienta GCS można podać lokalny zamiennik (np. src.bench.fake_gcs.FakeStorageClient)
+przez argument client= albo set_client().
+
+google.cloud.storage (gRPC, ~0.25 s) importowany dopiero w get_client() – import modułu jest tani,
+a z zamiennikiem klienta biblioteka GCS nie jest w ogóle potrzebna.
 """
 
-from google.cloud import storage
-from typing import List
+from __future__ import annotations
+
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+
+DEFAULT_PAGE_SIZE = 1000
+
+_client: Optional[storage.Client] = None
+_client_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def storage_available() -> bool:
+    """Czy google-cloud-storage jest zainstalowany (bez importowania go; w .venv-clip go nie ma)."""
+    try:
+        return importlib.util.find_spec("google.cloud.storage") is not None
+    except ModuleNotFoundError:  # brak pakietu google / google.cloud
+        return False
+
+
+def get_client() -> storage.Client:
+    """Współdzielony storage.Client (leniwie tworzony, bezpieczny wątkowo)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import storage
+
+                _client = storage.Client()
+    return _client
+
+
+def set_client(client: Optional[storage.Client]) -> None:
+    """Podmienia współdzielony klient (np. zamiennik lokalny); None = utwórz na nowo przy następnym użyciu."""
+    global _client
+    with _client_lock:
+        _client = client
 
 
 def list_images(bucket: str, prefix: str = "") -> List[str]:
@@ -11,7 +65,7 @@ def list_images(bucket: str, prefix: str = "") -> List[str]:
     Zwraca listę gs://... URI dla obrazów w buckecie pod danym prefixem.
     Filtruje podstawowe formaty rastrowe.
     """
-    client = storage.Client()
+    client = get_client()
     bkt = client.bucket(bucket)
 
     exts = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp")
@@ -23,3 +77,120 @@ def list_images(bucket: str, prefix: str = "") -> List[str]:
             uris.append(f"gs://{bucket}/{blob.name}")
 
     return uris
+
+
+def split_gs_uri(uri: str) -> Tuple[str, str]:
+    """gs://bucket/a/b -> ("bucket", "a/b")."""
+    if not uri.startswith("gs://"):
+        raise ValueError(f"Oczekiwano gs://..., jest: {uri}")
+    bucket, _, name = uri[len("gs://"):].partition("/")
+    return bucket, name
+
+
+def blob_meta(bucket: str, blob) -> Dict:
+    """Metadane blobu potrzebne do wykrywania zmian treści: generation, size, md5, crc32c."""
+    return {
+        "gcs_path": f"gs://{bucket}/{blob.name}",
+        "generation": str(blob.generation) if blob.generation is not None else None,
+        "size": int(blob.size) if blob.size is not None else None,
+        "md5": blob.md5_hash,
+        "crc32c": blob.crc32c,
+    }
+
+
+def stat_blob(gs_path: str, client: Optional[storage.Client] = None) -> Optional[Dict]:
+    """blob_meta jednego obiektu (tylko metadane, bez pobierania treści); None = brak obiektu."""
+    client = client or get_client()
+    bucket, name = split_gs_uri(gs_path)
+    blob = client.bucket(bucket).get_blob(name)
+    return blob_meta(bucket, blob) if blob is not None else None
+
+
+def stat_blobs(
+    gs_paths: Iterable[str],
+    client: Optional[storage.Client] = None,
+    max_workers: int = 16,
+) -> Dict[str, Dict]:
+    """
+    stat_blob dla wielu ścieżek równolegle -> {gcs_path: blob_meta}.
+
+    Brakujące obiekty (i błędy zapytań) są pominięte w wyniku.
+    """
+    gs_paths = list(dict.fromkeys(gs_paths))
+    client = client or get_client()
+
+    def _one(p: str) -> Optional[Dict]:
+        try:
+            return stat_blob(p, client=client)
+        except Exception:
+            return None
+
+    if len(gs_paths) <= 1 or max_workers <= 1:
+        metas = [_one(p) for p in gs_paths]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(gs_paths)), thread_name_prefix="stat") as ex:
+            metas = list(ex.map(_one, gs_paths))
+    return {p: m for p, m in zip(gs_paths, metas) if m is not None}
+
+
+def iter_images_meta(
+    prefix_uri: str,
+    exts: Optional[Tuple[str, ...]] = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"),
+    client: Optional[storage.Client] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Iterator[Dict]:
+    """
+    Strumieniowo (strona po stronie) zwraca blob_meta obiektów pod prefix_uri/**.
+
+    exts=None => wszystkie obiekty (bez "katalogów" zakończonych '/').
+    Kolejność: leksykograficzna po nazwie (tak listuje GCS).
+    """
+    client = client or get_client()
+    bucket, prefix = split_gs_uri(prefix_uri.rstrip("/") + "/")
+
+    for blob in client.list_blobs(bucket, prefix=prefix, page_size=page_size):
+        if blob.name.endswith("/"):
+            continue
+        if exts and not blob.name.lower().endswith(exts):
+            continue
+        yield blob_meta(bucket, blob)
+
+
+def list_images_meta(
+    prefix_uri: str,
+    exts: Tuple[str, ...] = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".bmp"),
+    client: Optional[storage.Client] = None,
+) -> List[Dict]:
+    """
+    Jak list_images, ale dla prefixu gs://bucket/folder i z metadanymi (blob_meta).
+    Posortowane po gcs_path.
+    """
+    return sorted(iter_images_meta(prefix_uri, exts=exts, client=client), key=lambda m: m["gcs_path"])
+
+
+def iter_folders(
+    prefix_uri: str,
+    client: Optional[storage.Client] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+) -> Iterator[str]:
+    """
+    Zwraca nazwy "folderów" bezpośrednio pod prefix_uri (listowanie z delimiter="/").
+
+    gs://ocr-2026 -> "photos", "referencje", ...
+    """
+    client = client or get_client()
+    bucket, prefix = split_gs_uri(prefix_uri.rstrip("/") + "/")
+
+    it = client.list_blobs(bucket, prefix=prefix, delimiter="/", page_size=page_size)
+    for page in it.pages:
+        for p in page.prefixes:
+            yield p[len(prefix):].rstrip("/")
+
+
+def list_folders(
+    prefix_uri: str,
+    exclude: Tuple[str, ...] = (),
+    client: Optional[storage.Client] = None,
+) -> List[str]:
+    """Posortowane nazwy folderów pod prefix_uri (bez tych z exclude)."""
+    return sorted({f for f in iter_folders(prefix_uri, client=client) if f and f not in exclude})
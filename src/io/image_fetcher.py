@@ -0,0 +1,298 @@
+"""
+Pobieranie obrazów z GCS z cache (galeria, miniatury CLIP, referencje).
+
+ImageFetcher:
+- pobiera przez współdzielony storage.Client (src.io.gcs.get_client), równolegle (get_many),
+- cache na dysku (LRU z limitem rozmiaru), klucz = gcs_path + generation,
+- cache w pamięci (LRU z limitem bajtów) dla najczęściej oglądanych plików.
+
+Podmieniony plik dostaje nową generation, więc nowy klucz, a stary wpis wypada z cache przez LRU.
+Generation najlepiej podać z listingu (src.io.gcs.iter_images_meta); bez niej fetcher sam pyta
+GCS o metadane obiektu (stat_blob, bez pobierania treści) przed sprawdzeniem cache – wynik
+trzymany generation_ttl_s sekund. Bez biblioteki GCS klucz to sam gcs_path.
+
+W środowisku bez google-cloud-storage (kernel CLIP) pobieranie idzie przez `gcloud storage cat`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from src.io.gcs import get_client, split_gs_uri, stat_blob, storage_available
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "OCR_SEARCH_IMAGE_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ocr-search", "images"),
+)
+DEFAULT_DISK_BYTES = 2 * 1024**3
+DEFAULT_MEMORY_BYTES = 256 * 1024**2
+DEFAULT_GENERATION_TTL_S = 30.0
+
+
+def gcloud_cat_bytes(gs_path: str) -> bytes:
+    """Pobiera plik przez `gcloud storage cat` (fallback bez biblioteki GCS)."""
+    r = subprocess.run(["gcloud", "storage", "cat", gs_path], capture_output=True)
+    if r.returncode != 0 or not r.stdout:
+        err = (r.stderr or b"").decode("utf-8", errors="ignore")[:800]
+        raise RuntimeError(f"gcloud storage cat failed for {gs_path}\n{err}")
+    return r.stdout
+
+
+def client_download_bytes(gs_path: str, generation: str | None = None, client=None) -> bytes:
+    """Pobiera plik przez storage client (opcjonalnie konkretną generation)."""
+    client = client or get_client()
+    bucket, name = split_gs_uri(gs_path)
+    blob = client.bucket(bucket).blob(name, generation=int(generation) if generation else None)
+    return blob.download_as_bytes()
+
+
+def cache_key(gs_path: str, generation: str | None = None) -> str:
+    return hashlib.sha1(f"{gs_path}#{generation or ''}".encode("utf-8")).hexdigest()
+
+
+class ImageFetcher:
+    """
+    Pobieranie obrazów z GCS z dwupoziomowym cache (pamięć + dysk).
+
+    cache_dir — katalog cache dyskowego ("" = bez cache dyskowego),
+    max_disk_bytes / max_memory_bytes — limity LRU,
+    max_workers — równoległe pobrania w get_many,
+    download — funkcja (gs_path, generation) -> bytes; domyślnie storage client albo gcloud,
+    resolve — funkcja gs_path -> generation dla wywołań bez generation; domyślnie stat_blob
+              (tylko przy domyślnym download i dostępnej bibliotece GCS),
+    generation_ttl_s — jak długo pamiętana jest generation ustalona przez resolve.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        max_disk_bytes: int = DEFAULT_DISK_BYTES,
+        max_memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        max_workers: int = 16,
+        download: Callable[[str, str | None], bytes] | None = None,
+        resolve: Callable[[str], str | None] | None = None,
+        generation_ttl_s: float = DEFAULT_GENERATION_TTL_S,
+    ):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.max_memory_bytes = int(max_memory_bytes)
+        self.max_workers = int(max_workers)
+        self._download = download or self._default_download
+        if resolve is None and download is None:
+            resolve = self._default_resolve
+        self._resolve = resolve
+        self.generation_ttl_s = float(generation_ttl_s)
+        self._generations: dict[str, tuple[float, str | None]] = {}
+
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._mem_bytes = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key -> rozmiar, od najdawniej użytego
+        self._disk_bytes = 0
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.resolves = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def _default_download(gs_path: str, generation: str | None = None) -> bytes:
+        if storage_available():
+            return client_download_bytes(gs_path, generation=generation)
+        return gcloud_cat_bytes(gs_path)
+
+    @staticmethod
+    def _default_resolve(gs_path: str) -> str | None:
+        if not storage_available():
+            return None
+        meta = stat_blob(gs_path)
+        if meta is None:
+            raise FileNotFoundError(f"Brak obiektu: {gs_path}")
+        return meta["generation"]
+
+    def _resolve_generation(self, gs_path: str) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._generations.get(gs_path)
+            if hit is not None and now - hit[0] < self.generation_ttl_s:
+                return hit[1]
+        self.resolves += 1
+        generation = self._resolve(gs_path)
+        with self._lock:
+            self._generations[gs_path] = (now, generation)
+        return generation
+
+    # --- dysk ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ".bin")
+
+    def _scan_disk(self) -> None:
+        """Odtwarza indeks LRU z katalogu (kolejność po mtime – trafienia odświeżają mtime)."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fn in files:
+                if not fn.endswith(".bin"):
+                    continue
+                st = os.stat(os.path.join(root, fn))
+                entries.append((st.st_mtime, fn[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if not self.cache_dir:
+            return None
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                data = f.read()
+            os.utime(p)
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if not self.cache_dir or len(data) > self.max_disk_bytes:
+            return
+        p = self._path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, p)
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        victims = []
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                victims.append(key)
+        for key in victims:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    # --- pamięć ---
+
+    def _read_mem(self, key: str) -> bytes | None:
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+            return data
+
+    def _write_mem(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            self._mem[key] = data
+            self._mem_bytes += len(data)
+            while self._mem_bytes > self.max_memory_bytes and self._mem:
+                _, d = self._mem.popitem(last=False)
+                self._mem_bytes -= len(d)
+
+    # --- API ---
+
+    def get(self, gs_path: str, generation: str | None = None) -> bytes:
+        """Bajty obrazu: pamięć -> dysk -> GCS; bez generation ustalana przez resolve."""
+        if generation is None and self._resolve is not None:
+            generation = self._resolve_generation(gs_path)
+        key = cache_key(gs_path, generation)
+
+        data = self._read_mem(key)
+        if data is not None:
+            self.hits_memory += 1
+            return data
+
+        data = self._read_disk(key)
+        if data is not None:
+            self.hits_disk += 1
+            self._write_mem(key, data)
+            return data
+
+        self.misses += 1
+        data = self._download(gs_path, generation)
+        if not data:
+            raise FileNotFoundError(f"Pusty obiekt: {gs_path}")
+        self._write_disk(key, data)
+        self._write_mem(key, data)
+        return data
+
+    def get_many(
+        self,
+        gs_paths: Iterable[str],
+        generations: dict[str, str] | None = None,
+    ) -> list[bytes | Exception]:
+        """Równoległe get() dla wielu plików; wynik (bytes albo wyjątek) w kolejności wejściowej."""
+        gs_paths = list(gs_paths)
+        generations = generations or {}
+
+        def _one(p: str) -> bytes | Exception:
+            try:
+                return self.get(p, generations.get(p))
+            except Exception as e:
+                return e
+
+        if len(gs_paths) <= 1 or self.max_workers <= 1:
+            return [_one(p) for p in gs_paths]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(gs_paths)), thread_name_prefix="img") as ex:
+            return list(ex.map(_one, gs_paths))
+
+    def prefetch(self, gs_paths: Iterable[str], generations: dict[str, str] | None = None) -> None:
+        """Rozgrzewa cache (np. przed renderem galerii); błędy pojedynczych plików są ignorowane."""
+        self.get_many(gs_paths, generations=generations)
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._mem_bytes = 0
+
+
+_fetcher: ImageFetcher | None = None
+_fetcher_lock = threading.Lock()
+
+
+def get_fetcher() -> ImageFetcher:
+    """Współdzielony ImageFetcher (domyślny katalog cache i limity)."""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = ImageFetcher()
+    return _fetcher
+
+
+def set_fetcher(fetcher: ImageFetcher | None) -> None:
+    """Podmienia współdzielony ImageFetcher (np. inny katalog cache albo zamiennik GCS)."""
+    global _fetcher
+    with _fetcher_lock:
+        _fetcher = fetcher
@@ -0,0 +1,214 @@
+"""
+Wsadowy OCR przez Vision API.
+
+- batch_annotate_images: do 16 obrazów w jednym RPC (synchronicznie),
+- async_batch_annotate_images: duże zadania, wyniki JSON zapisywane przez Vision do GCS.
+
+Parsowanie odpowiedzi i wywołania pojedyncze są wstrzykiwane (parse_fn / single_fn),
+żeby korzystać z tej samej logiki linii, co ocr_lines_from_gcs (src.ocr.ocr_cache).
+Fallback do pojedynczych wywołań dotyczy wyłącznie plików, które w paczce się nie udały.
+google.cloud.vision importowany dopiero przy budowie zapytań (tani import modułu).
+"""
+
+from __future__ import annotations
+
+import uuid
+from typing import TYPE_CHECKING, Callable, Iterator, Sequence
+
+from src.io.gcs import get_client, split_gs_uri
+from src.ocr.dispatch import call_with_retry, iter_ocr_results
+from src.pipeline.metrics import get_metrics
+
+if TYPE_CHECKING:
+    from google.cloud import storage, vision
+
+
+MAX_SYNC_BATCH = 16
+MAX_ASYNC_BATCH = 2000
+
+ParseFn = Callable[[object, str], list[dict]]
+SingleFn = Callable[[str], list[dict]]
+
+
+def _chunks(items: Sequence[str], size: int) -> list[tuple[str, ...]]:
+    return [tuple(items[i : i + size]) for i in range(0, len(items), size)]
+
+
+def doc_text_request(gs_path: str) -> vision.AnnotateImageRequest:
+    """AnnotateImageRequest z DOCUMENT_TEXT_DETECTION dla obrazu w GCS."""
+    from google.cloud import vision
+
+    return vision.AnnotateImageRequest(
+        image=vision.Image(source=vision.ImageSource(gcs_image_uri=gs_path)),
+        features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+    )
+
+
+def annotate_batch(gs_paths: Sequence[str], client: vision.ImageAnnotatorClient) -> list:
+    """Jedno wywołanie batch_annotate_images; odpowiedzi w kolejności gs_paths."""
+    if len(gs_paths) > MAX_SYNC_BATCH:
+        raise ValueError(f"batch_annotate_images przyjmuje maks. {MAX_SYNC_BATCH} obrazów, jest {len(gs_paths)}")
+    requests = [doc_text_request(p) for p in gs_paths]
+    with get_metrics().timer("ocr.vision_rpc", backend="batch"):
+        resp = client.batch_annotate_images(requests=requests)
+    responses = list(resp.responses)
+    if len(responses) != len(gs_paths):
+        raise RuntimeError(f"batch_annotate_images: {len(responses)} odpowiedzi na {len(gs_paths)} obrazów")
+    return responses
+
+
+def _parse_or_error(parse_fn: ParseFn, resp, gs_path: str) -> list[dict] | Exception:
+    try:
+        with get_metrics().timer("ocr.parse"):
+            return parse_fn(resp, gs_path)
+    except Exception as e:
+        return e
+
+
+def _with_fallback(
+    batch: Sequence[str],
+    results: Sequence[list[dict] | Exception],
+    single_fn: SingleFn,
+    max_retries: int,
+) -> Iterator[tuple[str, list[dict] | None, Exception | None]]:
+    """Przepuszcza udane wyniki paczki; dla nieudanych plików – pojedyncze wywołanie (z retry)."""
+    for gs_path, res in zip(batch, results):
+        if not isinstance(res, Exception):
+            yield gs_path, res, None
+            continue
+        try:
+            yield gs_path, call_with_retry(lambda: single_fn(gs_path), max_retries=max_retries), None
+        except Exception as e:
+            yield gs_path, None, e
+
+
+def iter_ocr_results_batched(
+    gcs_paths: Sequence[str],
+    client: vision.ImageAnnotatorClient,
+    parse_fn: ParseFn,
+    single_fn: SingleFn,
+    *,
+    batch_size: int = MAX_SYNC_BATCH,
+    max_in_flight: int = 4,
+    max_retries: int = 5,
+) -> Iterator[tuple[str, list[dict] | None, Exception | None]]:
+    """
+    OCR paczkami po batch_size obrazów (batch_annotate_images), maks. max_in_flight paczek naraz.
+
+    Zwraca (gs_path, rows, err) w kolejności wejściowej – jak iter_ocr_results.
+    Błąd całej paczki (po retry) => fallback pojedynczy dla wszystkich jej plików.
+    """
+    batch_size = max(1, min(int(batch_size), MAX_SYNC_BATCH))
+
+    def _run(batch: tuple[str, ...]) -> list[list[dict] | Exception]:
+        responses = annotate_batch(batch, client)
+        return [_parse_or_error(parse_fn, r, p) for p, r in zip(batch, responses)]
+
+    results = iter_ocr_results(
+        _chunks(gcs_paths, batch_size),
+        _run,
+        max_in_flight=max_in_flight,
+        max_retries=max_retries,
+    )
+    for batch, per_item, err in results:
+        if err is not None:
+            per_item = [err] * len(batch)
+        yield from _with_fallback(batch, per_item, single_fn, max_retries)
+
+
+def async_batch_annotate_to_gcs(
+    gs_paths: Sequence[str],
+    client: vision.ImageAnnotatorClient,
+    output_uri: str,
+    *,
+    responses_per_file: int = 100,
+    timeout_s: float = 3600.0,
+) -> str:
+    """
+    Uruchamia async_batch_annotate_images (maks. 2000 obrazów) i czeka na zakończenie.
+
+    Vision zapisuje wyniki jako pliki JSON (BatchAnnotateImagesResponse) pod output_uri.
+    Zwraca prefix, pod którym leżą wyniki.
+    """
+    if len(gs_paths) > MAX_ASYNC_BATCH:
+        raise ValueError(f"async_batch_annotate_images przyjmuje maks. {MAX_ASYNC_BATCH} obrazów, jest {len(gs_paths)}")
+
+    from google.cloud import vision
+
+    output_config = vision.OutputConfig(
+        gcs_destination=vision.GcsDestination(uri=output_uri),
+        batch_size=int(responses_per_file),
+    )
+    op = client.async_batch_annotate_images(
+        requests=[doc_text_request(p) for p in gs_paths],
+        output_config=output_config,
+    )
+    op.result(timeout=timeout_s)
+    return output_uri
+
+
+def read_async_batch_output(
+    output_uri: str,
+    storage_client: storage.Client | None = None,
+) -> dict[str, vision.AnnotateImageResponse]:
+    """Wczytuje JSON-y wyników async_batch_annotate_images: {gcs_image_uri: AnnotateImageResponse}."""
+    from google.cloud import vision
+
+    storage_client = storage_client or get_client()
+    bucket, prefix = split_gs_uri(output_uri)
+
+    out: dict[str, vision.AnnotateImageResponse] = {}
+    for blob in storage_client.list_blobs(bucket, prefix=prefix):
+        if not blob.name.endswith(".json"):
+            continue
+        batch = vision.BatchAnnotateImagesResponse.from_json(
+            blob.download_as_bytes(), ignore_unknown_fields=True
+        )
+        for r in batch.responses:
+            if r.context and r.context.uri:
+                out[r.context.uri] = r
+    return out
+
+
+def iter_ocr_results_async(
+    gcs_paths: Sequence[str],
+    client: vision.ImageAnnotatorClient,
+    parse_fn: ParseFn,
+    single_fn: SingleFn,
+    *,
+    output_uri: str,
+    chunk_size: int = MAX_ASYNC_BATCH,
+    max_retries: int = 5,
+    storage_client: storage.Client | None = None,
+) -> Iterator[tuple[str, list[dict] | None, Exception | None]]:
+    """
+    OCR bardzo dużych folderów przez async_batch_annotate_images (wyniki przez GCS).
+
+    Każda porcja (maks. 2000 obrazów) trafia pod output_uri/<run>/chunk-NNNNN/.
+    Pliki bez odpowiedzi lub z błędem => fallback pojedynczy.
+    """
+    chunk_size = max(1, min(int(chunk_size), MAX_ASYNC_BATCH))
+    run_prefix = f"{output_uri.rstrip('/')}/{uuid.uuid4().hex[:12]}"
+
+    for ci, chunk in enumerate(_chunks(gcs_paths, chunk_size)):
+        chunk_uri = f"{run_prefix}/chunk-{ci:05d}/"
+        try:
+            call_with_retry(
+                lambda: async_batch_annotate_to_gcs(chunk, client, chunk_uri),
+                max_retries=max_retries,
+            )
+            responses = read_async_batch_output(chunk_uri, storage_client=storage_client)
+        except Exception as e:
+            responses, chunk_err = {}, e
+        else:
+            chunk_err = None
+
+        results: list[list[dict] | Exception] = []
+        for p in chunk:
+            r = responses.get(p)
+            if r is None:
+                results.append(chunk_err or RuntimeError(f"Brak odpowiedzi async dla {p}"))
+            else:
+                results.append(_parse_or_error(parse_fn, r, p))
+
+        yield from _with_fallback(chunk, results, single_fn, max_retries)
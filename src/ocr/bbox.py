@@ -0,0 +1,140 @@
+"""
+Bboxy linii OCR jako kolumny liczbowe + wektorowa geometria.
+
+Schemat linii: x1, y1, x2, y2 (float32, piksele obrazu OCR) oraz img_w, img_h (rozmiar strony
+z odpowiedzi Vision; NaN, gdy nieznany) – zamiast tekstowej kolumny bbox_norm "x1,y1,x2,y2".
+Starsze cache / CSV z bbox_norm są konwertowane przy wczytaniu (ensure_bbox_columns);
+bbox_strings daje dawny zapis tekstowy tam, gdzie jest nadal potrzebny (dokumenty TextIndex, wyniki wyszukiwania).
+
+Współrzędne mogą być w pikselach albo w [0..1] (starsze dane, okna fragmentów CLIP):
+wiersz z max <= UNIT_MAX traktujemy jak [0..1] – ta sama reguła w miniaturach i indeksie fragmentów.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+BBOX_COLS = ["x1", "y1", "x2", "y2"]
+SIZE_COLS = ["img_w", "img_h"]
+LEGACY_BBOX_COL = "bbox_norm"
+BBOX_DTYPE = np.float32
+UNIT_MAX = 1.5  # max(bbox) <= 1.5 => współrzędne [0..1], inaczej piksele
+
+
+def parse_bbox_strings(s: pd.Series) -> np.ndarray:
+    """Kolumna "x1,y1,x2,y2" -> float32 [n, 4]; puste / niepoprawne wiersze => NaN (bez pętli po wierszach)."""
+    if len(s) == 0:
+        return np.empty((0, 4), dtype=BBOX_DTYPE)
+    parts = s.astype("string").str.strip().str.split(",", expand=True)
+    parts = parts.reindex(columns=range(4)) if parts.shape[1] != 4 else parts
+    arr = parts.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    return arr.astype(BBOX_DTYPE)
+
+
+def format_bboxes(boxes: np.ndarray) -> np.ndarray:
+    """float [n, 4] -> "x1,y1,x2,y2" (najkrótszy zapis float32, jak dawne "12.0,40.0,..."); NaN => ""."""
+    b = np.asarray(boxes, dtype=BBOX_DTYPE).reshape(-1, 4)
+    cols = [pd.Series(b[:, j]).astype(str) for j in range(4)]
+    out = (cols[0] + "," + cols[1] + "," + cols[2] + "," + cols[3]).to_numpy(dtype=object)
+    out[np.isnan(b).any(axis=1)] = ""
+    return out
+
+
+def has_bbox_columns(df: pd.DataFrame) -> bool:
+    return all(c in df.columns for c in BBOX_COLS)
+
+
+def ensure_bbox_columns(df: pd.DataFrame, drop_legacy: bool = True) -> pd.DataFrame:
+    """
+    Dopasowuje df do schematu liczbowego: x1..y2 (float32) i img_w / img_h (float32, NaN = nieznany).
+
+    Legacy bbox_norm jest parsowany raz (także dla wierszy bez x1..y2 w danych mieszanych, np. stare
+    i nowe partycje Parquet), a potem usuwany (drop_legacy=False – zostaje). df bez bboxów – bez zmian.
+    """
+    legacy = LEGACY_BBOX_COL in df.columns
+    if not legacy and not any(c in df.columns for c in BBOX_COLS):
+        return df
+
+    df = df.copy()
+    if has_bbox_columns(df):
+        arr = df[BBOX_COLS].to_numpy(dtype=np.float64).astype(BBOX_DTYPE)
+    else:
+        arr = np.full((len(df), 4), np.nan, dtype=BBOX_DTYPE)
+    if legacy:
+        missing = np.isnan(arr).any(axis=1)
+        if missing.any():
+            arr[missing] = parse_bbox_strings(df.loc[missing, LEGACY_BBOX_COL])
+    for j, c in enumerate(BBOX_COLS):
+        df[c] = arr[:, j]
+    for c in SIZE_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").astype(BBOX_DTYPE) if c in df.columns else np.float32("nan")
+    if legacy and drop_legacy:
+        df = df.drop(columns=[LEGACY_BBOX_COL])
+    return df
+
+
+def bbox_array(df: pd.DataFrame) -> np.ndarray:
+    """Bboxy wierszy df jako float32 [n, 4] (kolumny x1..y2 albo legacy bbox_norm); brak bboxa => NaN."""
+    if has_bbox_columns(df):
+        arr = df[BBOX_COLS].to_numpy(dtype=np.float64).astype(BBOX_DTYPE)
+        if LEGACY_BBOX_COL in df.columns:
+            missing = np.isnan(arr).any(axis=1)
+            if missing.any():
+                arr[missing] = parse_bbox_strings(df.loc[missing, LEGACY_BBOX_COL])
+        return arr
+    if LEGACY_BBOX_COL in df.columns:
+        return parse_bbox_strings(df[LEGACY_BBOX_COL])
+    return np.full((len(df), 4), np.nan, dtype=BBOX_DTYPE)
+
+
+def bbox_strings(df: pd.DataFrame) -> pd.Series:
+    """Dawny zapis tekstowy "x1,y1,x2,y2" dla wierszy df (indeks df); brak bboxa => ""."""
+    if LEGACY_BBOX_COL in df.columns and not has_bbox_columns(df):
+        return df[LEGACY_BBOX_COL].fillna("").astype(str)
+    return pd.Series(format_bboxes(bbox_array(df)), index=df.index, dtype=object)
+
+
+def valid_mask(boxes: np.ndarray) -> np.ndarray:
+    """Wiersze z kompletnym, niepustym bboxem (x2 > x1, y2 > y1)."""
+    b = np.asarray(boxes)
+    return ~np.isnan(b).any(axis=1) & (b[:, 2] > b[:, 0]) & (b[:, 3] > b[:, 1])
+
+
+def union_boxes(codes: np.ndarray, boxes: np.ndarray, n_groups: int | None = None) -> np.ndarray:
+    """Suma (otoczka) bboxów w grupach: codes[i] = numer grupy wiersza i (0..n_groups-1) -> [n_groups, 4]."""
+    codes = np.asarray(codes, dtype=np.int64)
+    b = np.asarray(boxes, dtype=np.float64)
+    n = int(n_groups if n_groups is not None else (codes.max() + 1 if len(codes) else 0))
+    lo = np.full((n, 2), np.inf)
+    hi = np.full((n, 2), -np.inf)
+    np.minimum.at(lo, codes, b[:, :2])
+    np.maximum.at(hi, codes, b[:, 2:])
+    out = np.concatenate([lo, hi], axis=1)
+    out[~np.isfinite(out).all(axis=1)] = np.nan
+    return out
+
+
+def is_unit(boxes: np.ndarray) -> np.ndarray:
+    """Wiersze w [0..1] (max <= UNIT_MAX); pozostałe to piksele."""
+    return np.asarray(boxes).max(axis=1) <= UNIT_MAX
+
+
+def to_pixels(boxes: np.ndarray, width, height) -> np.ndarray:
+    """Bboxy (piksele albo [0..1]) -> piksele obrazu width × height (skalary albo tablice [n])."""
+    b = np.asarray(boxes, dtype=np.float64).reshape(-1, 4).copy()
+    if len(b) == 0:
+        return b
+    unit = is_unit(b)
+    wh = np.stack(np.broadcast_arrays(width, height, width, height), axis=-1).astype(np.float64)
+    wh = np.broadcast_to(wh, b.shape)
+    b[unit] *= wh[unit]
+    return b
+
+
+def scale_boxes(boxes: np.ndarray, width: int, height: int, scale: float) -> np.ndarray:
+    """Bboxy -> współrzędne obrazu przeskalowanego o scale (int32), np. miniatury."""
+    if len(boxes) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    return (to_pixels(boxes, width, height) * scale).astype(np.int32)
@@ -0,0 +1,421 @@
+"""
+Magazyn cache OCR (linie) używany przez run_ocr_cache.
+
+- CsvOcrCacheStore: dotychczasowy pojedynczy CSV (pełny odczyt/zapis przy każdym uruchomieniu),
+- ParquetOcrCacheStore: partycjonowany Parquet + mały manifest plików.
+
+Układ ParquetOcrCacheStore (katalog root):
+    manifest.parquet          – 1 wiersz / przetworzony plik: gcs_path, file_id, generation, content_key, n_lines, part
+    parts/part-000001.parquet – linie OCR dopisane w jednym uruchomieniu (nigdy nie przepisywane)
+    journal.jsonl             – dziennik checkpointu (src.ocr.ocr_journal)
+
+Sprawdzenie "co brakuje" czyta tylko kolumnę gcs_path z manifestu. Ponowne dodanie pliku
+(np. po zmianie treści) przepina go w manifeście na nową partycję – stare wiersze są pomijane
+przy odczycie i usuwane dopiero przez compact().
+
+content_key (md5 / crc32c+size z listingu GCS) pozwala wykryć podmienione skany
+i ponownie użyć wyników OCR dla identycznych plików pod inną ścieżką.
+CsvOcrCacheStore trzyma te klucze w małym pliku obok: <out_csv>.manifest.csv.
+
+Bboxy linii: kolumny liczbowe x1..y2 / img_w / img_h (src.ocr.bbox); cache z tekstowym bbox_norm
+jest konwertowany przy odczycie, a przy najbliższym zapisie zapisywany już w nowym schemacie.
+"""
+
+from __future__ import annotations
+
+import os
+from abc import ABC, abstractmethod
+from typing import Iterable, Mapping
+
+import pandas as pd
+
+from src.ocr.bbox import ensure_bbox_columns
+from src.ocr.ocr_journal import JOURNAL_SUFFIX
+
+
+# kolumny, których nie chcemy w tym workflow (obrazy, bez PDF/page, bez script)
+DROP_LEGACY_COLS = ("page", "script")
+DEDUP_KEY_COLS = ("gcs_path", "line_id", "text")
+MANIFEST_COLS = ("gcs_path", "file_id", "generation", "content_key", "n_lines", "part")
+CSV_MANIFEST_SUFFIX = ".manifest.csv"
+
+
+def drop_legacy_cols(df: pd.DataFrame) -> pd.DataFrame:
+    """Usuwa legacy kolumny ('page', 'script'), jeśli są."""
+    cols_to_drop = [c for c in DROP_LEGACY_COLS if c in df.columns]
+    return df.drop(columns=cols_to_drop) if cols_to_drop else df
+
+
+def to_line_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Bez legacy kolumn ('page', 'script'), bboxy jako x1..y2 (float32) zamiast tekstowego bbox_norm."""
+    if len(df.columns) == 0:
+        return df
+    return ensure_bbox_columns(drop_legacy_cols(df))
+
+
+def dedupe_lines(df: pd.DataFrame) -> pd.DataFrame:
+    """drop_duplicates po (gcs_path, line_id, text) – pierwszy wpis wygrywa."""
+    if len(df) == 0:
+        return df
+    key_cols = [c for c in DEDUP_KEY_COLS if c in df.columns]
+    return df.drop_duplicates(subset=key_cols, keep="first") if key_cols else df
+
+
+def write_csv_atomic(df: pd.DataFrame, out_csv: str) -> None:
+    """Zapis CSV przez plik tymczasowy + os.replace (przerwany zapis nie psuje cache)."""
+    out_dir = os.path.dirname(out_csv)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp = out_csv + ".tmp"
+    df.to_csv(tmp, index=False, encoding="utf-8")
+    os.replace(tmp, out_csv)
+
+
+def _write_parquet_atomic(df: pd.DataFrame, path: str) -> None:
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+class OcrCacheStore(ABC):
+    """
+    Interfejs magazynu cache OCR (content_index, add, update_meta i load muszą być zaimplementowane).
+
+    processed_paths() – gcs_path już przetworzonych plików (podstawa "co brakuje"),
+    content_index() – {gcs_path: content_key albo None (nieznany, np. stary cache)},
+    rows_for(paths) – linie wskazanych plików (ponowne użycie wyniku dla duplikatów),
+    add(df_new, processed, meta) – dopisuje linie plików z processed (także bez linii);
+                                   istniejące linie tych plików są zastępowane,
+    add_stream(chunks, processed, meta) – jak add, ale linie w porcjach DataFrame (np. z dziennika);
+                                          w pamięci jest jedna porcja naraz,
+    refresh() – wywoływane, gdy nie było nic nowego,
+    load() – pełny DataFrame linii,
+    export_csv(path) – widok CSV.
+    """
+
+    location: str = ""
+    journal_path: str = ""
+
+    def processed_paths(self) -> set[str]:
+        return set(self.content_index())
+
+    @abstractmethod
+    def content_index(self) -> dict[str, str | None]:
+        ...
+
+    def rows_for(self, gcs_paths: Iterable[str]) -> pd.DataFrame:
+        df = self.load()
+        if len(df) == 0 or "gcs_path" not in df.columns:
+            return df
+        return df[df["gcs_path"].isin(set(gcs_paths))]
+
+    @abstractmethod
+    def add(
+        self,
+        df_new: pd.DataFrame,
+        processed: Iterable[str] = (),
+        meta: Mapping[str, Mapping] | None = None,
+    ) -> None:
+        ...
+
+    def add_stream(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        processed: Iterable[str] = (),
+        meta: Mapping[str, Mapping] | None = None,
+    ) -> None:
+        """
+        Domyślnie: add na porcję (pliki z linii porcji), na końcu pliki z processed bez linii.
+        Linie jednego pliku muszą być w jednej porcji (add zastępuje linie pliku).
+        """
+        seen: set[str] = set()
+        for chunk in chunks:
+            if len(chunk) == 0:
+                continue
+            paths = chunk["gcs_path"].astype(str).unique().tolist()
+            self.add(chunk, processed=paths, meta=meta)
+            seen.update(paths)
+        rest = [p for p in dict.fromkeys(processed) if p not in seen]
+        if rest:
+            self.add(pd.DataFrame(), processed=rest, meta=meta)
+
+    @abstractmethod
+    def update_meta(self, meta: Mapping[str, Mapping]) -> None:
+        """Uzupełnia generation/content_key istniejących wpisów (bez zmiany linii)."""
+
+    def refresh(self) -> None:
+        pass
+
+    @abstractmethod
+    def load(self) -> pd.DataFrame:
+        ...
+
+    def export_csv(self, path: str) -> str:
+        write_csv_atomic(self.load(), path)
+        return path
+
+
+class CsvOcrCacheStore(OcrCacheStore):
+    """Cache jako jeden CSV (zachowanie sprzed OcrCacheStore)."""
+
+    def __init__(self, out_csv: str):
+        self.out_csv = out_csv
+        self.location = out_csv
+        self.journal_path = out_csv + JOURNAL_SUFFIX
+        self.manifest_path = out_csv + CSV_MANIFEST_SUFFIX
+        self._df: pd.DataFrame | None = None
+
+    def load(self) -> pd.DataFrame:
+        if self._df is None:
+            df = pd.read_csv(self.out_csv) if os.path.exists(self.out_csv) else pd.DataFrame()
+            # usuń legacy kolumny z cache i skonwertuj bbox_norm (w pamięci)
+            self._df = to_line_schema(df) if len(df) else df
+        return self._df
+
+    def _read_keys(self) -> dict[str, str | None]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        m = pd.read_csv(self.manifest_path, dtype=str, keep_default_na=False)
+        return {p: (k or None) for p, k in zip(m["gcs_path"], m["content_key"])}
+
+    def content_index(self) -> dict[str, str | None]:
+        df = self.load()
+        keys = self._read_keys()
+        paths = df["gcs_path"].dropna().astype(str).unique().tolist() if "gcs_path" in df.columns else []
+        # pliki bez linii tekstu są tylko w manifeście
+        return {p: keys.get(p) for p in dict.fromkeys([*paths, *keys])}
+
+    def add(
+        self,
+        df_new: pd.DataFrame,
+        processed: Iterable[str] = (),
+        meta: Mapping[str, Mapping] | None = None,
+    ) -> None:
+        df_cache = self.load()
+        processed = list(processed)
+
+        # ponownie przetworzone pliki (zmieniona treść) – stare linie wypadają
+        if processed and len(df_cache) and "gcs_path" in df_cache.columns:
+            df_cache = df_cache[~df_cache["gcs_path"].isin(set(processed))]
+
+        # defensywnie: jeśli skądkolwiek przyszły legacy kolumny -> usuń
+        if len(df_new):
+            df_new = to_line_schema(df_new)
+
+        df_out = pd.concat([df_cache, df_new], ignore_index=True) if len(df_cache) else df_new
+        if len(df_out):
+            df_out = dedupe_lines(to_line_schema(df_out))
+
+        write_csv_atomic(df_out, self.out_csv)
+        self._df = df_out
+
+        if meta:
+            self.update_meta({p: meta.get(p) or {} for p in processed})
+
+    def add_stream(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        processed: Iterable[str] = (),
+        meta: Mapping[str, Mapping] | None = None,
+    ) -> None:
+        """
+        Jeden przebieg zapisu CSV: stary cache bez plików z processed, potem porcje dopisywane do pliku
+        tymczasowego (+ os.replace). processed musi obejmować wszystkie pliki z porcji.
+        """
+        processed = list(processed)
+        df_cache = self.load()
+        if processed and len(df_cache) and "gcs_path" in df_cache.columns:
+            df_cache = df_cache[~df_cache["gcs_path"].isin(set(processed))]
+
+        out_dir = os.path.dirname(self.out_csv)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        tmp = self.out_csv + ".tmp"
+        cols = list(df_cache.columns) if len(df_cache.columns) else None
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            if cols is not None:
+                df_cache.to_csv(f, index=False)
+            del df_cache
+            self._df = None  # cache w pamięci nieaktualny; load() przeczyta plik po zapisie
+            for chunk in chunks:
+                if len(chunk) == 0:
+                    continue
+                chunk = dedupe_lines(to_line_schema(chunk))
+                if cols is None:
+                    cols = list(chunk.columns)
+                    chunk.to_csv(f, index=False)
+                else:
+                    chunk.reindex(columns=cols).to_csv(f, index=False, header=False)
+            if cols is None:
+                pd.DataFrame().to_csv(f, index=False)  # jak add() z pustym cache
+        os.replace(tmp, self.out_csv)
+
+        if meta:
+            self.update_meta({p: meta.get(p) or {} for p in processed})
+
+    def update_meta(self, meta: Mapping[str, Mapping]) -> None:
+        keys = self._read_keys()
+        for p, m in meta.items():
+            keys[p] = m.get("content_key")
+        write_csv_atomic(
+            pd.DataFrame({"gcs_path": list(keys), "content_key": [k or "" for k in keys.values()]}),
+            self.manifest_path,
+        )
+
+    def refresh(self) -> None:
+        # KLUCZOWE: zapisz „oczyszczony” cache także bez nowych plików,
+        # żeby stary CSV z kolumną 'page' zniknął z dysku
+        write_csv_atomic(self.load(), self.out_csv)
+
+
+class ParquetOcrCacheStore(OcrCacheStore):
+    """Cache jako partycje Parquet + manifest plików (patrz opis modułu)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.location = root
+        self.parts_dir = os.path.join(root, "parts")
+        self.manifest_path = os.path.join(root, "manifest.parquet")
+        self.journal_path = os.path.join(root, "journal.jsonl")
+
+    def read_manifest(self, columns: list[str] | None = None) -> pd.DataFrame:
+        columns = list(columns or MANIFEST_COLS)
+        if not os.path.exists(self.manifest_path):
+            return pd.DataFrame(columns=columns)
+        m = pd.read_parquet(self.manifest_path)
+        for c in columns:
+            # manifest sprzed dodania kolumny (np. content_key)
+            if c not in m.columns:
+                m[c] = None
+        return m[columns]
+
+    def processed_paths(self) -> set[str]:
+        m = self.read_manifest(columns=["gcs_path"])
+        return set(m["gcs_path"].astype(str).tolist())
+
+    def content_index(self) -> dict[str, str | None]:
+        m = self.read_manifest(columns=["gcs_path", "content_key"])
+        return {str(p): (k if isinstance(k, str) and k else None) for p, k in zip(m["gcs_path"], m["content_key"])}
+
+    def rows_for(self, gcs_paths: Iterable[str]) -> pd.DataFrame:
+        wanted = set(gcs_paths)
+        m = self.read_manifest(columns=["gcs_path", "part"])
+        m = m[m["gcs_path"].isin(wanted) & (m["part"].astype(str) != "")]
+        frames = []
+        for part, paths in m.groupby("part", sort=True)["gcs_path"]:
+            df = pd.read_parquet(os.path.join(self.parts_dir, part))
+            frames.append(df[df["gcs_path"].isin(set(paths))])
+        return to_line_schema(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
+
+    def is_empty(self) -> bool:
+        return not os.path.exists(self.manifest_path)
+
+    def _next_part_name(self, manifest: pd.DataFrame) -> str:
+        existing = set(manifest["part"].astype(str)) if len(manifest) else set()
+        if os.path.isdir(self.parts_dir):
+            existing |= set(os.listdir(self.parts_dir))
+        n = 1 + max((int(p[5:11]) for p in existing if p.startswith("part-") and p[5:11].isdigit()), default=0)
+        return f"part-{n:06d}.parquet"
+
+    def add(
+        self,
+        df_new: pd.DataFrame,
+        processed: Iterable[str] = (),
+        meta: Mapping[str, Mapping] | None = None,
+    ) -> None:
+        """
+        Dopisuje nową partycję i aktualizuje manifest (bez przepisywania starych danych).
+
+        processed – gcs_path przetworzone w tym uruchomieniu (także te bez linii tekstu),
+        meta – opcjonalnie {gcs_path: {"file_id": ..., "generation": ..., "content_key": ...}} (z listingu GCS).
+        """
+        meta = meta or {}
+        if len(df_new):
+            df_new = dedupe_lines(to_line_schema(df_new))
+
+        paths = list(dict.fromkeys([*processed, *(df_new["gcs_path"].astype(str) if len(df_new) else [])]))
+        if not paths:
+            return
+
+        os.makedirs(self.parts_dir, exist_ok=True)
+        manifest = self.read_manifest()
+        part = self._next_part_name(manifest)
+
+        if len(df_new):
+            _write_parquet_atomic(df_new.reset_index(drop=True), os.path.join(self.parts_dir, part))
+
+        if len(df_new):
+            n_lines = df_new.groupby("gcs_path").size()
+            file_ids = df_new.groupby("gcs_path")["file_id"].first() if "file_id" in df_new.columns else pd.Series(dtype=str)
+        else:
+            n_lines = pd.Series(dtype="int64")
+            file_ids = pd.Series(dtype=str)
+
+        entries = pd.DataFrame(
+            {
+                "gcs_path": paths,
+                "file_id": [file_ids.get(p) or (meta.get(p) or {}).get("file_id") for p in paths],
+                "generation": [(meta.get(p) or {}).get("generation") for p in paths],
+                "content_key": [(meta.get(p) or {}).get("content_key") for p in paths],
+                "n_lines": [int(n_lines.get(p, 0)) for p in paths],
+                "part": [part if int(n_lines.get(p, 0)) else "" for p in paths],
+            }
+        )
+        entries["generation"] = entries["generation"].astype("string")
+        entries["content_key"] = entries["content_key"].astype("string")
+
+        if len(manifest):
+            manifest = manifest[~manifest["gcs_path"].isin(set(paths))]
+            manifest = pd.concat([manifest, entries], ignore_index=True)
+        else:
+            manifest = entries
+
+        _write_parquet_atomic(manifest, self.manifest_path)
+
+    def update_meta(self, meta: Mapping[str, Mapping]) -> None:
+        manifest = self.read_manifest()
+        if len(manifest) == 0:
+            return
+        for col in ("generation", "content_key"):
+            upd = {p: m.get(col) for p, m in meta.items() if m.get(col) is not None}
+            if upd:
+                new = manifest["gcs_path"].map(upd)
+                manifest[col] = new.where(new.notna(), manifest[col]).astype("string")
+        _write_parquet_atomic(manifest, self.manifest_path)
+
+    def load(self) -> pd.DataFrame:
+        manifest = self.read_manifest(columns=["gcs_path", "part"])
+        manifest = manifest[manifest["part"].astype(str) != ""]
+        if len(manifest) == 0:
+            return pd.DataFrame()
+
+        frames = []
+        for part, paths in manifest.groupby("part", sort=True)["gcs_path"]:
+            df = pd.read_parquet(os.path.join(self.parts_dir, part))
+            live = set(paths)
+            # wiersze plików przepiętych później na nowszą partycję są pomijane
+            frames.append(df if df["gcs_path"].isin(live).all() else df[df["gcs_path"].isin(live)])
+        # partycje sprzed kolumn liczbowych mają bbox_norm – konwersja po złożeniu (jeden parse)
+        return to_line_schema(pd.concat(frames, ignore_index=True))
+
+    def import_csv(self, csv_path: str) -> None:
+        """Migracja: wczytuje istniejący cache CSV jako pierwszą partycję."""
+        df = pd.read_csv(csv_path)
+        if len(df):
+            self.add(to_line_schema(df))
+
+    def compact(self) -> None:
+        """Scala żywe wiersze do jednej partycji i usuwa nieużywane pliki partycji."""
+        df = self.load()
+        manifest = self.read_manifest()
+        if len(manifest) == 0:
+            return
+        part = self._next_part_name(manifest)
+        if len(df):
+            _write_parquet_atomic(df, os.path.join(self.parts_dir, part))
+        manifest["part"] = [part if n else "" for n in manifest["n_lines"]]
+        _write_parquet_atomic(manifest, self.manifest_path)
+
+        for name in os.listdir(self.parts_dir):
+            if name != part:
+                os.remove(os.path.join(self.parts_dir, name))
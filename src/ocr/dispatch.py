@@ -0,0 +1,149 @@
+"""
+Współbieżne wywołania OCR (Vision) z limitem równoległych żądań.
+
+- call_with_retry: ponawianie pojedynczego wywołania (backoff + jitter) dla błędów quota/5xx,
+- iter_ocr_results: pula wątków z ograniczoną liczbą żądań "w locie",
+  wyniki zwracane w kolejności wejściowej (deterministycznie).
+
+Klient Vision (gRPC) jest bezpieczny wątkowo – jeden klient na całą pulę.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from src.pipeline.metrics import get_metrics
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+# HTTP: 429 (quota) + 5xx; google.rpc.Code: 4=DEADLINE_EXCEEDED, 8=RESOURCE_EXHAUSTED, 13=INTERNAL, 14=UNAVAILABLE
+RETRYABLE_HTTP_CODES = frozenset({429, 500, 502, 503, 504})
+RETRYABLE_RPC_CODES = frozenset({4, 8, 13, 14})
+RETRYABLE_GRPC_NAMES = frozenset({"DEADLINE_EXCEEDED", "RESOURCE_EXHAUSTED", "INTERNAL", "UNAVAILABLE"})
+
+
+class VisionResponseError(RuntimeError):
+    """Błąd zwrócony w treści odpowiedzi Vision (resp.error), z kodem google.rpc."""
+
+    def __init__(self, message: str, code: int = 0):
+        super().__init__(message)
+        self.code = int(code or 0)
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    """True dla błędów przejściowych: quota (429 / RESOURCE_EXHAUSTED) i 5xx / UNAVAILABLE."""
+    if isinstance(e, VisionResponseError):
+        return e.code in RETRYABLE_RPC_CODES
+
+    code = getattr(e, "code", None)
+    if callable(code):
+        # grpc.RpcError: code() -> grpc.StatusCode
+        try:
+            code = code()
+        except Exception:
+            return False
+        return getattr(code, "name", "") in RETRYABLE_GRPC_NAMES
+
+    # google.api_core.exceptions.GoogleAPICallError: code = status HTTP
+    if isinstance(code, int):
+        return code in RETRYABLE_HTTP_CODES
+
+    return isinstance(e, (TimeoutError, ConnectionError))
+
+
+def backoff_delay(
+    attempt: int,
+    base_delay: float = 1.0,
+    max_delay: float = 32.0,
+    rng: random.Random | None = None,
+) -> float:
+    """Opóźnienie przed ponowieniem (attempt=1,2,...): exponential backoff z pełnym jitterem."""
+    cap = min(max_delay, base_delay * (2 ** (attempt - 1)))
+    return (rng or random).uniform(0.0, cap)
+
+
+def call_with_retry(
+    fn: Callable[[], object],
+    *,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 32.0,
+    sleep: Callable[[float], None] = time.sleep,
+    rng: random.Random | None = None,
+):
+    """Wywołuje fn(); błędy przejściowe ponawia do max_retries razy, pozostałe przepuszcza od razu."""
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            attempt += 1
+            if attempt > max_retries or not is_retryable_error(e):
+                raise
+            get_metrics().inc("ocr.retries")
+            sleep(backoff_delay(attempt, base_delay=base_delay, max_delay=max_delay, rng=rng))
+
+
+def iter_ocr_results(
+    gcs_paths: Iterable[T],
+    ocr_fn: Callable[[T], R],
+    *,
+    max_in_flight: int = 8,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 32.0,
+) -> Iterator[tuple[T, R | None, Exception | None]]:
+    """
+    Uruchamia ocr_fn(gs_path) dla wszystkich ścieżek, maks. max_in_flight naraz.
+    (Elementem może być też paczka ścieżek – patrz src.ocr.batch.)
+
+    Zwraca (gs_path, rows, None) albo (gs_path, None, błąd) – w kolejności wejściowej,
+    niezależnie od kolejności, w jakiej kończą się żądania.
+    max_in_flight <= 1: wywołania sekwencyjne w bieżącym wątku (bez puli).
+    """
+
+    def _one(gs_path: T) -> R:
+        return call_with_retry(
+            lambda: ocr_fn(gs_path),
+            max_retries=max_retries,
+            base_delay=base_delay,
+            max_delay=max_delay,
+        )
+
+    if max_in_flight <= 1:
+        for gs_path in gcs_paths:
+            try:
+                yield gs_path, _one(gs_path), None
+            except Exception as e:
+                yield gs_path, None, e
+        return
+
+    it = iter(gcs_paths)
+    pending: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=int(max_in_flight), thread_name_prefix="ocr") as ex:
+        # okno: co najwyżej max_in_flight zleconych, odbiór zawsze od najstarszego
+        for gs_path in it:
+            pending.append((gs_path, ex.submit(_one, gs_path)))
+            if len(pending) >= max_in_flight:
+                break
+
+        while pending:
+            gs_path, fut = pending.popleft()
+            try:
+                res = (gs_path, fut.result(), None)
+            except Exception as e:
+                res = (gs_path, None, e)
+
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append((nxt, ex.submit(_one, nxt)))
+
+            yield res
@@ -3,26 +3,38 @@
 
     run_ocr_cache():
     - listuje obrazy w GCS (stan "teraz"),
-    - wczytuje out_csv jako cache,
+    - wczytuje cache (out_csv albo OcrCacheStore, np. Parquet + manifest),
     - uruchamia OCR tylko dla brakujących plików,
-    - dopisuje wyniki, deduplikuje,
-    - zapisuje out_csv i zwraca df_out.
+    - dopisuje wyniki (na bieżąco do dziennika JSONL), deduplikuje,
+    - zapisuje cache i zwraca df_out.
 
     Uwaga: dla obrazów (nie PDF) nie zapisujemy kolumny `page`.
+    google.cloud.vision importowany leniwie: klient Vision powstaje dopiero, gdy jest co OCR-ować.
 """
 
 from __future__ import annotations
 
 import os
-import subprocess
 import hashlib
-from typing import Iterable
+import time
+from typing import TYPE_CHECKING, Iterable
 
 import pandas as pd
-from google.cloud import vision
+
+from src.io.gcs import iter_images_meta, list_images_meta
+from src.ocr.batch import iter_ocr_results_async, iter_ocr_results_batched
+from src.ocr.dispatch import VisionResponseError, iter_ocr_results
+from src.ocr.cache_store import CsvOcrCacheStore, OcrCacheStore, ParquetOcrCacheStore, write_csv_atomic
+from src.ocr.ocr_journal import DEFAULT_CHUNK_ROWS, OcrJournal, iter_journal_frames, read_journal_paths
+from src.pipeline.metrics import get_metrics
+from src.search.text_index import TextIndex
+
+if TYPE_CHECKING:
+    from google.cloud import vision
 
 
 DEFAULT_IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp")
+OCR_BACKENDS = ("single", "batch", "async")
 
 
 def file_id_from_gcs_path(gs_path: str) -> str:
@@ -31,41 +43,21 @@ def file_id_from_gcs_path(gs_path: str) -> str:
 
 
 def list_gcs_images(prefix: str, image_exts: tuple[str, ...] = DEFAULT_IMAGE_EXTS) -> list[str]:
-    """Listuje obrazy pod prefix/** w GCS przez CLI (gcloud storage ls)."""
-    r = subprocess.run(
-        ["gcloud", "storage", "ls", f"{prefix.rstrip('/')}/**"],
-        capture_output=True,
-        text=True,
-    )
-    if r.returncode != 0:
-        raise RuntimeError(r.stderr.strip()[:2000])
-
-    paths: list[str] = []
-    for line in r.stdout.splitlines():
-        p = line.strip()
-        if not p or p.endswith("/"):
-            continue
-        if p.lower().endswith(image_exts):
-            paths.append(p)
+    """Listuje obrazy pod prefix/** w GCS (storage client, strumieniowo strona po stronie)."""
+    return sorted(m["gcs_path"] for m in iter_images_meta(prefix, exts=image_exts))
 
-    return sorted(paths)
 
-
-def ocr_lines_from_gcs(
-    gs_path: str,
-    client: vision.ImageAnnotatorClient,
-    source: str = "gcv_ocr_line",
-) -> list[dict]:
+def lines_from_response(resp, gs_path: str, source: str = "gcv_ocr_line") -> list[dict]:
     """
-    Uruchamia Google Vision OCR (document_text_detection) i zwraca linie tekstu.
+    Parsuje AnnotateImageResponse (document_text_detection) do rekordów linii.
 
-    Zwracane pola: text, file_name, file_id, gcs_path, line_id, bbox_norm, source
-    (bez `page`).
+    Wspólne dla wywołań pojedynczych i wsadowych (batch_annotate_images / async).
+    Zwracane pola: text, file_name, file_id, gcs_path, line_id, x1, y1, x2, y2, img_w, img_h, source
+    (bbox w pikselach strony, img_w / img_h = rozmiar strony; bez `page`).
+    Bbox linii to otoczka bboxów słów (bboxy symboli leżą wewnątrz słowa – nie są potrzebne).
     """
-    image = vision.Image(source=vision.ImageSource(gcs_image_uri=gs_path))
-    resp = client.document_text_detection(image=image)
     if resp.error.message:
-        raise RuntimeError(resp.error.message)
+        raise VisionResponseError(resp.error.message, code=resp.error.code)
 
     out: list[dict] = []
     fid = file_id_from_gcs_path(gs_path)
@@ -77,17 +69,18 @@ def ocr_lines_from_gcs(
 
     # Dla obrazów traktujemy wynik jako jeden "ciąg linii" (bez numerowania stron)
     line_id = 0
+    inf = float("inf")
 
     for page in fta.pages:
+        img_w = float(page.width) if getattr(page, "width", 0) else float("nan")
+        img_h = float(page.height) if getattr(page, "height", 0) else float("nan")
         line_text: list[str] = []
-        xs: list[int] = []
-        ys: list[int] = []
+        x1, y1, x2, y2 = inf, inf, -inf, -inf
 
         def flush_line():
-            nonlocal line_id, line_text, xs, ys
+            nonlocal line_id, line_text, x1, y1, x2, y2
             text = "".join(line_text).strip()
-            if text and xs and ys:
-                x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
+            if text and x1 <= x2:
                 out.append(
                     {
                         "text": text,
@@ -95,26 +88,36 @@ def ocr_lines_from_gcs(
                         "file_id": fid,
                         "gcs_path": gs_path,
                         "line_id": line_id,
-                        "bbox_norm": f"{float(x1)},{float(y1)},{float(x2)},{float(y2)}",
+                        "x1": float(x1),
+                        "y1": float(y1),
+                        "x2": float(x2),
+                        "y2": float(y2),
+                        "img_w": img_w,
+                        "img_h": img_h,
                         "source": source,
                     }
                 )
                 line_id += 1
-            line_text, xs, ys = [], [], []
+            line_text = []
+            x1, y1, x2, y2 = inf, inf, -inf, -inf
 
         for block in page.blocks:
             for para in block.paragraphs:
                 for word in para.words:
                     wb = word.bounding_box.vertices
-                    xs.extend([v.x for v in wb])
-                    ys.extend([v.y for v in wb])
+                    if wb:
+                        xs = [v.x for v in wb]
+                        ys = [v.y for v in wb]
+                        x1, y1 = min(x1, min(xs)), min(y1, min(ys))
+                        x2, y2 = max(x2, max(xs)), max(y2, max(ys))
 
+                    split = False  # łamanie linii w środku słowa: reszta słowa dostaje bboxy symboli
                     for sym in word.symbols:
                         line_text.append(sym.text)
-
-                        sb = sym.bounding_box.vertices
-                        xs.extend([v.x for v in sb])
-                        ys.extend([v.y for v in sb])
+                        if split:
+                            sb = sym.bounding_box.vertices
+                            x1, y1 = min([x1, *(v.x for v in sb)]), min([y1, *(v.y for v in sb)])
+                            x2, y2 = max([x2, *(v.x for v in sb)]), max([y2, *(v.y for v in sb)])
 
                         br = None
                         if sym.property and sym.property.detected_break:
@@ -126,117 +129,330 @@ def ocr_lines_from_gcs(
                             line_text.append(" ")
                         if br_val == 5:
                             flush_line()
+                            split = True
 
         flush_line()
 
     return out
 
 
+def ocr_lines_from_gcs(
+    gs_path: str,
+    client: vision.ImageAnnotatorClient,
+    source: str = "gcv_ocr_line",
+) -> list[dict]:
+    """
+    Uruchamia Google Vision OCR (document_text_detection) i zwraca linie tekstu.
+
+    Zwracane pola: jak lines_from_response (bbox jako x1..y2 + img_w / img_h, bez `page`).
+    """
+    from google.cloud import vision
+
+    m = get_metrics()
+    image = vision.Image(source=vision.ImageSource(gcs_image_uri=gs_path))
+    with m.timer("ocr.vision_rpc", backend="single"):
+        resp = client.document_text_detection(image=image)
+    with m.timer("ocr.parse"):
+        return lines_from_response(resp, gs_path, source=source)
+
+
+def content_key(blob_meta: dict) -> str | None:
+    """Klucz treści pliku z metadanych GCS: md5, a dla obiektów złożonych (bez md5) crc32c + rozmiar."""
+    if blob_meta.get("md5"):
+        return f"md5:{blob_meta['md5']}"
+    if blob_meta.get("crc32c"):
+        return f"crc32c:{blob_meta['crc32c']}:{blob_meta.get('size')}"
+    return None
+
+
+def _copy_lines(reuse: dict[str, str], store: OcrCacheStore) -> pd.DataFrame:
+    """Linie dla plików-duplikatów: kopia linii źródła (już w magazynie) z podmienionym gcs_path / file_name / file_id."""
+    df_src = store.rows_for(set(reuse.values()))
+    if len(df_src) == 0:
+        return pd.DataFrame()
+
+    by_src = {p: g for p, g in df_src.groupby("gcs_path", sort=False)}
+    frames = []
+    for gs_path, src in reuse.items():
+        g = by_src.get(src)
+        if g is None:
+            continue
+        g = g.copy()
+        g["gcs_path"] = gs_path
+        g["file_name"] = gs_path.split("/")[-1]
+        g["file_id"] = file_id_from_gcs_path(gs_path)
+        frames.append(g)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
 def run_ocr_cache(
     gcs_photos_prefix: str,
-    out_csv: str,
+    out_csv: str | None,
     limit_images: int | None = None,
     image_exts: tuple[str, ...] = DEFAULT_IMAGE_EXTS,
+    max_in_flight: int = 1,
+    max_retries: int = 5,
+    client: vision.ImageAnnotatorClient | None = None,
+    backend: str = "single",
+    batch_size: int = 16,
+    async_output_uri: str | None = None,
+    checkpoint: bool = True,
+    checkpoint_every: int = 25,
+    store: OcrCacheStore | None = None,
+    text_index: TextIndex | None = None,
+    journal_chunk_rows: int = DEFAULT_CHUNK_ROWS,
 ) -> pd.DataFrame:
     """
     OCR z cache:
-    - listuje obrazy w GCS (stan teraz),
-    - wczytuje out_csv jako cache,
-    - uruchamia OCR tylko dla brakujących plików,
+    - listuje obrazy w GCS (stan teraz, z md5/crc32c i generation),
+    - wczytuje cache (domyślnie out_csv),
+    - uruchamia OCR tylko dla brakujących i podmienionych plików
+      (identyczna treść pod inną ścieżką => kopia wyniku, bez OCR),
     - dopisuje i deduplikuje,
-    - zapisuje out_csv,
+    - zapisuje cache,
     - zwraca df_out.
 
     Uwaga (legacy): starsze cache mogły zawierać kolumny z poprzednich iteracji (np. 'page', 'script').
     W tym workflow dla obrazów ich nie utrzymujemy.
-    """
-    client = vision.ImageAnnotatorClient()
 
-    # kolumny, których nie chcemy w tym workflow (obrazy, bez PDF/page, bez script)
-    DROP_LEGACY_COLS = ("page", "script")
-
-    # 1) lista plików w GCS
-    gcs_files_all = list_gcs_images(gcs_photos_prefix, image_exts=image_exts)
+    max_in_flight — maks. liczba równoległych żądań do Vision (1 = sekwencyjnie, jak dotąd).
+    max_retries — ponowienia pojedynczego pliku przy błędach quota/5xx (backoff + jitter).
+    client — opcjonalny klient Vision (np. zamiennik lokalny); domyślnie ImageAnnotatorClient().
+    backend — "single" (1 obraz / RPC), "batch" (batch_annotate_images, batch_size <= 16 obrazów / RPC)
+              albo "async" (async_batch_annotate_images, wyniki JSON w async_output_uri=gs://...).
+    checkpoint — wyniki OCR zapisywane na bieżąco do dziennika JSONL (fsync co checkpoint_every plików);
+                 po przerwaniu dziennik jest traktowany jak cache, a na końcu kompaktowany do cache
+                 strumieniowo, porcjami po journal_chunk_rows linii (pamięć nie rośnie z wielkością partii).
+    store — magazyn cache (src.ocr.cache_store); domyślnie CsvOcrCacheStore(out_csv).
+            Dla ParquetOcrCacheStore out_csv jest widokiem CSV (eksport po zmianach; None = bez eksportu),
+            a istniejący out_csv jest jednorazowo importowany do pustego magazynu.
+    text_index — indeks pełnotekstowy (src.search.text_index) aktualizowany przyrostowo
+                 (tylko pliki z OCR/kopią w tym uruchomieniu i pliki brakujące w indeksie,
+                 więc edycje text_edited w pozostałych plikach zostają) i zapisywany po uruchomieniu.
+
+    Metryki etapów (src.pipeline.metrics, jeśli włączone): czasy listingu, RPC Vision, parsowania,
+    zapisu/odczytu cache, liczniki plików i linii; na końcu tabela podsumowania i flush do sinków.
+    """
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Nieznany backend OCR: {backend} (dostępne: {', '.join(OCR_BACKENDS)})")
+    if backend == "async" and not async_output_uri:
+        raise ValueError("backend='async' wymaga async_output_uri (gs://...).")
+
+    if store is None:
+        if not out_csv:
+            raise ValueError("Podaj out_csv albo store.")
+        store = CsvOcrCacheStore(out_csv)
+    elif isinstance(store, ParquetOcrCacheStore) and out_csv and store.is_empty() and os.path.exists(out_csv):
+        print("[MIGRATE] Import cache CSV do Parquet:", out_csv, "->", store.location)
+        store.import_csv(out_csv)
+
+    m = get_metrics()
+    t_run = time.perf_counter()
+
+    # 1) lista plików w GCS (z metadanymi: generation, size, md5/crc32c)
+    with m.timer("gcs.list"):
+        listing = list_images_meta(gcs_photos_prefix, exts=image_exts)
     if limit_images is not None:
-        gcs_files_all = gcs_files_all[: int(limit_images)]
-
-    # 2) wczytaj cache
-    df_cache = pd.read_csv(out_csv) if os.path.exists(out_csv) else pd.DataFrame()
-
-    # usuń legacy kolumny z cache (w pamięci)
-    if len(df_cache):
-        cols_to_drop = [c for c in DROP_LEGACY_COLS if c in df_cache.columns]
-        if cols_to_drop:
-            df_cache = df_cache.drop(columns=cols_to_drop)
-
-    cached_paths = (
-        set(df_cache["gcs_path"].dropna().astype(str).unique().tolist())
-        if "gcs_path" in df_cache.columns
-        else set()
-    )
+        listing = listing[: int(limit_images)]
+    gcs_files_all = [bm["gcs_path"] for bm in listing]
+    meta = {
+        bm["gcs_path"]: {**bm, "file_id": file_id_from_gcs_path(bm["gcs_path"]), "content_key": content_key(bm)}
+        for bm in listing
+    }
+
+    # 2) cache: przetworzone ścieżki + klucze treści (Parquet: sam manifest)
+    with m.timer("cache.index"):
+        content_idx = store.content_index()
+    cached_paths = set(content_idx)
+
+    # 2b) dziennik z przerwanego uruchomienia (opłacone, jeszcze niezapisane w cache)
+    journal_path = store.journal_path
+    journal_paths = read_journal_paths(journal_path) if checkpoint else set()
+
+    # 3) brakujące: nowe ścieżki i podmienione pliki (inny content_key);
+    #    identyczna treść pod inną ścieżką => kopia wyniku zamiast OCR.
+    #    Podmienione pliki nie są źródłem kopii pod starym kluczem: ich linie w magazynie
+    #    zostaną w tym uruchomieniu zastąpione wynikiem OCR nowej treści.
+    changed = [
+        p
+        for p in gcs_files_all
+        if p in cached_paths
+        and p not in journal_paths
+        and content_idx[p]
+        and meta[p]["content_key"]
+        and content_idx[p] != meta[p]["content_key"]
+    ]
+    replaced = set(changed)
+    key_to_path = {k: p for p, k in content_idx.items() if k and p not in replaced}
+    gcs_files_missing: list[str] = []
+    reuse: dict[str, str] = {}  # gcs_path -> źródło linii (ta sama treść)
+    backfill: dict[str, dict] = {}  # stary cache bez klucza treści – dopisz klucz, bez OCR
+
+    for p in gcs_files_all:
+        if p in journal_paths:
+            continue
+        key = meta[p]["content_key"]
+        if p in cached_paths:
+            old_key = content_idx[p]
+            if not key or old_key == key:
+                continue
+            if old_key is None:
+                backfill[p] = meta[p]
+                key_to_path.setdefault(key, p)
+                continue
+        src = key_to_path.get(key) if key else None
+        if src is not None and src != p:
+            reuse[p] = src
+            continue
+        if key:
+            key_to_path[key] = p
+        gcs_files_missing.append(p)
 
-    # 3) brakujące
-    gcs_files_missing = [p for p in gcs_files_all if p not in cached_paths]
+    if backfill:
+        store.update_meta(backfill)
 
     print("GCS files:", len(gcs_files_all))
     print("Cached OCR files:", len(cached_paths))
+    if journal_paths:
+        print("Journal (odzyskane z przerwanego OCR):", len(journal_paths))
+    if changed:
+        print("Changed (nowa treść -> ponowny OCR):", len(changed))
+    if reuse:
+        print("Reused (identyczna treść, bez OCR):", len(reuse))
     print("Missing (to OCR now):", len(gcs_files_missing))
+    m.inc("ocr.files_listed", len(gcs_files_all))
+    m.inc("ocr.files_reused", len(reuse))
 
     # 4) OCR tylko brakujących + zapis cache
-    if len(gcs_files_missing) == 0:
+    written: list[str] = []  # ścieżki z nowymi liniami w tym uruchomieniu (dla text_index)
+    if len(gcs_files_missing) == 0 and not journal_paths and not reuse:
         print("[SKIP] Brak nowych plików – OCR nie został uruchomiony (0 kosztów).")
-        df_out = df_cache.copy()
-
-        # KLUCZOWE: zapisz „oczyszczony” cache także w tym wariancie,
-        # żeby stary CSV z kolumną 'page' zniknął z dysku
-        out_dir = os.path.dirname(out_csv)
-        if out_dir:
-            os.makedirs(out_dir, exist_ok=True)
-        df_out.to_csv(out_csv, index=False, encoding="utf-8")
-        print("[DONE] Cache odświeżony (bez legacy kolumn):", out_csv)
+        with m.timer("cache.write"):
+            store.refresh()
+        print("[DONE] Cache odświeżony (bez legacy kolumn):", store.location)
+        cache_updated = False
 
     else:
         rows_new: list[dict] = []
-        for i, gs_path in enumerate(gcs_files_missing, start=1):
-            fn = gs_path.split("/")[-1]
-            try:
-                rows = ocr_lines_from_gcs(gs_path, client=client)  # bez 'page' i bez 'script'
-                rows_new.extend(rows)
-                print(f"[{i}/{len(gcs_files_missing)}] OK: {fn} -> {len(rows)} linii")
-            except Exception as e:
-                print(f"[{i}/{len(gcs_files_missing)}] ERROR: {fn}: {e}")
-
-        df_new = pd.DataFrame(rows_new)
-
-        # defensywnie: jeśli skądkolwiek przyszły legacy kolumny -> usuń
-        if len(df_new):
-            cols_to_drop = [c for c in DROP_LEGACY_COLS if c in df_new.columns]
-            if cols_to_drop:
-                df_new = df_new.drop(columns=cols_to_drop)
-
-        df_out = pd.concat([df_cache, df_new], ignore_index=True) if len(df_cache) else df_new
-
-        # defensywnie: usuń legacy po concat
-        if len(df_out):
-            cols_to_drop = [c for c in DROP_LEGACY_COLS if c in df_out.columns]
-            if cols_to_drop:
-                df_out = df_out.drop(columns=cols_to_drop)
-
-        if len(df_out) > 0:
-            key_cols = [c for c in ["gcs_path", "line_id", "text"] if c in df_out.columns]
-            if key_cols:
-                df_out = df_out.drop_duplicates(subset=key_cols, keep="first")
-
-        out_dir = os.path.dirname(out_csv)
-        if out_dir:
-            os.makedirs(out_dir, exist_ok=True)
-
-        df_out.to_csv(out_csv, index=False, encoding="utf-8")
-        print("[DONE] Cache zaktualizowany:", out_csv)
+        processed_ok: list[str] = list(journal_paths)
+
+        if client is None and gcs_files_missing:
+            from google.cloud import vision
+
+            client = vision.ImageAnnotatorClient()
+
+        def single_fn(gs_path: str) -> list[dict]:
+            return ocr_lines_from_gcs(gs_path, client=client)  # bez 'page' i bez 'script'
+
+        if backend == "batch":
+            results = iter_ocr_results_batched(
+                gcs_files_missing,
+                client,
+                lines_from_response,
+                single_fn,
+                batch_size=batch_size,
+                max_in_flight=max_in_flight,
+                max_retries=max_retries,
+            )
+        elif backend == "async":
+            results = iter_ocr_results_async(
+                gcs_files_missing,
+                client,
+                lines_from_response,
+                single_fn,
+                output_uri=async_output_uri,
+                max_retries=max_retries,
+            )
+        else:
+            results = iter_ocr_results(
+                gcs_files_missing,
+                single_fn,
+                max_in_flight=max_in_flight,
+                max_retries=max_retries,
+            )
+
+        def consume(sink) -> None:
+            for i, (gs_path, rows, err) in enumerate(results, start=1):
+                fn = gs_path.split("/")[-1]
+                if err is None:
+                    sink(gs_path, rows)
+                    processed_ok.append(gs_path)
+                    m.inc("ocr.files", status="ok")
+                    m.inc("ocr.lines", len(rows))
+                    print(f"[{i}/{len(gcs_files_missing)}] OK: {fn} -> {len(rows)} linii")
+                else:
+                    m.inc("ocr.files", status="error")
+                    print(f"[{i}/{len(gcs_files_missing)}] ERROR: {fn}: {err}")
+
+        with m.timer("ocr.dispatch", backend=backend):
+            if checkpoint:
+                # pamięć stała: wyniki idą od razu do dziennika, nie do listy
+                with OcrJournal(journal_path, fsync_every=checkpoint_every) as journal:
+                    consume(journal.append)
+            else:
+                consume(lambda _p, rows: rows_new.extend(rows))
+
+        def file_meta(paths: list[str]) -> dict[str, dict]:
+            return {p: meta.get(p) or {"file_id": file_id_from_gcs_path(p)} for p in paths}
+
+        with m.timer("cache.write"):
+            if checkpoint:
+                # dziennik -> magazyn porcjami po journal_chunk_rows linii (pamięć stała niezależnie od partii)
+                store.add_stream(
+                    iter_journal_frames(journal_path, journal_chunk_rows),
+                    processed=processed_ok,
+                    meta=file_meta(processed_ok),
+                )
+            else:
+                df_new = pd.DataFrame(rows_new)
+                del rows_new
+                store.add(df_new, processed=processed_ok, meta=file_meta(processed_ok))
+                del df_new
+
+        # duplikaty treści: kopia linii źródła (z cache albo z tego uruchomienia – już w magazynie)
+        if reuse:
+            done = cached_paths | set(processed_ok)
+            reused_ok = [p for p, src in reuse.items() if src in done]  # źródło musi mieć wynik
+            with m.timer("cache.build_frame"):
+                df_reused = _copy_lines(reuse, store)
+            with m.timer("cache.write"):
+                store.add(df_reused, processed=reused_ok, meta=file_meta(reused_ok))
+            written.extend(reused_ok)
+        written.extend(processed_ok)
+
+        if checkpoint and os.path.exists(journal_path):
+            # dziennik skompaktowany do cache
+            os.remove(journal_path)
+        print("[DONE] Cache zaktualizowany:", store.location)
+        cache_updated = True
+
+    with m.timer("cache.load"):
+        df_out = store.load()
+
+    # widok CSV dla magazynów innych niż CSV: eksport tylko po zmianach (lub gdy brak pliku)
+    if out_csv and not isinstance(store, CsvOcrCacheStore) and (cache_updated or not os.path.exists(out_csv)):
+        with m.timer("cache.csv_view"):
+            write_csv_atomic(df_out, out_csv)
+        print("[DONE] Widok CSV:", out_csv)
+
+    if text_index is not None:
+        with m.timer("index.sync"):
+            stats = text_index.sync(df_out, files=[file_id_from_gcs_path(p) for p in written])
+            if text_index.root:
+                text_index.save()
+        print(
+            "[DONE] Indeks tekstowy:",
+            f"{stats['changed_files']} plików przeindeksowanych, {stats['removed_files']} usuniętych,",
+            f"{stats['lines']} linii",
+        )
 
     print("CSV rows:", len(df_out))
     print(
         "CSV unique files:",
         df_out["file_name"].nunique() if "file_name" in df_out.columns and len(df_out) else 0,
     )
-    return df_out
\ No newline at end of file
+    if m.enabled:
+        m.observe("ocr.run_ocr_cache", time.perf_counter() - t_run, kind="timer", backend=backend)
+        m.print_summary()
+        m.flush()
+    return df_out
@@ -0,0 +1,139 @@
+"""
+Append-only dziennik (JSONL) wyników OCR – checkpoint odporny na przerwanie kernela.
+
+Jeden wiersz = jeden przetworzony plik: {"gcs_path": ..., "rows": [...linie OCR...]}.
+- wynik trafia na dysk zaraz po OCR pliku (flush), fsync co `fsync_every` plików,
+- urwany ostatni wiersz (crash w trakcie zapisu) jest pomijany przy odczycie,
+- po restarcie dziennik działa jak cache (opłacone wywołania Vision nie przepadają),
+- run_ocr_cache kompaktuje dziennik do cache porcjami (iter_journal_frames, pamięć stała) i usuwa go po udanym zapisie.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Iterator
+
+import pandas as pd
+
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+DEFAULT_CHUNK_ROWS = 50_000
+TAIL_BLOCK = 64 * 1024
+
+
+def journal_path_for(out_csv: str) -> str:
+    """Ścieżka dziennika obok cache CSV: <out_csv>.journal.jsonl"""
+    return out_csv + JOURNAL_SUFFIX
+
+
+def iter_journal(path: str) -> Iterator[tuple[str, list[dict]]]:
+    """Zwraca (gcs_path, rows) dla kolejnych kompletnych wpisów dziennika."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # niedokończony zapis (crash) – pomijamy
+                break
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            yield str(rec["gcs_path"]), rec.get("rows") or []
+
+
+def read_journal_paths(path: str) -> set[str]:
+    """Zbiór gcs_path zapisanych w dzienniku (bez trzymania linii w pamięci)."""
+    return {p for p, _ in iter_journal(path)}
+
+
+def iter_journal_rows(path: str) -> Iterator[dict]:
+    """Wszystkie linie OCR z dziennika (strumieniowo)."""
+    for _, rows in iter_journal(path):
+        yield from rows
+
+
+def iter_journal_frames(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Linie OCR z dziennika jako DataFrame porcjami po ~chunk_rows linii (w pamięci jedna porcja naraz).
+    Wpis (wszystkie linie jednego pliku) nigdy nie jest dzielony między porcje.
+    """
+    chunk_rows = max(1, int(chunk_rows))
+    buf: list[dict] = []
+    for _, rows in iter_journal(path):
+        buf.extend(rows)
+        if len(buf) >= chunk_rows:
+            yield pd.DataFrame(buf)
+            buf = []
+    if buf:
+        yield pd.DataFrame(buf)
+
+
+def truncate_partial_tail(path: str, block: int = TAIL_BLOCK) -> None:
+    """
+    Obcina urwany ostatni wiersz pliku JSONL (crash w trakcie zapisu), żeby nowe wpisy nie skleiły się z nim.
+    Czyta tylko koniec pliku (bloki po `block` bajtów od końca do ostatniego "\n"), nie cały dziennik.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(block, pos)
+            f.seek(pos - step)
+            data = f.read(step)
+            if pos == end and data.endswith(b"\n"):
+                return
+            i = data.rfind(b"\n")
+            if i >= 0:
+                f.truncate(pos - step + i + 1)
+                return
+            pos -= step
+        if end:
+            f.truncate(0)
+
+
+class OcrJournal:
+    """
+    Dopisywanie wyników OCR do dziennika JSONL.
+
+    with OcrJournal(path, fsync_every=25) as j:
+        j.append(gs_path, rows)
+    """
+
+    def __init__(self, path: str, fsync_every: int = 25):
+        self.path = path
+        self.fsync_every = max(1, int(fsync_every))
+        self._f = None
+        self._pending = 0
+
+    def __enter__(self) -> "OcrJournal":
+        out_dir = os.path.dirname(self.path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        self._repair_tail()
+        self._f = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def _repair_tail(self) -> None:
+        truncate_partial_tail(self.path)
+
+    def append(self, gs_path: str, rows: list[dict]) -> None:
+        self._f.write(json.dumps({"gcs_path": gs_path, "rows": rows}, ensure_ascii=False) + "\n")
+        self._f.flush()
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._pending = 0
+
+    def __exit__(self, *exc) -> None:
+        if self._f is not None:
+            self.sync()
+            self._f.close()
+            self._f = None
@@ -1,21 +1,26 @@
 """
 Postprocessing OCR: group WORD-level records into LINE-level records.
+
+Bboxy słów: pola x1..y2 albo legacy bbox_norm; linie wychodzą w schemacie liczbowym (src.ocr.bbox).
 """
 
 from typing import List, Dict, Tuple
 
+import numpy as np
+
+from src.ocr.bbox import BBOX_COLS, union_boxes
+
 
 def _bbox_from_str(bbox: str) -> Tuple[float, float, float, float]:
     x1, y1, x2, y2 = bbox.split(",")
     return float(x1), float(y1), float(x2), float(y2)
 
 
-def _bbox_union(bboxes: List[Tuple[float, float, float, float]]) -> str:
-    xs1 = [b[0] for b in bboxes]
-    ys1 = [b[1] for b in bboxes]
-    xs2 = [b[2] for b in bboxes]
-    ys2 = [b[3] for b in bboxes]
-    return f"{min(xs1)},{min(ys1)},{max(xs2)},{max(ys2)}"
+def _word_boxes(words: List[Dict]) -> np.ndarray:
+    """Bboxy słów [n, 4]: pola x1..y2 (nowy schemat) albo legacy bbox_norm "x1,y1,x2,y2"."""
+    if words and all(k in words[0] for k in BBOX_COLS):
+        return np.array([[float(w[k]) for k in BBOX_COLS] for w in words], dtype=np.float64)
+    return np.array([_bbox_from_str(w["bbox_norm"]) for w in words], dtype=np.float64).reshape(-1, 4)
 
 
 def _y_center(bbox: Tuple[float, float, float, float]) -> float:
@@ -42,44 +47,50 @@ def words_to_lines(
     line_records: List[Dict] = []
 
     for file_id, words in by_file.items():
-        # Parsuj bboxy i sortuj po Y
-        enriched = []
-        for w in words:
-            bbox = _bbox_from_str(w["bbox_norm"])
-            enriched.append((w, bbox, _y_center(bbox)))
-
-        enriched.sort(key=lambda x: x[2])  # po y_center
-
-        lines: List[List[Tuple[Dict, Tuple[float, float, float, float]]]] = []
-
-        for w, bbox, yc in enriched:
-            placed = False
-            for line in lines:
-                _, _, line_yc = line[0][0], line[0][1], _y_center(line[0][1])
-                if abs(yc - line_yc) <= y_threshold_px:
-                    line.append((w, bbox))
-                    placed = True
-                    break
-            if not placed:
-                lines.append([(w, bbox)])
-
-        # Dla każdej linii: sortuj po X i sklej tekst
-        for line_idx, line in enumerate(lines):
-            line_sorted = sorted(line, key=lambda x: x[1][0])  # po x1
-            texts = [w["text"] for (w, _) in line_sorted]
-            bboxes = [bbox for (_, bbox) in line_sorted]
-
-            line_text = " ".join(texts)
-            line_bbox = _bbox_union(bboxes)
-
-            base = line_sorted[0][0]
+        # bboxy i środki Y wektorowo; sortowanie po Y stabilne (remisy w kolejności wejścia)
+        boxes = _word_boxes(words)
+        yc = (boxes[:, 1] + boxes[:, 3]) / 2.0
+        order = np.argsort(yc, kind="stable")
+
+        line_of = np.empty(len(words), dtype=np.int64)  # numer linii słowa
+        anchors: List[float] = []  # y_center pierwszego słowa linii (rosnąco, jak kolejność linii)
+        lo = 0
+
+        # Zachłannie: słowo trafia do pierwszej linii, której kotwica jest w odległości <= y_threshold_px.
+        # Słowa są posortowane po y_center, więc kotwice rosną, a wszystkie są <= yc bieżącego słowa:
+        # linie z yc - kotwica > próg nie przyjmą już żadnego słowa i wskaźnik `lo` tylko rośnie (O(n)).
+        for i, y in zip(order.tolist(), yc[order].tolist()):
+            while lo < len(anchors) and y - anchors[lo] > y_threshold_px:
+                lo += 1
+            if lo < len(anchors) and abs(y - anchors[lo]) <= y_threshold_px:
+                line_of[i] = lo
+            else:
+                line_of[i] = len(anchors)
+                anchors.append(y)
+
+        # Dla każdej linii: słowa po X (remisy w kolejności Y), tekst sklejony, bbox = otoczka słów
+        rank = np.empty(len(words), dtype=np.int64)
+        rank[order] = np.arange(len(words))
+        seq = np.lexsort((rank, boxes[:, 0], line_of))
+        line_boxes = union_boxes(line_of, boxes, n_groups=len(anchors))
+        starts = np.searchsorted(line_of[seq], np.arange(len(anchors) + 1))
+
+        for line_idx in range(len(anchors)):
+            idx = seq[starts[line_idx]:starts[line_idx + 1]].tolist()
+            base = words[idx[0]]
+            x1, y1, x2, y2 = line_boxes[line_idx].tolist()
             rec = {
-                "text": line_text,
+                "text": " ".join(words[i]["text"] for i in idx),
                 "file_name": base["file_name"],
                 "file_id": base["file_id"],
                 "gcs_path": base["gcs_path"],
                 "line_id": line_idx,
-                "bbox_norm": line_bbox,
+                "x1": x1,
+                "y1": y1,
+                "x2": x2,
+                "y2": y2,
+                "img_w": base.get("img_w"),
+                "img_h": base.get("img_h"),
                 "source": "gcv_ocr_line",
             }
             line_records.append(rec)
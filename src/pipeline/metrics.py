@@ -0,0 +1,384 @@
+"""
+Metryki etapów pipeline'u: czasy, liczniki i histogramy z wymiennymi sinkami.
+
+Domyślnie wyłączone: get_metrics() zwraca NULL_METRICS, którego metody nic nie robią
+(koszt hooka = wywołanie pustej metody / wejście do współdzielonego pustego context managera).
+Włączenie (notebook, CLI):
+
+    from src.pipeline.metrics import JsonlSink, Metrics, enable
+    m = enable(Metrics(sinks=[JsonlSink("outputs/metrics/ocr.jsonl")]))
+    run_ocr_cache(...)
+    m.print_summary()
+    m.flush()
+
+Nazwy: "<obszar>.<etap>", np. "ocr.vision_rpc", "ocr.parse", "cache.write", "gallery.thumbs".
+Etykiety (labels) – kilka wartości na metrykę (backend, status), nigdy ścieżki plików.
+
+Sinki:
+- JsonlSink: każde zdarzenie jako linia JSON + podsumowanie przy flush (analiza offline),
+- PrometheusTextfileSink: plik .prom dla node_exporter (textfile collector), nadpisywany przy flush,
+- MemorySink: zdarzenia i podsumowania w pamięci (testy, notebook).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from typing import Iterable
+
+
+# granice kubełków histogramu [s] (Prometheus); percentyle liczone z próbki wartości
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RESERVOIR_SIZE = 4096
+
+_Key = tuple  # (name, ((label, value), ...))
+
+
+def _key(name: str, labels: dict) -> _Key:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, int(round(q * (len(sorted_vals) - 1)))))
+    return sorted_vals[i]
+
+
+class _Histogram:
+    """Liczba, suma, max, kubełki i próbka (reservoir sampling) wartości do percentyli."""
+
+    __slots__ = ("count", "sum", "max", "buckets", "sample", "_rng")
+
+    def __init__(self, n_buckets: int):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * n_buckets
+        self.sample: list[float] = []
+        self._rng = random.Random(0)
+
+    def add(self, value: float, bounds: tuple[float, ...]) -> None:
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        for i, b in enumerate(bounds):
+            if value <= b:
+                self.buckets[i] += 1
+                break
+        if len(self.sample) < RESERVOIR_SIZE:
+            self.sample.append(value)
+        else:
+            j = self._rng.randrange(self.count)
+            if j < RESERVOIR_SIZE:
+                self.sample[j] = value
+
+    def summary(self) -> dict:
+        vals = sorted(self.sample)
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": _percentile(vals, 0.50),
+            "p95": _percentile(vals, 0.95),
+            "max": self.max,
+        }
+
+
+class _Timer:
+    """Context manager mierzący czas bloku; wyjątek => licznik <name>.errors (z tymi samymi etykietami)."""
+
+    __slots__ = ("_m", "_name", "_labels", "_t0", "elapsed")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self._m = metrics
+        self._name = name
+        self._labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.elapsed = time.perf_counter() - self._t0
+        self._m.observe(self._name, self.elapsed, kind="timer", **self._labels)
+        if exc_type is not None:
+            self._m.inc(self._name + ".errors", **self._labels)
+        return False
+
+
+class NullMetrics:
+    """Metryki wyłączone: wszystkie hooki są no-op."""
+
+    enabled = False
+    _NULL_TIMER = nullcontext()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, kind: str = "value", **labels) -> None:
+        pass
+
+    def timer(self, name: str, **labels):
+        return self._NULL_TIMER
+
+    def snapshot(self) -> dict:
+        return {"counters": [], "histograms": []}
+
+    def format_summary(self) -> str:
+        return ""
+
+    def print_summary(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class Metrics:
+    """
+    Rejestr metryk (bezpieczny wątkowo – OCR wysyła żądania z puli wątków).
+
+    sinks — odbiorcy zdarzeń i podsumowań (JsonlSink / PrometheusTextfileSink / MemorySink),
+    buckets — granice kubełków histogramów [s].
+    """
+
+    enabled = True
+
+    def __init__(self, sinks: Iterable = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS, run_id: str | None = None):
+        self.sinks = list(sinks)
+        self.buckets = tuple(sorted(buckets))
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.counters: dict[_Key, float] = {}
+        self.histograms: dict[_Key, _Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _emit(self, kind: str, name: str, value: float, labels: dict) -> None:
+        if not self.sinks:
+            return
+        event = {"ts": time.time(), "run": self.run_id, "kind": kind, "name": name, "value": value, "labels": labels}
+        for s in self.sinks:
+            s.event(event)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        k = _key(name, labels)
+        with self._lock:
+            self.counters[k] = self.counters.get(k, 0) + value
+            self._emit("counter", name, value, labels)
+
+    def observe(self, name: str, value: float, kind: str = "value", **labels) -> None:
+        k = _key(name, labels)
+        with self._lock:
+            h = self.histograms.get(k)
+            if h is None:
+                h = self.histograms[k] = _Histogram(len(self.buckets))
+            h.add(float(value), self.buckets)
+            self._emit(kind, name, float(value), labels)
+
+    def timer(self, name: str, **labels) -> _Timer:
+        return _Timer(self, name, labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [
+                {"name": n, "labels": dict(lb), "value": v} for (n, lb), v in sorted(self.counters.items())
+            ]
+            histograms = [
+                {
+                    "name": n,
+                    "labels": dict(lb),
+                    **h.summary(),
+                    "buckets": list(zip(self.buckets, _cumulative(h.buckets))),
+                    "errors": self.counters.get((n + ".errors", lb), 0),
+                }
+                for (n, lb), h in sorted(self.histograms.items())
+            ]
+        return {
+            "run": self.run_id,
+            "started": self.started,
+            "elapsed_s": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def format_summary(self) -> str:
+        """Tabela: czasy etapów (n, suma, średnia, p50, p95, max, błędy) i liczniki."""
+        snap = self.snapshot()
+        lines = []
+        if snap["histograms"]:
+            head = f"{'etap':<34} {'n':>8} {'suma [s]':>10} {'śr [ms]':>9} {'p50 [ms]':>9} {'p95 [ms]':>9} {'max [ms]':>9} {'błędy':>6}"
+            lines += [head, "-" * len(head)]
+            for h in snap["histograms"]:
+                lines.append(
+                    f"{_label(h['name'], h['labels']):<34} {h['count']:>8} {h['sum']:>10.3f} "
+                    f"{1000 * h['mean']:>9.1f} {1000 * h['p50']:>9.1f} {1000 * h['p95']:>9.1f} "
+                    f"{1000 * h['max']:>9.1f} {int(h['errors']):>6}"
+                )
+        counters = [c for c in snap["counters"] if not c["name"].endswith(".errors")]
+        if counters:
+            lines.append("")
+            for c in counters:
+                v = c["value"]
+                lines.append(f"{_label(c['name'], c['labels']):<34} {int(v) if float(v).is_integer() else v:>8}")
+        return "\n".join(lines)
+
+    def print_summary(self) -> None:
+        text = self.format_summary()
+        if text:
+            print(f"[INFO] Metryki (run {self.run_id}):")
+            print(text)
+
+    def flush(self) -> None:
+        """Przekazuje podsumowanie do sinków (JSONL: rekord summary, Prometheus: nowy plik .prom)."""
+        snap = self.snapshot()
+        for s in self.sinks:
+            s.flush(snap)
+
+
+def _cumulative(counts: list[int]) -> list[int]:
+    out, acc = [], 0
+    for c in counts:
+        acc += c
+        out.append(acc)
+    return out
+
+
+def _label(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels.items()) + "}"
+
+
+# --- sinki ---
+
+
+class MemorySink:
+    """Zdarzenia i podsumowania w pamięci (testy, podgląd w notebooku)."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.snapshots: list[dict] = []
+
+    def event(self, event: dict) -> None:
+        self.events.append(event)
+
+    def flush(self, snapshot: dict) -> None:
+        self.snapshots.append(snapshot)
+
+
+class JsonlSink:
+    """Zdarzenia dopisywane do pliku JSONL (jedna linia = jedno zdarzenie); przy flush rekord "summary"."""
+
+    def __init__(self, path: str, events: bool = True):
+        self.path = path
+        self.events = events
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+
+    def event(self, event: dict) -> None:
+        if self.events:
+            self._f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def flush(self, snapshot: dict) -> None:
+        self._f.write(json.dumps({"ts": time.time(), "kind": "summary", **snapshot}, ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+_PROM_INVALID = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _prom_name(name: str, prefix: str) -> str:
+    return _PROM_INVALID.sub("_", f"{prefix}_{name}")
+
+
+def _prom_labels(labels: dict, extra: dict | None = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    esc = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in items.items()}
+    return "{" + ",".join(f'{_PROM_INVALID.sub("_", k)}="{v}"' for k, v in esc.items()) + "}"
+
+
+class PrometheusTextfileSink:
+    """
+    Plik w formacie tekstowym Prometheus dla node_exporter --collector.textfile.directory.
+
+    Zapis atomowy (tmp + os.replace) przy każdym flush; zdarzenia pojedyncze są ignorowane.
+    """
+
+    def __init__(self, path: str, prefix: str = "ocr_search"):
+        self.path = path
+        self.prefix = prefix
+
+    def event(self, event: dict) -> None:
+        pass
+
+    def render(self, snapshot: dict) -> str:
+        out: list[str] = []
+        seen: set[str] = set()
+        for c in snapshot["counters"]:
+            n = _prom_name(c["name"], self.prefix) + "_total"
+            if n not in seen:
+                out.append(f"# TYPE {n} counter")
+                seen.add(n)
+            out.append(f"{n}{_prom_labels(c['labels'])} {c['value']}")
+        for h in snapshot["histograms"]:
+            n = _prom_name(h["name"], self.prefix) + "_seconds"
+            if n not in seen:
+                out.append(f"# TYPE {n} histogram")
+                seen.add(n)
+            for le, cnt in h["buckets"]:
+                out.append(f"{n}_bucket{_prom_labels(h['labels'], {'le': le})} {cnt}")
+            out.append(f"{n}_bucket{_prom_labels(h['labels'], {'le': '+Inf'})} {h['count']}")
+            out.append(f"{n}_sum{_prom_labels(h['labels'])} {h['sum']}")
+            out.append(f"{n}_count{_prom_labels(h['labels'])} {h['count']}")
+        return "\n".join(out) + "\n"
+
+    def flush(self, snapshot: dict) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render(snapshot))
+        os.replace(tmp, self.path)
+
+
+# --- bieżący rejestr (globalny dla procesu) ---
+
+_current: Metrics | NullMetrics = NULL_METRICS
+
+
+def get_metrics() -> Metrics | NullMetrics:
+    """Rejestr używany przez hooki w pipeline; NULL_METRICS, jeśli metryki są wyłączone."""
+    return _current
+
+
+def enable(metrics: Metrics | None = None) -> Metrics:
+    """Włącza metryki (domyślnie nowy Metrics bez sinków – tylko podsumowanie) i zwraca rejestr."""
+    global _current
+    _current = metrics if metrics is not None else Metrics()
+    return _current
+
+
+def disable() -> None:
+    global _current
+    _current = NULL_METRICS
+
+
+def timed(name: str, **labels):
+    """Skrót: get_metrics().timer(name, **labels)."""
+    return _current.timer(name, **labels)
@@ -1,7 +1,26 @@
+"""
+WORD CSV/Parquet -> LINE CSV/Parquet (words_to_lines), strumieniowo plik po pliku.
+
+Pamięć nie zależy od rozmiaru wejścia:
+- wejście pogrupowane po file_id (typowy eksport OCR) jest czytane raz, linie obrazu
+  są zapisywane zaraz po wczytaniu jego ostatniego słowa,
+- wejście niepogrupowane przechodzi przez sortowanie zewnętrzne (posortowane porcje
+  w plikach tymczasowych + scalanie); w trybie auto wykrywane w trakcie konwersji
+  (pierwszy powracający file_id), bez osobnego przebiegu sprawdzającego,
+- --workers N: grupy plików liczone w puli procesów (ograniczona liczba grup w locie).
+"""
+
 import csv
 import argparse
-from typing import List, Dict
+import heapq
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional
 
+from src.ocr.bbox import BBOX_COLS, SIZE_COLS
 from src.ocr.postprocess import words_to_lines
 
 LINE_FIELDS = [
@@ -11,11 +30,25 @@ LINE_FIELDS = [
     "gcs_path",
     "page",
     "line_id",
-    "bbox_norm",
+    "x1",
+    "y1",
+    "x2",
+    "y2",
+    "img_w",
+    "img_h",
     "script",
     "source",
 ]
 
+FLOAT_FIELDS = frozenset(BBOX_COLS + SIZE_COLS)
+
+DEFAULT_BATCH_ROWS = 65536
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
 
 def read_words(path: str) -> List[Dict]:
     with open(path, newline="", encoding="utf-8") as f:
@@ -30,17 +63,232 @@ def write_lines(path: str, rows: List[Dict]):
             w.writerow({k: r.get(k) for k in LINE_FIELDS})
 
 
+def iter_words(path: str, batch_rows: int = DEFAULT_BATCH_ROWS) -> Iterator[Dict]:
+    """Strumieniowo zwraca rekordy WORD z CSV albo Parquet (porcjami po batch_rows)."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq  # tylko dla wejścia Parquet
+
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=batch_rows):
+            yield from batch.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+class NotGroupedError(ValueError):
+    """Słowa jednego file_id nie tworzą ciągłego bloku (file_id wraca po innym pliku)."""
+
+
+def iter_file_groups(words: Iterable[Dict]) -> Iterator[List[Dict]]:
+    """Kolejne bloki słów jednego file_id (wejście musi być pogrupowane; pamięć ~ liczba plików)."""
+    seen = set()
+    for fid, grp in groupby(words, key=lambda r: r["file_id"]):
+        if fid in seen:
+            raise NotGroupedError(f"Wejście nie jest pogrupowane po file_id ({fid} wraca). Użyj --input-order any.")
+        seen.add(fid)
+        yield list(grp)
+
+
+def external_sort_words(
+    path: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    tmp_dir: Optional[str] = None,
+) -> Iterator[Dict]:
+    """
+    Sortowanie zewnętrzne po file_id: porcje po chunk_rows sortowane w pamięci i zapisywane
+    do plików tymczasowych, potem scalane (heapq.merge). Kolejność słów w obrębie pliku zachowana.
+    """
+    fieldnames: Optional[List[str]] = None
+    chunk_paths: List[str] = []
+
+    def flush(rows: List[Dict]) -> None:
+        rows.sort(key=lambda r: r["file_id"])  # sort stabilny
+        fd, p = tempfile.mkstemp(suffix=".csv", prefix="words_sort_", dir=tmp_dir)
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fieldnames)
+            w.writeheader()
+            w.writerows(rows)
+        chunk_paths.append(p)
+
+    try:
+        buf: List[Dict] = []
+        for r in iter_words(path):
+            if fieldnames is None:
+                fieldnames = list(r.keys())
+            buf.append(r)
+            if len(buf) >= chunk_rows:
+                flush(buf)
+                buf = []
+        if buf:
+            flush(buf)
+
+        files = [open(p, newline="", encoding="utf-8") for p in chunk_paths]
+        try:
+            # heapq.merge jest stabilny względem kolejności porcji => kolejność w obrębie pliku zachowana
+            yield from heapq.merge(*(csv.DictReader(f) for f in files), key=lambda r: r["file_id"])
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        for p in chunk_paths:
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+def _lines_for_group(args) -> List[Dict]:
+    words, y_threshold = args
+    return words_to_lines(words, y_threshold_px=y_threshold)
+
+
+def iter_lines(
+    groups: Iterable[List[Dict]],
+    y_threshold: float = 20.0,
+    workers: int = 1,
+    max_pending: Optional[int] = None,
+) -> Iterator[List[Dict]]:
+    """Linie per grupa (plik), w kolejności wejścia; workers > 1 => pula procesów z oknem max_pending grup."""
+    if workers <= 1:
+        for g in groups:
+            yield words_to_lines(g, y_threshold_px=y_threshold)
+        return
+
+    max_pending = max_pending or 4 * workers
+    pending: deque = deque()
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for g in groups:
+            pending.append(ex.submit(_lines_for_group, (g, y_threshold)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class LineWriter:
+    """Zapis linii do CSV albo Parquet (po rozszerzeniu), przyrostowo."""
+
+    def __init__(self, path: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+        self.path = path
+        self.batch_rows = batch_rows
+        self.n = 0
+        self._buf: List[Dict] = []
+        self._f = None
+        self._csv = None
+        self._pq = None
+
+    def __enter__(self) -> "LineWriter":
+        if _is_parquet(self.path):
+            import pyarrow as pa  # tylko dla wyjścia Parquet
+            import pyarrow.parquet as pq
+
+            self._schema = pa.schema(
+                [
+                    (k, pa.int64() if k == "line_id" else pa.float32() if k in FLOAT_FIELDS else pa.string())
+                    for k in LINE_FIELDS
+                ]
+            )
+            self._pa = pa
+            self._pq = pq.ParquetWriter(self.path, self._schema)
+        else:
+            self._f = open(self.path, "w", newline="", encoding="utf-8")
+            self._csv = csv.DictWriter(self._f, fieldnames=LINE_FIELDS)
+            self._csv.writeheader()
+        return self
+
+    def write(self, rows: List[Dict]) -> None:
+        self.n += len(rows)
+        if self._csv is not None:
+            for r in rows:
+                self._csv.writerow({k: r.get(k) for k in LINE_FIELDS})
+            return
+        self._buf.extend(rows)
+        if len(self._buf) >= self.batch_rows:
+            self._flush_parquet()
+
+    def _flush_parquet(self) -> None:
+        if not self._buf:
+            return
+        cols = {}
+        for k in LINE_FIELDS:
+            vals = [r.get(k) for r in self._buf]
+            if k in FLOAT_FIELDS:
+                cols[k] = [None if v is None or v == "" else float(v) for v in vals]
+            else:
+                cols[k] = [None if v is None else (int(v) if k == "line_id" else str(v)) for v in vals]
+        self._pq.write_table(self._pa.table(cols, schema=self._schema))
+        self._buf = []
+
+    def __exit__(self, *exc) -> None:
+        if self._pq is not None:
+            self._flush_parquet()
+            self._pq.close()
+        if self._f is not None:
+            self._f.close()
+
+
+def convert(
+    input_path: str,
+    output_path: str,
+    y_threshold: float = 20.0,
+    workers: int = 1,
+    input_order: str = "auto",
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> int:
+    """
+    Strumieniowa konwersja WORD -> LINE. Zwraca liczbę zapisanych linii.
+
+    input_order: "grouped" (wejście pogrupowane po file_id), "any" (sortowanie zewnętrzne),
+                 "auto" (konwersja jak dla "grouped"; przy pierwszym powracającym file_id
+                 wyjście jest zapisywane od nowa przez sortowanie zewnętrzne).
+    Pogrupowane wejście jest więc czytane raz. Przy sortowaniu zewnętrznym pliki w wyjściu
+    są w kolejności file_id.
+    """
+    if input_order not in ("auto", "grouped", "any"):
+        raise ValueError(f"Nieznane input_order: {input_order}")
+
+    def write(words: Iterable[Dict]) -> int:
+        with LineWriter(output_path) as out:
+            for lines in iter_lines(iter_file_groups(words), y_threshold=y_threshold, workers=workers):
+                out.write(lines)
+        return out.n
+
+    if input_order != "any":
+        try:
+            return write(iter_words(input_path))
+        except NotGroupedError:
+            if input_order == "grouped":
+                raise
+            print("[INFO] Wejście nie jest pogrupowane po file_id – konwersja od nowa przez sortowanie zewnętrzne.")
+    return write(external_sort_words(input_path, chunk_rows=chunk_rows))
+
+
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--input", required=True, help="ocr_blocks.csv")
-    p.add_argument("--output", required=True, help="ocr_lines.csv")
+    p.add_argument("--input", required=True, help="ocr_blocks.csv / .parquet")
+    p.add_argument("--output", required=True, help="ocr_lines.csv / .parquet")
     p.add_argument("--y-threshold", type=float, default=20.0)
+    p.add_argument("--workers", type=int, default=1, help="procesy liczące linie (1 = bez puli)")
+    p.add_argument(
+        "--input-order",
+        choices=["auto", "grouped", "any"],
+        default="auto",
+        help="grouped: słowa pogrupowane po file_id; any: sortowanie zewnętrzne; auto: wykryj",
+    )
+    p.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="porcja sortowania zewnętrznego")
     args = p.parse_args()
 
-    words = read_words(args.input)
-    lines = words_to_lines(words, y_threshold_px=args.y_threshold)
-    write_lines(args.output, lines)
-    print(f"[DONE] Wrote {len(lines)} lines to {args.output}")
+    n = convert(
+        args.input,
+        args.output,
+        y_threshold=args.y_threshold,
+        workers=args.workers,
+        input_order=args.input_order,
+        chunk_rows=args.chunk_rows,
+    )
+    print(f"[DONE] Wrote {n} lines to {args.output}")
 
 
 if __name__ == "__main__":
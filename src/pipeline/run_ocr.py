@@ -1,80 +1,446 @@
 """
-Batch runner for OCR.
+Wsadowy OCR dużych folderów GCS: shardy, wiele procesów / maszyn, scalanie wyników.
+
+Katalog zadania (--job-dir; lokalny dysk dla wielu procesów albo współdzielony FS dla wielu maszyn):
+    job.json                          – prefix, liczba shardów i obrazów
+    listing/shard-00007.txt           – gcs_path obrazów shardu (shard = hash file_id, deterministycznie)
+    leases/, done/shard-00007.json    – kolejka shardów (src.pipeline.shard_queue)
+    journals/shard-00007.<worker>.jsonl – wyniki OCR na bieżąco (src.ocr.ocr_journal)
+    out/shard-00007.csv               – linie OCR shardu (kolejność jak w listingu)
+
+Worker bierze shard przez lease, robi OCR tylko plików bez wyniku w dziennikach shardu
+(shard przejęty po martwym workerze nie powtarza opłaconych wywołań), zapisuje out/<shard>.csv i oznacza
+shard jako zakończony. Shard workera, który przestał odnawiać lease, wraca do puli po --lease-ttl s.
+merge skleja out/*.csv w jeden CSV linii (kolumny jak cache run_ocr_cache).
+
+Uruchomienie:
+    python -m src.pipeline.run_ocr plan   --prefix gs://ocr-2026/<zestaw> --job-dir outputs/ocr_jobs/<slug> --shards 64
+    python -m src.pipeline.run_ocr work   --job-dir outputs/ocr_jobs/<slug> --processes 4 --backend batch
+    python -m src.pipeline.run_ocr merge  --job-dir outputs/ocr_jobs/<slug> --output outputs/csv/ocr_lines__<slug>.csv
+    python -m src.pipeline.run_ocr status --job-dir outputs/ocr_jobs/<slug>
+    python -m src.pipeline.run_ocr run    --prefix ... --job-dir ... --output ...   (plan + work + merge)
 """
 
 import argparse
 import csv
+import glob
+import json
+import multiprocessing as mp
+import os
+import shutil
 import sys
-from typing import List, Dict
+import time
+from typing import Dict, Iterable, List, Optional
 
-from src.io.gcs import list_images
-from src.ocr.vision_ocr import run_ocr
+from src.ocr.ocr_journal import OcrJournal, iter_journal
+from src.pipeline.shard_queue import DEFAULT_LEASE_TTL_S, Lease, ShardQueue, shard_name, shard_of
 
 
-CSV_FIELDS = [
+OCR_LINE_FIELDS = [
     "text",
     "file_name",
     "file_id",
     "gcs_path",
-    "page",
-    "block_id",
-    "bbox_norm",
-    "confidence",
-    "script",
+    "line_id",
+    "x1",
+    "y1",
+    "x2",
+    "y2",
+    "img_w",
+    "img_h",
     "source",
 ]
 
+JOB_FILE = "job.json"
+DEFAULT_SHARDS = 64
+OCR_BACKENDS = ("single", "batch")
+
+
+class LeaseLost(RuntimeError):
+    """Shard przejęty przez innego workera w trakcie przetwarzania."""
+
+
+def _listing_path(job_dir: str, shard: int) -> str:
+    return os.path.join(job_dir, "listing", shard_name(shard) + ".txt")
+
+
+def _out_path(job_dir: str, shard: int) -> str:
+    return os.path.join(job_dir, "out", shard_name(shard) + ".csv")
+
+
+def load_job(job_dir: str) -> Dict:
+    path = os.path.join(job_dir, JOB_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Brak zadania OCR w {job_dir} (najpierw: plan)")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_shard_listing(job_dir: str, shard: int) -> List[str]:
+    with open(_listing_path(job_dir, shard), encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def plan_job(job_dir: str, paths: Iterable[str], n_shards: int = DEFAULT_SHARDS, prefix: str = "") -> Dict:
+    """
+    Dzieli listing na n_shards shardów po hashu file_id i zapisuje job.json.
+
+    Istniejące zadanie nie jest planowane od nowa (wyniki shardów odnoszą się do jego listingu).
+    """
+    from src.ocr.ocr_cache import file_id_from_gcs_path
+
+    if os.path.exists(os.path.join(job_dir, JOB_FILE)):
+        job = load_job(job_dir)
+        print(f"[SKIP] Zadanie już zaplanowane: {job_dir} ({job['n_images']} obrazów, {job['n_shards']} shardów)")
+        return job
+
+    n_shards = max(1, int(n_shards))
+    shards: List[List[str]] = [[] for _ in range(n_shards)]
+    for p in sorted(set(paths)):
+        shards[shard_of(file_id_from_gcs_path(p), n_shards)].append(p)
+
+    os.makedirs(os.path.join(job_dir, "listing"), exist_ok=True)
+    for s, items in enumerate(shards):
+        path = _listing_path(job_dir, s)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(p + "\n" for p in items)
+        os.replace(path + ".tmp", path)
+
+    job = {"prefix": prefix, "n_shards": n_shards, "n_images": sum(len(s) for s in shards), "created": time.time()}
+    with open(os.path.join(job_dir, JOB_FILE), "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+    print(f"[DONE] Plan: {job['n_images']} obrazów w {n_shards} shardach -> {job_dir}")
+    return job
+
+
+def _shard_results(paths: List[str], client, backend: str, batch_size: int, max_in_flight: int, max_retries: int):
+    from src.ocr.batch import iter_ocr_results_batched
+    from src.ocr.dispatch import iter_ocr_results
+    from src.ocr.ocr_cache import lines_from_response, ocr_lines_from_gcs
+
+    def single_fn(gs_path: str) -> List[Dict]:
+        return ocr_lines_from_gcs(gs_path, client=client)
+
+    if backend == "batch":
+        return iter_ocr_results_batched(
+            paths,
+            client,
+            lines_from_response,
+            single_fn,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            max_retries=max_retries,
+        )
+    return iter_ocr_results(paths, single_fn, max_in_flight=max_in_flight, max_retries=max_retries)
+
+
+def write_shard_csv(path: str, paths: List[str], rows_by_path: Dict[str, List[Dict]]) -> int:
+    """Linie OCR shardu w kolejności listingu (plik tymczasowy + os.replace); zwraca liczbę linii."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    n = 0
+    with open(path + ".tmp", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=OCR_LINE_FIELDS)
+        w.writeheader()
+        for p in paths:
+            for r in rows_by_path.get(p, ()):
+                w.writerow({k: r.get(k) for k in OCR_LINE_FIELDS})
+                n += 1
+    os.replace(path + ".tmp", path)
+    return n
+
+
+def process_shard(
+    job_dir: str,
+    lease: Lease,
+    get_client,
+    backend: str = "single",
+    batch_size: int = 16,
+    max_in_flight: int = 8,
+    max_retries: int = 5,
+    checkpoint_every: int = 25,
+) -> Dict:
+    """OCR jednego shardu (z wznowieniem z dzienników wszystkich poprzednich właścicieli)."""
+    t0 = time.time()
+    paths = read_shard_listing(job_dir, lease.shard)
+
+    rows_by_path: Dict[str, List[Dict]] = {}
+    for jp in sorted(glob.glob(os.path.join(job_dir, "journals", lease.name + ".*.jsonl"))):
+        for gs_path, rows in iter_journal(jp):
+            rows_by_path[gs_path] = rows
+    todo = [p for p in paths if p not in rows_by_path]
+    resumed = len(paths) - len(todo)
+
+    failed: List[List[str]] = []
+    if todo:
+        owner_tag = lease.owner.replace(":", "_").replace(os.sep, "_")
+        journal_path = os.path.join(job_dir, "journals", f"{lease.name}.{owner_tag}.jsonl")
+        results = _shard_results(todo, get_client(), backend, batch_size, max_in_flight, max_retries)
+        with OcrJournal(journal_path, fsync_every=checkpoint_every) as journal:
+            for gs_path, rows, err in results:
+                if lease.lost:
+                    raise LeaseLost(lease.name)
+                if err is not None:
+                    failed.append([gs_path, str(err)[:300]])
+                    continue
+                journal.append(gs_path, rows)
+                rows_by_path[gs_path] = rows
+
+    if lease.lost:
+        raise LeaseLost(lease.name)
+    n_lines = write_shard_csv(_out_path(job_dir, lease.shard), paths, rows_by_path)
+    return {
+        "shard": lease.name,
+        "files": len(paths),
+        "resumed": resumed,
+        "ocr": len(todo) - len(failed),
+        "failed": failed,
+        "lines": n_lines,
+        "seconds": round(time.time() - t0, 3),
+    }
+
+
+def work(
+    job_dir: str,
+    client=None,
+    backend: str = "single",
+    batch_size: int = 16,
+    max_in_flight: int = 8,
+    max_retries: int = 5,
+    lease_ttl_s: float = DEFAULT_LEASE_TTL_S,
+    wait: bool = True,
+    poll_s: float = 10.0,
+    max_shards: Optional[int] = None,
+) -> Dict:
+    """
+    Pętla workera: bierze kolejne wolne shardy aż wszystkie są zakończone.
+
+    wait=True: gdy wolnych shardów brak, ale inne są w toku – czeka (co poll_s) i przejmuje shardy
+    workerów, których lease wygasł. client — klient Vision (domyślnie ImageAnnotatorClient(), tworzony
+    dopiero przy pierwszym pliku do OCR). max_shards — limit shardów dla tego workera (None = bez limitu).
+    """
+    if backend not in OCR_BACKENDS:
+        raise ValueError(f"Nieznany backend OCR: {backend} (dostępne: {', '.join(OCR_BACKENDS)})")
+    job = load_job(job_dir)
+    queue = ShardQueue(job_dir, job["n_shards"], ttl_s=lease_ttl_s)
+
+    clients = [client]
+
+    def get_client():
+        if clients[0] is None:
+            from google.cloud import vision
+
+            clients[0] = vision.ImageAnnotatorClient()
+        return clients[0]
+
+    stats = {"owner": queue.owner, "shards": 0, "files": 0, "ocr": 0, "failed": 0, "lines": 0, "lost": 0}
+    while max_shards is None or stats["shards"] < max_shards:
+        lease = queue.claim_next()
+        if lease is None:
+            if queue.all_done() or not wait:
+                break
+            time.sleep(poll_s)
+            continue
+
+        lease.start_heartbeat()
+        try:
+            info = process_shard(job_dir, lease, get_client, backend, batch_size, max_in_flight, max_retries)
+        except LeaseLost:
+            stats["lost"] += 1
+            lease.release()
+            continue
+        except BaseException:
+            lease.release()  # shard od razu wraca do puli (dziennik zostaje)
+            raise
+        if not queue.mark_done(lease, info):
+            stats["lost"] += 1
+            continue
+
+        stats["shards"] += 1
+        for k in ("files", "ocr", "lines"):
+            stats[k] += info[k]
+        stats["failed"] += len(info["failed"])
+        print(
+            f"[{lease.name}] {info['files']} plików (OCR {info['ocr']}, z dziennika {info['resumed']}, "
+            f"błędy {len(info['failed'])}) -> {info['lines']} linii w {info['seconds']:.1f} s"
+        )
+
+    print(f"[DONE] Worker {queue.owner}: {stats}")
+    return stats
+
+
+def _work_process(job_dir: str, kwargs: Dict) -> None:
+    work(job_dir, **kwargs)
+
+
+def run_workers(job_dir: str, processes: int = 1, **kwargs) -> None:
+    """processes > 1: osobne procesy (każdy z własnym klientem Vision) – lokalny odpowiednik wielu maszyn."""
+    if processes <= 1:
+        work(job_dir, **kwargs)
+        return
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=_work_process, args=(job_dir, kwargs)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    bad = [p.exitcode for p in procs if p.exitcode]
+    if bad:
+        print(f"[WARN] {len(bad)} z {processes} workerów zakończyło się błędem (kody: {bad}); ich shardy wrócą do puli.")
+
+
+def reopen_failed(job_dir: str) -> int:
+    """Shardy z plikami, których OCR się nie udał, wracają do puli (udane pliki są w dziennikach)."""
+    job = load_job(job_dir)
+    queue = ShardQueue(job_dir, job["n_shards"])
+    n = 0
+    for s in range(queue.n_shards):
+        info = queue.done_info(s)
+        if info and info.get("failed"):
+            queue.reopen(s)
+            n += 1
+    print(f"[INFO] Ponowienie błędów: {n} shardów wraca do puli.")
+    return n
+
+
+def job_status(job_dir: str) -> Dict:
+    job = load_job(job_dir)
+    queue = ShardQueue(job_dir, job["n_shards"])
+    st = {"images": job["n_images"], **queue.status()}
+    infos = [queue.done_info(s) for s in range(queue.n_shards)]
+    st["failed_files"] = sum(len(i.get("failed") or ()) for i in infos if i)
+    st["lines"] = sum(i.get("lines", 0) for i in infos if i)
+    return st
+
+
+def merge_job(job_dir: str, output: str, allow_partial: bool = False) -> Dict:
+    """Skleja out/<shard>.csv (kolejność shardów) w jeden CSV – strumieniowo, plik tymczasowy + os.replace."""
+    job = load_job(job_dir)
+    queue = ShardQueue(job_dir, job["n_shards"])
+    missing = [s for s in range(queue.n_shards) if not queue.is_done(s)]
+    if missing and not allow_partial:
+        raise RuntimeError(f"Niezakończone shardy: {len(missing)} z {queue.n_shards} (np. {shard_name(missing[0])})")
+
+    out_dir = os.path.dirname(output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    failed = 0
+    with open(output + ".tmp", "w", newline="", encoding="utf-8") as out:
+        csv.writer(out).writerow(OCR_LINE_FIELDS)
+        for s in range(queue.n_shards):
+            if s in missing:
+                continue
+            failed += len((queue.done_info(s) or {}).get("failed") or ())
+            with open(_out_path(job_dir, s), newline="", encoding="utf-8") as f:
+                header = f.readline().strip()
+                if header != ",".join(OCR_LINE_FIELDS):
+                    # shard z wcześniejszej wersji (np. bbox_norm zamiast x1..y2) – nie mieszamy schematów
+                    raise RuntimeError(f"{shard_name(s)}: inny schemat kolumn ({header}) – ponów shard albo nowy job.")
+                shutil.copyfileobj(f, out)
+    os.replace(output + ".tmp", output)
+
+    info = {"output": output, "shards": queue.n_shards - len(missing), "missing_shards": len(missing), "failed_files": failed}
+    if failed:
+        print(f"[WARN] {failed} plików bez OCR (błędy) – ponów: work --retry-failed")
+    print(f"[DONE] Scalono: {info}")
+    return info
+
+
+def list_images_for_plan(prefix: str) -> List[str]:
+    from src.ocr.ocr_cache import DEFAULT_IMAGE_EXTS
+    from src.io.gcs import iter_images_meta
+
+    return [m["gcs_path"] for m in iter_images_meta(prefix, exts=DEFAULT_IMAGE_EXTS)]
+
 
 def parse_args(argv=None):
-    parser = argparse.ArgumentParser(
-        description="Run batch OCR on images stored in Google Cloud Storage."
-    )
+    parser = argparse.ArgumentParser(description="Sharded batch OCR for images stored in Google Cloud Storage.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
 
-    parser.add_argument("--bucket", required=True)
-    parser.add_argument("--prefix", default="")
-    parser.add_argument("--output", required=True)
-    parser.add_argument("--ocr-language", default="pl")
-    parser.add_argument("--dry-run", action="store_true")
+    def job_arg(p):
+        p.add_argument("--job-dir", required=True, help="katalog zadania (wspólny dla workerów)")
 
-    return parser.parse_args(argv)
+    def plan_args(p):
+        src = p.add_mutually_exclusive_group(required=True)
+        src.add_argument("--prefix", help="gs://bucket/folder")
+        src.add_argument("--paths-file", help="plik z listą gs://... (jedna ścieżka w linii)")
+        p.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+        p.add_argument("--dry-run", action="store_true", help="tylko listing i podział, bez zapisu")
 
+    def work_args(p):
+        p.add_argument("--processes", type=int, default=1, help="procesy workerów na tej maszynie")
+        p.add_argument("--backend", choices=OCR_BACKENDS, default="single")
+        p.add_argument("--batch-size", type=int, default=16)
+        p.add_argument("--max-in-flight", type=int, default=8, help="równoległe żądania Vision na worker")
+        p.add_argument("--max-retries", type=int, default=5)
+        p.add_argument("--lease-ttl", type=float, default=DEFAULT_LEASE_TTL_S, help="s bez odnowienia => shard wraca do puli")
+        p.add_argument("--no-wait", action="store_true", help="zakończ, gdy brak wolnych shardów (nie czekaj na innych)")
+        p.add_argument("--retry-failed", action="store_true", help="ponów pliki, których OCR się nie udał")
 
-def write_csv(path: str, rows: List[Dict]):
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+    p = sub.add_parser("plan")
+    job_arg(p)
+    plan_args(p)
 
+    p = sub.add_parser("work")
+    job_arg(p)
+    work_args(p)
+
+    p = sub.add_parser("merge")
+    job_arg(p)
+    p.add_argument("--output", required=True)
+    p.add_argument("--partial", action="store_true", help="scal także przy niezakończonych shardach")
+
+    p = sub.add_parser("status")
+    job_arg(p)
+
+    p = sub.add_parser("run")
+    job_arg(p)
+    plan_args(p)
+    work_args(p)
+    p.add_argument("--output", required=True)
+
+    return parser.parse_args(argv)
 
-def main(argv=None):
-    args = parse_args(argv)
 
-    images = list_images(args.bucket, args.prefix)
+def _work_kwargs(args) -> Dict:
+    return {
+        "backend": args.backend,
+        "batch_size": args.batch_size,
+        "max_in_flight": args.max_in_flight,
+        "max_retries": args.max_retries,
+        "lease_ttl_s": args.lease_ttl,
+        "wait": not args.no_wait,
+    }
 
-    print(f"[INFO] Found {len(images)} images under gs://{args.bucket}/{args.prefix}")
 
-    if args.dry_run:
-        for uri in images[:10]:
-            print(f"[DRY-RUN] {uri}")
-        print("[INFO] Dry-run only. Exiting.")
-        return 0
+def main(argv=None):
+    args = parse_args(argv)
 
-    all_rows: List[Dict] = []
+    if args.cmd in ("plan", "run"):
+        if args.prefix:
+            images = list_images_for_plan(args.prefix)
+        else:
+            with open(args.paths_file, encoding="utf-8") as f:
+                images = [line.strip() for line in f if line.strip()]
+        print(f"[INFO] Found {len(images)} images under {args.prefix or args.paths_file}")
+        if args.dry_run:
+            for uri in images[:10]:
+                print(f"[DRY-RUN] {uri}")
+            print("[INFO] Dry-run only. Exiting.")
+            return 0
+        plan_job(args.job_dir, images, n_shards=args.shards, prefix=args.prefix or "")
 
-    for idx, uri in enumerate(images, start=1):
-        print(f"[INFO] OCR {idx}/{len(images)}: {uri}")
-        records = run_ocr(uri, ocr_language_hint=args.ocr_language)
+    if args.cmd in ("work", "run"):
+        if args.retry_failed:
+            reopen_failed(args.job_dir)
+        run_workers(args.job_dir, processes=args.processes, **_work_kwargs(args))
 
-        for rec in records:
-            # Upewnij się, że kolejność/klucze są zgodne z CSV_FIELDS
-            row = {k: rec.get(k) for k in CSV_FIELDS}
-            all_rows.append(row)
+    if args.cmd in ("merge", "run"):
+        merge_job(args.job_dir, args.output, allow_partial=getattr(args, "partial", False))
 
-    write_csv(args.output, all_rows)
-    print(f"[DONE] Wrote {len(all_rows)} rows to {args.output}")
+    if args.cmd == "status":
+        print(job_status(args.job_dir))
     return 0
 
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Kolejka shardów na plikach: deterministyczny podział pracy + lease z terminem ważności.
+
+Katalog kolejki (lokalny dysk dla wielu procesów albo współdzielony FS dla wielu maszyn):
+    leases/shard-00007.lease  – kto przetwarza shard i do kiedy (JSON: owner, host, pid, expires)
+    done/shard-00007.json     – shard zakończony (podsumowanie zapisane przez właściciela lease)
+
+- shard_of(file_id, n): shard z hasha file_id – ten sam plik zawsze trafia do tego samego shardu,
+- claim: lease tworzony przez O_CREAT | O_EXCL (dokładnie jeden worker wygrywa),
+- heartbeat: wątek odnawia lease co ttl/3; worker, który przestał odnawiać (crash, zabity proces,
+  maszyna bez sieci), traci shard po ttl – przejęcie wygasłego lease przez os.rename (jeden zwycięzca),
+- renew sprawdza właściciela: worker, któremu przejęto shard, dowiaduje się o tym (lease.lost) i przerywa;
+  odczyt i zapis przy odnowieniu są jedną operacją (rename + link), więc zatrzymany stary właściciel
+  nie nadpisze lease przejętego w międzyczasie.
+Terminy liczone z zegara systemowego – maszyny powinny mieć zsynchronizowany czas (NTP), ttl >> rozjazd.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+
+DEFAULT_LEASE_TTL_S = 600.0
+LEASES_DIR = "leases"
+DONE_DIR = "done"
+
+
+def shard_of(file_id: str, n_shards: int) -> int:
+    """Shard pliku z hasha file_id (sha1 hex, src.ocr.ocr_cache.file_id_from_gcs_path)."""
+    return int(file_id[:15], 16) % int(n_shards)
+
+
+def shard_name(shard: int) -> str:
+    return f"shard-{int(shard):05d}"
+
+
+def new_owner_id() -> str:
+    """Identyfikator workera: host:pid:losowy sufiks (unikalny także po restarcie z tym samym pid)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _read_json(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json_atomic(path: str, data: dict) -> None:
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _put_back(held: str, path: str) -> None:
+    """Przywraca zabrany plik lease (os.link nie nadpisuje lease utworzonego w międzyczasie)."""
+    try:
+        os.link(held, path)
+    except FileExistsError:
+        pass
+    os.remove(held)
+
+
+class Lease:
+    """Prawo do przetwarzania shardu do `expires`; odnawiane przez start_heartbeat()."""
+
+    def __init__(self, queue: "ShardQueue", shard: int, expires: float):
+        self.queue = queue
+        self.shard = shard
+        self.owner = queue.owner
+        self.path = queue.lease_path(shard)
+        self.expires = expires
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def name(self) -> str:
+        return shard_name(self.shard)
+
+    def _take(self) -> str | None:
+        """
+        Zabiera plik lease (os.rename – jak przy przejęciu) i zwraca jego tymczasową ścieżkę, jeśli lease
+        jest nasz; cudzy wraca na miejsce. Między sprawdzeniem właściciela a zapisem nikt inny nie
+        widzi tego pliku, więc nie nadpiszemy lease przejętego w tym czasie.
+        """
+        held = f"{self.path}.held-{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(self.path, held)
+        except FileNotFoundError:
+            return None
+        info = _read_json(held)
+        if info is None or info.get("owner") != self.owner:
+            _put_back(held, self.path)
+            return None
+        return held
+
+    def renew(self) -> bool:
+        """
+        Przedłuża lease o ttl; False (i lost=True), jeśli shard przejął inny worker.
+
+        Worker, który w ułamku sekundy bez pliku lease utworzy własny (O_EXCL), wygrywa – os.link
+        naszej nowej treści się wtedy nie uda, a my tracimy shard (w najgorszym razie powtórzona praca).
+        """
+        held = self._take()
+        if held is None:
+            self.lost = True
+            return False
+        expires = time.time() + self.queue.ttl_s
+        with open(held, "w", encoding="utf-8") as f:
+            json.dump(self.queue._lease_info(expires), f, ensure_ascii=False)
+        try:
+            os.link(held, self.path)
+        except FileExistsError:
+            self.lost = True
+            return False
+        finally:
+            os.remove(held)
+        self.expires = expires
+        return True
+
+    def start_heartbeat(self) -> "Lease":
+        def beat() -> None:
+            while not self._stop.wait(self.queue.ttl_s / 3):
+                if not self.renew():
+                    print(f"[WARN] {self.name}: lease przejęty przez innego workera – przerywam shard.")
+                    return
+
+        self._thread = threading.Thread(target=beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def release(self) -> None:
+        """Zatrzymuje heartbeat i usuwa lease (jeśli nadal nasz)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        held = self._take()
+        if held is not None:
+            os.remove(held)
+
+
+class ShardQueue:
+    """
+    root — katalog kolejki, n_shards — liczba shardów,
+    ttl_s — ważność lease bez odnowienia, owner — identyfikator workera (domyślnie new_owner_id()).
+    """
+
+    def __init__(self, root: str, n_shards: int, ttl_s: float = DEFAULT_LEASE_TTL_S, owner: str | None = None):
+        self.root = root
+        self.n_shards = int(n_shards)
+        self.ttl_s = float(ttl_s)
+        self.owner = owner or new_owner_id()
+        os.makedirs(os.path.join(root, LEASES_DIR), exist_ok=True)
+        os.makedirs(os.path.join(root, DONE_DIR), exist_ok=True)
+
+    def lease_path(self, shard: int) -> str:
+        return os.path.join(self.root, LEASES_DIR, shard_name(shard) + ".lease")
+
+    def done_path(self, shard: int) -> str:
+        return os.path.join(self.root, DONE_DIR, shard_name(shard) + ".json")
+
+    def is_done(self, shard: int) -> bool:
+        return os.path.exists(self.done_path(shard))
+
+    def done_info(self, shard: int) -> dict | None:
+        return _read_json(self.done_path(shard))
+
+    def _lease_info(self, expires: float) -> dict:
+        return {"owner": self.owner, "host": socket.gethostname(), "pid": os.getpid(), "expires": expires}
+
+    def _take_over_expired(self, shard: int, info: dict) -> bool:
+        """Usuwa wygasły lease; przy wyścigu kilku workerów rename udaje się dokładnie jednemu."""
+        path = self.lease_path(shard)
+        stale = f"{path}.stale-{uuid.uuid4().hex[:8]}"
+        try:
+            os.rename(path, stale)
+        except FileNotFoundError:
+            return False
+        renewed = _read_json(stale)
+        if renewed is not None and renewed.get("expires", 0) > time.time():
+            _put_back(stale, path)  # właściciel zdążył odnowić między odczytem a rename – oddajemy mu lease
+            return False
+        os.remove(stale)
+        print(f"[INFO] {shard_name(shard)}: przejmuję wygasły lease {info.get('owner')}")
+        return True
+
+    def try_claim(self, shard: int) -> Lease | None:
+        """Lease shardu albo None (zakończony / przetwarzany przez żywego workera / przegrany wyścig)."""
+        if self.is_done(shard):
+            return None
+        path = self.lease_path(shard)
+        info = _read_json(path)
+        if os.path.exists(path):
+            if info is not None:
+                expired = info.get("expires", 0) <= time.time()
+            else:  # właśnie zapisywany albo uszkodzony (crash w trakcie zapisu) – decyduje wiek pliku
+                try:
+                    expired = time.time() - os.path.getmtime(path) > self.ttl_s
+                except FileNotFoundError:
+                    expired = False
+            if not expired or not self._take_over_expired(shard, info or {}):
+                return None
+
+        expires = time.time() + self.ttl_s
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._lease_info(expires), f, ensure_ascii=False)
+
+        lease = Lease(self, shard, expires)
+        if self.is_done(shard):  # zakończony między sprawdzeniem a utworzeniem lease
+            lease.release()
+            return None
+        return lease
+
+    def claim_next(self) -> Lease | None:
+        """Pierwszy wolny shard; workerzy zaczynają od różnych miejsc (mniej kolizji przy starcie)."""
+        start = int(uuid.uuid5(uuid.NAMESPACE_OID, self.owner).hex[:8], 16) % max(1, self.n_shards)
+        for k in range(self.n_shards):
+            lease = self.try_claim((start + k) % self.n_shards)
+            if lease is not None:
+                return lease
+        return None
+
+    def mark_done(self, lease: Lease, info: dict) -> bool:
+        """Zapisuje podsumowanie shardu i zwalnia lease; False, jeśli lease został w międzyczasie przejęty."""
+        if lease.lost or not lease.renew():
+            lease.release()
+            return False
+        _write_json_atomic(self.done_path(lease.shard), {**info, "owner": self.owner, "finished": time.time()})
+        lease.release()
+        return True
+
+    def reopen(self, shard: int) -> None:
+        """Shard wraca do puli (np. ponowienie plików, które się nie udały)."""
+        try:
+            os.remove(self.done_path(shard))
+        except FileNotFoundError:
+            pass
+
+    def status(self) -> dict:
+        now = time.time()
+        done = leased = expired = 0
+        for s in range(self.n_shards):
+            if self.is_done(s):
+                done += 1
+                continue
+            info = _read_json(self.lease_path(s))
+            if info is None:
+                continue
+            if info.get("expires", 0) > now:
+                leased += 1
+            else:
+                expired += 1
+        return {
+            "shards": self.n_shards,
+            "done": done,
+            "leased": leased,
+            "expired": expired,
+            "pending": self.n_shards - done - leased,
+        }
+
+    def all_done(self) -> bool:
+        return all(self.is_done(s) for s in range(self.n_shards))
@@ -0,0 +1,90 @@
+"""
+Wyszukiwanie z linii poleceń w gotowych indeksach (bez OCR i bez budowy indeksów).
+
+Tekst (indeks pełnotekstowy src.search.text_index; bez google-cloud i bez torch):
+    python -m src.search.cli --text-index outputs/csv/ocr_lines__<slug>__text_index "apteka"
+    python -m src.search.cli --text-index ... --fuzzy "aptieka"
+
+Obraz / opis (magazyn CLIP; embedding zapytania liczy współdzielony serwer modelu src.clip.model_server,
+więc wielokrotne wywołania nie ładują wag od nowa):
+    python -m src.search.cli --clip-store outputs/clip_index/clip_global__<slug> --image ref.jpg
+    python -m src.search.cli --clip-store ... "szyld apteki"
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+import pandas as pd
+
+
+def search_text(index_dir: str, query: str, k: int = 20, fuzzy: bool = False) -> pd.DataFrame:
+    from src.search.text_index import TextIndex
+
+    index = TextIndex(index_dir)
+    if fuzzy:
+        from src.search.fuzzy_index import FuzzyIndex
+
+        return FuzzyIndex(index).search(query, limit=k)
+    return index.search(query, limit=k)
+
+
+def search_clip(
+    store_dir: str,
+    query: str | None = None,
+    image_path: str | None = None,
+    k: int = 20,
+    backend: str = "auto",
+    mode: str = "auto",
+) -> pd.DataFrame:
+    from src.clip.ann_index import open_vector_index
+    from src.clip.embedding_store import EmbeddingStore
+    from src.clip.model_server import connect_clip
+
+    store = EmbeddingStore(store_dir)
+    model_name, _, pretrained = (store.model_id or "").partition("::")
+    clip = connect_clip(model_name, pretrained, mode=mode) if pretrained else connect_clip(mode=mode)
+    if image_path:
+        with open(image_path, "rb") as f:
+            q = clip.embed_image(f.read())
+    else:
+        q = clip.embed_text(query or "")
+
+    rows, sims = open_vector_index(store, backend=backend).search(q, k=k)
+    out = store.meta(["gcs_path", "file_name"]).iloc[rows].reset_index(drop=True)
+    out["score"] = sims
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("query", nargs="?", default=None)
+    where = p.add_mutually_exclusive_group(required=True)
+    where.add_argument("--text-index", help="katalog indeksu pełnotekstowego (…__text_index)")
+    where.add_argument("--clip-store", help="katalog magazynu embeddingów CLIP (clip_global__<slug>)")
+    p.add_argument("--image", default=None, help="obraz referencyjny (tylko z --clip-store)")
+    p.add_argument("--fuzzy", action="store_true", help="wyszukiwanie przybliżone (literówki OCR)")
+    p.add_argument("--k", type=int, default=20)
+    p.add_argument("--backend", default="auto", help="exact / ivfpq / auto")
+    p.add_argument("--model-mode", default="auto", help="server / local / auto (src.clip.model_server)")
+    p.add_argument("--csv", action="store_true", help="wynik jako CSV na stdout")
+    args = p.parse_args()
+
+    if args.text_index:
+        if not args.query:
+            p.error("podaj zapytanie tekstowe")
+        df = search_text(args.text_index, args.query, k=args.k, fuzzy=args.fuzzy)
+    else:
+        if not args.query and not args.image:
+            p.error("podaj zapytanie tekstowe albo --image")
+        df = search_clip(args.clip_store, args.query, args.image, k=args.k, backend=args.backend, mode=args.model_mode)
+
+    if args.csv:
+        df.to_csv(sys.stdout, index=False)
+    else:
+        print(df.to_string(index=False) if len(df) else "[INFO] Brak wyników.")
+
+
+if __name__ == "__main__":
+    main()
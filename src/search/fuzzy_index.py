@@ -0,0 +1,227 @@
+"""
+Wyszukiwanie odporne na błędy OCR ("Apteka" znajduje "Aptcka", "APTEK A").
+
+FuzzyIndex działa nad dokumentami TextIndex (te same linie, aktualizacje i zapis):
+- indeks trigramów znakowych znormalizowanego tekstu linii (normalize_text),
+  budowany w pamięci i dobudowywany przyrostowo dla nowych linii,
+- filtr kandydatów (lemat q-gramowy): przy <= k błędach fragment zawiera co najmniej
+  (liczba różnych trigramów zapytania - 3k) z nich,
+- weryfikacja kandydatów: odległość Levenshteina zapytania od najlepszego fragmentu linii
+  (algorytm bitowy Myersa, O(długość linii) na kandydata), bez liczenia dla wszystkich linii,
+- wynik: fragment oryginalnego tekstu + bbox linii i przybliżony bbox fragmentu
+  (interpolacja w poziomie wzdłuż bboxa linii).
+"""
+
+from __future__ import annotations
+
+import bisect
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from src.search.text_index import DOC_COLS, TextIndex, normalize_text
+
+
+MIN_QUERY_LEN = 3
+DEFAULT_MAX_CANDIDATES = 20000
+RESULT_COLS = [
+    "file_name",
+    "file_id",
+    "line_id",
+    "bbox_norm",
+    "text",
+    "fragment",
+    "bbox_fragment",
+    "distance",
+]
+
+
+def default_max_dist(query_len: int) -> int:
+    """Domyślny limit błędów: 0 dla bardzo krótkich zapytań, 1 do 7 znaków, potem 2."""
+    if query_len < 4:
+        return 0
+    return 1 if query_len < 8 else 2
+
+
+def trigrams(s: str) -> set[str]:
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+def _pattern_masks(q: str) -> dict[str, int]:
+    peq: dict[str, int] = {}
+    for i, ch in enumerate(q):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    return peq
+
+
+def best_match_end(peq: dict[str, int], m: int, text: str) -> tuple[int, int]:
+    """
+    (najmniejsza odległość, koniec fragmentu) dla wzorca długości m w dowolnym miejscu text.
+
+    Bitowy algorytm Myersa (wariant wyszukiwania: początek fragmentu dowolny).
+    """
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best, best_end = m, 0
+    for j, c in enumerate(text):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best, best_end = score, j + 1
+    return best, best_end
+
+
+def match_start(q: str, text: str, end: int, dist: int) -> int:
+    """Początek fragmentu text[start:end] o odległości dist od q (DP tylko na oknie przed end)."""
+    lo = max(0, end - len(q) - dist)
+    window = text[lo:end]
+    m = len(q)
+    # kolumny DP po znakach okna; start[i] = początek fragmentu dla komórki (i, j)
+    prev = list(range(m + 1))
+    prev_start = [0] * (m + 1)
+    for j, c in enumerate(window, start=1):
+        cur = [0] * (m + 1)
+        cur_start = [j] * (m + 1)
+        for i in range(1, m + 1):
+            diag = prev[i - 1] + (q[i - 1] != c)
+            up = cur[i - 1] + 1
+            left = prev[i] + 1
+            if diag <= up and diag <= left:
+                cur[i], cur_start[i] = diag, prev_start[i - 1]
+            elif up <= left:
+                cur[i], cur_start[i] = up, cur_start[i - 1]
+            else:
+                cur[i], cur_start[i] = left, prev_start[i]
+        prev, prev_start = cur, cur_start
+    return lo + prev_start[m] if prev[m] <= dist else max(0, end - m)
+
+
+def _char_map(text: str) -> list[int] | None:
+    """Pozycja w tekście znormalizowanym -> pozycja w oryginale (None, gdy długości się nie zgadzają)."""
+    idx: list[int] = []
+    for i, ch in enumerate(text):
+        idx.extend([i] * len(normalize_text(ch)))
+    return idx if len(idx) == len(normalize_text(text)) else None
+
+
+def fragment_bbox(bbox_norm: str, start: int, end: int, n: int) -> str:
+    """Przybliżony bbox fragmentu: część bboxa linii proporcjonalna do pozycji znaków."""
+    try:
+        x1, y1, x2, y2 = (float(v) for v in str(bbox_norm).split(","))
+    except ValueError:
+        return ""
+    if n <= 0:
+        return bbox_norm
+    fx1 = x1 + (x2 - x1) * start / n
+    fx2 = x1 + (x2 - x1) * end / n
+    return ",".join(f"{v:.6g}" for v in (fx1, y1, fx2, y2))
+
+
+class FuzzyIndex:
+    """
+    Indeks trigramów nad liniami TextIndex.
+
+    Nowe linie z TextIndex są dobudowywane przy każdym search(); po compact() (nowe doc id)
+    indeks trigramów budowany jest od nowa.
+    """
+
+    def __init__(self, text_index: TextIndex):
+        self.text_index = text_index
+        self._epoch = -1
+        self._reset()
+
+    def _reset(self) -> None:
+        self._grams: dict[str, array] = {}
+        self._norm: list[str] = []
+
+    def refresh(self) -> int:
+        """Dobudowuje trigramy dla linii dodanych do TextIndex od ostatniego wywołania."""
+        ti = self.text_index
+        if self._epoch != ti.epoch:
+            self._reset()
+            self._epoch = ti.epoch
+        texts = ti.docs["text"]
+        start = len(self._norm)
+        for d in range(start, len(texts)):
+            s = normalize_text(texts[d])
+            self._norm.append(s)
+            for g in trigrams(s):
+                a = self._grams.get(g)
+                if a is None:
+                    a = self._grams[g] = array("i")
+                a.append(d)
+        return len(texts) - start
+
+    def candidates(self, q: str, max_dist: int, max_candidates: int) -> tuple[np.ndarray, np.ndarray]:
+        """Linie z co najmniej (trigramy zapytania - 3 * max_dist) wspólnymi trigramami, najlepsze pierwsze."""
+        grams = trigrams(q)
+        lists = [np.frombuffer(self._grams[g], dtype=np.int32) for g in grams if g in self._grams]
+        if not lists:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        docs, counts = np.unique(np.concatenate(lists), return_counts=True)
+        need = max(1, len(grams) - 3 * max_dist)
+        alive = np.frombuffer(self.text_index.alive, dtype=np.uint8)[docs].astype(bool)
+        keep = (counts >= need) & alive
+        docs, counts = docs[keep], counts[keep]
+        order = np.lexsort((docs, -counts))[:max_candidates]
+        return docs[order], counts[order]
+
+    def search(
+        self,
+        query: str,
+        max_dist: int | None = None,
+        limit: int | None = 50,
+        max_candidates: int = DEFAULT_MAX_CANDIDATES,
+    ) -> pd.DataFrame:
+        """
+        Linie zawierające fragment w odległości edycyjnej <= max_dist od zapytania.
+
+        max_dist=None => default_max_dist(len(query)). Zapytania krótsze niż 3 znaki => brak wyników.
+        Kolejność: odległość rosnąco, potem liczba wspólnych trigramów.
+        """
+        self.refresh()
+        q = normalize_text(query or "").strip()
+        if len(q) < MIN_QUERY_LEN:
+            return pd.DataFrame(columns=RESULT_COLS)
+        k = default_max_dist(len(q)) if max_dist is None else int(max_dist)
+
+        docs, counts = self.candidates(q, k, max_candidates)
+        peq, m, n_grams = _pattern_masks(q), len(q), len(trigrams(q))
+        hits: list[tuple[int, int, int, int]] = []  # (dist, -count, doc, end), posortowane
+        for d, cnt in zip(docs.tolist(), counts.tolist()):
+            # kandydaci malejąco po liczbie trigramów: dalsze linie mają odległość >= (brakujące trigramy) / 3
+            if limit is not None and len(hits) >= limit and hits[-1][0] <= -(-(n_grams - cnt) // 3):
+                break
+            dist, end = best_match_end(peq, m, self._norm[d])
+            if dist <= k:
+                bisect.insort(hits, (dist, -cnt, d, end))
+                if limit is not None and len(hits) > limit:
+                    hits.pop()
+
+        docs_tbl = self.text_index.docs
+        rows = []
+        for dist, _, d, end in hits:
+            norm = self._norm[d]
+            start = match_start(q, norm, end, dist)
+            text = docs_tbl["text"][d]
+            cmap = _char_map(text)
+            fragment = text[cmap[start]:cmap[end - 1] + 1] if cmap and end > start else norm[start:end]
+            row = {c: docs_tbl[c][d] for c in DOC_COLS}
+            row["fragment"] = fragment
+            row["bbox_fragment"] = fragment_bbox(row["bbox_norm"], start, end, len(norm))
+            row["distance"] = dist
+            rows.append(row)
+        return pd.DataFrame(rows, columns=RESULT_COLS)
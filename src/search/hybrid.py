@@ -0,0 +1,270 @@
+"""
+Wyszukiwanie hybrydowe: tekst z OCR + podobieństwo wizualne CLIP, wyniki per obraz.
+
+HybridSearcher.search(text=..., image=...) uruchamia etapy równolegle (wątki; NumPy/torch zwalniają GIL):
+- "ocr"        – TextIndex (BM25, AND, prefiks ostatniego słowa),
+- "fuzzy"      – FuzzyIndex (odporny na błędy OCR), opcjonalnie,
+- "clip_text"  – zapytanie tekstowe -> embedding tekstu CLIP -> indeks wektorowy GLOBAL (tekst -> obraz),
+- "clip_image" – obraz referencyjny -> indeks wektorowy GLOBAL,
+- "patch"      – obraz referencyjny -> PatchSearcher (fragmenty; bbox najlepszego fragmentu).
+
+Każdy etap daje ranking obrazów (najlepsza linia / fragment na obraz). Fuzja:
+- "rrf": suma w_s / (rrf_k + pozycja_s) (odporna na różne skale wyników),
+- "weighted": suma w_s × wynik_s znormalizowany min-max w obrębie etapu.
+
+Obrazy łączone po file_id (sha1 pełnej ścieżki gs://, jak w run_ocr_cache); gcs_path trafień samego OCR
+uzupełniany z metadanych magazynu GLOBAL. Czasy etapów (ms) w last_timings; budżety => ostrzeżenie.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Mapping
+
+import numpy as np
+import pandas as pd
+
+from src.search.fuzzy_index import FuzzyIndex
+from src.search.text_index import TextIndex
+
+
+STAGES = ("ocr", "fuzzy", "clip_text", "clip_image", "patch")
+DEFAULT_WEIGHTS = {"ocr": 1.0, "fuzzy": 0.5, "clip_text": 0.6, "clip_image": 1.0, "patch": 1.0}
+RRF_K = 60
+STAGE_K = 100  # obrazów na etap przed fuzją
+LINES_PER_IMAGE = 5  # linie OCR pobierane na 1 obraz etapu (kilka trafień w jednym obrazie)
+RESULT_COLS = ["file_id", "gcs_path", "file_name", "score", "match", "text", "fragment", "line_id", "bbox_norm"]
+
+
+def file_id_for(gcs_path: str) -> str:
+    """Jak src.ocr.ocr_cache.file_id_from_gcs_path (bez importu google.cloud w kernelu CLIP)."""
+    return hashlib.sha1(gcs_path.encode("utf-8")).hexdigest()
+
+
+def fuse(
+    rankings: Mapping[str, pd.DataFrame],
+    method: str = "rrf",
+    weights: Mapping[str, float] | None = None,
+    rrf_k: int = RRF_K,
+) -> pd.DataFrame:
+    """
+    Łączy rankingi etapów (każdy: file_id + score, malejąco, jeden wiersz na obraz).
+
+    Zwraca file_id, score (fuzja) i rank_<etap> (1 = najlepszy; NaN = brak w etapie), malejąco po score.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    if method not in ("rrf", "weighted"):
+        raise ValueError(f"Nieznana metoda fuzji: {method}")
+    # rankingi są krótkie (STAGE_K wierszy) – słowniki zamiast groupby/pivot (narzut pandas > praca)
+    score: dict[str, float] = {}
+    ranks: dict[str, dict[str, int]] = {}
+    for stage, df in rankings.items():
+        if df is None or len(df) == 0:
+            continue
+        w = float(weights.get(stage, 1.0))
+        ids = df["file_id"].tolist()
+        if method == "rrf":
+            contrib = [w / (rrf_k + r) for r in range(1, len(ids) + 1)]
+        else:
+            s = df["score"].to_numpy(dtype=np.float64)
+            span = s.max() - s.min()
+            contrib = (w * ((s - s.min()) / span if span > 0 else np.ones_like(s))).tolist()
+        col = ranks.setdefault(f"rank_{stage}", {})
+        for r, (f, c) in enumerate(zip(ids, contrib), start=1):
+            score[f] = score.get(f, 0.0) + c
+            col[f] = r
+
+    order = sorted(score, key=lambda f: (-score[f], f))
+    out = pd.DataFrame({"file_id": order, "score": [score[f] for f in order]})
+    for c, col in ranks.items():
+        out[c] = [col.get(f, np.nan) for f in order]
+    return out
+
+
+class HybridSearcher:
+    """
+    text_index / fuzzy — indeksy OCR (src.search),
+    vector_index — indeks nad magazynem GLOBAL (src.clip.ann_index.open_vector_index),
+    patch_searcher — src.clip.patch_index.PatchSearcher (opcjonalnie),
+    embed_text(str) / embed_image(PIL.Image) -> wektor CLIP (potrzebne dla clip_text / clip_image / patch),
+    budgets_ms — {etap: ms}; przekroczenie => [WARN] i wpis w last_timings["over_budget"].
+    """
+
+    def __init__(
+        self,
+        text_index: TextIndex | None = None,
+        vector_index=None,
+        patch_searcher=None,
+        fuzzy: FuzzyIndex | None = None,
+        embed_text: Callable[[str], np.ndarray] | None = None,
+        embed_image: Callable[[object], np.ndarray] | None = None,
+        budgets_ms: Mapping[str, float] | None = None,
+        max_workers: int = 4,
+    ):
+        self.text_index = text_index
+        self.vector_index = vector_index
+        self.patch_searcher = patch_searcher
+        self.fuzzy = fuzzy
+        self.embed_text = embed_text
+        self.embed_image = embed_image
+        self.budgets_ms = dict(budgets_ms or {})
+        self.last_timings: dict = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hybrid")
+        self._paths_key = None
+        self._paths: dict[str, str] = {}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+    # --- etapy: DataFrame file_id, file_name, gcs_path, score, (text, fragment, line_id, bbox_norm) ---
+
+    def _stage_ocr(self, text: str, k: int) -> pd.DataFrame:
+        hits = self.text_index.search(text, limit=k * LINES_PER_IMAGE)
+        hits = hits[~hits["file_id"].duplicated()].head(k)
+        return hits.assign(fragment=hits["text"], gcs_path=None, match="ocr")
+
+    def _stage_fuzzy(self, text: str, k: int) -> pd.DataFrame:
+        hits = self.fuzzy.search(text, limit=k * LINES_PER_IMAGE)
+        hits = hits[~hits["file_id"].duplicated()].head(k)
+        out = hits.drop(columns=["bbox_norm"]).rename(columns={"bbox_fragment": "bbox_norm"})
+        return out.assign(score=-out["distance"].astype(float), gcs_path=None, match="fuzzy")
+
+    def _vector_hits(self, q: np.ndarray, k: int) -> pd.DataFrame:
+        store = self.vector_index.store
+        rows, sims = self.vector_index.search(q, k=k)
+        meta = store.meta(["gcs_path", "file_name"]).iloc[rows]
+        paths = meta["gcs_path"].astype(str).tolist()
+        return pd.DataFrame(
+            {
+                "file_id": [file_id_for(p) for p in paths],
+                "gcs_path": paths,
+                "file_name": meta["file_name"].to_numpy(),
+                "score": sims,
+            }
+        )
+
+    def _stage_clip_text(self, text: str, k: int, timings: dict) -> pd.DataFrame:
+        t = time.perf_counter()
+        q = self.embed_text(text)
+        timings["encode_text"] = (time.perf_counter() - t) * 1000
+        return self._vector_hits(q, k).assign(match="clip_text")
+
+    def _stage_clip_image(self, q: np.ndarray, k: int) -> pd.DataFrame:
+        return self._vector_hits(q, k).assign(match="clip_image")
+
+    def _stage_patch(self, q: np.ndarray, k: int) -> pd.DataFrame:
+        hits = self.patch_searcher.search(q, k=k)
+        hits = hits.assign(file_id=[file_id_for(p) for p in hits["gcs_path"]], match="patch")
+        return hits.drop(columns=["source"])
+
+    def _timed(self, name: str, fn, timings: dict, *args):
+        t = time.perf_counter()
+        out = fn(*args)
+        timings[name] = (time.perf_counter() - t) * 1000
+        return out
+
+    # --- API ---
+
+    def _image_vector(self, image, timings: dict) -> np.ndarray:
+        if isinstance(image, np.ndarray) and image.ndim == 1:
+            return image
+        t = time.perf_counter()
+        q = self.embed_image(image)
+        timings["encode_image"] = (time.perf_counter() - t) * 1000
+        return q
+
+    def _path_lookup(self) -> dict[str, str]:
+        """file_id -> gcs_path z magazynu GLOBAL (uzupełnienie trafień samego OCR)."""
+        if self.vector_index is None:
+            return {}
+        store = self.vector_index.store
+        key = (store.root, store.version)
+        if key != self._paths_key:
+            self._paths = {file_id_for(p): p for p in store.meta(["gcs_path"])["gcs_path"].astype(str)}
+            self._paths_key = key
+        return self._paths
+
+    def search(
+        self,
+        text: str | None = None,
+        image=None,
+        k: int = 20,
+        method: str = "rrf",
+        weights: Mapping[str, float] | None = None,
+        stages: tuple[str, ...] | None = None,
+        stage_k: int = STAGE_K,
+        clip_prompt: str = "{}",
+    ) -> pd.DataFrame:
+        """
+        Top-k obrazów: file_id, gcs_path, file_name, score, match (etap najlepszego dopasowania z bboxem),
+        text / fragment / line_id / bbox_norm (linia OCR albo fragment obrazu), rank_<etap>.
+
+        image — PIL.Image albo gotowy wektor CLIP; stages=None => wszystkie dostępne dla danego zapytania.
+        clip_prompt — szablon dla clip_text, np. "a photo of a shop sign with the text {}".
+        """
+        text = (text or "").strip()
+        available = {
+            "ocr": bool(text) and self.text_index is not None,
+            "fuzzy": bool(text) and self.fuzzy is not None,
+            "clip_text": bool(text) and self.vector_index is not None and self.embed_text is not None,
+            "clip_image": image is not None and self.vector_index is not None,
+            "patch": image is not None and self.patch_searcher is not None,
+        }
+        run = [s for s in (stages or STAGES) if available.get(s)]
+        timings: dict = {}
+        t0 = time.perf_counter()
+
+        q_img = self._image_vector(image, timings) if ("clip_image" in run or "patch" in run) else None
+        jobs = {
+            "ocr": lambda: self._timed("ocr", self._stage_ocr, timings, text, stage_k),
+            "fuzzy": lambda: self._timed("fuzzy", self._stage_fuzzy, timings, text, stage_k),
+            "clip_text": lambda: self._timed(
+                "clip_text", self._stage_clip_text, timings, clip_prompt.format(text), stage_k, timings
+            ),
+            "clip_image": lambda: self._timed("clip_image", self._stage_clip_image, timings, q_img, stage_k),
+            "patch": lambda: self._timed("patch", self._stage_patch, timings, q_img, stage_k),
+        }
+        futures = {s: self._pool.submit(jobs[s]) for s in run}
+        rankings = {s: f.result() for s, f in futures.items()}
+
+        t = time.perf_counter()
+        fused = fuse(rankings, method=method, weights=weights).head(int(k))
+        out = self._details(fused, rankings)
+        timings["fusion"] = (time.perf_counter() - t) * 1000
+        timings["total"] = (time.perf_counter() - t0) * 1000
+
+        over = {s: round(timings[s], 1) for s, b in self.budgets_ms.items() if timings.get(s, 0.0) > b}
+        for s, ms in over.items():
+            print(f"[WARN] Etap {s}: {ms} ms > budżet {self.budgets_ms[s]} ms")
+        self.last_timings = {**{s: round(v, 2) for s, v in timings.items()}, "over_budget": over}
+        return out
+
+    def _details(self, fused: pd.DataFrame, rankings: Mapping[str, pd.DataFrame]) -> pd.DataFrame:
+        """Dla każdego obrazu: ścieżka + najlepsze dopasowanie z lokalizacją (ocr > fuzzy > patch) albo z CLIP."""
+        ids = fused["file_id"].tolist()
+        wanted = set(ids)
+        detail_cols = ("gcs_path", "file_name", "match", "text", "fragment", "line_id", "bbox_norm")
+        info: dict[str, dict] = {f: {} for f in ids}
+        # priorytet: etapy z lokalizacją, od najbardziej wiarygodnego (później wpisane nie nadpisują)
+        for stage in ("ocr", "fuzzy", "patch", "clip_image", "clip_text"):
+            df = rankings.get(stage)
+            if df is None or len(df) == 0:
+                continue
+            df = df[df["file_id"].isin(wanted)]
+            cols = [c for c in detail_cols if c in df.columns]
+            for rec in df[["file_id"] + cols].to_dict("records"):
+                cur = info[rec.pop("file_id")]
+                for c, v in rec.items():
+                    if cur.get(c) is None and v is not None:
+                        cur[c] = v
+
+        lookup = self._path_lookup()
+        for f, cur in info.items():
+            if cur.get("gcs_path") is None:
+                cur["gcs_path"] = lookup.get(f)
+        details = pd.DataFrame([info[f] for f in ids], columns=list(detail_cols))
+        out = pd.concat([fused.reset_index(drop=True), details], axis=1)
+        rank_cols = [c for c in out.columns if c.startswith("rank_")]
+        return out[RESULT_COLS + rank_cols]
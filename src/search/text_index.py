@@ -0,0 +1,496 @@
+"""
+Odwrócony indeks pełnotekstowy nad liniami OCR (wyszukiwanie tekstowe).
+
+- normalize_text / tokenize: casefold + zwijanie znaków diakrytycznych (ą->a, ł->l, ó->o, ...),
+  to samo dla indeksu i zapytania, więc "lodz" znajduje "Łódź",
+- TextIndex: listy wystąpień z pozycjami słów w linii (frazy w cudzysłowie: "ul. długa"),
+  ranking BM25, ostatnie słowo zapytania jako prefiks (wyszukiwanie w trakcie pisania),
+- aktualizacje przyrostowe: sync(df) przeindeksowuje tylko pliki o zmienionym odcisku treści
+  (run_ocr_cache), add_lines() / update_line() dla edycji recenzenta,
+- usunięte i podmienione linie zostają jako nagrobki (alive=0) do compact(),
+- zapis na dysk: katalog root/gen-NNNNNN/ + plik CURRENT (podmieniany atomowo).
+
+Zapytanie: wszystkie słowa/frazy muszą wystąpić w linii (AND), kolejność wyników wg BM25.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import math
+import os
+import re
+import shutil
+import unicodedata
+from array import array
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from src.ocr.bbox import bbox_strings, has_bbox_columns
+
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+DOC_COLS = ["file_id", "file_name", "line_id", "bbox_norm", "text"]
+MAX_PREFIX_TERMS = 256  # limit rozwinięć prefiksu (krótki prefiks => najczęstsze słowa)
+COMPACT_DEAD_RATIO = 0.25
+
+_TOKEN_RE = re.compile(r"\w+")
+_PHRASE_RE = re.compile(r'"([^"]*)"?')
+_FOLD = str.maketrans({"ł": "l", "ß": "ss", "æ": "ae", "ø": "o"})  # nie rozkładają się w NFKD
+
+
+def normalize_text(s: str) -> str:
+    """casefold + usunięcie znaków diakrytycznych (Łódź -> lodz)."""
+    s = str(s).casefold()
+    if s.isascii():
+        return s
+    s = unicodedata.normalize("NFKD", s.translate(_FOLD))
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+
+def tokenize(s: str) -> list[str]:
+    return _TOKEN_RE.findall(normalize_text(s))
+
+
+def parse_query(query: str) -> tuple[list[str], list[list[str]], bool]:
+    """
+    Zapytanie -> (słowa, frazy, czy ostatnie słowo jest niedokończone).
+
+    'ul "brama grodzka" lub' -> (["ul", "lub"], [["brama", "grodzka"]], True)
+    """
+    query = query or ""
+    phrases = [t for t in (tokenize(m) for m in _PHRASE_RE.findall(query)) if t]
+    rest = _PHRASE_RE.sub(" ", query)
+    terms = tokenize(rest)
+    open_last = bool(terms) and not query[-1:].isspace() and not query.rstrip().endswith('"')
+    return terms, phrases, open_last
+
+
+def file_fingerprints(df: pd.DataFrame, text_col: str) -> pd.Series:
+    """Odcisk treści per file_id (suma hashy wierszy: line_id, tekst, bbox) – wykrywa zmienione pliki."""
+    if len(df) == 0:
+        return pd.Series(dtype="uint64")
+    cols = [c for c in ("line_id", text_col) if c in df.columns]
+    key = df[cols].astype(str)
+    if has_bbox_columns(df) or "bbox_norm" in df.columns:
+        key["bbox_norm"] = bbox_strings(df)  # ten sam odcisk dla cache tekstowego i liczbowego
+    h = pd.util.hash_pandas_object(key, index=False)
+    return h.groupby(df["file_id"].astype(str).to_numpy()).sum()
+
+
+def _read_current(root: str) -> str | None:
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+class _Postings:
+    """Lista wystąpień jednego słowa: doc id (rosnąco), offsety do pozycji, pozycje słów w linii."""
+
+    __slots__ = ("docs", "offs", "pos")
+
+    def __init__(self):
+        self.docs = array("i")
+        self.offs = array("i", [0])
+        self.pos = array("i")
+
+
+class TextIndex:
+    """
+    Indeks linii OCR: (file_id, line_id) -> dokument.
+
+    root — katalog indeksu (None = tylko pamięć); istniejący indeks jest wczytywany.
+    k1, b — parametry BM25.
+    """
+
+    def __init__(self, root: str | None = None, k1: float = 1.2, b: float = 0.75):
+        self.root = root
+        self.k1 = float(k1)
+        self.b = float(b)
+        self.epoch = 0  # zmienia się, gdy doc id są przenumerowane (compact)
+        self._reset()
+        if root and os.path.exists(os.path.join(root, CURRENT_FILE)):
+            self._load()
+
+    def _reset(self) -> None:
+        self.docs: dict[str, list] = {c: [] for c in DOC_COLS}
+        self.n_tokens = array("i")
+        self.alive = bytearray()
+        self.fingerprints: dict[str, int] = {}
+        self.version = 0
+        self._postings: dict[str, _Postings] = {}
+        self._by_key: dict[tuple[str, int], int] = {}
+        self._by_file: dict[str, list[int]] = {}
+        self._n_alive = 0
+        self._len_alive = 0
+        self._terms_sorted: list[str] | None = None
+
+    def __len__(self) -> int:
+        return self._n_alive
+
+    # --- dokumenty ---
+
+    def _add_doc(self, file_id: str, file_name: str, line_id: int, bbox_norm: str, text: str) -> int:
+        d = len(self.n_tokens)
+        toks = tokenize(text)
+        positions: dict[str, list[int]] = {}
+        for i, t in enumerate(toks):
+            positions.setdefault(t, []).append(i)
+        for t, ps in positions.items():
+            p = self._postings.get(t)
+            if p is None:
+                p = self._postings[t] = _Postings()
+                self._terms_sorted = None
+            p.docs.append(d)
+            p.pos.extend(ps)
+            p.offs.append(len(p.pos))
+
+        for c, v in zip(DOC_COLS, (file_id, file_name, line_id, bbox_norm, text)):
+            self.docs[c].append(v)
+        self.n_tokens.append(len(toks))
+        self.alive.append(1)
+        self._by_key[(file_id, line_id)] = d
+        self._by_file.setdefault(file_id, []).append(d)
+        self._n_alive += 1
+        self._len_alive += len(toks)
+        return d
+
+    def _kill_doc(self, d: int) -> None:
+        if not self.alive[d]:
+            return
+        self.alive[d] = 0
+        self._n_alive -= 1
+        self._len_alive -= self.n_tokens[d]
+        key = (self.docs["file_id"][d], self.docs["line_id"][d])
+        if self._by_key.get(key) == d:
+            del self._by_key[key]
+
+    def add_lines(self, df: pd.DataFrame, text_col: str | None = None) -> int:
+        """
+        Dodaje/podmienia linie (klucz: file_id + line_id). Zwraca liczbę (prze)indeksowanych linii.
+
+        text_col=None => text_edited, jeśli jest, inaczej text. Niezmienione linie są pomijane.
+        """
+        if len(df) == 0:
+            return 0
+        text_col = text_col or ("text_edited" if "text_edited" in df.columns else "text")
+        cols = {
+            "file_id": df["file_id"].astype(str).tolist(),
+            "file_name": df["file_name"].astype(str).tolist() if "file_name" in df.columns else [""] * len(df),
+            "line_id": pd.to_numeric(df["line_id"], errors="coerce").fillna(-1).astype(int).tolist(),
+            "bbox_norm": bbox_strings(df).tolist(),
+            "text": df[text_col].fillna("").astype(str).tolist(),
+        }
+        n = 0
+        for fid, fn, lid, bbox, text in zip(*(cols[c] for c in DOC_COLS)):
+            old = self._by_key.get((fid, lid))
+            if old is not None:
+                if (
+                    self.docs["text"][old] == text
+                    and self.docs["bbox_norm"][old] == bbox
+                    and self.docs["file_name"][old] == fn
+                ):
+                    continue
+                self._kill_doc(old)
+            self._add_doc(fid, fn, lid, bbox, text)
+            n += 1
+        if n:
+            self.version += 1
+        return n
+
+    def update_line(self, file_id: str, line_id: int, text: str) -> bool:
+        """Edycja jednej linii (np. text_edited z tabeli recenzji). False, gdy linii nie ma w indeksie."""
+        file_id, line_id = str(file_id), int(line_id)
+        d = self._by_key.get((file_id, line_id))
+        if d is None:
+            return False
+        if self.docs["text"][d] == text:
+            return True
+        self._kill_doc(d)
+        self._add_doc(file_id, self.docs["file_name"][d], line_id, self.docs["bbox_norm"][d], text)
+        self.fingerprints.pop(file_id, None)  # odcisk nieaktualny => sync() sprawdzi plik ponownie
+        self.version += 1
+        return True
+
+    def remove_files(self, file_ids: Iterable[str]) -> int:
+        n = 0
+        for fid in file_ids:
+            for d in self._by_file.pop(str(fid), []):
+                if self.alive[d]:
+                    self._kill_doc(d)
+                    n += 1
+            self.fingerprints.pop(str(fid), None)
+        if n:
+            self.version += 1
+        return n
+
+    def sync(
+        self,
+        df: pd.DataFrame,
+        text_col: str | None = None,
+        files: Iterable[str] | None = None,
+    ) -> dict[str, int]:
+        """
+        Dopasowuje indeks do df (np. df_out z run_ocr_cache): przeindeksowuje tylko pliki,
+        których odcisk treści się zmienił, usuwa pliki nieobecne w df.
+
+        files — file_id, których treść na pewno się zmieniła (np. ponowny OCR); pozostałe pliki
+        są tylko dodawane, jeśli ich brak w indeksie. Tak df bez text_edited nie nadpisuje
+        edycji recenzenta (update_line / add_lines z text_col="text_edited").
+        """
+        text_col = text_col or ("text_edited" if "text_edited" in df.columns else "text")
+        fp = file_fingerprints(df, text_col)
+        current = {str(f): int(h) for f, h in fp.items()}
+
+        only = None if files is None else {str(f) for f in files}
+        changed = [
+            f
+            for f, h in current.items()
+            if self.fingerprints.get(f) != h and (only is None or f in only or f not in self._by_file)
+        ]
+        removed = [f for f in self._by_file if f not in current]
+        self.remove_files(changed + removed)
+        if changed:
+            self.add_lines(df[df["file_id"].astype(str).isin(set(changed))], text_col=text_col)
+        for f in changed:
+            self.fingerprints[f] = current[f]
+        return {"changed_files": len(changed), "removed_files": len(removed), "lines": self._n_alive}
+
+    # --- wyszukiwanie ---
+
+    def _sorted_terms(self) -> list[str]:
+        if self._terms_sorted is None:
+            self._terms_sorted = sorted(self._postings)
+        return self._terms_sorted
+
+    def expand_prefix(self, prefix: str, limit: int = MAX_PREFIX_TERMS) -> list[str]:
+        """Słowa z indeksu zaczynające się od prefix (najczęstsze pierwsze, maks. limit)."""
+        terms = self._sorted_terms()
+        i = bisect.bisect_left(terms, prefix)
+        out = []
+        while i < len(terms) and terms[i].startswith(prefix):
+            out.append(terms[i])
+            i += 1
+        if len(out) > limit:
+            out.sort(key=lambda t: -len(self._postings[t].docs))
+            out = out[:limit]
+        return out
+
+    def _term_scores(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """(doc ids, BM25) dla żywych dokumentów zawierających term."""
+        p = self._postings.get(term)
+        if p is None or self._n_alive == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        docs = np.frombuffer(p.docs, dtype=np.int32)
+        tf = np.diff(np.frombuffer(p.offs, dtype=np.int32)).astype(np.float64)
+        alive = np.frombuffer(self.alive, dtype=np.uint8)[docs].astype(bool)
+        docs, tf = docs[alive], tf[alive]
+        if len(docs) == 0:
+            return docs, tf
+
+        n = self._n_alive
+        idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+        dl = np.frombuffer(self.n_tokens, dtype=np.int32)[docs]
+        avgdl = max(self._len_alive / n, 1e-9)
+        score = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+        return docs, score
+
+    def _prefix_scores(self, prefix: str) -> tuple[np.ndarray, np.ndarray]:
+        parts = [self._term_scores(t) for t in self.expand_prefix(prefix)]
+        parts = [x for x in parts if len(x[0])]
+        if not parts:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        if len(parts) == 1:
+            return parts[0]
+        docs = np.concatenate([x[0] for x in parts])
+        score = np.concatenate([x[1] for x in parts])
+        u, inv = np.unique(docs, return_inverse=True)
+        best = np.zeros(len(u), dtype=np.float64)
+        np.maximum.at(best, inv, score)
+        return u, best
+
+    def _phrase_scores(self, terms: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        scored = [self._term_scores(t) for t in terms]
+        docs, score = scored[0]
+        for d2, s2 in scored[1:]:
+            docs, i1, i2 = np.intersect1d(docs, d2, assume_unique=True, return_indices=True)
+            score = score[i1] + s2[i2]
+        if len(docs) == 0 or len(terms) == 1:
+            return docs, score
+
+        plist = [self._postings[t] for t in terms]
+        keep = np.zeros(len(docs), dtype=bool)
+        for k, d in enumerate(docs.tolist()):
+            starts = None
+            for off, p in enumerate(plist):
+                j = bisect.bisect_left(p.docs, d)
+                ps = {x - off for x in p.pos[p.offs[j]:p.offs[j + 1]]}
+                starts = ps if starts is None else starts & ps
+                if not starts:
+                    break
+            keep[k] = bool(starts)
+        return docs[keep], score[keep]
+
+    def search_docs(self, query: str, prefix: bool = True) -> tuple[np.ndarray, np.ndarray]:
+        """(doc ids, score) posortowane malejąco po score; wszystkie słowa i frazy muszą wystąpić."""
+        terms, phrases, open_last = parse_query(query)
+        slots: list[tuple[np.ndarray, np.ndarray]] = []
+        for i, t in enumerate(terms):
+            last = i == len(terms) - 1
+            slots.append(self._prefix_scores(t) if (prefix and open_last and last) else self._term_scores(t))
+        slots.extend(self._phrase_scores(ph) for ph in phrases)
+        if not slots:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        slots.sort(key=lambda x: len(x[0]))  # najpierw najrzadsze => małe przecięcia
+        docs, score = slots[0]
+        for d2, s2 in slots[1:]:
+            if len(docs) == 0:
+                break
+            docs, i1, i2 = np.intersect1d(docs, d2, assume_unique=True, return_indices=True)
+            score = score[i1] + s2[i2]
+
+        order = np.lexsort((docs, -score))
+        return docs[order], score[order]
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = 50,
+        prefix: bool = True,
+        file_name: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Wyniki: file_name, file_id, line_id, bbox_norm, text, score (malejąco).
+
+        limit=None => wszystkie trafienia; file_name => tylko ten plik.
+        """
+        docs, score = self.search_docs(query, prefix=prefix)
+        if file_name and file_name != "(wszystkie)":
+            m = np.fromiter((self.docs["file_name"][d] == file_name for d in docs.tolist()), dtype=bool, count=len(docs))
+            docs, score = docs[m], score[m]
+        if limit is not None:
+            docs, score = docs[:limit], score[:limit]
+
+        idx = docs.tolist()
+        out = pd.DataFrame({c: [self.docs[c][d] for d in idx] for c in DOC_COLS})
+        out["score"] = score
+        return out[["file_name", "file_id", "line_id", "bbox_norm", "text", "score"]]
+
+    # --- kompaktowanie i zapis ---
+
+    def compact(self) -> None:
+        """Przebudowuje listy wystąpień bez nagrobków (nowe doc id, ta sama kolejność)."""
+        live = [d for d in range(len(self.n_tokens)) if self.alive[d]]
+        rows = [tuple(self.docs[c][d] for c in DOC_COLS) for d in live]
+        fingerprints, version = self.fingerprints, self.version
+        self._reset()
+        for r in rows:
+            self._add_doc(*r)
+        self.fingerprints, self.version = fingerprints, version + 1
+        self.epoch += 1
+
+    def save(self, root: str | None = None) -> str:
+        """Zapis do nowej generacji root/gen-NNNNNN/ i podmiana CURRENT; stare generacje są usuwane."""
+        root = root or self.root
+        if not root:
+            raise ValueError("Brak katalogu indeksu (root).")
+        n_docs = len(self.n_tokens)
+        if n_docs and (n_docs - self._n_alive) / n_docs > COMPACT_DEAD_RATIO:
+            self.compact()
+
+        os.makedirs(root, exist_ok=True)
+        gen = f"gen-{self.version:06d}"
+        gen_dir = os.path.join(root, gen)
+        if _read_current(root) == gen:
+            return gen_dir  # bez zmian od ostatniego zapisu
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        os.makedirs(gen_dir)
+
+        docs = pd.DataFrame(self.docs)
+        docs["n_tokens"] = np.frombuffer(self.n_tokens, dtype=np.int32).copy()
+        docs["alive"] = np.frombuffer(self.alive, dtype=np.uint8).copy()
+        docs.to_parquet(os.path.join(gen_dir, "docs.parquet"), index=False)
+
+        terms = self._sorted_terms()
+        plist = [self._postings[t] for t in terms]
+        pd.DataFrame(
+            {
+                "term": terms,
+                "n_docs": [len(p.docs) for p in plist],
+                "n_pos": [len(p.pos) for p in plist],
+            }
+        ).to_parquet(os.path.join(gen_dir, "terms.parquet"), index=False)
+
+        def cat(arrays: list[np.ndarray]) -> np.ndarray:
+            return np.concatenate(arrays).astype(np.int32) if arrays else np.empty(0, dtype=np.int32)
+
+        np.savez(
+            os.path.join(gen_dir, "postings.npz"),
+            docs=cat([np.frombuffer(p.docs, dtype=np.int32) for p in plist]),
+            tf=cat([np.diff(np.frombuffer(p.offs, dtype=np.int32)) for p in plist]),
+            pos=cat([np.frombuffer(p.pos, dtype=np.int32) for p in plist]),
+        )
+        fps = {f: h for f, h in self.fingerprints.items() if h is not None}
+        pd.DataFrame(
+            {"file_id": list(fps), "fingerprint": np.array(list(fps.values()), dtype=np.uint64)}
+        ).to_parquet(os.path.join(gen_dir, "files.parquet"), index=False)
+        with open(os.path.join(gen_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"format": FORMAT_VERSION, "version": self.version, "k1": self.k1, "b": self.b}, f)
+
+        tmp = os.path.join(root, CURRENT_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(gen)
+        os.replace(tmp, os.path.join(root, CURRENT_FILE))
+
+        for name in os.listdir(root):
+            if name.startswith("gen-") and name != gen:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        self.root = root
+        return gen_dir
+
+    def _load(self) -> None:
+        gen_dir = os.path.join(self.root, _read_current(self.root))
+        with open(os.path.join(gen_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Nieobsługiwany format indeksu: {meta.get('format')} ({gen_dir})")
+
+        docs = pd.read_parquet(os.path.join(gen_dir, "docs.parquet"))
+        for c in DOC_COLS:
+            self.docs[c] = docs[c].tolist()
+        self.docs["line_id"] = [int(x) for x in self.docs["line_id"]]
+        self.n_tokens = array("i", docs["n_tokens"].to_numpy(dtype=np.int32).tobytes())
+        self.alive = bytearray(docs["alive"].to_numpy(dtype=np.uint8).tobytes())
+
+        for d, (fid, lid, a) in enumerate(zip(self.docs["file_id"], self.docs["line_id"], self.alive)):
+            if a:
+                self._by_key[(fid, lid)] = d
+                self._by_file.setdefault(fid, []).append(d)
+        alive_np = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        self._n_alive = int(alive_np.sum())
+        self._len_alive = int(np.frombuffer(self.n_tokens, dtype=np.int32)[alive_np].sum())
+
+        terms = pd.read_parquet(os.path.join(gen_dir, "terms.parquet"))
+        with np.load(os.path.join(gen_dir, "postings.npz")) as z:
+            all_docs, all_tf, all_pos = z["docs"], z["tf"], z["pos"]
+        i = j = 0
+        for t, nd, npos in zip(terms["term"].tolist(), terms["n_docs"].tolist(), terms["n_pos"].tolist()):
+            p = _Postings()
+            p.docs.frombytes(all_docs[i:i + nd].tobytes())
+            p.offs.frombytes(np.cumsum(all_tf[i:i + nd], dtype=np.int32).tobytes())
+            p.pos.frombytes(all_pos[j:j + npos].tobytes())
+            self._postings[t] = p
+            i += nd
+            j += npos
+        self._terms_sorted = terms["term"].tolist()
+
+        files = pd.read_parquet(os.path.join(gen_dir, "files.parquet"))
+        self.fingerprints = dict(zip(files["file_id"].tolist(), (int(h) for h in files["fingerprint"].tolist())))
+        self.version = int(meta["version"])
+        self.k1, self.b = float(meta["k1"]), float(meta["b"])
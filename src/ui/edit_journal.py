@@ -0,0 +1,331 @@
+"""
+Append-only dziennik edycji recenzji OCR (JSONL) zamiast pełnych kopii __vNNN.csv przy każdym zapisie.
+
+Bazą jest cache OCR (text); ensure_edit_columns daje stan domyślny (text_edited = text, excluded = False).
+Dziennik trzyma tylko delty (file_id, line_id, text_edited, excluded) względem poprzedniego zapisu,
+z oryginalnym tekstem OCR linii (text) jako strażnikiem treści:
+
+    {"v": 3, "ts": "2026-10-18T12:00:01.250", "file_id": [...], "line_id": [...], "text": [...], "text_edited": [...], "excluded": [...]}
+
+file_id pochodzi ze ścieżki, więc po ponownym OCR podmienionego pliku (nowy content_key) te same
+(file_id, line_id) wskazują inne linie. Delta jest stosowana tylko wtedy, gdy text linii w bazie
+zgadza się ze strażnikiem; pozostałe są pomijane i zgłaszane (stale_edits). Wpisy bez text (starsze
+dzienniki) stosowane są jak dotąd.
+
+- commit(df): porównuje df ze stanem dziennika (wektorowo) i dopisuje jeden wpis z samymi zmianami (flush + fsync),
+- replay(base, version=..., until=...): dowolna wersja = baza + wpisy do tej wersji / chwili,
+- compact(): starsze wpisy składane w jeden snapshot (ostatnia wartość na linię); ostatnie keep_versions wersji
+  zostają do odtworzenia, wcześniejsze – już nie. commit kompaktuje sam co compact_every wpisów,
+- urwany ostatni wiersz (crash w trakcie zapisu) jest pomijany i obcinany (src.ocr.ocr_journal.truncate_partial_tail).
+
+Pliki dotknięte deltą (commit()["file_ids"]) wystarczą do przeliczenia eksportu per obraz
+(src.exports.ocr_review_export.update_per_image).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from src.ocr.ocr_journal import truncate_partial_tail
+from src.pipeline.metrics import get_metrics
+from src.ui.table_helpers import ensure_edit_columns
+
+
+EDIT_JOURNAL_SUFFIX = ".edits.jsonl"
+EDIT_COLS = ["file_id", "line_id", "text", "text_edited", "excluded"]
+STALE_COLS = ["file_id", "line_id", "text", "text_guard", "text_edited"]  # text = bieżący OCR, text_guard = z chwili edycji
+DEFAULT_COMPACT_EVERY = 100
+DEFAULT_KEEP_VERSIONS = 20
+
+
+def edit_journal_path_for(out_csv: str) -> str:
+    """Ścieżka dziennika edycji obok cache OCR: <out_csv>.edits.jsonl"""
+    return out_csv + EDIT_JOURNAL_SUFFIX
+
+
+def iter_edit_records(path: str) -> Iterator[dict]:
+    """Kolejne kompletne wpisy dziennika (snapshot i delty) w kolejności zapisu."""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # niedokończony zapis (crash) – pomijamy
+                break
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _now() -> str:
+    return dt.datetime.now().isoformat(timespec="milliseconds")
+
+
+def _line_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays(
+        [df["file_id"].astype(str), pd.to_numeric(df["line_id"], errors="coerce").fillna(-1).astype(np.int64)]
+    )
+
+
+def _record_frame(rec: dict) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "file_id": pd.Series(rec.get("file_id") or [], dtype=object),
+            "line_id": pd.Series(rec.get("line_id") or [], dtype=np.int64),
+            "text": pd.Series(rec.get("text") or [None] * len(rec.get("file_id") or []), dtype=object),
+            "text_edited": pd.Series(rec.get("text_edited") or [], dtype=object),
+            "excluded": pd.Series(rec.get("excluded") or [], dtype=bool),
+        }
+    )
+
+
+def _fold(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Stan netto: ostatnia wartość (text_edited, excluded) na (file_id, line_id)."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return _record_frame({})
+    out = pd.concat(frames, ignore_index=True)
+    return out.drop_duplicates(["file_id", "line_id"], keep="last").reset_index(drop=True)
+
+
+def _match(state: pd.DataFrame, state_keys: pd.MultiIndex, df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Wiersze df z edycją w state: (pozycje w state, maska trafień, maska nieaktualnych).
+
+    Trafienie wymaga zgodnego strażnika: text delty == text wiersza df (brak strażnika = zgodny).
+    Nieaktualne – ten sam (file_id, line_id), inny text (plik po ponownym OCR).
+    """
+    pos = state_keys.get_indexer(_line_keys(df))
+    hit = pos >= 0
+    guard = state["text"].to_numpy(dtype=object)[pos[hit]]
+    text = df["text"].astype(str).to_numpy(dtype=object)[hit]
+    ok = pd.isna(guard) | (guard == text)
+    stale = np.zeros(len(df), dtype=bool)
+    stale[np.flatnonzero(hit)[~ok]] = True
+    hit[stale] = False
+    return pos, hit, stale
+
+
+class EditJournal:
+    """
+    Dziennik edycji recenzji OCR (jeden plik JSONL na zestaw).
+
+    journal = EditJournal(edit_journal_path_for(OUT_OCR_CSV))
+    df = journal.replay(df_out)           # ostatnia wersja
+    info = journal.commit(df)             # {"version", "edits", "file_ids"}
+    old = journal.replay(df_out, version=3)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compact_every: int = DEFAULT_COMPACT_EVERY,
+        keep_versions: int = DEFAULT_KEEP_VERSIONS,
+        fsync: bool = True,
+    ):
+        self.path = path
+        self.compact_every = max(1, int(compact_every))
+        self.keep_versions = min(max(0, int(keep_versions)), self.compact_every - 1)
+        self.fsync = fsync
+        self.stale_edits = pd.DataFrame(columns=STALE_COLS)  # edycje pominięte w ostatnim replay()
+        self._load()
+
+    # --- odczyt ---
+
+    def _load(self) -> None:
+        truncate_partial_tail(self.path)
+        self._versions: list[dict] = []  # {"v", "ts", "n", "snapshot"}
+        frames = []
+        for rec in iter_edit_records(self.path):
+            self._versions.append(
+                {"v": int(rec["v"]), "ts": rec.get("ts", ""), "n": len(rec.get("file_id") or []), "snapshot": bool(rec.get("snapshot"))}
+            )
+            frames.append(_record_frame(rec))
+        self._state = _fold(frames)
+        self._state_keys = _line_keys(self._state)
+
+    @property
+    def version(self) -> int:
+        """Ostatnia zapisana wersja (0 = sama baza)."""
+        return self._versions[-1]["v"] if self._versions else 0
+
+    def versions(self) -> pd.DataFrame:
+        """Wersje możliwe do odtworzenia: v, ts, n (delt we wpisie), snapshot."""
+        rows = list(self._versions)
+        if not rows or not rows[0]["snapshot"]:
+            rows = [{"v": 0, "ts": "", "n": 0, "snapshot": False}] + rows
+        return pd.DataFrame(rows, columns=["v", "ts", "n", "snapshot"])
+
+    def _resolve(self, version: int | None, until: str | dt.datetime | None) -> int:
+        available = self.versions()
+        if until is not None and version is not None:
+            raise ValueError("Podaj version albo until, nie oba.")
+        if until is not None:
+            until = until.isoformat(timespec="milliseconds") if isinstance(until, dt.datetime) else str(until)
+            ok = available[available["ts"] <= until]  # wersja 0 (ts "") zawsze, o ile nie skompaktowana
+            if ok.empty:
+                raise ValueError(f"Brak wersji sprzed {until} (starsze wpisy skompaktowane).")
+            return int(ok["v"].iloc[-1])
+        if version is None:
+            return self.version
+        if int(version) not in set(available["v"].tolist()):
+            raise ValueError(
+                f"Wersja {version} niedostępna (dostępne: {available['v'].min()}..{available['v'].max()}; starsze skompaktowane)."
+            )
+        return int(version)
+
+    def state(self, version: int | None = None, until: str | dt.datetime | None = None) -> pd.DataFrame:
+        """Edycje netto (EDIT_COLS) dla wersji version albo ostatniej wersji zapisanej przed until."""
+        v = self._resolve(version, until)
+        if v == self.version:
+            return self._state.copy()
+        return _fold([_record_frame(rec) for rec in iter_edit_records(self.path) if int(rec["v"]) <= v])
+
+    def replay(
+        self,
+        base: pd.DataFrame,
+        version: int | None = None,
+        until: str | dt.datetime | None = None,
+    ) -> pd.DataFrame:
+        """
+        Odtwarza df recenzji: ensure_edit_columns(base) + edycje z dziennika do wersji version / chwili until.
+        Edycje linii nieobecnych w base (np. plik zniknął z cache) są pomijane, podobnie edycje,
+        których strażnik (text) nie zgadza się z base – te trafiają do self.stale_edits (z [WARN]).
+        """
+        m = get_metrics()
+        with m.timer("review.journal_replay"):
+            out = ensure_edit_columns(base)
+            self.stale_edits = pd.DataFrame(columns=STALE_COLS)
+            st = self.state(version, until)
+            if len(st) == 0 or len(out) == 0:
+                return out
+            pos, hit, stale = _match(st, _line_keys(st), out)
+            if stale.any():
+                self.stale_edits = out.loc[stale, ["file_id", "line_id", "text"]].assign(
+                    text_guard=st["text"].to_numpy(dtype=object)[pos[stale]],
+                    text_edited=st["text_edited"].to_numpy(dtype=object)[pos[stale]],
+                )
+                m.inc("review.stale_edits", int(stale.sum()))
+                print(
+                    f"[WARN] Pominięto {int(stale.sum())} edycji w {self.stale_edits['file_id'].nunique()} plikach:",
+                    "tekst OCR linii się zmienił (ponowny OCR). Lista: journal.stale_edits",
+                )
+            text = out["text_edited"].to_numpy(dtype=object).copy()
+            excl = out["excluded"].eq(True).to_numpy().copy()
+            text[hit] = st["text_edited"].to_numpy(dtype=object)[pos[hit]]
+            excl[hit] = st["excluded"].to_numpy(dtype=bool)[pos[hit]]
+            out["text_edited"] = text
+            out["excluded"] = excl
+            return out
+
+    # --- zapis ---
+
+    def diff(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Linie df, których (text_edited, excluded) różni się od stanu dziennika (EDIT_COLS).
+        Edycje z niezgodnym strażnikiem (text) nie są stanem linii – porównanie z samym text.
+        """
+        if "text" not in df.columns:
+            raise KeyError("Brak kolumny 'text'.")
+        text = df["text"].astype(str).to_numpy(dtype=object)
+        cur_text = df["text_edited"].astype(str).to_numpy(dtype=object) if "text_edited" in df.columns else text
+        cur_excl = df["excluded"].eq(True).to_numpy() if "excluded" in df.columns else np.zeros(len(df), dtype=bool)
+
+        keys = _line_keys(df)
+        exp_text = text.copy()
+        exp_excl = np.zeros(len(df), dtype=bool)
+        if len(self._state):
+            pos, hit, _ = _match(self._state, self._state_keys, df)
+            exp_text[hit] = self._state["text_edited"].to_numpy(dtype=object)[pos[hit]]
+            exp_excl[hit] = self._state["excluded"].to_numpy(dtype=bool)[pos[hit]]
+
+        changed = np.flatnonzero((cur_text != exp_text) | (cur_excl != exp_excl))
+        return pd.DataFrame(
+            {
+                "file_id": keys.get_level_values(0).to_numpy(dtype=object)[changed],
+                "line_id": keys.get_level_values(1).to_numpy(dtype=np.int64)[changed],
+                "text": text[changed],
+                "text_edited": cur_text[changed],
+                "excluded": cur_excl[changed],
+            }
+        )
+
+    def _write(self, f, rec: dict) -> None:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _record(self, v: int, edits: pd.DataFrame, snapshot: bool = False) -> dict:
+        rec = {"v": int(v), "ts": _now()}
+        if snapshot:
+            rec["snapshot"] = True
+        rec.update(
+            {
+                "file_id": edits["file_id"].astype(str).tolist(),
+                "line_id": edits["line_id"].astype(np.int64).tolist(),
+                "text": [None if pd.isna(t) else str(t) for t in edits["text"].tolist()],
+                "text_edited": edits["text_edited"].astype(str).tolist(),
+                "excluded": edits["excluded"].astype(bool).tolist(),
+            }
+        )
+        return rec
+
+    def commit(self, df: pd.DataFrame) -> dict:
+        """
+        Dopisuje delty df względem stanu dziennika jako nową wersję.
+        Zwraca {"version", "edits", "file_ids"}; bez zmian – nic nie zapisuje (edits = 0, ta sama wersja).
+        """
+        m = get_metrics()
+        with m.timer("review.journal_commit"):
+            edits = self.diff(df)
+            if len(edits) == 0:
+                return {"version": self.version, "edits": 0, "file_ids": []}
+
+            out_dir = os.path.dirname(self.path)
+            if out_dir:
+                os.makedirs(out_dir, exist_ok=True)
+            rec = self._record(self.version + 1, edits)
+            with open(self.path, "a", encoding="utf-8") as f:
+                self._write(f, rec)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+            self._versions.append({"v": rec["v"], "ts": rec["ts"], "n": len(edits), "snapshot": False})
+            self._state = _fold([self._state, edits])
+            self._state_keys = _line_keys(self._state)
+            m.inc("review.edits", len(edits))
+
+        if sum(not v["snapshot"] for v in self._versions) > self.compact_every:
+            self.compact()
+        return {"version": rec["v"], "edits": int(len(edits)), "file_ids": sorted(set(edits["file_id"].tolist()))}
+
+    def compact(self, keep_versions: int | None = None) -> dict:
+        """
+        Składa wpisy starsze niż ostatnie keep_versions wersji w jeden snapshot (ostatnia wartość na linię)
+        i przepisuje dziennik atomowo (plik tymczasowy + os.replace). Zwraca {"records_before", "records_after"}.
+        """
+        keep = self.keep_versions if keep_versions is None else max(0, int(keep_versions))
+        records = list(iter_edit_records(self.path))
+        n_fold = len(records) - keep
+        if n_fold < 1 or (n_fold == 1 and records[0].get("snapshot")):
+            return {"records_before": len(records), "records_after": len(records)}
+
+        with get_metrics().timer("review.journal_compact"):
+            head, tail = records[:n_fold], records[n_fold:]
+            snap = self._record(int(head[-1]["v"]), _fold([_record_frame(r) for r in head]), snapshot=True)
+            snap["ts"] = head[-1].get("ts", snap["ts"])  # snapshot = stan z chwili ostatniej złożonej wersji
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in [snap] + tail:
+                    self._write(f, rec)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        self._load()
+        return {"records_before": len(records), "records_after": 1 + len(tail)}
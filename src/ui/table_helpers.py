@@ -6,8 +6,13 @@ Cel: wynieść logikę danych z notebooka, zostawiając konstrukcję widgetów w
 
 from __future__ import annotations
 
+import weakref
+
 import pandas as pd
 
+from src.search.fuzzy_index import FuzzyIndex
+from src.search.text_index import TextIndex
+
 
 def ensure_edit_columns(df: pd.DataFrame) -> pd.DataFrame:
     """Zapewnia text_edited i excluded w df (bez modyfikowania oryginału)."""
@@ -21,24 +26,74 @@ def ensure_edit_columns(df: pd.DataFrame) -> pd.DataFrame:
     return out
 
 
-def filter_df_for_table(df: pd.DataFrame, file_name: str, query: str) -> pd.DataFrame:
+_row_map: tuple[weakref.ref, tuple[int, int], dict[tuple[str, int], int]] | None = None
+
+
+def row_positions(df: pd.DataFrame) -> dict[tuple[str, int], int]:
+    """
+    (file_id, line_id) -> pozycja wiersza w df.
+
+    Budowane raz na wersję df (ten sam obiekt, ten sam indeks i liczba wierszy), więc zapytania
+    w trakcie pisania nie skanują całego df. Edycje text_edited/excluded nie zmieniają wersji.
+    """
+    global _row_map
+    token = (id(df.index), len(df))
+    if _row_map is not None and _row_map[0]() is df and _row_map[1] == token:
+        return _row_map[2]
+    fids = df["file_id"].astype(str).tolist()
+    lids = pd.to_numeric(df["line_id"], errors="coerce").fillna(-1).astype(int).tolist()
+    pos: dict[tuple[str, int], int] = {}
+    for i, k in enumerate(zip(fids, lids)):
+        pos.setdefault(k, i)
+    _row_map = (weakref.ref(df), token, pos)
+    return pos
+
+
+def _rows_in_hits(df: pd.DataFrame, hits: pd.DataFrame, file_name: str) -> pd.DataFrame:
+    """Wiersze df dla trafień indeksu (kolejność jak w df); koszt zależy od liczby trafień, nie od df."""
+    pos_map = row_positions(df)
+    keys = zip(hits["file_id"].astype(str).tolist(), hits["line_id"].astype(int).tolist())
+    out = df.iloc[sorted({pos_map[k] for k in keys if k in pos_map})]
+    if file_name and file_name != "(wszystkie)":
+        out = out[out["file_name"] == file_name]
+    return out.copy()
+
+
+def filter_df_for_table(
+    df: pd.DataFrame,
+    file_name: str,
+    query: str,
+    index: TextIndex | None = None,
+    fuzzy: FuzzyIndex | None = None,
+) -> pd.DataFrame:
     """
     Filtruje df pod tabelę:
     - opcjonalnie ogranicza do file_name (jeśli nie '(wszystkie)'),
     - filtruje substring po text_edited/text,
     - NIE usuwa excluded (to robimy per plik, bo status liczymy na całości).
+
+    index — TextIndex zsynchronizowany z df: zamiast skanu substringów wyszukiwanie w indeksie
+    (słowa bez polskich znaków i wielkości liter, ostatnie słowo jako prefiks, frazy w "...").
+    fuzzy — FuzzyIndex (nad tym samym TextIndex): dopasowanie z tolerancją błędów OCR.
+    Trafienia indeksów mapowane na wiersze przez row_positions (bez skanu df).
     """
-    dff = df.copy()
+    q = (query or "").strip()
+    if q and fuzzy is not None:
+        return _rows_in_hits(df, fuzzy.search(q, limit=None), file_name)
+    if q and index is not None:
+        return _rows_in_hits(df, index.search(q, limit=None, file_name=file_name), file_name)
 
     if file_name and file_name != "(wszystkie)":
-        dff = dff[dff["file_name"] == file_name]
+        dff = df[df["file_name"] == file_name]
+    else:
+        dff = df
 
-    q = (query or "").strip().lower()
+    q = q.lower()
     if q:
         base_col = "text_edited" if "text_edited" in dff.columns else "text"
         dff = dff[dff[base_col].astype(str).str.lower().str.contains(q, na=False)]
 
-    return dff
+    return dff.copy()
 
 
 def list_files(dff: pd.DataFrame) -> list[str]:
@@ -1,8 +1,11 @@
 """
 Galeria miniatur z bboxami OCR.
 
-- Czyta obrazy z PHOTOS_DIR (jeśli podane) lub z GCS przez: gcloud storage cat gs://.../file_name
-- Rysuje bboxy z kolumny bbox_norm (px lub [0..1])
+- Czyta obrazy z PHOTOS_DIR (jeśli podane) lub z GCS przez ImageFetcher (cache pamięć/dysk, równoległe pobieranie)
+- Rysuje bboxy z kolumn x1..y2 (albo legacy bbox_norm; px lub [0..1])
+- Miniatury bazowe (bez bboxów) liczone w puli procesów i trzymane w cache (src.viz.thumbs),
+  klucz = gcs_path + generation (metadane z GCS, bez pobierania) albo mtime pliku lokalnego;
+  skany pobierane i dekodowane tylko dla braków, partiami, więc ponowny render rysuje tylko nakładkę bboxów
 - Renderuje HTML w notebooku
 """
 
@@ -11,16 +14,39 @@ from __future__ import annotations
 import os
 import io
 import base64
-import subprocess
 from typing import Optional
 
 import pandas as pd
-from PIL import Image, ImageDraw
+from PIL import Image
 from IPython.display import display, HTML
 
+from src.io.gcs import stat_blobs, storage_available
+from src.io.image_fetcher import get_fetcher
+from src.pipeline.metrics import get_metrics
+from src.viz.thumbs import (
+    ThumbnailCache,
+    base_thumbnails,
+    bbox_array,
+    gcs_source_id,
+    get_thumb_cache,
+    local_source_id,
+    make_base_thumb,
+    overlay_bboxes,
+    thumb_key,
+)
+
+
+def load_image_bytes(
+    file_name: str,
+    gcs_photos_prefix: str,
+    photos_dir: str = "",
+    generation: Optional[str] = None,
+) -> bytes:
+    """
+    Ładuje bajty obrazu lokalnie (photos_dir) albo z GCS (ImageFetcher z cache).
 
-def load_image_bytes(file_name: str, gcs_photos_prefix: str, photos_dir: str = "") -> bytes:
-    """Ładuje bajty obrazu lokalnie (photos_dir) albo z GCS (gcloud storage cat)."""
+    generation – z listingu (iter_images_meta); None => fetcher ustala ją z metadanych obiektu.
+    """
     if photos_dir:
         p = os.path.join(photos_dir, file_name)
         if os.path.exists(p):
@@ -28,47 +54,15 @@ def load_image_bytes(file_name: str, gcs_photos_prefix: str, photos_dir: str = "
                 return f.read()
 
     gs_path = f"{gcs_photos_prefix.rstrip('/')}/{file_name}"
-    r = subprocess.run(["gcloud", "storage", "cat", gs_path], capture_output=True)
-    if r.returncode != 0 or not r.stdout:
-        raise FileNotFoundError(r.stderr.decode("utf-8", errors="ignore")[:400])
-    return r.stdout
-
-
-def _parse_bbox(s: str) -> tuple[float, float, float, float]:
-    x1, y1, x2, y2 = map(float, str(s).split(","))
-    return x1, y1, x2, y2
+    try:
+        return get_fetcher().get(gs_path, generation)
+    except Exception as e:
+        raise FileNotFoundError(str(e)[:400]) from e
 
 
 def thumb_with_bboxes(img_bytes: bytes, rows: pd.DataFrame, max_side: int = 720) -> Image.Image:
     """Zwraca miniaturę PIL z dorysowanymi bboxami."""
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    W, H = img.size
-
-    scale = min(max_side / W, max_side / H, 1.0)
-    nw, nh = int(W * scale), int(H * scale)
-    thumb = img.resize((nw, nh))
-
-    draw = ImageDraw.Draw(thumb)
-
-    if "bbox_norm" in rows.columns:
-        for _, r in rows.iterrows():
-            bn = r.get("bbox_norm", None)
-            if pd.isna(bn) or not str(bn).strip():
-                continue
-
-            x1, y1, x2, y2 = _parse_bbox(str(bn))
-
-            # jeśli <= 1.5 => [0..1], inaczej piksele
-            if max(x1, y1, x2, y2) <= 1.5:
-                x1, y1, x2, y2 = x1 * W, y1 * H, x2 * W, y2 * H
-
-            draw.rectangle(
-                [int(x1 * scale), int(y1 * scale), int(x2 * scale), int(y2 * scale)],
-                outline="red",
-                width=2,
-            )
-
-    return thumb
+    return overlay_bboxes(make_base_thumb(img_bytes, max_side), bbox_array(rows), max_side)
 
 
 def pil_to_data_uri(pil_img: Image.Image) -> str:
@@ -79,16 +73,73 @@ def pil_to_data_uri(pil_img: Image.Image) -> str:
     return f"data:image/jpeg;base64,{b64}"
 
 
+def gcs_meta(gs_paths: list[str]) -> dict[str, dict] | None:
+    """
+    generation/size obiektów z GCS (zapytania o metadane, bez pobierania treści).
+
+    Bez biblioteki GCS (kernel CLIP, pobieranie przez gcloud) => None: klucze z samego gcs_path.
+    """
+    if not storage_available():
+        return None
+    return stat_blobs(gs_paths)
+
+
+def gcs_thumbnails(
+    gs_paths: list[str],
+    max_side: int,
+    meta: dict[str, dict] | None = None,
+    cache: Optional[ThumbnailCache] = None,
+    processes: Optional[int] = None,
+) -> list[tuple[bytes, int, int] | Exception]:
+    """
+    Miniatury bazowe obrazów z GCS; pobierane (ImageFetcher) i dekodowane tylko braki w cache.
+
+    meta: {gcs_path: {"generation", "size"}} z listingu (iter_images_meta); None => gcs_meta().
+    """
+    if meta is None:
+        with get_metrics().timer("gallery.stat"):
+            meta = gcs_meta(gs_paths)
+    keys: list[str | Exception] = []
+    for p in gs_paths:
+        if meta is None:
+            keys.append(thumb_key(gcs_source_id(p), max_side))
+        elif p in meta:
+            keys.append(thumb_key(gcs_source_id(p, meta[p].get("generation"), meta[p].get("size")), max_side))
+        else:
+            keys.append(FileNotFoundError(f"Brak obiektu: {p}"))
+
+    def load(idx: list[int]) -> list[bytes | Exception]:
+        paths = [gs_paths[i] for i in idx]
+        generations = {p: meta[p]["generation"] for p in paths if meta and meta.get(p, {}).get("generation")}
+        with get_metrics().timer("gallery.fetch"):
+            fetched = get_fetcher().get_many(paths, generations=generations)
+        return [FileNotFoundError(str(b)[:400]) if isinstance(b, Exception) else b for b in fetched]
+
+    return base_thumbnails(
+        keys,
+        load,
+        max_side,
+        cache=cache if cache is not None else get_thumb_cache(),
+        processes=processes,
+    )
+
+
 def render_gallery(
     df: pd.DataFrame,
     gcs_photos_prefix: str,
     photos_dir: str = "",
     max_side: int = 720,
     limit_gallery: Optional[int] = 50,
+    processes: Optional[int] = None,
+    thumb_cache: Optional[ThumbnailCache] = None,
+    meta: Optional[dict[str, dict]] = None,
 ) -> None:
     """
     Renderuje galerię miniatur dla plików z df['file_name'].
     limit_gallery: None/0 = bez limitu.
+    processes: procesy do liczenia miniatur (None = liczba CPU, 1 = bez puli).
+    thumb_cache: cache miniatur bazowych (domyślnie współdzielony, na dysku).
+    meta: {gcs_path: {"generation", "size"}} z listingu (iter_images_meta); None => zapytanie o metadane plików.
     """
     if "file_name" not in df.columns:
         raise KeyError("Brak kolumny 'file_name' w df.")
@@ -103,33 +154,77 @@ def render_gallery(
         print(f"[INFO] Galeria: pokazuję {int(limit_gallery)}/{len(files)} plików (limit_gallery).")
         files = files[: int(limit_gallery)]
 
+    m = get_metrics()
+
+    # wiersze per plik – jeden groupby zamiast filtra df[df.file_name == fn] dla każdego pliku
+    # klucze grup z samego podzbioru (tablica, bez wyrównania indeksów) – df po concat może mieć powtórzony indeks
+    sub = df[df["file_name"].astype(str).isin(set(files))]
+    groups = {fn: g for fn, g in sub.groupby(sub["file_name"].astype(str).to_numpy(), sort=False)}
+
+    # źródła: plik lokalny (photos_dir, klucz z mtime) albo GCS (klucz z generation)
+    local: list[int] = []
+    remote: list[int] = []
+    for i, fn in enumerate(files):
+        p = os.path.join(photos_dir, fn) if photos_dir else ""
+        (local if p and os.path.exists(p) else remote).append(i)
+
+    cache = thumb_cache if thumb_cache is not None else get_thumb_cache()
+    bases: list[tuple[bytes, int, int] | Exception] = [None] * len(files)
+
+    with m.timer("gallery.thumbs"):
+        if local:
+            paths = [os.path.join(photos_dir, files[i]) for i in local]
+
+            def load_local(idx: list[int]) -> list[bytes | Exception]:
+                out: list[bytes | Exception] = []
+                for j in idx:
+                    try:
+                        with open(paths[j], "rb") as f:
+                            out.append(f.read())
+                    except OSError as e:
+                        out.append(e)
+                return out
+
+            keys = [thumb_key(local_source_id(p), max_side) for p in paths]
+            for i, b in zip(local, base_thumbnails(keys, load_local, max_side, cache=cache, processes=processes)):
+                bases[i] = b
+        if remote:
+            gs_paths = [f"{gcs_photos_prefix.rstrip('/')}/{files[i]}" for i in remote]
+            for i, b in zip(remote, gcs_thumbnails(gs_paths, max_side, meta=meta, cache=cache, processes=processes)):
+                bases[i] = b
+
     cards = []
     ok = 0
     missing = 0
 
-    for fn in files:
-        rows = df[df["file_name"] == fn]
-        try:
-            img_bytes = load_image_bytes(fn, gcs_photos_prefix=gcs_photos_prefix, photos_dir=photos_dir)
-            thumb = thumb_with_bboxes(img_bytes, rows, max_side=max_side)
-            uri = pil_to_data_uri(thumb)
-            ok += 1
-            cards.append(f"""
-            <div style="width:{max_side+40}px; margin:10px;">
-                <div style="font-size:12px; margin-bottom:6px;">{fn}</div>
-                <img src="{uri}" style="max-width:{max_side}px; border:1px solid #ddd;" />
-            </div>
-            """)
-        except Exception as e:
-            missing += 1
-            cards.append(f"""
-              <div style="width:520px; margin:10px; border:1px solid #f2f2f2; padding:10px;">
-                <div style="font-size:12px; margin-bottom:6px;">{fn}</div>
-                <div style="font-size:12px; color:#a00;">Brak obrazu / błąd odczytu</div>
-                <div style="font-size:11px; white-space:pre-wrap;">{str(e)[:350]}</div>
-              </div>
-            """)
+    with m.timer("gallery.overlay_html"):
+        for fn, base in zip(files, bases):
+            try:
+                if isinstance(base, Exception):
+                    raise base
+                rows = groups.get(fn, df.iloc[0:0])
+                thumb = overlay_bboxes(base, bbox_array(rows), max_side)
+                uri = pil_to_data_uri(thumb)
+                ok += 1
+                cards.append(f"""
+                <div style="width:{max_side+40}px; margin:10px;">
+                    <div style="font-size:12px; margin-bottom:6px;">{fn}</div>
+                    <img src="{uri}" style="max-width:{max_side}px; border:1px solid #ddd;" />
+                </div>
+                """)
+            except Exception as e:
+                missing += 1
+                cards.append(f"""
+                  <div style="width:520px; margin:10px; border:1px solid #f2f2f2; padding:10px;">
+                    <div style="font-size:12px; margin-bottom:6px;">{fn}</div>
+                    <div style="font-size:12px; color:#a00;">Brak obrazu / błąd odczytu</div>
+                    <div style="font-size:11px; white-space:pre-wrap;">{str(e)[:350]}</div>
+                  </div>
+                """)
 
     print(f"[DONE] Galeria: OK={ok}, błędy={missing}, razem={ok+missing}")
+    m.inc("gallery.images", ok, status="ok")
+    m.inc("gallery.images", missing, status="error")
     html = "<div style='display:flex; flex-wrap:wrap; align-items:flex-start;'>" + "\n".join(cards) + "</div>"
-    display(HTML(html))
+    with m.timer("gallery.display"):
+        display(HTML(html))
@@ -1,16 +1,23 @@
-import subprocess
+from typing import Iterable
 
-def gcs_cat_bytes(gs_path: str) -> bytes:
+from src.io.image_fetcher import get_fetcher
+
+
+def gcs_cat_bytes(gs_path: str, generation: str | None = None) -> bytes:
     """
-    Pobiera plik z GCS przez `gcloud storage cat` i zwraca bytes.
+    Pobiera plik z GCS i zwraca bytes (przez współdzielony ImageFetcher z cache).
 
     gs_path – pełna ścieżka, np. "gs://ocr-2026/photos/0002.jpg"
+    generation – z listingu (iter_images_meta); None => fetcher sam ustala ją z metadanych obiektu,
+    więc podmieniony plik nie jest podawany z cache.
+    Powtórne pobranie tego samego pliku idzie z cache (pamięć / dysk).
     """
-    r = subprocess.run(
-        ["gcloud", "storage", "cat", gs_path],
-        capture_output=True,
-    )
-    if r.returncode != 0 or not r.stdout:
-        err = (r.stderr or b"").decode("utf-8", errors="ignore")[:800]
-        raise RuntimeError(f"gcloud storage cat failed for {gs_path}\n{err}")
-    return r.stdout
+    try:
+        return get_fetcher().get(gs_path, generation)
+    except Exception as e:
+        raise RuntimeError(f"Pobranie z GCS nie powiodło się: {gs_path}\n{str(e)[:800]}") from e
+
+
+def gcs_prefetch(gs_paths: Iterable[str], generations: dict[str, str] | None = None) -> None:
+    """Równolegle pobiera pliki do cache (np. przed renderem kafelków wyników)."""
+    get_fetcher().prefetch(gs_paths, generations=generations)
@@ -0,0 +1,301 @@
+"""
+Miniatury do galerii: szybkie dekodowanie, pula procesów i cache miniatur bazowych.
+
+- make_base_thumb: dekodowanie JPEG w zmniejszonej rozdzielczości (Image.draft) + resize,
+- ThumbnailCache: miniatury bazowe (bez bboxów) w pamięci i na dysku (LRU z limitem rozmiaru),
+  klucz = tożsamość źródła (gcs_path + generation/size albo ścieżka lokalna + mtime) + max_side,
+  więc trafienie nie wymaga pobierania ani czytania skanu,
+- base_thumbnails: pobierane i dekodowane tylko braki, partiami (batch_size), w puli procesów,
+- bbox_array / overlay_bboxes: bboxy z kolumn x1..y2 (src.ocr.bbox) i tania nakładka bboxów na gotową miniaturę.
+
+Po edycji linii (inne bboxy) przerysowywana jest tylko nakładka – dekodowanie skanu nie jest powtarzane.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Sequence
+
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from src.ocr.bbox import bbox_array as _bbox_array, scale_boxes
+
+
+DEFAULT_THUMB_CACHE_DIR = os.environ.get(
+    "OCR_SEARCH_THUMB_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "ocr-search", "thumbs"),
+)
+DEFAULT_THUMB_DISK_BYTES = 512 * 1024**2
+THUMB_QUALITY = 90  # miniatura bazowa jest jeszcze raz kodowana po nałożeniu bboxów
+MIN_ITEMS_FOR_POOL = 4
+THUMB_BATCH = 32  # tyle pełnych skanów naraz w pamięci (i w pickle do puli)
+
+
+def make_base_thumb(img_bytes: bytes, max_side: int) -> tuple[bytes, int, int]:
+    """
+    Miniatura bazowa (JPEG, bez bboxów) + rozmiar oryginału (W, H).
+
+    Dla JPEG dekoder od razu skaluje 1/2, 1/4 lub 1/8 (draft), więc pełna
+    rozdzielczość skanu nie jest dekodowana.
+    """
+    img = Image.open(io.BytesIO(img_bytes))
+    W, H = img.size
+
+    scale = min(max_side / W, max_side / H, 1.0)
+    nw, nh = max(1, int(W * scale)), max(1, int(H * scale))
+
+    if img.format == "JPEG":
+        img.draft("RGB", (nw, nh))
+    img = img.convert("RGB")
+    thumb = img.resize((nw, nh)) if img.size != (nw, nh) else img
+
+    buf = io.BytesIO()
+    thumb.save(buf, format="JPEG", quality=THUMB_QUALITY)
+    return buf.getvalue(), W, H
+
+
+def _make_base_thumb_safe(args: tuple[bytes, int]) -> tuple[bytes, int, int] | Exception:
+    try:
+        return make_base_thumb(*args)
+    except Exception as e:
+        return e
+
+
+def gcs_source_id(gs_path: str, generation: str | None = None, size: int | None = None) -> str:
+    """Tożsamość obiektu GCS; bez generation/size (nieznane) – sam gcs_path, jak w ImageFetcher."""
+    return f"{gs_path}#{generation or ''}#{size if size is not None else ''}"
+
+
+def local_source_id(path: str) -> str:
+    """Tożsamość pliku lokalnego: ścieżka + mtime + rozmiar (stat, bez czytania treści)."""
+    st = os.stat(path)
+    return f"file://{os.path.abspath(path)}#{st.st_mtime_ns}#{st.st_size}"
+
+
+def thumb_key(source_id: str, max_side: int) -> str:
+    return f"{hashlib.sha1(source_id.encode('utf-8')).hexdigest()}_{int(max_side)}"
+
+
+class ThumbnailCache:
+    """
+    Cache miniatur bazowych: pamięć (LRU, max_items) + dysk (<key>.jpg i <key>.json z W, H).
+
+    Dysk to LRU z limitem max_disk_bytes (kolejność po mtime, trafienia odświeżają mtime),
+    tak jak cache obrazów w ImageFetcher. cache_dir="" => tylko pamięć.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_THUMB_CACHE_DIR,
+        max_items: int = 2000,
+        max_disk_bytes: int = DEFAULT_THUMB_DISK_BYTES,
+    ):
+        self.cache_dir = cache_dir
+        self.max_items = int(max_items)
+        self.max_disk_bytes = int(max_disk_bytes)
+        self._mem: OrderedDict[str, tuple[bytes, int, int]] = OrderedDict()
+        self._disk: OrderedDict[str, int] = OrderedDict()  # key -> rozmiar (jpg + json), od najdawniej użytego
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".jpg", base + ".json"
+
+    def _scan_disk(self) -> None:
+        """Odtwarza indeks LRU z katalogu; wpis kompletny = jest .json (zapisywany po .jpg)."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for fn in files:
+                if not fn.endswith(".json"):
+                    continue
+                key = fn[:-5]
+                p_jpg, p_meta = self._paths(key)
+                try:
+                    st = os.stat(p_jpg)
+                    size = st.st_size + os.path.getsize(p_meta)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, key, size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        victims = []
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                victims.append(key)
+        for key in victims:
+            # najpierw .json: bez niego wpis i tak nie jest czytany
+            for p in reversed(self._paths(key)):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key: str) -> tuple[bytes, int, int] | None:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                return hit
+            if not self.cache_dir or key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+        p_jpg, p_meta = self._paths(key)
+        try:
+            with open(p_meta, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(p_jpg, "rb") as f:
+                hit = (f.read(), int(meta["W"]), int(meta["H"]))
+            os.utime(p_jpg)
+        except (FileNotFoundError, ValueError, KeyError):
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        self._put_mem(key, hit)
+        return hit
+
+    def _put_mem(self, key: str, value: tuple[bytes, int, int]) -> None:
+        with self._lock:
+            self._mem[key] = value
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_items:
+                self._mem.popitem(last=False)
+
+    def put(self, key: str, value: tuple[bytes, int, int]) -> None:
+        self._put_mem(key, value)
+        if not self.cache_dir:
+            return
+        p_jpg, p_meta = self._paths(key)
+        meta = json.dumps({"W": value[1], "H": value[2]})
+        size = len(value[0]) + len(meta)
+        if size > self.max_disk_bytes:
+            return
+        os.makedirs(os.path.dirname(p_jpg), exist_ok=True)
+        tmp = f".{threading.get_ident()}.tmp"
+        with open(p_jpg + tmp, "wb") as f:
+            f.write(value[0])
+        os.replace(p_jpg + tmp, p_jpg)
+        # meta zapisywane po JPEG: obecność .json oznacza kompletny wpis
+        with open(p_meta + tmp, "w", encoding="utf-8") as f:
+            f.write(meta)
+        os.replace(p_meta + tmp, p_meta)
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+        self._evict_disk()
+
+
+_thumb_cache: ThumbnailCache | None = None
+
+
+def get_thumb_cache() -> ThumbnailCache:
+    """Współdzielony ThumbnailCache (domyślny katalog)."""
+    global _thumb_cache
+    if _thumb_cache is None:
+        _thumb_cache = ThumbnailCache()
+    return _thumb_cache
+
+
+def base_thumbnails(
+    keys: Sequence[str | Exception],
+    load: Callable[[list[int]], list[bytes | Exception]],
+    max_side: int,
+    cache: ThumbnailCache | None = None,
+    processes: int | None = None,
+    batch_size: int = THUMB_BATCH,
+) -> list[tuple[bytes, int, int] | Exception]:
+    """
+    Miniatury bazowe dla listy źródeł.
+
+    keys — klucz miniatury (thumb_key) albo wyjątek (np. brak pliku – przepuszczany dalej),
+    load — (indeksy braków) -> bajty obrazów albo wyjątki, w tej samej kolejności.
+
+    Najpierw sprawdzany jest cache; load() wołane tylko dla braków, partiami po batch_size,
+    więc w pamięci jest naraz co najwyżej jedna partia pełnych skanów. Braki liczone w puli
+    procesów (processes=None => liczba CPU; 1 lub mało plików => w bieżącym procesie).
+    """
+    out: list[tuple[bytes, int, int] | Exception | None] = [None] * len(keys)
+    todo: list[int] = []
+
+    for i, key in enumerate(keys):
+        if isinstance(key, Exception):
+            out[i] = key
+            continue
+        hit = cache.get(key) if cache is not None else None
+        if hit is not None:
+            out[i] = hit
+        else:
+            todo.append(i)
+
+    if not todo:
+        return out
+
+    batch_size = max(1, int(batch_size))
+    n_proc = processes if processes is not None else (os.cpu_count() or 1)
+    use_pool = n_proc > 1 and len(todo) >= MIN_ITEMS_FOR_POOL
+    ex = ProcessPoolExecutor(max_workers=min(n_proc, len(todo), batch_size)) if use_pool else None
+    try:
+        for start in range(0, len(todo), batch_size):
+            idx = todo[start:start + batch_size]
+            images = load(idx)
+            args = [(b, int(max_side)) for b in images if not isinstance(b, Exception)]
+            if ex is not None and len(args) >= MIN_ITEMS_FOR_POOL:
+                made = iter(list(ex.map(_make_base_thumb_safe, args, chunksize=max(1, len(args) // (4 * n_proc)))))
+            else:
+                made = iter([_make_base_thumb_safe(a) for a in args])
+            del args
+            for i, b in zip(idx, images):
+                res = b if isinstance(b, Exception) else next(made)
+                out[i] = res
+                if cache is not None and not isinstance(res, Exception):
+                    cache.put(keys[i], res)
+            del images
+    finally:
+        if ex is not None:
+            ex.shutdown()
+
+    return out
+
+
+def bbox_array(rows: pd.DataFrame) -> np.ndarray:
+    """Bboxy wierszy (x1..y2 albo legacy bbox_norm) -> tablica float [n, 4]; puste/niepoprawne wiersze pominięte."""
+    if len(rows) == 0:
+        return np.empty((0, 4), dtype=np.float32)
+    arr = _bbox_array(rows)
+    return arr[~np.isnan(arr).any(axis=1)]
+
+
+def scale_bboxes(boxes: np.ndarray, W: int, H: int, scale: float) -> np.ndarray:
+    """bboxy (px lub [0..1]) -> współrzędne miniatury (int)."""
+    return scale_boxes(boxes, W, H, scale)
+
+
+def overlay_bboxes(base: tuple[bytes, int, int], boxes: np.ndarray, max_side: int) -> Image.Image:
+    """Dorysowuje bboxy (tablica z bbox_array) na miniaturze bazowej."""
+    jpeg, W, H = base
+    thumb = Image.open(io.BytesIO(jpeg)).convert("RGB")
+    scale = min(max_side / W, max_side / H, 1.0)
+
+    draw = ImageDraw.Draw(thumb)
+    for x1, y1, x2, y2 in scale_bboxes(boxes, W, H, scale).tolist():
+        draw.rectangle([x1, y1, x2, y2], outline="red", width=2)
+    return thumb
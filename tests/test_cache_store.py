@@ -0,0 +1,130 @@
+"""Magazyny cache OCR (src.ocr.cache_store): interfejs, zapis i odczyt po ponownym otwarciu, migracja CSV."""
+
+from __future__ import annotations
+
+import pandas as pd
+import pytest
+
+from src.ocr.cache_store import CsvOcrCacheStore, OcrCacheStore, ParquetOcrCacheStore
+
+
+def _path(name: str) -> str:
+    return f"gs://bkt/photos/{name}"
+
+
+def _lines(name: str, texts: list[str]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "text": texts,
+            "file_name": name,
+            "file_id": f"id-{name}",
+            "gcs_path": _path(name),
+            "line_id": range(len(texts)),
+            "x1": 0.1,
+            "y1": 0.2,
+            "x2": 0.5,
+            "y2": 0.3,
+            "img_w": 640,
+            "img_h": 480,
+            "source": "gcv_ocr_line",
+        }
+    )
+
+
+def _texts(df: pd.DataFrame, name: str) -> list[str]:
+    return df[df["gcs_path"] == _path(name)].sort_values("line_id")["text"].tolist()
+
+
+@pytest.fixture(params=["csv", "parquet"])
+def make_store(request, tmp_path):
+    def make():
+        if request.param == "csv":
+            return CsvOcrCacheStore(str(tmp_path / "ocr_lines.csv"))
+        return ParquetOcrCacheStore(str(tmp_path / "cache"))
+
+    return make
+
+
+def test_incomplete_store_fails_at_construction():
+    class NoLoad(OcrCacheStore):
+        def content_index(self):
+            return {}
+
+        def add(self, df_new, processed=(), meta=None):
+            pass
+
+        def update_meta(self, meta):
+            pass
+
+    with pytest.raises(TypeError, match="load"):
+        NoLoad()
+
+
+def test_add_round_trip(make_store):
+    store = make_store()
+    meta = {_path(n): {"content_key": f"md5:{n}", "generation": "1"} for n in ("a.jpg", "b.jpg", "empty.jpg")}
+    df_new = pd.concat([_lines("a.jpg", ["A0", "A1"]), _lines("b.jpg", ["B0"])], ignore_index=True)
+    store.add(df_new, processed=list(meta), meta=meta)
+
+    reopened = make_store()
+    assert reopened.content_index() == {p: m["content_key"] for p, m in meta.items()}
+    assert reopened.processed_paths() == set(meta)
+    df = reopened.load()
+    assert _texts(df, "a.jpg") == ["A0", "A1"] and _texts(df, "b.jpg") == ["B0"]
+    assert df["x1"].dtype == "float32"
+    assert _texts(reopened.rows_for([_path("b.jpg")]), "b.jpg") == ["B0"]
+
+    # ponowne dodanie pliku zastępuje jego linie (zmieniona treść)
+    reopened.add(_lines("a.jpg", ["A-new"]), processed=[_path("a.jpg")], meta={_path("a.jpg"): {"content_key": "md5:a2"}})
+    again = make_store()
+    assert _texts(again.load(), "a.jpg") == ["A-new"] and _texts(again.load(), "b.jpg") == ["B0"]
+    assert again.content_index()[_path("a.jpg")] == "md5:a2"
+
+
+def test_add_stream_round_trip(make_store):
+    store = make_store()
+    store.add(pd.concat([_lines("a.jpg", ["A0"]), _lines("b.jpg", ["B0"])], ignore_index=True), processed=[_path("a.jpg"), _path("b.jpg")])
+
+    chunks = iter([_lines("a.jpg", ["A1", "A2"]), pd.DataFrame(), _lines("c.jpg", ["C0"])])
+    meta = {_path(n): {"content_key": f"md5:{n}"} for n in ("a.jpg", "c.jpg", "empty.jpg")}
+    make_store().add_stream(chunks, processed=list(meta), meta=meta)
+
+    reopened = make_store()
+    df = reopened.load()
+    assert _texts(df, "a.jpg") == ["A1", "A2"]
+    assert _texts(df, "b.jpg") == ["B0"]
+    assert _texts(df, "c.jpg") == ["C0"]
+    index = reopened.content_index()
+    assert set(index) == {_path(n) for n in ("a.jpg", "b.jpg", "c.jpg", "empty.jpg")}
+    assert index[_path("empty.jpg")] == "md5:empty.jpg" and index[_path("b.jpg")] is None
+
+
+def test_update_meta_keeps_lines(make_store):
+    store = make_store()
+    store.add(_lines("a.jpg", ["A0"]), processed=[_path("a.jpg")])
+    assert make_store().content_index() == {_path("a.jpg"): None}  # cache sprzed kluczy treści
+
+    make_store().update_meta({_path("a.jpg"): {"content_key": "md5:a", "generation": "7"}})
+
+    reopened = make_store()
+    assert reopened.content_index() == {_path("a.jpg"): "md5:a"}
+    assert _texts(reopened.load(), "a.jpg") == ["A0"]
+
+
+def test_import_csv_migrates_legacy_cache(tmp_path):
+    legacy = pd.concat([_lines("a.jpg", ["A0", "A1"]), _lines("b.jpg", ["B0"])], ignore_index=True)
+    legacy = legacy.drop(columns=["x1", "y1", "x2", "y2"]).assign(bbox_norm="0.1,0.2,0.5,0.3", page=1)
+    csv_path = str(tmp_path / "ocr_lines.csv")
+    legacy.to_csv(csv_path, index=False)
+
+    store = ParquetOcrCacheStore(str(tmp_path / "cache"))
+    assert store.is_empty()
+    store.import_csv(csv_path)
+
+    reopened = ParquetOcrCacheStore(str(tmp_path / "cache"))
+    assert reopened.processed_paths() == {_path("a.jpg"), _path("b.jpg")}
+    df = reopened.load()
+    assert "page" not in df.columns and "bbox_norm" not in df.columns
+    assert df["x2"].tolist() == pytest.approx([0.5] * 3)
+    assert _texts(df, "a.jpg") == ["A0", "A1"]
+    assert reopened.read_manifest().set_index("gcs_path")["n_lines"].to_dict() == {_path("a.jpg"): 2, _path("b.jpg"): 1}
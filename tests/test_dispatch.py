@@ -0,0 +1,152 @@
+"""Wysyłka OCR (src.ocr.dispatch, run_ocr_cache) na lokalnym zamienniku Vision (src.bench.fake_vision)."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.bench.fake_vision import FakeImageAnnotatorClient, FakeVisionError
+from src.bench.synthetic import populate_fake_gcs
+from src.io.gcs import set_client
+from src.ocr.cache_store import ParquetOcrCacheStore
+from src.ocr.dispatch import call_with_retry, iter_ocr_results
+from src.ocr.ocr_cache import ocr_lines_from_gcs, run_ocr_cache
+from src.pipeline import metrics
+
+
+PREFIX = "gs://bench/photos"
+
+
+def _paths(n: int) -> list[str]:
+    return [f"{PREFIX}/img_{i:07d}.jpg" for i in range(n)]
+
+
+def _ocr_fn(client):
+    return lambda gs_path: ocr_lines_from_gcs(gs_path, client=client)
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 4])
+def test_results_in_input_order(max_in_flight):
+    paths = _paths(20)
+    delays = {p: 0.001 * ((7 * i) % 5) for i, p in enumerate(paths)}  # kończą się w innej kolejności
+
+    def fn(p):
+        time.sleep(delays[p])
+        return p.upper()
+
+    out = list(iter_ocr_results(paths, fn, max_in_flight=max_in_flight, base_delay=0))
+    assert [p for p, _, _ in out] == paths
+    assert [r for _, r, _ in out] == [p.upper() for p in paths]
+    assert all(e is None for _, _, e in out)
+
+
+@pytest.mark.parametrize("max_in_flight", [2, 4, 8])
+def test_concurrency_bounded_by_max_in_flight(max_in_flight):
+    client = FakeImageAnnotatorClient(latency_s=0.01)
+    out = list(iter_ocr_results(_paths(40), _ocr_fn(client), max_in_flight=max_in_flight, base_delay=0))
+    assert len(out) == 40 and all(e is None for _, _, e in out)
+    assert client.calls == 40
+    assert 1 < client.max_concurrent <= max_in_flight
+
+
+def test_lazy_window_never_pulls_more_than_max_in_flight():
+    started = []
+    lock = threading.Lock()
+
+    def fn(p):
+        with lock:
+            started.append(p)
+        return p
+
+    it = iter_ocr_results(iter(_paths(50)), fn, max_in_flight=3)
+    next(it)
+    time.sleep(0.05)
+    assert len(started) <= 4  # okno 3 + jedno zlecone po odbiorze pierwszego wyniku
+    assert len(list(it)) == 49
+
+
+def test_retryable_errors_are_retried():
+    client = FakeImageAnnotatorClient(transient_failures=2)
+    out = list(iter_ocr_results(_paths(6), _ocr_fn(client), max_in_flight=3, max_retries=3, base_delay=0))
+    assert all(e is None and len(rows) == 5 for _, rows, e in out)
+    assert set(client.calls_by_path.values()) == {3}
+
+
+def test_retries_exhausted_reports_error():
+    client = FakeImageAnnotatorClient(transient_failures=5)
+    out = list(iter_ocr_results(_paths(3), _ocr_fn(client), max_in_flight=2, max_retries=2, base_delay=0))
+    assert all(rows is None and isinstance(e, FakeVisionError) and e.code == 503 for _, rows, e in out)
+    assert set(client.calls_by_path.values()) == {3}  # 1 + 2 ponowienia
+
+
+def test_non_retryable_error_reported_without_retry():
+    paths = _paths(5)
+    client = FakeImageAnnotatorClient(permanent_error_paths=[paths[1], paths[3]])
+    out = list(iter_ocr_results(paths, _ocr_fn(client), max_in_flight=4, max_retries=5, base_delay=0))
+    errors = {p: e for p, _, e in out if e is not None}
+    assert set(errors) == {paths[1], paths[3]}
+    assert all(e.code == 400 for e in errors.values())
+    assert client.calls_by_path[paths[1]] == 1 and client.calls_by_path[paths[3]] == 1
+    assert client.calls == 5
+
+
+def test_call_with_retry_backoff_sleeps():
+    sleeps = []
+    attempts = iter([FakeVisionError("quota", code=429), FakeVisionError("x", code=503), "ok"])
+
+    def fn():
+        v = next(attempts)
+        if isinstance(v, Exception):
+            raise v
+        return v
+
+    assert call_with_retry(fn, max_retries=3, base_delay=0.5, sleep=sleeps.append) == "ok"
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+
+
+@pytest.fixture
+def fake_gcs():
+    storage = FakeStorageClient()
+    populate_fake_gcs(storage, PREFIX, 12, width=64, height=48, distinct=12)
+    set_client(storage)
+    yield storage
+    set_client(None)
+
+
+@pytest.fixture
+def memory_metrics():
+    m = metrics.enable(metrics.Metrics())
+    yield m
+    metrics.disable()
+
+
+def _counter(m, name: str, **labels) -> float:
+    return sum(c["value"] for c in m.snapshot()["counters"] if c["name"] == name and c["labels"] == labels)
+
+
+@pytest.mark.parametrize("checkpoint", [True, False])
+def test_run_ocr_cache_ok_error_accounting(fake_gcs, memory_metrics, tmp_path, capsys, checkpoint):
+    paths = sorted(_paths(12))
+    bad = {paths[2], paths[7]}
+    store = ParquetOcrCacheStore(str(tmp_path / "cache"))
+    client = FakeImageAnnotatorClient(permanent_error_paths=bad)
+
+    df = run_ocr_cache(PREFIX, None, client=client, max_in_flight=4, store=store, checkpoint=checkpoint)
+    out = capsys.readouterr().out
+
+    assert out.count("] OK: ") == 10 and out.count("] ERROR: ") == 2
+    assert _counter(memory_metrics, "ocr.files", status="ok") == 10
+    assert _counter(memory_metrics, "ocr.files", status="error") == 2
+    assert _counter(memory_metrics, "ocr.lines") == 50
+    assert client.max_concurrent <= 4
+    assert set(df["gcs_path"]) == set(paths) - bad
+    assert store.processed_paths() == set(paths) - bad
+
+    # pliki z błędem nie trafiły do cache – kolejne uruchomienie OCR-uje tylko je
+    client2 = FakeImageAnnotatorClient()
+    df2 = run_ocr_cache(PREFIX, None, client=client2, max_in_flight=4, store=store, checkpoint=checkpoint)
+    assert set(client2.calls_by_path) == bad
+    assert set(df2["gcs_path"]) == set(paths) and len(df2) == 60
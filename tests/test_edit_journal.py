@@ -0,0 +1,57 @@
+"""Dziennik edycji recenzji (src.ui.edit_journal): strażnik treści i urwany ostatni wiersz."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from src.ui.edit_journal import EditJournal
+
+
+def _base(texts: list[str]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"file_id": ["a", "a", "b"], "file_name": ["a.jpg", "a.jpg", "b.jpg"], "line_id": [0, 1, 0], "text": texts}
+    )
+
+
+def test_edits_survive_reload(tmp_path):
+    path = str(tmp_path / "x.edits.jsonl")
+    journal = EditJournal(path)
+    df = journal.replay(_base(["foo", "bar", "baz"]))
+    df.loc[0, "text_edited"] = "FOO"
+    df.loc[2, "excluded"] = True
+    assert journal.commit(df) == {"version": 1, "edits": 2, "file_ids": ["a", "b"]}
+
+    out = EditJournal(path).replay(_base(["foo", "bar", "baz"]))
+    assert out["text_edited"].tolist() == ["FOO", "bar", "baz"]
+    assert out["excluded"].tolist() == [False, False, True]
+
+
+def test_edit_is_skipped_when_line_text_changed(tmp_path):
+    path = str(tmp_path / "x.edits.jsonl")
+    journal = EditJournal(path)
+    df = journal.replay(_base(["foo", "bar", "baz"]))
+    df.loc[0, "text_edited"] = "FOO"
+    df.loc[1, "text_edited"] = "BAR"
+    journal.commit(df)
+
+    # ponowny OCR pliku "a": te same (file_id, line_id), linia 0 z innym tekstem
+    reocr = _base(["inna linia", "bar", "baz"])
+    out = journal.replay(reocr)
+
+    assert out["text_edited"].tolist() == ["inna linia", "BAR", "baz"]
+    assert journal.stale_edits[["line_id", "text_guard", "text_edited"]].values.tolist() == [[0, "foo", "FOO"]]
+    assert journal.commit(out)["edits"] == 0  # pominięta edycja nie generuje nowej delty
+
+
+def test_legacy_records_without_guard_still_apply(tmp_path):
+    path = tmp_path / "x.edits.jsonl"
+    path.write_text(
+        '{"v": 1, "ts": "2026-01-01T00:00:00.000", "file_id": ["a"], "line_id": [1], "text_edited": ["BAR"], "excluded": [false]}\n'
+        '{"v": 2, "ts',  # urwany zapis
+        encoding="utf-8",
+    )
+    journal = EditJournal(str(path))
+
+    assert journal.version == 1
+    assert path.read_text(encoding="utf-8").endswith("}\n")
+    assert journal.replay(_base(["x", "y", "z"]))["text_edited"].tolist() == ["x", "BAR", "z"]
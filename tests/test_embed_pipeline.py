@@ -0,0 +1,41 @@
+"""embed_images (src.clip.embed_pipeline) bez torch: koder i preprocess zastąpione funkcjami numpy."""
+
+from __future__ import annotations
+
+import numpy as np
+
+from src.bench.synthetic import synthetic_jpeg
+from src.clip.embed_pipeline import embed_images, open_store
+
+DIM = 8
+
+
+def _encode(x: np.ndarray) -> np.ndarray:
+    return np.ones((len(x), DIM), dtype=np.float32)
+
+
+def _preprocess(img) -> np.ndarray:
+    return np.zeros((3, 4, 4), dtype=np.float32)
+
+
+def test_skipped_counts_only_input_already_in_store(tmp_path, capsys):
+    store = open_store(str(tmp_path / "store"), dim=DIM, model_id="fake")
+    in_store = [f"gs://bkt/old_{i}.jpg" for i in range(5)]
+    store.append(np.ones((5, DIM), dtype=np.float32), [{"gcs_path": p, "file_name": p[-9:]} for p in in_store])
+
+    jpeg = synthetic_jpeg(64, 48)
+    paths = in_store[:2] + ["gs://bkt/new_0.jpg", "gs://bkt/new_1.jpg", "gs://bkt/new_0.jpg"]
+    stats = embed_images(
+        paths,
+        store,
+        _encode,
+        _preprocess,
+        batch_size=4,
+        workers=0,
+        fetch_many=lambda ps: [jpeg for _ in ps],
+    )
+
+    assert stats["images"] == 2
+    assert stats["skipped"] == 2
+    assert "Do przeliczenia: 2 obrazów (już w magazynie: 2)" in capsys.readouterr().out
+    assert len(store.paths()) == 7
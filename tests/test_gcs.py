@@ -0,0 +1,118 @@
+"""Listowanie GCS (src.io.gcs) na zamienniku w pamięci (src.bench.fake_gcs) podanym przez set_client."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+
+import pytest
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.io.gcs import iter_images_meta, list_folders, list_images_meta, set_client
+
+
+class RecordingStorageClient(FakeStorageClient):
+    """FakeStorageClient zapisujący argumenty list_blobs."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.list_calls: list[dict] = []
+
+    def list_blobs(self, bucket_or_name, prefix=None, delimiter=None, page_size=None, **kwargs):
+        self.list_calls.append({"bucket": bucket_or_name, "prefix": prefix, "delimiter": delimiter, "page_size": page_size})
+        return super().list_blobs(bucket_or_name, prefix=prefix, delimiter=delimiter, page_size=page_size, **kwargs)
+
+
+@pytest.fixture
+def fake_client():
+    client = RecordingStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+def _populate(client: FakeStorageClient) -> dict[str, bytes]:
+    data = {}
+    for i in (5, 0, 3, 1, 4, 2):  # wstawiane w innej kolejności niż leksykograficzna
+        data[f"gs://bkt/photos/img_{i:03d}.jpg"] = f"jpeg-{i}".encode()
+    data["gs://bkt/photos/scan.TIFF"] = b"tiff"
+    data["gs://bkt/photos/sub/deep.png"] = b"png"
+    data["gs://bkt/photos/notes.txt"] = b"txt"
+    data["gs://bkt/photos/meta.json"] = b"{}"
+    data["gs://bkt/other/img_x.jpg"] = b"other"
+    for path, b in data.items():
+        client.put(path, b)
+    client.put("gs://bkt/photos/empty_dir/", b"")  # "katalog" z konsoli GCS
+    return data
+
+
+def test_iter_images_meta_walks_all_pages_and_filters_exts(fake_client):
+    _populate(fake_client)
+    metas = list(iter_images_meta("gs://bkt/photos", page_size=2))
+
+    paths = [m["gcs_path"] for m in metas]
+    assert set(paths) == {
+        *(f"gs://bkt/photos/img_{i:03d}.jpg" for i in range(6)),
+        "gs://bkt/photos/scan.TIFF",
+        "gs://bkt/photos/sub/deep.png",
+    }
+    assert fake_client.pages_served >= 6  # 11 obiektów pod prefiksem po 2 na stronę
+    assert fake_client.list_calls[-1]["page_size"] == 2
+    assert fake_client.list_calls[-1]["prefix"] == "photos/"
+
+
+def test_iter_images_meta_all_objects_without_dirs(fake_client):
+    _populate(fake_client)
+    paths = {m["gcs_path"] for m in iter_images_meta("gs://bkt/photos/", exts=None, page_size=3)}
+    assert "gs://bkt/photos/notes.txt" in paths and "gs://bkt/photos/meta.json" in paths
+    assert not any(p.endswith("/") for p in paths)
+    assert len(paths) == 10
+
+
+def test_images_meta_fields(fake_client):
+    data = _populate(fake_client)
+    metas = {m["gcs_path"]: m for m in iter_images_meta("gs://bkt/photos")}
+    m = metas["gs://bkt/photos/img_003.jpg"]
+    body = data["gs://bkt/photos/img_003.jpg"]
+
+    assert set(m) >= {"gcs_path", "generation", "size", "md5", "crc32c"}
+    assert isinstance(m["generation"], str) and m["generation"].isdigit()
+    assert m["size"] == len(body)
+    assert m["md5"] == base64.b64encode(hashlib.md5(body).digest()).decode("ascii")
+    assert m["crc32c"]
+
+    # podmiana obiektu => nowa generation i md5
+    fake_client.put("gs://bkt/photos/img_003.jpg", b"replaced")
+    m2 = {x["gcs_path"]: x for x in iter_images_meta("gs://bkt/photos")}["gs://bkt/photos/img_003.jpg"]
+    assert int(m2["generation"]) > int(m["generation"])
+    assert m2["md5"] != m["md5"] and m2["crc32c"] != m["crc32c"]
+
+
+def test_list_images_meta_sorted(fake_client):
+    _populate(fake_client)
+    paths = [m["gcs_path"] for m in list_images_meta("gs://bkt/photos")]
+    assert paths == sorted(paths)
+    assert len(paths) == 8
+
+
+def test_list_folders_uses_delimiter(fake_client):
+    _populate(fake_client)
+    fake_client.put("gs://bkt/refs/a.jpg", b"a")
+    fake_client.put("gs://bkt/refs/nested/b.jpg", b"b")
+
+    assert list_folders("gs://bkt") == ["other", "photos", "refs"]
+    call = fake_client.list_calls[-1]
+    assert call["delimiter"] == "/" and call["prefix"] == ""
+
+    assert list_folders("gs://bkt/photos") == ["empty_dir", "sub"]
+    assert fake_client.list_calls[-1]["delimiter"] == "/" and fake_client.list_calls[-1]["prefix"] == "photos/"
+    assert list_folders("gs://bkt", exclude=("other",)) == ["photos", "refs"]
+
+
+def test_set_client_none_resets(fake_client):
+    from src.io import gcs
+
+    assert gcs.get_client() is fake_client
+    set_client(None)
+    assert gcs._client is None
+    set_client(fake_client)
@@ -0,0 +1,49 @@
+"""ImageFetcher (src.io.image_fetcher): klucz cache z generation, także gdy wywołujący jej nie zna."""
+
+from __future__ import annotations
+
+import pytest
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.io.gcs import set_client
+from src.io.image_fetcher import ImageFetcher
+
+
+@pytest.fixture
+def fake_client():
+    client = FakeStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+def test_replaced_object_is_not_served_stale_without_generation(fake_client, tmp_path):
+    fetcher = ImageFetcher(str(tmp_path), generation_ttl_s=0)
+    fake_client.put("gs://bkt/a.jpg", b"old")
+    assert fetcher.get("gs://bkt/a.jpg") == b"old"
+    assert fetcher.get("gs://bkt/a.jpg") == b"old"
+    assert fetcher.misses == 1
+
+    fake_client.put("gs://bkt/a.jpg", b"new")
+    assert fetcher.get("gs://bkt/a.jpg") == b"new"
+    assert fetcher.get_many(["gs://bkt/a.jpg"]) == [b"new"]
+    assert fetcher.misses == 2
+
+
+def test_generation_is_resolved_once_per_ttl(fake_client, tmp_path):
+    fetcher = ImageFetcher(str(tmp_path), generation_ttl_s=60)
+    fake_client.put("gs://bkt/a.jpg", b"data")
+    for _ in range(3):
+        fetcher.get("gs://bkt/a.jpg")
+    assert fetcher.resolves == 1
+
+    blob = fake_client.put("gs://bkt/b.jpg", b"data")
+    fetcher.get("gs://bkt/b.jpg", str(blob.generation))  # generation z listingu => bez zapytania
+    assert fetcher.resolves == 1
+
+
+def test_missing_object_raises(fake_client, tmp_path):
+    fetcher = ImageFetcher(str(tmp_path))
+    with pytest.raises(FileNotFoundError):
+        fetcher.get("gs://bkt/missing.jpg")
+    assert isinstance(fetcher.get_many(["gs://bkt/missing.jpg"])[0], FileNotFoundError)
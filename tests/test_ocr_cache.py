@@ -0,0 +1,125 @@
+"""run_ocr_cache: podmienione pliki, duplikaty treści i uzupełnianie kluczy (fake GCS + fake Vision)."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.bench.fake_vision import FakeImageAnnotatorClient, fake_response
+from src.io.gcs import set_client
+from src.ocr.cache_store import CsvOcrCacheStore, ParquetOcrCacheStore
+from src.ocr.ocr_cache import file_id_from_gcs_path, run_ocr_cache
+
+
+PREFIX = "gs://bkt/photos"
+
+
+class ContentVision(FakeImageAnnotatorClient):
+    """Tekst OCR zależny od treści obiektu (nie od ścieżki): ta sama treść => te same linie."""
+
+    def __init__(self, storage: FakeStorageClient, **kwargs):
+        super().__init__(**kwargs)
+        self.storage = storage
+
+    def _respond(self, gs_path: str):
+        bucket, _, name = gs_path[len("gs://"):].partition("/")
+        data = self.storage.bucket(bucket).get_blob(name).download_as_bytes()
+        return fake_response(data.decode("ascii"), n_lines=self.n_lines, words_per_line=self.words_per_line)
+
+
+@pytest.fixture
+def storage():
+    client = FakeStorageClient()
+    set_client(client)
+    yield client
+    set_client(None)
+
+
+@pytest.fixture(params=["csv", "parquet"])
+def make_store(request, tmp_path):
+    def make():
+        if request.param == "csv":
+            return CsvOcrCacheStore(str(tmp_path / "ocr_lines.csv"))
+        return ParquetOcrCacheStore(str(tmp_path / "cache"))
+
+    return make
+
+
+def _texts(df, name: str) -> list[str]:
+    return df[df["file_name"] == name].sort_values("line_id")["text"].tolist()
+
+
+def _run(storage, store, **kwargs):
+    client = ContentVision(storage)
+    df = run_ocr_cache(PREFIX, None, store=store, client=client, checkpoint=False, **kwargs)
+    return df, client
+
+
+def test_duplicate_of_replaced_file_gets_old_content(storage, make_store):
+    storage.put(f"{PREFIX}/a.jpg", b"ONE")
+    df_one, _ = _run(storage, make_store())
+    one = _texts(df_one, "a.jpg")
+
+    storage.put(f"{PREFIX}/a.jpg", b"TWO")  # podmiana a.jpg
+    storage.put(f"{PREFIX}/b.jpg", b"ONE")  # nowy plik ze starą treścią a.jpg
+    df, client = _run(storage, make_store())
+
+    assert _texts(df, "b.jpg") == one
+    assert _texts(df, "a.jpg") != one
+    # b.jpg nie ma źródła w cache (a.jpg ma już inną treść) => OCR obu plików
+    assert set(client.calls_by_path) == {f"{PREFIX}/a.jpg", f"{PREFIX}/b.jpg"}
+
+
+def test_duplicate_of_file_replaced_later_in_listing(storage, make_store):
+    storage.put(f"{PREFIX}/z.jpg", b"ONE")
+    df_one, _ = _run(storage, make_store())
+    one = _texts(df_one, "z.jpg")
+
+    storage.put(f"{PREFIX}/a.jpg", b"ONE")  # duplikat przed źródłem w kolejności listingu
+    storage.put(f"{PREFIX}/z.jpg", b"TWO")
+    df, _ = _run(storage, make_store())
+
+    assert _texts(df, "a.jpg") == one
+    assert _texts(df, "z.jpg") != one
+
+
+def test_duplicates_reuse_unchanged_and_new_sources(storage, make_store):
+    storage.put(f"{PREFIX}/a.jpg", b"ONE")
+    _run(storage, make_store())
+
+    storage.put(f"{PREFIX}/b.jpg", b"ONE")  # duplikat pliku z cache
+    storage.put(f"{PREFIX}/c.jpg", b"THREE")
+    storage.put(f"{PREFIX}/d.jpg", b"THREE")  # duplikat pliku z tego uruchomienia
+    df, client = _run(storage, make_store())
+
+    assert set(client.calls_by_path) == {f"{PREFIX}/c.jpg"}
+    assert _texts(df, "b.jpg") == _texts(df, "a.jpg")
+    assert _texts(df, "d.jpg") == _texts(df, "c.jpg")
+    assert set(df[df["file_name"] == "b.jpg"]["file_id"]) == {file_id_from_gcs_path(f"{PREFIX}/b.jpg")}
+
+
+def test_unchanged_files_are_skipped(storage, make_store, capsys):
+    storage.put(f"{PREFIX}/a.jpg", b"ONE")
+    _run(storage, make_store())
+
+    _, client = _run(storage, make_store())
+    assert client.calls == 0
+    assert "[SKIP]" in capsys.readouterr().out
+
+
+def test_legacy_cache_without_keys_is_backfilled_without_ocr(storage, tmp_path):
+    storage.put(f"{PREFIX}/a.jpg", b"ONE")
+    store = CsvOcrCacheStore(str(tmp_path / "ocr_lines.csv"))
+    df_one, _ = _run(storage, store)
+    os.remove(store.manifest_path)  # cache sprzed kluczy treści
+    assert CsvOcrCacheStore(store.out_csv).content_index() == {f"{PREFIX}/a.jpg": None}
+
+    storage.put(f"{PREFIX}/b.jpg", b"ONE")
+    df, client = _run(storage, CsvOcrCacheStore(store.out_csv))
+
+    assert client.calls == 0  # a.jpg: tylko klucz; b.jpg: kopia a.jpg
+    assert _texts(df, "b.jpg") == _texts(df_one, "a.jpg")
+    keys = CsvOcrCacheStore(store.out_csv).content_index()
+    assert keys[f"{PREFIX}/a.jpg"] and keys[f"{PREFIX}/a.jpg"] == keys[f"{PREFIX}/b.jpg"]
@@ -0,0 +1,70 @@
+"""Konwersja WORD -> LINE (src.pipeline.run_lines): wykrywanie grupowania w trakcie strumienia."""
+
+from __future__ import annotations
+
+import csv
+import random
+
+import pytest
+
+from src.pipeline import run_lines
+from src.pipeline.run_lines import NotGroupedError, convert
+
+
+def _words() -> list[dict]:
+    rows = []
+    for f in range(6):
+        for w in range(12):
+            y = (w // 4) * 40
+            rows.append(
+                {"text": f"w{w}", "file_name": f"f{f}.jpg", "file_id": f"f{f}", "gcs_path": "",
+                 "x1": w * 10, "y1": y, "x2": w * 10 + 8, "y2": y + 10}
+            )
+    return rows
+
+
+def _write(path, rows) -> str:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0]))
+        w.writeheader()
+        w.writerows(rows)
+    return str(path)
+
+
+def _read(path) -> list[tuple]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return sorted((r["file_id"], r["line_id"], r["text"]) for r in csv.DictReader(f))
+
+
+@pytest.fixture
+def count_reads(monkeypatch):
+    calls = []
+    orig = run_lines.iter_words
+    monkeypatch.setattr(run_lines, "iter_words", lambda *a, **k: calls.append(a) or orig(*a, **k))
+    return calls
+
+
+def test_auto_reads_grouped_input_once(tmp_path, count_reads):
+    src = _write(tmp_path / "g.csv", _words())
+    assert convert(src, str(tmp_path / "out.csv")) == 18
+    assert len(count_reads) == 1
+
+
+def test_auto_falls_back_to_external_sort(tmp_path, count_reads):
+    grouped = _write(tmp_path / "g.csv", _words())
+    shuffled = _words()
+    random.Random(0).shuffle(shuffled)
+    src = _write(tmp_path / "u.csv", shuffled)
+
+    convert(grouped, str(tmp_path / "g_out.csv"))
+    count_reads.clear()
+    assert convert(src, str(tmp_path / "u_out.csv"), workers=2) == 18
+    assert len(count_reads) == 2  # przerwany przebieg "grouped" + porcje sortowania
+    assert _read(tmp_path / "u_out.csv") == _read(tmp_path / "g_out.csv")
+
+
+def test_grouped_order_rejects_ungrouped_input(tmp_path):
+    rows = _words()
+    src = _write(tmp_path / "u.csv", rows[:3] + rows[12:15] + rows[3:12] + rows[15:])
+    with pytest.raises(NotGroupedError):
+        convert(src, str(tmp_path / "out.csv"), input_order="grouped")
@@ -0,0 +1,118 @@
+"""Wsadowy OCR w shardach (src.pipeline.run_ocr): wznowienie z dzienników, ponowienie błędów, merge (fake Vision)."""
+
+from __future__ import annotations
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from src.bench.fake_vision import FakeImageAnnotatorClient
+from src.ocr.ocr_journal import OcrJournal
+from src.pipeline import run_ocr
+from src.pipeline.shard_queue import ShardQueue
+
+
+PATHS = [f"gs://bkt/photos/{i}.jpg" for i in range(6)]
+
+
+def _work(job_dir: str, client, **kwargs):
+    return run_ocr.work(job_dir, client=client, wait=False, max_retries=0, **kwargs)
+
+
+def _journal(job_dir: str, shard: int, owner_tag: str, paths: list[str]) -> None:
+    path = os.path.join(job_dir, "journals", f"shard-{shard:05d}.{owner_tag}.jsonl")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with OcrJournal(path) as journal:
+        for p in paths:
+            journal.append(p, [{"text": f"dziennik {owner_tag}", "gcs_path": p, "file_name": os.path.basename(p)}])
+
+
+def test_work_and_merge_cover_all_files(tmp_path):
+    job_dir = str(tmp_path / "job")
+    run_ocr.plan_job(job_dir, PATHS, n_shards=3)
+    client = FakeImageAnnotatorClient(n_lines=2)
+
+    stats = _work(job_dir, client)
+    assert stats["shards"] == 3 and stats["ocr"] == len(PATHS)
+
+    out = str(tmp_path / "lines.csv")
+    run_ocr.merge_job(job_dir, out)
+    df = pd.read_csv(out)
+    assert list(df.columns) == run_ocr.OCR_LINE_FIELDS
+    assert sorted(set(df["gcs_path"])) == sorted(PATHS) and len(df) == 2 * len(PATHS)
+
+
+def test_takeover_resumes_from_previous_owners_journals(tmp_path):
+    job_dir = str(tmp_path / "job")
+    run_ocr.plan_job(job_dir, PATHS, n_shards=1)
+    dead = ShardQueue(job_dir, 1, owner="dead:1:a")
+    dead.try_claim(0)
+    with open(dead.lease_path(0), "w", encoding="utf-8") as f:
+        json.dump({**dead._lease_info(0.0), "expires": 0.0}, f)  # worker zginął, lease wygasł
+    listing = run_ocr.read_shard_listing(job_dir, 0)
+    _journal(job_dir, 0, "dead_1_a", listing[:2])
+    _journal(job_dir, 0, "dead_2_b", listing[2:3])
+
+    client = FakeImageAnnotatorClient()
+    stats = _work(job_dir, client)
+
+    assert stats["shards"] == 1 and stats["ocr"] == 3
+    assert set(client.calls_by_path) == set(listing[3:])
+    assert ShardQueue(job_dir, 1).done_info(0)["resumed"] == 3
+
+    out = str(tmp_path / "lines.csv")
+    run_ocr.merge_job(job_dir, out)
+    texts = pd.read_csv(out).groupby("gcs_path")["text"].first()
+    assert texts[listing[0]] == "dziennik dead_1_a" and texts[listing[2]] == "dziennik dead_2_b"
+
+
+def test_lost_lease_aborts_shard(tmp_path):
+    job_dir = str(tmp_path / "job")
+    run_ocr.plan_job(job_dir, PATHS, n_shards=1)
+    queue = ShardQueue(job_dir, 1, owner="w")
+    lease = queue.try_claim(0)
+    lease.lost = True  # heartbeat zauważył przejęcie
+
+    with pytest.raises(run_ocr.LeaseLost):
+        run_ocr.process_shard(job_dir, lease, lambda: FakeImageAnnotatorClient(), max_in_flight=1, max_retries=0)
+    assert not os.path.exists(run_ocr._out_path(job_dir, 0))
+
+
+def test_reopen_failed_retries_only_failed_files(tmp_path):
+    job_dir = str(tmp_path / "job")
+    run_ocr.plan_job(job_dir, PATHS, n_shards=2)
+    bad = PATHS[0]
+    _work(job_dir, FakeImageAnnotatorClient(permanent_error_paths=[bad]))
+
+    assert run_ocr.job_status(job_dir)["failed_files"] == 1
+    assert run_ocr.merge_job(job_dir, str(tmp_path / "partial.csv"))["failed_files"] == 1
+
+    assert run_ocr.reopen_failed(job_dir) == 1
+    assert run_ocr.job_status(job_dir)["done"] == 1
+
+    client = FakeImageAnnotatorClient()
+    _work(job_dir, client)
+    assert set(client.calls_by_path) == {bad}
+    assert run_ocr.job_status(job_dir)["failed_files"] == 0
+    assert run_ocr.reopen_failed(job_dir) == 0
+
+    out = str(tmp_path / "lines.csv")
+    run_ocr.merge_job(job_dir, out)
+    assert sorted(set(pd.read_csv(out)["gcs_path"])) == sorted(PATHS)
+
+
+def test_merge_rejects_unfinished_and_foreign_schema(tmp_path):
+    job_dir = str(tmp_path / "job")
+    run_ocr.plan_job(job_dir, PATHS, n_shards=2)
+    out = str(tmp_path / "lines.csv")
+    with pytest.raises(RuntimeError, match="Niezakończone"):
+        run_ocr.merge_job(job_dir, out)
+    assert run_ocr.merge_job(job_dir, out, allow_partial=True)["missing_shards"] == 2
+
+    _work(job_dir, FakeImageAnnotatorClient())
+    with open(run_ocr._out_path(job_dir, 1), "w", encoding="utf-8") as f:
+        f.write("text,file_name,gcs_path,bbox_norm\n")  # shard z wcześniejszej wersji
+    with pytest.raises(RuntimeError, match="schemat"):
+        run_ocr.merge_job(job_dir, out)
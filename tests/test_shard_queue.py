@@ -0,0 +1,104 @@
+"""Kolejka shardów (src.pipeline.shard_queue): wyłączność claim, przejęcie wygasłego lease, odnowienie."""
+
+from __future__ import annotations
+
+import json
+import threading
+
+from src.pipeline import shard_queue
+from src.pipeline.shard_queue import ShardQueue
+
+
+def _expire(queue: ShardQueue, shard: int) -> None:
+    """Lease bez odnowienia po ttl (jak po śmierci workera) – bez czekania w teście."""
+    with open(queue.lease_path(shard), "w", encoding="utf-8") as f:
+        json.dump({**queue._lease_info(0.0), "expires": 0.0}, f)
+
+
+def _owner(queue: ShardQueue, shard: int) -> str | None:
+    return (shard_queue._read_json(queue.lease_path(shard)) or {}).get("owner")
+
+
+def test_claim_is_exclusive(tmp_path):
+    queues = [ShardQueue(str(tmp_path), 1, owner=f"w{i}") for i in range(16)]
+    barrier = threading.Barrier(len(queues))
+    won = []
+
+    def claim(q):
+        barrier.wait()
+        lease = q.try_claim(0)
+        if lease is not None:
+            won.append(lease.owner)
+
+    threads = [threading.Thread(target=claim, args=(q,)) for q in queues]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(won) == 1
+    assert _owner(queues[0], 0) == won[0]
+    assert queues[0].try_claim(0) is None
+
+
+def test_live_lease_is_not_taken_over(tmp_path):
+    old = ShardQueue(str(tmp_path), 1, owner="old")
+    assert old.try_claim(0) is not None
+    assert ShardQueue(str(tmp_path), 1, owner="new").try_claim(0) is None
+    assert old.status()["leased"] == 1
+
+
+def test_expired_lease_is_taken_over_and_old_owner_loses_it(tmp_path):
+    old = ShardQueue(str(tmp_path), 1, owner="old")
+    new = ShardQueue(str(tmp_path), 1, owner="new")
+    old_lease = old.try_claim(0)
+    _expire(old, 0)
+    assert old.status()["expired"] == 1
+
+    new_lease = new.try_claim(0)
+    assert new_lease is not None and _owner(new, 0) == "new"
+
+    assert old_lease.renew() is False and old_lease.lost
+    assert old.mark_done(old_lease, {"files": 0}) is False
+    assert not old.is_done(0)
+    assert _owner(new, 0) == "new"  # release starego właściciela nie usuwa cudzego lease
+
+    assert new.mark_done(new_lease, {"files": 0}) is True
+    assert new.is_done(0) and new.done_info(0)["owner"] == "new"
+    assert new.try_claim(0) is None
+
+
+def test_stalled_renew_does_not_overwrite_takeover(tmp_path, monkeypatch):
+    old = ShardQueue(str(tmp_path), 1, owner="old")
+    new = ShardQueue(str(tmp_path), 1, owner="new")
+    old_lease = old.try_claim(0)
+    _expire(old, 0)
+
+    read_json = shard_queue._read_json
+    taken = []
+
+    def stall_after_read(path):
+        info = read_json(path)
+        if not taken:  # stary właściciel zatrzymany po odczycie – w tym czasie przejęcie
+            taken.append(None)
+            taken[0] = new.try_claim(0)
+        return info
+
+    monkeypatch.setattr(shard_queue, "_read_json", stall_after_read)
+    assert old_lease.renew() is False
+    monkeypatch.undo()
+
+    assert taken[0] is not None
+    assert _owner(new, 0) == "new"
+    assert taken[0].renew() is True
+
+
+def test_reopen_returns_shard_to_pool(tmp_path):
+    q = ShardQueue(str(tmp_path), 2, owner="w")
+    for _ in range(2):
+        assert q.mark_done(q.claim_next(), {"files": 0})
+    assert q.all_done() and q.claim_next() is None
+
+    q.reopen(1)
+    lease = q.claim_next()
+    assert lease is not None and lease.shard == 1
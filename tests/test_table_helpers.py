@@ -0,0 +1,51 @@
+"""Filtr tabeli recenzji (src.ui.table_helpers) z TextIndex: mapowanie trafień na wiersze df."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from src.search.text_index import TextIndex
+from src.ui import table_helpers
+from src.ui.table_helpers import ensure_edit_columns, filter_df_for_table, row_positions
+
+
+def _df() -> pd.DataFrame:
+    return ensure_edit_columns(
+        pd.DataFrame(
+            {
+                "file_id": ["a", "a", "b", "b", "c"],
+                "file_name": ["a.jpg", "a.jpg", "b.jpg", "b.jpg", "c.jpg"],
+                "line_id": [0, 1, 0, 1, 0],
+                "text": ["Apteka Łódź", "ul. Długa", "apteka", "Piekarnia", "APTEKA pod orłem"],
+            }
+        )
+    )
+
+
+def test_index_filter_matches_rows_in_df_order():
+    df = _df()
+    index = TextIndex()
+    index.sync(df)
+
+    out = filter_df_for_table(df, "(wszystkie)", "apteka", index=index)
+    assert out.index.tolist() == [0, 2, 4]
+
+    out = filter_df_for_table(df, "b.jpg", "apteka", index=index)
+    assert out.index.tolist() == [2]
+
+
+def test_row_map_is_built_once_per_df_version(monkeypatch):
+    df = _df()
+    first = row_positions(df)
+    df.loc[0, "text_edited"] = "edycja"  # edycja nie zmienia wersji
+    assert row_positions(df) is first
+
+    grown = pd.concat([df, df.iloc[:1].assign(line_id=7)], ignore_index=True)
+    assert row_positions(grown)[("a", 7)] == 5
+
+    calls = []
+    monkeypatch.setattr(table_helpers, "row_positions", lambda d: calls.append(1) or first)
+    index = TextIndex()
+    index.sync(df)
+    filter_df_for_table(df, "(wszystkie)", "apt", index=index)
+    assert calls == [1]
@@ -0,0 +1,46 @@
+"""TextIndex.sync (src.search.text_index): przyrostowa synchronizacja bez nadpisywania edycji."""
+
+from __future__ import annotations
+
+import pandas as pd
+
+from src.search.text_index import TextIndex
+
+
+def _ocr_df(texts: dict[str, list[str]]) -> pd.DataFrame:
+    rows = [
+        {"file_id": fid, "file_name": f"{fid}.jpg", "line_id": i, "text": t}
+        for fid, lines in texts.items()
+        for i, t in enumerate(lines)
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_sync_with_files_keeps_reviewer_edits():
+    df = _ocr_df({"a": ["apteka", "ul. dluga"], "b": ["piekarnia"]})
+    review = df.assign(text_edited=df["text"])
+    review.loc[1, "text_edited"] = "ul. Długa 5"
+
+    index = TextIndex()
+    index.sync(review, text_col="text_edited")
+    index.update_line("b", 0, "piekarnia miejska")
+
+    # run_ocr_cache: df_out bez text_edited, ponowny OCR tylko pliku "c"
+    df_out = _ocr_df({"a": ["apteka", "ul. dluga"], "b": ["piekarnia"], "c": ["kino"]})
+    stats = index.sync(df_out, files=["c"])
+
+    assert stats["changed_files"] == 1
+    assert len(index.search("dluga 5")) == 1
+    assert len(index.search("miejska")) == 1
+    assert len(index.search("kino")) == 1
+
+
+def test_sync_reindexes_listed_files_and_removes_missing():
+    index = TextIndex()
+    index.sync(_ocr_df({"a": ["stary napis"], "b": ["piekarnia"]}))
+
+    stats = index.sync(_ocr_df({"a": ["nowy napis"]}), files=["a"])
+
+    assert stats == {"changed_files": 1, "removed_files": 1, "lines": 1}
+    assert index.search("stary").empty
+    assert len(index.search("nowy")) == 1
@@ -0,0 +1,116 @@
+"""Miniatury bazowe (src.viz.thumbs): klucz z tożsamości źródła, braki partiami, LRU na dysku."""
+
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pytest
+
+from src.bench.fake_gcs import FakeStorageClient
+from src.bench.synthetic import synthetic_jpeg
+from src.io.gcs import set_client
+from src.io.image_fetcher import ImageFetcher, set_fetcher
+from src.viz import gallery
+from src.viz.gallery import gcs_thumbnails
+from src.viz.thumbs import ThumbnailCache, base_thumbnails, gcs_source_id, local_source_id, thumb_key
+
+
+@pytest.fixture
+def fake_gcs(tmp_path):
+    client = FakeStorageClient()
+    fetcher = ImageFetcher(str(tmp_path / "images"))
+    set_client(client)
+    set_fetcher(fetcher)
+    yield client, fetcher
+    set_client(None)
+    set_fetcher(None)
+
+
+def test_only_misses_are_loaded_in_bounded_batches(tmp_path):
+    images = [synthetic_jpeg(320, 240, seed=i) for i in range(7)]
+    keys = [thumb_key(f"src-{i}", 64) for i in range(7)]
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+    calls: list[list[int]] = []
+
+    def load(idx):
+        calls.append(list(idx))
+        return [images[i] for i in idx]
+
+    first = base_thumbnails(keys, load, 64, cache=cache, processes=1, batch_size=3)
+    assert calls == [[0, 1, 2], [3, 4, 5], [6]]
+    assert all(t[1:] == (320, 240) for t in first)
+
+    calls.clear()
+    keys[4] = thumb_key("src-4-new", 64)
+    base_thumbnails(keys, load, 64, cache=cache, processes=1, batch_size=3)
+    assert calls == [[4]]
+
+
+def test_errors_pass_through_without_loading(tmp_path):
+    err = FileNotFoundError("brak")
+    out = base_thumbnails([err], lambda idx: pytest.fail("load"), 64, cache=ThumbnailCache(""), processes=1)
+    assert out == [err]
+
+
+def test_disk_tier_is_bounded_lru(tmp_path):
+    cache_dir = str(tmp_path / "thumbs")
+    cache = ThumbnailCache(cache_dir, max_items=1, max_disk_bytes=250)
+    value = (b"x" * 100, 10, 10)  # ~100 B JPEG + ~20 B meta => mieszczą się dwa wpisy
+    cache.put("aa1", value)
+    cache.put("bb2", value)
+    assert cache.get("aa1") is not None  # aa1 świeższy niż bb2
+    cache.put("cc3", value)
+
+    assert cache._disk_bytes <= 250
+    assert not os.path.exists(os.path.join(cache_dir, "bb", "bb2.jpg"))
+
+    reopened = ThumbnailCache(cache_dir, max_disk_bytes=250)
+    assert reopened.get("aa1") is not None
+    assert reopened.get("cc3") is not None
+    assert reopened.get("bb2") is None
+
+
+def test_source_ids_follow_generation_and_mtime(tmp_path):
+    assert gcs_source_id("gs://b/a.jpg", "1", 10) != gcs_source_id("gs://b/a.jpg", "2", 10)
+
+    p = tmp_path / "a.jpg"
+    p.write_bytes(b"one")
+    before = local_source_id(str(p))
+    os.utime(p, ns=(1, 1))
+    assert local_source_id(str(p)) != before
+
+
+def test_gcs_thumbnails_warm_render_does_not_fetch(fake_gcs, tmp_path):
+    client, fetcher = fake_gcs
+    paths = [f"gs://bkt/photos/{i}.jpg" for i in range(3)]
+    for i, p in enumerate(paths):
+        client.put(p, synthetic_jpeg(320, 240, seed=i))
+    cache = ThumbnailCache(str(tmp_path / "thumbs"))
+
+    gcs_thumbnails(paths + ["gs://bkt/photos/missing.jpg"], 64, cache=cache, processes=1)
+    assert fetcher.misses == 3
+
+    fetcher.clear_memory()
+    out = gcs_thumbnails(paths, 64, cache=ThumbnailCache(str(tmp_path / "thumbs")), processes=1)
+    assert fetcher.misses == 3 and fetcher.hits_disk == 0
+    assert all(not isinstance(t, Exception) for t in out)
+
+    client.put(paths[1], synthetic_jpeg(200, 100, seed=9))  # podmiana skanu => nowa generation
+    out = gcs_thumbnails(paths, 64, cache=cache, processes=1)
+    assert fetcher.misses == 4
+    assert out[1][1:] == (200, 100)
+
+
+def test_render_gallery_with_duplicate_index_labels(fake_gcs, tmp_path, monkeypatch, capsys):
+    client, _ = fake_gcs
+    for name in ("a.jpg", "b.jpg"):
+        client.put(f"gs://bkt/photos/{name}", synthetic_jpeg(320, 240))
+    part = pd.DataFrame({"file_name": ["a.jpg", "b.jpg"], "x1": 0.1, "y1": 0.1, "x2": 0.5, "y2": 0.5})
+    df = pd.concat([part, part.assign(file_name=["b.jpg", "c.jpg"])])  # indeks 0, 1, 0, 1
+    monkeypatch.setattr(gallery, "display", lambda *a, **k: None)
+
+    cache = ThumbnailCache(str(tmp_path / "t"))
+    gallery.render_gallery(df, "gs://bkt/photos", limit_gallery=2, thumb_cache=cache, processes=1)  # bez c.jpg
+
+    assert "OK=2, błędy=0, razem=2" in capsys.readouterr().out